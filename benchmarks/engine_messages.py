@@ -0,0 +1,75 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Benchmarks predict calls through the model engine with large arrays, sent inline through the socket against
+through shared memory.
+
+Usage: python benchmarks/engine_messages.py [megabytes]
+"""
+import os
+import os.path as osp
+import shutil
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from catwalk.server.engine import ModelEngine, EngineClient, DEFAULT_THRESHOLD
+
+ECHO_MODEL = """
+class Model(object):
+
+    def __init__(self, path="."):
+        pass
+
+    def predict(self, X):
+        return X
+"""
+
+
+def main(megabytes=64, repeat=5):
+    model_path = tempfile.mkdtemp()
+    with open(osp.join(model_path, "model.py"), "w") as fp:
+        fp.write(ECHO_MODEL)
+    fd, config_path = tempfile.mkstemp()
+    with os.fdopen(fd, "w") as fp:
+        fp.write("server:\n  engine:\n    processes: 1\n")
+
+    engine = ModelEngine(config_path, model_path)
+    try:
+        X = np.random.default_rng(0).random(megabytes * 2 ** 17)
+        inline = EngineClient(engine.path, threshold=2 ** 62)
+        shared = EngineClient(engine.path, threshold=DEFAULT_THRESHOLD)
+        inline.call("predict", X[:1])
+
+        t_inline = min(timeit.repeat(lambda: inline.call("predict", X), number=1, repeat=repeat))
+        t_shared = min(timeit.repeat(lambda: shared.call("predict", X), number=1, repeat=repeat))
+    finally:
+        engine.stop()
+        shutil.rmtree(model_path, ignore_errors=True)
+        os.remove(config_path)
+
+    print("size:    {} MB".format(megabytes))
+    print("inline:  {:.1f} ms".format(1000 * t_inline))
+    print("shared:  {:.1f} ms".format(1000 * t_shared))
+    print("speedup: {:.1f}x".format(t_inline / t_shared))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
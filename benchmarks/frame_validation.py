@@ -0,0 +1,72 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Benchmarks DataFrame column validation against converting the frame to records and validating them with the
+compiled row schema.
+
+Usage: python benchmarks/frame_validation.py [rows]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from catwalk.validation.compiler import compile_schema
+from catwalk.validation.frame import FrameValidator
+
+INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "seed": {"type": "integer"},
+        "mu": {"type": "number"},
+        "sigma": {"type": "number", "nullable": True},
+        "label": {"type": "string"}
+    }
+}
+
+
+def main(rows=100000, repeat=3):
+    rng = np.random.default_rng(0)
+    sigma = rng.random(rows)
+    sigma[::10] = np.nan
+    df = pd.DataFrame({
+        "seed": np.arange(rows),
+        "mu": rng.random(rows),
+        "sigma": sigma,
+        "label": ["x{}".format(i % 7) for i in range(rows)]
+    })
+
+    rows_schema = compile_schema({"type": "array", "items": INPUT_SCHEMA})
+    frame = FrameValidator(INPUT_SCHEMA)
+
+    def records():
+        X = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+        rows_schema.validate(X)
+
+    t_records = min(timeit.repeat(records, number=1, repeat=repeat))
+    t_frame = min(timeit.repeat(lambda: frame.validate(df), number=1, repeat=repeat))
+
+    print("rows:    {}".format(rows))
+    print("records: {:.1f} ms".format(1000 * t_records))
+    print("frame:   {:.1f} ms".format(1000 * t_frame))
+    print("speedup: {:.1f}x".format(t_records / t_frame))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
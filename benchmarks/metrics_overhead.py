@@ -0,0 +1,52 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Benchmarks the cost of recording the metrics of one predict request, in memory and through a shared file.
+
+Usage: python benchmarks/metrics_overhead.py [requests]
+"""
+import shutil
+import sys
+import tempfile
+import timeit
+
+from catwalk.server.metrics import ServerMetrics, STAGES
+
+
+def record(metrics):
+    metrics.in_flight.inc()
+    for stage in STAGES:
+        metrics.stage_duration.observe(0.001, (stage,))
+    metrics.rows.inc(16)
+    metrics.in_flight.dec()
+    metrics.record_request("predict", 200, 0.005, 2048, 512)
+
+
+def main(requests=100000, repeat=3):
+    path = tempfile.mkdtemp()
+    try:
+        for name, metrics_path in (("memory", None), ("file", path)):
+            metrics = ServerMetrics(["predict"], metrics_path, {"model": "benchmark", "version": "1"})
+            t = min(timeit.repeat(lambda: record(metrics), number=requests, repeat=repeat))
+            print("{:<7} {:.2f} us per request".format(name + ":", 1e6 * t / requests))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
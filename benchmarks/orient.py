@@ -0,0 +1,62 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Benchmarks the payload size and DataFrame conversion time of a PANDAS_DATA_FRAME input in each orientation.
+
+Usage: python benchmarks/orient.py [rows]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from catwalk.server.codec import get_codec
+from catwalk.server.orient import RECORDS, COLUMNS, SPLIT, to_data_frame, from_data_frame
+
+
+def payloads(rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x{}".format(i): rng.random(rows) for i in range(8)})
+    return df, {
+        RECORDS: df.to_dict(orient="records"),
+        COLUMNS: df.to_dict(orient="list"),
+        SPLIT: {"columns": list(df.columns), "data": df.values.tolist()}
+    }
+
+
+def main(rows=100000, repeat=3):
+    codec = get_codec()
+    df, inputs = payloads(rows)
+    for orient, X in inputs.items():
+        body = codec.dumps({"input": X})
+        X = codec.loads(body)["input"]
+        if orient == RECORDS:
+            to_df = lambda: pd.DataFrame.from_dict(X)  # noqa: E731
+            from_df = lambda: codec.dumps(df.to_dict(orient="records"))  # noqa: E731
+        else:
+            to_df = lambda: to_data_frame(X, orient, pd)  # noqa: E731
+            from_df = lambda: codec.dumps(from_data_frame(df, orient))  # noqa: E731
+        t_in = min(timeit.repeat(to_df, number=1, repeat=repeat))
+        t_out = min(timeit.repeat(from_df, number=1, repeat=repeat))
+        print("{:<8} {:>8.1f} KiB  to DataFrame {:>7.1f} ms  from DataFrame {:>7.1f} ms".format(
+            orient + ":", len(body) / 1024, 1e3 * t_in, 1e3 * t_out))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Benchmarks compiled schema validation against Schema object validation on large array inputs.
+
+Usage: python benchmarks/schema_validation.py [rows]
+"""
+import sys
+import timeit
+
+from catwalk.validation.compiler import compile_request_schema
+from catwalk.validation.schema import get_request_schema
+
+INPUT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "seed": {"type": "integer"},
+            "seed_version": {"type": "integer"},
+            "mu": {"type": "number"},
+            "sigma": {"type": "number"},
+            "weights": {"type": "array", "items": {"type": "number"}}
+        }
+    }
+}
+
+
+def main(rows=10000, repeat=3):
+    data = {
+        "correlation_id": "1A",
+        "input": [{"seed": i, "seed_version": 2, "mu": 0.0, "sigma": 1.0, "weights": [0.5] * 8} for i in range(rows)]
+    }
+
+    reference = get_request_schema(INPUT_SCHEMA)
+    compiled = compile_request_schema(INPUT_SCHEMA)
+
+    t_schema = min(timeit.repeat(lambda: reference.validate(data), number=1, repeat=repeat))
+    t_compiled = min(timeit.repeat(lambda: compiled.validate(data), number=1, repeat=repeat))
+
+    print("rows:     {}".format(rows))
+    print("schema:   {:.1f} ms".format(1000 * t_schema))
+    print("compiled: {:.1f} ms".format(1000 * t_compiled))
+    print("speedup:  {:.1f}x".format(t_schema / t_compiled))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
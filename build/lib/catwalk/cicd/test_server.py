@@ -0,0 +1,351 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Test server with the following steps:
+Uses base test python file,
+set up model server,
+test http responses,
+validate model metadata,
+validate model I/O,
+test with specified correlation_id,
+test with a specified model,
+test with extra data,
+test error 404 response,
+test binary wire formats,
+report the stage timings.
+"""
+import logging
+from os import path as osp
+import unittest
+
+from schema import SchemaError
+import yaml
+
+from ..helpers.configuration import app_config
+from ..validation.schema import get_schema, get_response_schema, to_schema
+from ..validation.model import ModelIOTypes
+from ..validation.tensor import TensorSpec
+from ..server import app as app_server
+from ..server import formats
+from ..server.timing import parse_server_timing
+from .base_test import BaseTest
+
+
+class TestServer(BaseTest):
+    def __init__(self, model_path, *args, **kwargs):
+        super().__init__(model_path, *args, **kwargs)
+        self.config_path = None
+
+    def setUp(self):
+        super().setUp()
+
+        meta_path = osp.join(self.model_path, "model.yml")
+        with open(meta_path, "r") as fp:
+            meta = yaml.safe_load(fp)
+
+        self.logger.info("Testing server with model: " + meta["name"])
+
+        app_server.init(self.config_path, self.model_path)
+        app_server.app.config["TESTING"] = True
+
+        self.app_logger = app_server.app.logger
+        self.original_log_level = self.app_logger.level
+        self.app_logger.setLevel(logging.CRITICAL)
+
+        self.client = app_server.app.test_client()
+
+    def runTest(self):
+        self._test_status()
+        model_info = self._test_info()
+        self._test_predict(model_info)
+        self._test_formats(model_info)
+        self._test_timing(model_info)
+
+    def tearDown(self):
+        self.app_logger.setLevel(self.original_log_level)
+        super().tearDown()
+
+    def _test_status(self):
+        self.logger.info("Testing HTTP GET /status")
+
+        response = self.client.get("/status")
+
+        self.assertEqual(response.status_code, 200,
+                         "Response code to /status should be 200. Got code {}".format(response.status_code))
+
+        self.assertEqual(len(response.data), 0,
+                         "Response body to /status should be empty")
+
+    def _test_info(self):
+        self.logger.info("Testing HTTP GET /info")
+
+        response = self.client.get("/info")
+
+        self.assertEqual(response.status_code, 200,
+                         "Response code to /info should be 200. Got code {}".format(response.status_code))
+
+        self.assertTrue(response.is_json,
+                        "Response to /info should be json object")
+
+        info_schema = get_schema("info_response")
+        data = response.get_json()
+
+        try:
+            info_schema.validate(data)
+        except SchemaError as err:
+            self.logger.error(err)
+            self.fail("Invalid model metadata")
+
+        return data
+
+    def _load_test_input(self, model_info):
+        # Load the test data
+        X_test, y_test = app_server.model.load_test_data(self.model_path)
+
+        io_type = ModelIOTypes.get_io_type(model_info)
+
+        if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            X_test = X_test.to_dict(orient="records")
+        elif io_type == ModelIOTypes.COLUMNAR:
+            X_test = {name: list(column) for name, column in X_test.items()}
+        elif io_type == ModelIOTypes.NUMPY_ARRAY:
+            X_test = TensorSpec(model_info["schema"]["input"]).encode(X_test)
+        elif model_info["schema"]["input"]["type"] != "array":
+            X_test = X_test[0]
+
+        return X_test
+
+    def _test_predict(self, model_info):
+        self.logger.info("Testing HTTP POST /predict")
+
+        X_test = self._load_test_input(model_info)
+        io_type = ModelIOTypes.get_io_type(model_info)
+
+        def test_request(data):
+            # Make the request
+            response = self.client.post("/predict", json=data)
+
+            self.assertEqual(response.status_code, 200,
+                             "Response code to /predict should be 200. Got code {}".format(response.status_code))
+
+            self.assertTrue(response.is_json,
+                            "Response to /predict should be json object")
+
+            response_data = response.get_json()
+
+            # Validate against the output schema
+            out_schema = get_response_schema(model_info["schema"]["input"], model_info["schema"]["output"], io_type)
+
+            try:
+                out_schema.validate(response_data)
+            except SchemaError as err:
+                self.fail(err)
+
+            return response_data
+
+        request_data = {
+            "input": X_test,
+        }
+        response_data = test_request(request_data)
+
+        self.assertIn("correlation_id", response_data, "correlation_id not returned")
+
+        self.assertIn("model", response_data, "model not returned")
+
+        model_data = {
+            "name": model_info["name"],
+            "version": model_info["version"]
+        }
+        self.assertDictEqual(response_data["model"], model_data,
+                             "model returned but not a match")
+
+        # Test with specified correlation_id
+        request_data["correlation_id"] = "1A"
+        response_data = test_request(request_data)
+        self.assertEqual(response_data["correlation_id"], "1A", "correlation_id returned did not match")
+
+        # Test with a specified model
+        request_data["model"] = model_data
+        response_data = test_request(request_data)
+        self.assertDictEqual(response_data["model"], model_data,
+                             "model returned did not match")
+
+        # Test with extra_data
+        request_data["extra_data"] = {
+            "foo": "bar"
+        }
+        response_data = test_request(request_data)
+        self.assertIn("extra_data", response_data, "extra_data not returned")
+        self.assertDictEqual(request_data["extra_data"], response_data["extra_data"],
+                             "extra_data returned but not equal")
+
+        # Test the 400 response
+
+        response = self.client.post("/predict", json="This should fail")
+
+        self.assertEqual(response.status_code, 400,
+                         "Response code to /predict with bad data should be 400. Got code {}".format(response.status_code))
+
+        self.assertTrue(response.is_json,
+                        "Response to /predict with bad data should be json object")
+
+        response_data = response.get_json()
+        self.assertIn("message", response_data["output"],
+                      "Response to /predict with bad data should include a message")
+
+        # Test the 404 response
+
+        def test_404():
+            response = self.client.post("/predict", json=request_data)
+
+            self.assertEqual(response.status_code, 404,
+                             "Response code to /predict with wrong model should be 404. Got code {}".format(
+                                 response.status_code))
+
+            self.assertTrue(response.is_json,
+                            "Response to /predict with wrong model should be json object")
+
+            response_data = response.get_json()
+            self.assertIn("message", response_data["output"],
+                          "Response to /predict with wrong model should include a message")
+
+        request_data["model"]["name"] = "This should fail"
+        test_404()
+
+        request_data["model"]["name"] = model_info["name"]
+        request_data["model"]["version"] = "This should fail"
+        test_404()
+
+    def _test_formats(self, model_info):
+        io_type = ModelIOTypes.get_io_type(model_info)
+
+        if formats.msgpack is not None:
+            self.logger.info("Testing HTTP POST /predict with MessagePack")
+
+            request_data = {
+                "correlation_id": "1A",
+                "input": self._load_test_input(model_info)
+            }
+            response = self.client.post("/predict", data=formats.msgpack.packb(request_data),
+                                        content_type=formats.MsgPackFormat.mimetype)
+
+            self.assertEqual(response.status_code, 200,
+                             "Response code to /predict with MessagePack should be 200. Got code {}".format(
+                                 response.status_code))
+            self.assertEqual(response.mimetype, formats.MsgPackFormat.mimetype,
+                             "Response to /predict with MessagePack should be MessagePack")
+
+            response_data = formats.msgpack.unpackb(response.data, raw=False)
+            out_schema = get_response_schema(model_info["schema"]["input"], model_info["schema"]["output"], io_type)
+            try:
+                out_schema.validate(response_data)
+            except SchemaError as err:
+                self.fail(err)
+
+        if formats.pyarrow is not None and io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            self.logger.info("Testing HTTP POST /predict with Arrow IPC")
+
+            X_test, y_test = app_server.model.load_test_data(self.model_path)
+            body = formats.ArrowFormat.write_stream(X_test, {"correlation_id": "1A", "extra_data": {"foo": "bar"}})
+            response = self.client.post("/predict", data=body, content_type=formats.ArrowFormat.mimetype,
+                                        headers={"Accept": formats.ArrowFormat.mimetype})
+
+            self.assertEqual(response.status_code, 200,
+                             "Response code to /predict with Arrow should be 200. Got code {}".format(
+                                 response.status_code))
+            self.assertEqual(response.mimetype, formats.ArrowFormat.mimetype,
+                             "Response to /predict with Arrow should be Arrow")
+
+            envelope, table = formats.ArrowFormat.read_stream(response.data)
+            self.assertEqual(envelope["correlation_id"], "1A", "correlation_id returned did not match")
+            self.assertDictEqual(envelope["extra_data"], {"foo": "bar"}, "extra_data returned but not equal")
+            self.assertEqual(table.num_rows, len(X_test), "Arrow response has the wrong number of rows")
+
+            out_schema = model_info["schema"]["output"]
+            if out_schema["type"] == "object":
+                out_schema = {"type": "array", "items": out_schema}
+            try:
+                to_schema(out_schema).validate(table.to_pylist())
+            except SchemaError as err:
+                self.fail(err)
+
+        if io_type == ModelIOTypes.NUMPY_ARRAY:
+            self._test_tensor_format(model_info)
+
+    def _test_tensor_format(self, model_info):
+        self.logger.info("Testing HTTP POST /predict with raw tensors")
+
+        X_test, y_test = app_server.model.load_test_data(self.model_path)
+        headers = {
+            formats.SHAPE_HEADER: formats.format_shape(X_test.shape),
+            formats.CORRELATION_ID_HEADER: "1A",
+            "Accept": formats.TensorFormat.mimetype
+        }
+        body = TensorSpec(model_info["schema"]["input"]).conform(X_test, "input.shape").tobytes()
+        response = self.client.post("/predict", data=body,
+                                    content_type=formats.TensorFormat.mimetype, headers=headers)
+
+        self.assertEqual(response.status_code, 200,
+                         "Response code to /predict with raw tensors should be 200. Got code {}".format(
+                             response.status_code))
+        self.assertEqual(response.mimetype, formats.TensorFormat.mimetype,
+                         "Response to /predict with raw tensors should be a raw tensor")
+        self.assertEqual(response.headers[formats.CORRELATION_ID_HEADER], "1A",
+                         "correlation_id returned did not match")
+
+        out_spec = TensorSpec(model_info["schema"]["output"])
+        try:
+            r = out_spec.decode({"data": response.data,
+                                 "dtype": response.headers[formats.DTYPE_HEADER],
+                                 "shape": formats.parse_shape(response.headers[formats.SHAPE_HEADER])}, "output")
+        except SchemaError as err:
+            self.fail(err)
+        self.assertEqual(r.shape[0], len(X_test), "Raw tensor response has the wrong number of rows")
+
+    def _test_timing(self, model_info):
+        self.logger.info("Testing stage timings of HTTP POST /predict")
+
+        header = app_config.get_nested("server.timing.header", False)
+        app_config.set_nested("server.timing.header", True)
+        try:
+            response = self.client.post("/predict", json={"correlation_id": "1A",
+                                                          "input": self._load_test_input(model_info)})
+        finally:
+            app_config.set_nested("server.timing.header", header)
+
+        self.assertEqual(response.status_code, 200,
+                         "Response code to /predict should be 200. Got code {}".format(response.status_code))
+        self.assertIn("Server-Timing", response.headers, "Response to /predict should have a Server-Timing header")
+
+        timings = parse_server_timing(response.headers["Server-Timing"])
+        for stage in ["parse", "validate", "convert", "predict", "serialize"]:
+            self.assertIn(stage, timings, "Server-Timing should include the {} stage".format(stage))
+
+        self.logger.info("Stage timings of the test data:")
+        for stage, params in timings.items():
+            line = "  {:<10} {:>9.3f} ms wall".format(stage, params["dur"])
+            if "desc" in params:
+                line += " {:>9} ms cpu".format(params["desc"][len("cpu="):-len("ms")])
+            self.logger.info(line)
+
+
+def test_server(model_path="."):
+    suite = unittest.TestSuite()
+    suite.addTest(TestServer(model_path))
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    return result.wasSuccessful()
@@ -0,0 +1,307 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Distributes the chunks of a scoring job across several running model servers.
+
+Each chunk is POSTed to the /predict end-point of the server with the fewest outstanding requests, over a pool of
+keep-alive connections per server. A chunk that fails with a connection error or a retryable status code is retried
+on another server, and the server that failed is ejected for a cooldown that doubles with each consecutive failure,
+so a server that died (which refuses connections straight away, and so never has outstanding requests) is not chosen
+for every new chunk. Every chunk has a fixed correlation_id, so a server with the idempotency store enabled answers a
+retry of a chunk it already predicted without predicting it again. Results are yielded in input order.
+"""
+import collections
+import http.client
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from schema import SchemaError
+
+from ..server.codec import get_codec
+from ..validation.compiler import compile_records_schema
+from ..validation.model import is_batch_model
+
+# The status codes that are retried on another server
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class EndpointError(Exception):
+    """A request to an endpoint that failed, and may succeed on another endpoint."""
+    pass
+
+
+class Endpoint(object):
+    """A model server, with a pool of keep-alive connections.
+
+    :param str url: The server's base URL, e.g. http://host:9090. The scheme defaults to http.
+    :param float timeout: The socket timeout, in seconds.
+    """
+
+    def __init__(self, url, timeout=60.0):
+        parts = urlsplit(url if "://" in url else "http://" + url)
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = float(timeout)
+
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, self.base_path + path, body, headers)
+        response = conn.getresponse()
+        return response, response.read()
+
+    def request(self, method, path, body=None, headers=None):
+        """Makes a request on an idle keep-alive connection, or a new one.
+
+        :param str method:
+        :param str path:
+        :param bytes body:
+        :param dict headers:
+        :return (int, bytes): The status code and body of the response.
+        :raises EndpointError: If the request could not be made.
+        """
+        with self._lock:
+            conn = self._idle.pop() if len(self._idle) > 0 else None
+        is_reused = conn is not None
+        if conn is None:
+            conn = self._connect()
+
+        try:
+            try:
+                response, data = self._send(conn, method, path, body, headers or {})
+            except (OSError, http.client.HTTPException):
+                if not is_reused:
+                    raise
+                # The server may have closed the idle connection, so retry once on a new one
+                conn.close()
+                conn = self._connect()
+                response, data = self._send(conn, method, path, body, headers or {})
+        except (OSError, http.client.HTTPException) as err:
+            conn.close()
+            raise EndpointError("{}: {}".format(self.url, err))
+
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+
+
+class Coordinator(object):
+    """Scores chunks of records on several model servers, with least-outstanding-requests balancing.
+
+    :param list endpoints: The servers' base URLs.
+    :param int concurrency: The number of requests in flight per server.
+    :param int retries: The number of times a chunk is retried on another server.
+    :param float timeout: The socket timeout, in seconds.
+    :param float backoff: The delay, in seconds, before the first retry. It doubles on every retry.
+    :param float cooldown: How long, in seconds, a server that failed is ejected for. It doubles with each consecutive
+                           failure of the server, up to max_cooldown. 0 disables ejection.
+    :param float max_cooldown: In seconds.
+    """
+
+    def __init__(self, endpoints, concurrency=2, retries=3, timeout=60.0, backoff=0.1, cooldown=1.0,
+                 max_cooldown=30.0):
+        if len(endpoints) == 0:
+            raise ValueError("No endpoints given")
+        self.endpoints = [Endpoint(url, timeout) for url in endpoints]
+        self.concurrency = max(int(concurrency), 1)
+        self.retries = max(int(retries), 0)
+        self.backoff = float(backoff)
+        self.cooldown = float(cooldown)
+        self.max_cooldown = float(max_cooldown)
+        self.codec = get_codec()
+        self.job_id = uuid.uuid4().hex
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._is_batch = True
+        self._retried = 0
+
+    def info(self) -> dict:
+        """Fetches the model info from every available server, and checks they all serve the same model.
+        Unavailable servers are kept, as chunks sent to them are retried on other servers.
+
+        :return dict: The model info.
+        :raises ValueError: If no server is available, or a server serves a different model.
+        """
+        info = None
+        errors = []
+        for endpoint in self.endpoints:
+            try:
+                status, data = endpoint.request("GET", "/info")
+            except EndpointError as err:
+                errors.append(str(err))
+                continue
+            if status != 200:
+                raise ValueError("Endpoint {} returned {} for /info".format(endpoint.url, status))
+
+            endpoint_info = self.codec.loads(data)
+            if info is None:
+                info = endpoint_info
+            elif (endpoint_info["name"], endpoint_info["version"]) != (info["name"], info["version"]):
+                raise ValueError("Endpoint {} serves {}:{}, expected {}:{}".format(
+                    endpoint.url, endpoint_info["name"], endpoint_info["version"], info["name"], info["version"]))
+
+        if info is None:
+            raise ValueError("No endpoints available: {}".format("; ".join(errors)))
+
+        self._model = {"name": info["name"], "version": info["version"]}
+        self._is_batch = is_batch_model(info)
+        return info
+
+    def _choose(self, tried):
+        """Picks the server with the fewest outstanding requests, preferring servers that have not been tried.
+        Ejected servers are skipped, unless every server is ejected, when the one whose cooldown ends first is picked.
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = [e for e in self.endpoints if e.ejected_until <= now] or \
+                [min(self.endpoints, key=lambda e: e.ejected_until)]
+            candidates = [e for e in available if e not in tried] or available
+            endpoint = min(candidates, key=lambda e: e.outstanding)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _done(self, endpoint, failed, retryable=True):
+        # Only failures that are retried on another server eject the server, not e.g. a rejected request
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.failures += 1
+            if not failed or not retryable:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.consecutive_failures += 1
+            if self.cooldown > 0:
+                cooldown = min(self.cooldown * 2 ** (endpoint.consecutive_failures - 1), self.max_cooldown)
+                endpoint.ejected_until = time.monotonic() + cooldown
+
+    def predict(self, correlation_id, X):
+        """Predicts an input on one of the servers, retrying on other servers.
+
+        :param str correlation_id:
+        :param dict|list X: The input.
+        :return: The output.
+        :raises EndpointError: If every attempt failed.
+        :raises ValueError: If a server rejected the request.
+        """
+        body = self.codec.dumps({"correlation_id": correlation_id, "model": self._model, "input": X})
+        headers = {"Content-Type": "application/json"}
+        tried = set()
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                with self._lock:
+                    self._retried += 1
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            endpoint = self._choose(tried)
+            tried.add(endpoint)
+            try:
+                status, data = endpoint.request("POST", "/predict", body, headers)
+            except EndpointError as err:
+                self._done(endpoint, True)
+                error = err
+                continue
+
+            self._done(endpoint, status != 200, status in RETRY_STATUS_CODES)
+            if status == 200:
+                return self.codec.loads(data)["output"]
+            if status not in RETRY_STATUS_CODES:
+                raise ValueError("{} returned {}: {}".format(endpoint.url, status, data[:200].decode("utf-8", "replace")))
+            error = EndpointError("{} returned {}".format(endpoint.url, status))
+
+        raise error
+
+    def _score_chunk(self, n, rows):
+        correlation_id = "{}-{}".format(self.job_id, n)
+        if self._is_batch:
+            r = self.predict(correlation_id, rows)
+        else:
+            r = [self.predict("{}-{}".format(correlation_id, i), row) for i, row in enumerate(rows)]
+        if len(r) != len(rows):
+            raise ValueError("Chunk {}: predict returned {} rows for {} input rows".format(n, len(r), len(rows)))
+        return n, r
+
+    def score_chunks(self, chunks, info):
+        """Validates and scores (chunk number, records) tuples, yielding the results in order. At most two chunks
+        per concurrent request are in flight, so memory use does not grow with the size of the input.
+
+        :param iterable chunks:
+        :param dict info: The model info @see info.
+        :return: A generator of (chunk number, results) tuples.
+        """
+        records_schema = compile_records_schema(info["schema"]["input"])
+        workers = len(self.endpoints) * self.concurrency
+        executor = ThreadPoolExecutor(max_workers=workers)
+        pending = collections.deque()
+        try:
+            for n, rows in chunks:
+                try:
+                    records_schema.validate(rows)
+                except SchemaError as err:
+                    raise ValueError("Invalid input in chunk {}: {}".format(n, err.code))
+
+                pending.append(executor.submit(self._score_chunk, n, rows))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for endpoint in self.endpoints:
+                endpoint.close()
+
+    def stats(self) -> dict:
+        """Returns the request counts per server, and the number of retries.
+
+        :return dict:
+        """
+        with self._lock:
+            return {
+                "retries": self._retried,
+                "endpoints": {e.url: {"requests": e.requests, "failures": e.failures} for e in self.endpoints}
+            }
@@ -0,0 +1,350 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Chunked readers and incremental writers for the CSV, JSON lines and Parquet files scored by catwalk score.
+
+Readers yield lists of records. Writers append lists of records, and report a position (a byte offset, or a number of
+Parquet parts) after each write, so a checkpointed job can be resumed by truncating the output to that position.
+"""
+import csv
+import json
+import os
+import os.path as osp
+import shutil
+
+from ..server.codec import get_codec
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+CSV = "csv"
+JSONL = "jsonl"
+PARQUET = "parquet"
+
+_EXTENSIONS = {
+    ".csv": CSV,
+    ".jsonl": JSONL,
+    ".ndjson": JSONL,
+    ".parquet": PARQUET,
+    ".pq": PARQUET
+}
+
+
+def file_format(path) -> str:
+    """Returns the format of a file from its extension.
+
+    :param str path:
+    :return str: CSV, JSONL or PARQUET.
+    :raises ValueError: If the extension is not supported.
+    """
+    fmt = _EXTENSIONS.get(osp.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError("Unsupported file type: {} (expected one of {})".format(path, ", ".join(sorted(_EXTENSIONS))))
+    if fmt == PARQUET and pyarrow is None:
+        raise ValueError("Parquet files require pyarrow, install catwalk[arrow]")
+    return fmt
+
+
+def record_properties(schema) -> dict:
+    """Returns the properties of the records of a model.yml input or output schema, for flat file formats.
+
+    :param dict schema: An object schema, or an array of object schemas.
+    :return dict: The property schemas by name, or None if the records are not objects.
+    """
+    if schema["type"] == "array":
+        schema = schema["items"]
+    if schema["type"] != "object":
+        return None
+    return schema["properties"]
+
+
+def _parse_bool(value):
+    v = value.lower()
+    if v in ("true", "1"):
+        return True
+    if v in ("false", "0"):
+        return False
+    raise ValueError("Invalid boolean: {}".format(value))
+
+
+_CSV_PARSERS = {
+    "string": str,
+    "integer": int,
+    "number": float,
+    "boolean": _parse_bool,
+    "array": json.loads,
+    "object": json.loads
+}
+
+
+def _csv_parsers(properties):
+    parsers = {}
+    for key, value in (properties or {}).items():
+        parsers[key] = (_CSV_PARSERS[value["type"]], bool(value.get("nullable", False)))
+    return parsers
+
+
+def _parse_csv_row(row, parsers):
+    """Parses the string cells of a CSV row into the types of the schema. Cells that cannot be parsed are left as
+    strings, so validation reports them."""
+    for key, cell in row.items():
+        if key not in parsers:
+            continue
+        parse, nullable = parsers[key]
+        if cell == "" and nullable:
+            row[key] = None
+            continue
+        try:
+            row[key] = parse(cell)
+        except ValueError:
+            pass
+    return row
+
+
+def read_csv(path, chunk_size, properties=None):
+    """Reads a CSV file with a header row in chunks of records.
+
+    :param str path:
+    :param int chunk_size: The number of records per chunk.
+    :param dict properties: The record property schemas, used to parse the cells.
+    :return: A generator of lists of records.
+    """
+    parsers = _csv_parsers(properties)
+    with open(path, "r", newline="") as fp:
+        chunk = []
+        for row in csv.DictReader(fp):
+            chunk.append(_parse_csv_row(row, parsers))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+
+def read_jsonl(path, chunk_size, properties=None):
+    """Reads a JSON lines file in chunks of records. Blank lines are skipped.
+
+    :param str path:
+    :param int chunk_size: The number of records per chunk.
+    :param dict properties: Unused, JSON is already typed.
+    :return: A generator of lists of records.
+    """
+    codec = get_codec()
+    with open(path, "rb") as fp:
+        chunk = []
+        for line in fp:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            chunk.append(codec.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+
+def read_parquet(path, chunk_size, properties=None):
+    """Reads a Parquet file in chunks of records.
+
+    :param str path:
+    :param int chunk_size: The number of records per chunk.
+    :param dict properties: Unused, Parquet is already typed.
+    :return: A generator of lists of records.
+    """
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+READERS = {
+    CSV: read_csv,
+    JSONL: read_jsonl,
+    PARQUET: read_parquet
+}
+
+
+def read_chunks(path, chunk_size, properties=None):
+    """Reads a file in chunks of records, with the reader for its format.
+
+    :param str path:
+    :param int chunk_size: The number of records per chunk.
+    :param dict properties: The record property schemas @see record_properties.
+    :return: A generator of lists of records.
+    """
+    return READERS[file_format(path)](path, max(int(chunk_size), 1), properties)
+
+
+def _open_at(path, position, mode):
+    """Opens a file for appending, after truncating it to position (or creating it at position 0)."""
+    if position > 0:
+        with open(path, "r+b") as fp:
+            fp.truncate(position)
+        return open(path, "a" + mode, **({"newline": ""} if mode == "" else {}))
+    return open(path, "w" + mode, **({"newline": ""} if mode == "" else {}))
+
+
+def _sync(fp):
+    fp.flush()
+    os.fsync(fp.fileno())
+
+
+class JSONLWriter(object):
+    """Writes records as JSON lines.
+
+    :param str path:
+    :param int position: The byte offset to resume writing at.
+    :param dict properties: Unused.
+    """
+
+    def __init__(self, path, position=0, properties=None):
+        self.codec = get_codec()
+        self._fp = _open_at(path, position, "b")
+
+    def write(self, rows) -> int:
+        """Appends rows and syncs them to disk.
+
+        :param list rows:
+        :return int: The position after the rows.
+        """
+        self._fp.write(b"".join(self.codec.dumps(row) + b"\n" for row in rows))
+        _sync(self._fp)
+        return self._fp.tell()
+
+    def close(self):
+        self._fp.close()
+
+    def abort(self):
+        """Closes the file without finishing it, e.g. when the job failed."""
+        self._fp.close()
+
+
+class CSVWriter(object):
+    """Writes records as CSV, with a header row of the output schema's properties.
+    Booleans are written as true/false, and arrays and objects as JSON.
+
+    :param str path:
+    :param int position: The byte offset to resume writing at.
+    :param dict properties: The record property schemas.
+    """
+
+    def __init__(self, path, position=0, properties=None):
+        if properties is None:
+            raise ValueError("CSV output requires an output schema of objects")
+        self._fp = _open_at(path, position, "")
+        self._writer = csv.DictWriter(self._fp, fieldnames=list(properties), extrasaction="ignore")
+        if position == 0:
+            self._writer.writeheader()
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return value
+
+    def write(self, rows) -> int:
+        """Appends rows and syncs them to disk.
+
+        :param list rows:
+        :return int: The position after the rows.
+        """
+        self._writer.writerows({k: self._cell(v) for k, v in row.items()} for row in rows)
+        _sync(self._fp)
+        return self._fp.tell()
+
+    def close(self):
+        self._fp.close()
+
+    def abort(self):
+        """Closes the file without finishing it, e.g. when the job failed."""
+        self._fp.close()
+
+
+class ParquetWriter(object):
+    """Writes records as Parquet. Parquet files cannot be appended to, so each write is a part file in a
+    "<path>.parts" directory, and close combines the parts into the output file.
+
+    :param str path:
+    :param int position: The number of parts to resume writing after.
+    :param dict properties: Unused, the types are inferred from the records.
+    """
+
+    def __init__(self, path, position=0, properties=None):
+        self.path = path
+        self.parts_path = path + ".parts"
+        self._parts = int(position)
+
+        if self._parts == 0:
+            shutil.rmtree(self.parts_path, ignore_errors=True)
+        os.makedirs(self.parts_path, exist_ok=True)
+
+    def _part(self, n):
+        return osp.join(self.parts_path, "part-{:06d}.parquet".format(n))
+
+    def write(self, rows) -> int:
+        """Writes rows as the next part file.
+
+        :param list rows:
+        :return int: The number of parts written.
+        """
+        tmp_path = self._part(self._parts) + ".tmp"
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), tmp_path)
+        os.replace(tmp_path, self._part(self._parts))
+        self._parts += 1
+        return self._parts
+
+    def abort(self):
+        """Leaves the part files, for the job to resume from."""
+        pass
+
+    def close(self):
+        """Combines the part files into the output file, one part at a time."""
+        writer = None
+        try:
+            for n in range(self._parts):
+                table = pyarrow.parquet.read_table(self._part(n))
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+
+WRITERS = {
+    CSV: CSVWriter,
+    JSONL: JSONLWriter,
+    PARQUET: ParquetWriter
+}
+
+
+def open_writer(path, position=0, properties=None):
+    """Opens a file for incremental writing, with the writer for its format.
+
+    :param str path:
+    :param int position: The position to resume writing at, as returned by the writer's write method.
+    :param dict properties: The record property schemas @see record_properties.
+    :return JSONLWriter|CSVWriter|ParquetWriter:
+    """
+    return WRITERS[file_format(path)](path, position, properties)
@@ -0,0 +1,364 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Admission control for predict requests.
+
+Under overload, requests queue in nginx and gunicorn until they time out, so every request gets slow. Admission control
+answers the requests that cannot be served in time straight away instead:
+
+- Deadlines: a client can give a deadline as a Unix time in seconds, in the X-Request-Deadline header or the "deadline"
+  key of the request (next to "correlation_id"), or as a number of seconds in the X-Request-Timeout header.
+  server.admission.timeout caps the deadline of every request. Requests whose deadline has passed are answered with 504
+  before they are parsed, and before predict is called (also after waiting for the predict pool), as nobody is waiting
+  for their result any more.
+- An adaptive concurrency limit (server.admission.concurrency): requests beyond the limit are rejected with 503 and
+  Retry-After. The limit grows by one for every limit's worth of requests that complete within the target latency,
+  and is cut by a factor when they do not (AIMD), so it settles at the concurrency the model can serve without
+  queueing. The target is server.admission.concurrency.target seconds, or else a tolerance times a low percentile
+  (server.admission.concurrency.quantile) of the recent latencies. Only requests that called predict successfully are
+  observed: errors, cache hits and replays are answered without the model, and would pull the target down.
+- An input budget (server.admission.max_input_bytes): the decoded size of a request's input is estimated from its
+  Content-Length (which nginx sets, as it buffers request bodies) and the expansion of its format. Requests that would
+  never fit are rejected with 413, and requests that do not fit next to the requests in flight with 503.
+
+The limit and the budget are per worker, so they matter for workers that handle requests concurrently (gthread and
+gevent). Deadlines are followed with or without them.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .offload import ContextLocal
+
+DEADLINE_HEADER = "X-Request-Deadline"
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# The reasons requests are rejected for
+DEADLINE = "deadline"
+CONCURRENCY = "concurrency"
+MEMORY = "memory"
+SIZE = "size"
+REASONS = (DEADLINE, CONCURRENCY, MEMORY, SIZE)
+
+# The deadline of the request handled by this thread or greenlet
+_local = ContextLocal()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the deadline of a request has passed."""
+    pass
+
+
+class Overloaded(Exception):
+    """Raised when a request is rejected by the concurrency limit or the input budget, so it can be retried.
+
+    :param str reason: CONCURRENCY or MEMORY.
+    """
+
+    def __init__(self, reason):
+        super().__init__("Server is overloaded: {}".format(reason))
+        self.reason = reason
+
+
+class InputTooLarge(Exception):
+    """Raised when the estimated input of a request is larger than the whole input budget."""
+    pass
+
+
+def parse_deadline(headers, timeout=None, now=None) -> float:
+    """Reads the deadline of a request from its headers.
+
+    :param headers: The request headers.
+    :param float timeout: The longest a request is served for in seconds, or None.
+    :param float now: The Unix time the request arrived, by default the current time.
+    :return float: The deadline as a Unix time, or None if there is none.
+    :raises ValueError: If a header is not a number.
+    """
+    now = time.time() if now is None else now
+    deadlines = []
+    if headers.get(DEADLINE_HEADER) is not None:
+        deadlines.append(float(headers[DEADLINE_HEADER]))
+    if headers.get(TIMEOUT_HEADER) is not None:
+        deadlines.append(now + float(headers[TIMEOUT_HEADER]))
+    if timeout is not None:
+        deadlines.append(now + timeout)
+    return min(deadlines) if len(deadlines) > 0 else None
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Sets the deadline of the request handled in this context (in this thread or greenlet).
+
+    :param float deadline: A Unix time, or None.
+    """
+    previous = current_deadline()
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def predicted():
+    """Marks that the request handled in this context (in this thread or greenlet) called predict successfully, so
+    its latency adapts the concurrency limit @see AdmissionControl.admit
+    """
+    _local.predicted = True
+
+
+def current_deadline() -> float:
+    """:return float: The deadline of the current request, or None."""
+    return getattr(_local, "deadline", None)
+
+
+def tighten_deadline(deadline):
+    """Moves the deadline of the current request forward, e.g. to the "deadline" of the request data.
+
+    :param float deadline: A Unix time, or None to keep the current deadline.
+    """
+    current = current_deadline()
+    if deadline is not None:
+        _local.deadline = deadline if current is None else min(current, deadline)
+
+
+def check_deadline(deadline=None):
+    """Checks that a deadline has not passed.
+
+    :param float deadline: A Unix time, by default the deadline of the current request.
+    :raises DeadlineExceeded: If it has passed.
+    """
+    deadline = current_deadline() if deadline is None else deadline
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded("Request deadline exceeded.")
+
+
+def expiring(fn):
+    """Wraps fn(X) to check the current request's deadline when it is called, e.g. by another thread after waiting in
+    a queue.
+
+    :param callable fn:
+    :return callable:
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return fn
+
+    def call(X):
+        check_deadline(deadline)
+        return fn(X)
+    return call
+
+
+class ConcurrencyLimit(object):
+    """An adaptive limit on the requests in flight, which grows additively while their latency is on target and is
+    cut multiplicatively when it is not.
+
+    :param int initial: The initial limit.
+    :param int min_limit:
+    :param int max_limit:
+    :param float target: The target latency in seconds, or None to follow the recent latencies.
+    :param float tolerance: The target latency relative to a low percentile of the recent latencies, if target is None.
+    :param float backoff: The factor the limit is cut by.
+    :param int window: The number of recent latencies kept.
+    :param float quantile: The percentile of the recent latencies the target follows, between 0 and 1.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, target=None, tolerance=2.0, backoff=0.9, window=100,
+                 quantile=0.1):
+        self.min_limit = max(int(min_limit), 1)
+        self.max_limit = max(int(max_limit), self.min_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.target = target
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window = max(int(window), 1)
+        self.quantile = min(max(float(quantile), 0.0), 1.0)
+        self.in_flight = 0
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=self.window)
+        self._baseline = math.inf
+        self._cut = 0.0
+
+    @property
+    def target_latency(self) -> float:
+        """The latency above which the limit is cut, in seconds."""
+        if self.target is not None:
+            return self.target
+        return self.tolerance * self._baseline
+
+    def acquire(self) -> bool:
+        """Admits a request if the limit allows it, it must be released when it completes.
+
+        :return bool: True if the request is admitted.
+        """
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, dropped=False, observed=True):
+        """Releases an admitted request, and adapts the limit to its latency.
+
+        :param float latency: The time the request took, in seconds.
+        :param bool dropped: Whether the request was dropped, e.g. as its deadline passed, which cuts the limit.
+        :param bool observed: Whether the latency is one of a prediction, else it does not adapt the limit.
+        """
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if not observed and not dropped:
+                return
+            if observed:
+                self._observe(latency)
+            if dropped or latency > self.target_latency:
+                # Cut once per latency, as the requests in flight all see the same overload
+                now = time.monotonic()
+                if now - self._cut >= latency:
+                    self._cut = now
+                    self.limit = max(self.limit * self.backoff, self.min_limit)
+            elif 2 * in_flight >= self.limit:
+                # Only grow a limit that is used
+                self.limit = min(self.limit + 1.0 / self.limit, self.max_limit)
+
+    def _observe(self, latency):
+        self._latencies.append(latency)
+        latencies = sorted(self._latencies)
+        self._baseline = latencies[int(self.quantile * (len(latencies) - 1))]
+
+
+class InputBudget(object):
+    """A limit on the estimated decoded size of the inputs of the requests in flight.
+
+    :param int max_bytes:
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        """Reserves the size of a request's input, it must be released when the request completes.
+
+        :param int size: The estimated size in bytes.
+        :raises InputTooLarge: If the size is larger than the whole budget.
+        :raises Overloaded: If the size does not fit next to the inputs in flight.
+        """
+        if size > self.max_bytes:
+            raise InputTooLarge("Request input is too large: about {} bytes, at most {} bytes are accepted.".format(
+                size, self.max_bytes))
+        with self._lock:
+            if self.reserved + size > self.max_bytes:
+                raise Overloaded(MEMORY)
+            self.reserved += size
+
+    def release(self, size):
+        """:param int size: @see reserve"""
+        with self._lock:
+            self.reserved -= size
+
+
+class AdmissionControl(object):
+    """Admits predict requests by their deadline, the concurrency limit and the input budget.
+
+    :param ConcurrencyLimit limit: or None.
+    :param InputBudget budget: or None.
+    :param float timeout: The longest a request is served for in seconds, or None.
+    :param ServerMetrics metrics: Records rejections and the concurrency limit, if given.
+    """
+
+    def __init__(self, limit=None, budget=None, timeout=None, metrics=None):
+        self.limit = limit
+        self.budget = budget
+        self.timeout = timeout
+        self.metrics = metrics
+        if metrics is not None and limit is not None:
+            metrics.concurrency_limit.set(limit.limit)
+
+    def deadline(self, headers, now=None) -> float:
+        """Reads the deadline of a request @see parse_deadline
+
+        :param headers: The request headers.
+        :param float now: The Unix time the request arrived.
+        :return float: The deadline, or None.
+        :raises ValueError: If a header is not a number.
+        """
+        return parse_deadline(headers, self.timeout, now)
+
+    @contextmanager
+    def admit(self, deadline, size=None, expansion=1):
+        """Admits a request, and sets its deadline for the checks made while it is handled in this context.
+
+        :param float deadline: @see deadline
+        :param int size: The size of the request body, or None if it is not known.
+        :param float expansion: The decoded size of the input relative to the body @see catwalk.server.formats
+        :raises DeadlineExceeded: If the deadline passes.
+        :raises Overloaded: If the request is over the concurrency limit or the input budget.
+        :raises InputTooLarge: If the request is larger than the input budget.
+        """
+        reserved = int(size * expansion) if self.budget is not None and size else 0
+        self._enter(deadline, reserved)
+
+        started = time.monotonic()
+        dropped = False
+        _local.predicted = False
+        try:
+            with deadline_scope(deadline):
+                yield
+        except DeadlineExceeded:
+            dropped = True
+            self._rejected(DEADLINE)
+            raise
+        finally:
+            if reserved > 0:
+                self.budget.release(reserved)
+            if self.limit is not None:
+                self.limit.release(time.monotonic() - started, dropped, getattr(_local, "predicted", False))
+                if self.metrics is not None:
+                    self.metrics.concurrency_limit.set(self.limit.limit)
+
+    def _enter(self, deadline, reserved):
+        try:
+            check_deadline(deadline)
+        except DeadlineExceeded:
+            self._rejected(DEADLINE)
+            raise
+
+        try:
+            if reserved > 0:
+                self.budget.reserve(reserved)
+        except InputTooLarge:
+            self._rejected(SIZE)
+            raise
+        except Overloaded as err:
+            self._rejected(err.reason)
+            raise
+
+        if self.limit is not None and not self.limit.acquire():
+            if reserved > 0:
+                self.budget.release(reserved)
+            self._rejected(CONCURRENCY)
+            raise Overloaded(CONCURRENCY)
+
+    def _rejected(self, reason):
+        if self.metrics is not None:
+            self.metrics.admission_rejected.inc(labels=(reason,))
@@ -0,0 +1,103 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""An in-process cache of prediction results, with size-bounded LRU and TTL eviction."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """A thread-safe LRU cache whose entries also expire after a time to live.
+
+    :param int max_size: The maximum number of entries. The least recently used entry is evicted when it is exceeded.
+    :param float ttl: The time to live of an entry in seconds, or None for no expiry.
+    """
+
+    def __init__(self, max_size=10000, ttl=300.0):
+        self.max_size = max(int(max_size), 1)
+        self.ttl = float(ttl) if ttl is not None else None
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Looks up a key.
+
+        :param str key:
+        :return (bool, object): Whether the key was found, and its value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entries if the cache is full.
+
+        :param str key:
+        :param value:
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Returns the hit, miss and eviction counters of this cache.
+
+        :return dict:
+        """
+        with self._lock:
+            lookups = max(self.hits + self.misses, 1)
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
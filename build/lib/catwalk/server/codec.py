@@ -0,0 +1,143 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Pluggable JSON codecs for the model server.
+
+The fastest installed backend is used by default: orjson if it is installed, otherwise the stdlib json module.
+Both encode NumPy scalars and arrays; orjson serialises (C contiguous) ndarrays natively without converting them to
+Python lists first. The backend is chosen with server.json.backend ("auto", "orjson" or "stdlib").
+
+NaN and Infinity: both backends accept the (non-standard) NaN, Infinity and -Infinity literals in requests, e.g.
+missing values in DataFrame inputs, as the stdlib json module always has. orjson does not, so documents it rejects are
+decoded again with the json module. On output, orjson writes NaN and Infinity as null, where the stdlib json module
+writes the literals: clients that need the literals (e.g. to tell missing values from nulls) should set
+server.json.backend to "stdlib".
+"""
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def default_encoder(obj):
+    """Encodes types that the JSON backends do not support natively, e.g. NumPy arrays and scalars.
+
+    :param obj: The object to encode.
+    :return: A JSON serialisable equivalent of obj.
+    """
+    if hasattr(obj, "tolist"):
+        # NumPy arrays, NumPy scalars and array.array
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "to_pylist"):
+        # Arrow tables and arrays
+        return obj.to_pylist()
+    if hasattr(obj, "to_dict") and hasattr(obj, "iloc"):
+        # DataFrames are encoded in records orientation
+        return obj.to_dict(orient="records")
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+class StdlibCodec(object):
+    """A JSON codec using the stdlib json module."""
+
+    name = "stdlib"
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        """Encodes obj as JSON.
+
+        :param obj: The object to encode.
+        :return bytes: The UTF-8 encoded JSON.
+        """
+        return json.dumps(obj, default=default_encoder).encode("utf-8")
+
+    @staticmethod
+    def loads(data):
+        """Decodes JSON.
+
+        :param bytes|str data: The JSON to decode.
+        :return: The decoded object.
+        :raises ValueError: If the data is not valid JSON.
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(object):
+    """A JSON codec using orjson, with native NumPy serialisation.
+
+    Note that orjson encodes NaN and Infinity as null, where the stdlib json module writes (invalid) NaN literals.
+    Documents with NaN or Infinity literals, which orjson rejects, are decoded with the stdlib json module.
+    """
+
+    name = "orjson"
+
+    @staticmethod
+    def dumps(obj) -> bytes:
+        """Encodes obj as JSON.
+
+        :param obj: The object to encode.
+        :return bytes: The UTF-8 encoded JSON.
+        """
+        return orjson.dumps(obj, default=default_encoder,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def loads(data):
+        """Decodes JSON.
+
+        :param bytes|str data: The JSON to decode.
+        :return: The decoded object.
+        :raises ValueError: If the data is not valid JSON.
+        """
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN literals, which the stdlib json module accepts
+            return json.loads(data)
+
+
+CODECS = {
+    StdlibCodec.name: StdlibCodec,
+    OrjsonCodec.name: OrjsonCodec
+}
+
+
+def get_codec(name="auto"):
+    """Returns the named JSON codec, or the fastest installed codec if name is "auto".
+
+    :param str name: One of "auto", "orjson" or "stdlib".
+    :return: The codec.
+    """
+    if name == "auto" or name is None:
+        name = OrjsonCodec.name if orjson is not None else StdlibCodec.name
+
+    if name == OrjsonCodec.name and orjson is None:
+        logger.warning("JSON backend orjson is not installed, falling back to stdlib json")
+        name = StdlibCodec.name
+
+    if name not in CODECS:
+        raise ValueError("Unknown JSON backend: {}".format(name))
+
+    return CODECS[name]
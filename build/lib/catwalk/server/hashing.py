@@ -0,0 +1,69 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Canonical hashing of request data, for use as cache and coalescing keys."""
+import hashlib
+import json
+
+from .codec import orjson, default_encoder
+from .rows import is_data_frame
+
+
+def canonical_dumps(obj) -> bytes:
+    """Encodes obj as canonical JSON, i.e. with sorted keys and no whitespace.
+
+    :param obj: The object to encode.
+    :return bytes:
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default_encoder,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=default_encoder).encode("utf-8")
+
+
+def canonical_hash(obj, namespace="") -> str:
+    """Returns a hex digest of the canonical JSON of obj, prefixed by a namespace (e.g. the model name and version).
+
+    :param obj: The object to hash.
+    :param str namespace: A namespace that is hashed along with obj.
+    :return str:
+    """
+    h = hashlib.blake2b(namespace.encode("utf-8"), digest_size=16)
+    h.update(b"\0")
+    h.update(canonical_dumps(obj))
+    return h.hexdigest()
+
+
+def row_hashes(X, namespace="") -> list:
+    """Returns the canonical hash of each row in a model-native batch.
+
+    :param list|DataFrame X: A list of records or a DataFrame.
+    :param str namespace: A namespace that is hashed along with each row.
+    :return list: A hex digest per row.
+    """
+    if is_data_frame(X):
+        X = X.to_dict(orient="records")
+    return [canonical_hash(x, namespace) for x in X]
+
+
+def model_namespace(model_info) -> str:
+    """Returns the hash namespace of a model.
+
+    :param dict model_info: The model's metadata.
+    :return str:
+    """
+    return "{}:{}".format(model_info["name"], model_info["version"])
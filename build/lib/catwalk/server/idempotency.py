@@ -0,0 +1,299 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+An idempotency store for /predict responses, keyed on the correlation_id and model version.
+
+A retry that arrives while the first call is in flight waits for its response, and a retry that arrives within the
+window after it completed gets the stored response, without running the model again.
+
+Two backends are available:
+- "memory" stores responses in the worker process.
+- "file" stores responses in a directory, so they are shared by all gunicorn workers. Point it at a tmpfs mount such
+  as /dev/shm to keep the store in shared memory.
+"""
+import errno
+import hashlib
+import os
+import os.path as osp
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# The states returned by begin
+OWNER = "owner"
+DONE = "done"
+PENDING = "pending"
+
+
+def idempotency_key(correlation_id, namespace="") -> str:
+    """Returns a file name safe key for a correlation_id within a namespace (e.g. the model name and version).
+
+    :param str correlation_id:
+    :param str namespace:
+    :return str:
+    """
+    h = hashlib.blake2b(namespace.encode("utf-8"), digest_size=16)
+    h.update(b"\0")
+    h.update(correlation_id.encode("utf-8"))
+    return h.hexdigest()
+
+
+class MemoryBackend(object):
+    """Stores responses in this process.
+
+    :param float window: How long, in seconds, a completed response is kept.
+    :param int max_entries: The maximum number of completed responses kept. The oldest are evicted first.
+    :param float wait_timeout: How long, in seconds, a retry waits for an in-flight call.
+    """
+
+    def __init__(self, window=60.0, max_entries=10000, wait_timeout=30.0):
+        self.window = float(window)
+        self.max_entries = max(int(max_entries), 1)
+        self.wait_timeout = float(wait_timeout)
+
+        self._lock = threading.Lock()
+        self._done = OrderedDict()
+        self._in_flight = {}
+
+    def begin(self, key):
+        """Starts a call for key.
+
+        :param str key:
+        :return (str, object): (OWNER, None) if the caller should run the call and then complete or abort it,
+                               (DONE, response) if a stored response was found, or (PENDING, None) if a call is still
+                               in flight after waiting wait_timeout seconds.
+        """
+        with self._lock:
+            self._expire()
+            if key in self._done:
+                return DONE, self._done[key][1]
+
+            event = self._in_flight.get(key)
+            if event is None:
+                self._in_flight[key] = threading.Event()
+                return OWNER, None
+
+        event.wait(self.wait_timeout)
+
+        with self._lock:
+            if key in self._done:
+                return DONE, self._done[key][1]
+        return PENDING, None
+
+    def complete(self, key, response):
+        """Stores the response of a call started with begin.
+
+        :param str key:
+        :param response: The response to store.
+        """
+        with self._lock:
+            self._done[key] = (time.monotonic() + self.window, response)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def abort(self, key):
+        """Abandons a call started with begin, so a retry will run it again.
+
+        :param str key:
+        """
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _expire(self):
+        now = time.monotonic()
+        while len(self._done) > 0:
+            key, (expires, _) = next(iter(self._done.items()))
+            if expires >= now:
+                break
+            del self._done[key]
+
+    def stats(self) -> dict:
+        """Returns the number of stored and in-flight responses.
+
+        :return dict:
+        """
+        with self._lock:
+            return {"backend": "memory", "stored": len(self._done), "in_flight": len(self._in_flight)}
+
+
+class FileBackend(object):
+    """Stores responses as files in a directory shared by several processes.
+
+    An in-flight call holds an exclusively created "<key>.lock" file, and a completed response is atomically renamed
+    to "<key>.done". Lock files older than lock_timeout are considered abandoned (e.g. the worker was killed).
+
+    :param str path: The directory to store responses in.
+    :param float window: How long, in seconds, a completed response is kept.
+    :param int max_entries: The maximum number of completed responses kept. The oldest are evicted first.
+    :param float wait_timeout: How long, in seconds, a retry waits for an in-flight call.
+    :param float lock_timeout: The age, in seconds, after which an in-flight lock is considered abandoned.
+    :param float poll_interval: How often, in seconds, a waiting retry checks for the response.
+    """
+
+    def __init__(self, path, window=60.0, max_entries=10000, wait_timeout=30.0, lock_timeout=120.0,
+                 poll_interval=0.01):
+        self.path = path
+        self.window = float(window)
+        self.max_entries = max(int(max_entries), 1)
+        self.wait_timeout = float(wait_timeout)
+        self.lock_timeout = float(lock_timeout)
+        self.poll_interval = float(poll_interval)
+        self._completed = 0
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key, ext):
+        return osp.join(self.path, key + ext)
+
+    def _read_done(self, key):
+        """Returns the stored response for key, or None if there is none or it has expired."""
+        path = self._file(key, ".done")
+        try:
+            if time.time() - osp.getmtime(path) > self.window:
+                return None
+            with open(path, "rb") as fp:
+                return fp.read()
+        except OSError:
+            return None
+
+    def _try_lock(self, key):
+        path = self._file(key, ".lock")
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return True
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+        # Break abandoned locks
+        try:
+            if time.time() - osp.getmtime(path) > self.lock_timeout:
+                os.remove(path)
+                return self._try_lock(key)
+        except OSError:
+            pass
+        return False
+
+    def begin(self, key):
+        """Starts a call for key. See MemoryBackend.begin.
+
+        :param str key:
+        :return (str, bytes):
+        """
+        response = self._read_done(key)
+        if response is not None:
+            return DONE, response
+
+        if self._try_lock(key):
+            return OWNER, None
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            response = self._read_done(key)
+            if response is not None:
+                return DONE, response
+            if not osp.exists(self._file(key, ".lock")):
+                # The call was aborted, so this retry may run it
+                if self._try_lock(key):
+                    return OWNER, None
+        return PENDING, None
+
+    def complete(self, key, response):
+        """Stores the response of a call started with begin.
+
+        :param str key:
+        :param bytes response: The response body to store.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(response)
+        os.replace(tmp_path, self._file(key, ".done"))
+        self.abort(key)
+
+        self._completed += 1
+        if self._completed % 100 == 0:
+            self.prune()
+
+    def abort(self, key):
+        """Abandons a call started with begin, so a retry will run it again.
+
+        :param str key:
+        """
+        try:
+            os.remove(self._file(key, ".lock"))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Removes expired responses, and the oldest responses beyond max_entries."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".done"):
+                continue
+            path = osp.join(self.path, name)
+            try:
+                mtime = osp.getmtime(path)
+                if now - mtime > self.window:
+                    os.remove(path)
+                else:
+                    entries.append((mtime, path))
+            except OSError:
+                pass
+
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Returns the number of stored and in-flight responses, across all processes.
+
+        :return dict:
+        """
+        names = os.listdir(self.path)
+        return {
+            "backend": "file",
+            "stored": sum(1 for name in names if name.endswith(".done")),
+            "in_flight": sum(1 for name in names if name.endswith(".lock"))
+        }
+
+
+def get_backend(name="memory", **kwargs):
+    """Creates an idempotency backend.
+
+    :param str name: "memory" or "file".
+    :param kwargs: The backend's constructor arguments.
+    :return MemoryBackend|FileBackend:
+    """
+    if name == "memory":
+        kwargs.pop("path", None)
+        return MemoryBackend(**kwargs)
+    if name == "file":
+        return FileBackend(**kwargs)
+    raise ValueError("Unknown idempotency backend: {}".format(name))
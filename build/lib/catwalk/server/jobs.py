@@ -0,0 +1,408 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Asynchronous prediction jobs for long-running batches.
+
+A job is submitted to a bounded queue and run by a pool of background worker threads, so large batches do not hold
+an HTTP connection (and a request serving worker) for the whole prediction. Job statuses and paged results are kept
+in a JobStore directory on local disk, so any gunicorn worker on the host can answer status and result requests for
+a job, whichever worker is running it.
+
+The queue is kept in the memory of the worker that accepted the job, so the jobs of a worker that stops (e.g. it is
+restarted) are lost. Their statuses name the worker's pid, and they are marked failed once it is gone.
+"""
+import logging
+import os
+import os.path as osp
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+# The states of a job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED_STATES = (DONE, FAILED)
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted to a full queue."""
+    pass
+
+
+def is_alive(pid) -> bool:
+    """Checks if a process is running.
+
+    :param int pid:
+    :return bool:
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_job_id(job_id) -> bool:
+    """Checks if job_id is a well formed job id, so it is safe to use as a file name.
+
+    :param str job_id:
+    :return bool:
+    """
+    return isinstance(job_id, str) and _JOB_ID_PATTERN.match(job_id) is not None
+
+
+class JobStore(object):
+    """Stores job statuses and results in a directory, with one sub-directory per job.
+
+    Each job directory holds a "status.json" file and, once the job is done, one "page-<n>.json" file per page of
+    results. All files are written atomically, so readers never see a partial file.
+
+    :param str path: The directory to store jobs in.
+    :param codec: The JSON codec @see catwalk.server.codec.
+    :param int page_size: The number of result rows per page.
+    :param float ttl: How long, in seconds, a finished job is kept.
+    """
+
+    def __init__(self, path, codec, page_size=1000, ttl=3600.0):
+        self.path = path
+        self.codec = codec
+        self.page_size = max(int(page_size), 1)
+        self.ttl = float(ttl)
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, job_id, name):
+        return osp.join(self.path, job_id, name)
+
+    def _write(self, job_id, name, body):
+        fd, tmp_path = tempfile.mkstemp(dir=osp.join(self.path, job_id), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(body)
+        os.replace(tmp_path, self._file(job_id, name))
+
+    def _read(self, job_id, name):
+        if not is_job_id(job_id):
+            return None
+        try:
+            with open(self._file(job_id, name), "rb") as fp:
+                return fp.read()
+        except OSError:
+            return None
+
+    def create(self, job_id, status):
+        """Creates the directory of a new job and writes its first status.
+
+        :param str job_id:
+        :param dict status:
+        """
+        os.makedirs(osp.join(self.path, job_id))
+        self.put_status(job_id, status)
+
+    def put_status(self, job_id, status):
+        """Writes the status of a job.
+
+        :param str job_id:
+        :param dict status:
+        """
+        self._write(job_id, "status.json", self.codec.dumps(status))
+
+    def get_status(self, job_id):
+        """Reads the status of a job.
+
+        :param str job_id:
+        :return dict: The status, or None if there is no such job.
+        """
+        body = self._read(job_id, "status.json")
+        if body is None:
+            return None
+        try:
+            return self.codec.loads(body)
+        except ValueError:
+            return None
+
+    def put_results(self, job_id, rows) -> int:
+        """Writes the result rows of a job as pages of page_size rows.
+
+        :param str job_id:
+        :param list rows: The result rows.
+        :return int: The number of pages.
+        """
+        pages = max((len(rows) + self.page_size - 1) // self.page_size, 1)
+        for page in range(pages):
+            body = self.codec.dumps({
+                "job_id": job_id,
+                "page": page,
+                "pages": pages,
+                "output": rows[page * self.page_size:(page + 1) * self.page_size]
+            })
+            self._write(job_id, "page-{}.json".format(page), body)
+        return pages
+
+    def get_page(self, job_id, page):
+        """Reads a page of the results of a job.
+
+        :param str job_id:
+        :param int page:
+        :return bytes: The JSON encoded page, or None if there is no such page.
+        """
+        return self._read(job_id, "page-{}.json".format(int(page)))
+
+    def is_orphaned(self, status, now) -> bool:
+        """Checks if an unfinished job was lost with the worker that queued it: the worker has stopped, or (for jobs
+        without a worker) it was submitted more than ttl seconds ago.
+
+        :param dict status:
+        :param float now:
+        :return bool:
+        """
+        if status["state"] in FINISHED_STATES:
+            return False
+        pid = status.get("worker")
+        if pid is None:
+            return now - status["submitted"] > self.ttl
+        return not is_alive(pid)
+
+    def recover(self) -> int:
+        """Marks the orphaned jobs as failed @see is_orphaned, so they are finished, and pruned after ttl seconds.
+
+        :return int: The number of jobs marked failed.
+        """
+        now = time.time()
+        failed = 0
+        for job_id in os.listdir(self.path):
+            status = self.get_status(job_id)
+            if status is None or not self.is_orphaned(status, now):
+                continue
+            status["state"] = FAILED
+            status["error"] = "The worker running the job stopped."
+            status["finished"] = now
+            self.put_status(job_id, status)
+            failed += 1
+        return failed
+
+    def prune(self):
+        """Removes the jobs that finished more than ttl seconds ago, after marking orphaned jobs failed."""
+        self.recover()
+        now = time.time()
+        for job_id in os.listdir(self.path):
+            status = self.get_status(job_id)
+            if status is None or status["state"] not in FINISHED_STATES:
+                continue
+            if now - status["finished"] > self.ttl:
+                shutil.rmtree(osp.join(self.path, job_id), ignore_errors=True)
+
+
+class _Job(object):
+    """A job waiting in the queue."""
+
+    __slots__ = ["job_id", "X", "status"]
+
+    def __init__(self, job_id, X, status):
+        self.job_id = job_id
+        self.X = X
+        self.status = status
+
+
+class JobManager(object):
+    """Runs jobs on a pool of background worker threads, and stores their statuses and results in a JobStore.
+
+    The worker threads are started by the first submit, so a manager created before gunicorn forks its workers does
+    not start threads in the master process. Jobs left unfinished by stopped workers are marked failed when a manager
+    is created @see JobStore.recover
+
+    :param callable run_fn: The function that predicts a job's input and returns a list of result rows.
+    :param JobStore store: The store for statuses and results.
+    :param int workers: The number of worker threads.
+    :param int max_queue: The maximum number of jobs waiting to run. Further submits raise JobQueueFull.
+    :param float poll_interval: How often, in seconds, a long-poll checks the job status.
+    """
+
+    def __init__(self, run_fn, store, workers=2, max_queue=16, poll_interval=0.05):
+        self.run_fn = run_fn
+        self.store = store
+        self.workers = max(int(workers), 1)
+        self.poll_interval = float(poll_interval)
+
+        self._queue = queue.Queue(maxsize=max(int(max_queue), 1))
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+
+        self.store.recover()
+
+    def _start(self):
+        with self._lock:
+            if len(self._threads) > 0 or self._closed:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name="catwalk-job-{}".format(n), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, X, **extra) -> dict:
+        """Queues a job to predict X.
+
+        :param X: The job input.
+        :param extra: Extra keys for the job status, e.g. the correlation_id and model.
+        :return dict: The status of the new job.
+        :raises JobQueueFull: If the queue is full, or the manager is shut down.
+        """
+        if self._closed:
+            raise JobQueueFull()
+        self._start()
+
+        job_id = uuid.uuid4().hex
+        status = dict(extra)
+        status.update({
+            "job_id": job_id,
+            "state": QUEUED,
+            "worker": os.getpid(),
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "rows": None,
+            "pages": None,
+            "error": None
+        })
+        self.store.create(job_id, status)
+
+        try:
+            self._queue.put_nowait(_Job(job_id, X, status))
+        except queue.Full:
+            shutil.rmtree(osp.join(self.store.path, job_id), ignore_errors=True)
+            with self._lock:
+                self._rejected += 1
+            raise JobQueueFull()
+
+        with self._lock:
+            self._submitted += 1
+            if self._submitted % 100 == 0:
+                self.store.prune()
+        return dict(status)
+
+    def status(self, job_id, wait=0.0):
+        """Returns the status of a job, optionally waiting for it to finish.
+
+        :param str job_id:
+        :param float wait: The maximum time, in seconds, to wait for the job to finish.
+        :return dict: The status, or None if there is no such job.
+        """
+        deadline = time.monotonic() + max(float(wait), 0.0)
+        status = self.store.get_status(job_id)
+        while status is not None and status["state"] not in FINISHED_STATES and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            status = self.store.get_status(job_id)
+        return status
+
+    def shutdown(self, timeout=None):
+        """Stops the worker threads once the running jobs finish. Queued jobs are marked failed.
+
+        :param float timeout: The maximum time, in seconds, to wait for each worker thread, or None to wait for them.
+        """
+        with self._lock:
+            self._closed = True
+            threads, self._threads = self._threads, []
+
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.status.update(state=FAILED, error="The server was shut down.", finished=time.time())
+            self._put_status(job)
+            self._queue.task_done()
+
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _put_status(self, job):
+        try:
+            self.store.put_status(job.job_id, job.status)
+        except Exception:
+            logger.exception("Unable to store the status of job %s", job.job_id)
+
+    def _run(self, job):
+        # Errors of the store fail the job too, rather than the worker thread
+        status = job.status
+        try:
+            status["state"] = RUNNING
+            status["started"] = time.time()
+            self.store.put_status(job.job_id, status)
+
+            rows = self.run_fn(job.X)
+            job.X = None
+            status["rows"] = len(rows)
+            status["pages"] = self.store.put_results(job.job_id, rows)
+            status["state"] = DONE
+        except Exception as err:
+            status["state"] = FAILED
+            status["error"] = str(err)
+
+        # Count the job before its status is stored, so the stats are up to date once it is seen to be finished
+        with self._lock:
+            if status["state"] == DONE:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+        status["finished"] = time.time()
+        self._put_status(job)
+
+    def stats(self) -> dict:
+        """Returns the job counts of this manager.
+
+        :return dict:
+        """
+        with self._lock:
+            return {
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "queued": self._queue.qsize(),
+                "workers": self.workers
+            }
@@ -0,0 +1,275 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Priority lanes for predict calls.
+
+Latency critical single rows and large bulk batches are sent to the same /predict end-point, and would otherwise wait
+for the predict pool in one FIFO queue. With server.priority.enabled, each request is classified into a lane:
+
+1) by the X-Priority header, or the "priority" key of its "extra_data", if they name a lane;
+2) otherwise into the first lane whose min_rows or min_bytes the request reaches (rows of the input, or bytes of the
+   body);
+3) otherwise into the default lane (server.priority.default, by default the first lane).
+
+Each lane has its own queue of max_queue calls in the predict pool, and when a thread of the pool is free the next call
+is taken from the lanes by weight (stride scheduling): a lane with weight 4 gets 4 times the threads of a lane with
+weight 1 while both have calls waiting, and a lane that was idle does not get to catch up. A lane can be kept to
+max_threads threads, so that e.g. bulk calls always leave a thread for interactive calls. For example:
+
+    server:
+      predict_pool:
+        enabled: true
+        threads: 4
+      priority:
+        enabled: true
+        lanes:
+          interactive:
+            weight: 4
+            max_queue: 32
+          bulk:
+            weight: 1
+            max_queue: 4
+            max_threads: 3
+            min_rows: 1000
+
+Lanes order the calls of the predict pool, so they need server.predict_pool.enabled. Calls made outside a request
+(e.g. by the batch scheduler, jobs and streams) go to the default lane.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .offload import PredictPoolFull, ContextLocal
+
+LANE_HEADER = "X-Priority"
+LANE_FIELD = "priority"
+
+DEFAULT_LANES = {
+    "interactive": {"weight": 4},
+    "bulk": {"weight": 1, "min_rows": 1000}
+}
+
+# The lane of the request handled by this thread or greenlet
+_local = ContextLocal()
+
+
+@contextmanager
+def lane_scope(lane):
+    """Sets the lane of the predict calls made in this context (in this thread or greenlet).
+
+    :param str lane: The lane name, or None for the default lane.
+    """
+    previous = current_lane()
+    _local.lane = lane
+    try:
+        yield
+    finally:
+        _local.lane = previous
+
+
+def current_lane() -> str:
+    """:return str: The lane of the current request, or None."""
+    return getattr(_local, "lane", None)
+
+
+class Lane(object):
+    """A lane of predict calls.
+
+    :param str name:
+    :param float weight: The share of the predict threads relative to the other lanes.
+    :param int max_queue: The number of calls that can wait in the lane. Calls beyond this are rejected.
+    :param int max_threads: The most threads the lane's calls can use at once, or None for all of them.
+    :param int min_rows: Requests with at least this many rows are classified into the lane, or None.
+    :param int min_bytes: Requests with bodies of at least this many bytes are classified into the lane, or None.
+    """
+
+    def __init__(self, name, weight=1.0, max_queue=16, max_threads=None, min_rows=None, min_bytes=None):
+        if weight <= 0:
+            raise ValueError("The weight of lane {} must be positive".format(name))
+        self.name = name
+        self.weight = float(weight)
+        self.max_queue = max(int(max_queue), 0)
+        self.max_threads = max(int(max_threads), 1) if max_threads is not None else None
+        self.min_rows = min_rows
+        self.min_bytes = min_bytes
+
+        self.waiting = deque()
+        self.running = 0
+        self.stride = 0.0
+
+    def matches(self, rows, size) -> bool:
+        """Checks if a request is large enough for the lane.
+
+        :param int rows: The number of rows of the input.
+        :param int size: The size of the body in bytes, or None if it is not known.
+        :return bool:
+        """
+        return (self.min_rows is not None and rows >= self.min_rows) or \
+            (self.min_bytes is not None and size is not None and size >= self.min_bytes)
+
+    def __repr__(self):
+        return "{}(weight={:g}, max_queue={}, max_threads={})".format(self.name, self.weight, self.max_queue,
+                                                                      self.max_threads)
+
+
+def get_lanes(config, max_queue=16) -> list:
+    """Creates the lanes of the server.priority config.
+
+    :param dict config: The server.priority config, or None.
+    :param int max_queue: The default max_queue of the lanes, e.g. the predict pool's.
+    :return list: The lanes, or None if priority lanes are disabled.
+    :raises ValueError: If a lane is invalid.
+    """
+    if not config or not config.get("enabled", False):
+        return None
+
+    lanes = []
+    for name, options in (config.get("lanes") or DEFAULT_LANES).items():
+        options = dict(options or {})
+        options.setdefault("max_queue", max_queue)
+        lanes.append(Lane(str(name), **options))
+    default = config.get("default", lanes[0].name)
+    if default not in [lane.name for lane in lanes]:
+        raise ValueError("The default lane {} is not one of the lanes".format(default))
+    # The default lane goes first, and is classified into last
+    return sorted(lanes, key=lambda lane: lane.name != default)
+
+
+class LaneScheduler(object):
+    """Shares the threads of the predict pool between lanes.
+
+    :param list lanes: @see get_lanes. The first lane is the default lane.
+    :param int threads: The number of threads to share.
+    :param ServerMetrics metrics: Records the lanes' queue depths, wait times, calls and rejections, if given.
+    """
+
+    def __init__(self, lanes, threads, metrics=None):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.default = lanes[0]
+        self.threads = max(int(threads), 1)
+        self.metrics = metrics
+        self._free = self.threads
+        self._stride = 0.0
+        # Only used by the callers, not the pool's threads @see PredictPool
+        self._lock = threading.Lock()
+
+    def classify(self, headers, extra_data=None, rows=1, size=None) -> str:
+        """Classifies a request into a lane.
+
+        :param headers: The request headers.
+        :param dict extra_data: The "extra_data" of the request, or None.
+        :param int rows: The number of rows of the input.
+        :param int size: The size of the body in bytes, or None if it is not known.
+        :return str: The lane name.
+        """
+        name = headers.get(LANE_HEADER)
+        if name is None and isinstance(extra_data, dict):
+            name = extra_data.get(LANE_FIELD)
+        if name in self.lanes:
+            return name
+
+        for lane in self.lanes.values():
+            if lane is not self.default and lane.matches(rows, size):
+                return lane.name
+        return self.default.name
+
+    def acquire(self, name=None, admit_all=False):
+        """Waits for a thread for a call in a lane. It must be released when the call returns.
+
+        :param str name: The lane, or None (or an unknown lane) for the default lane.
+        :param bool admit_all: Queue the call even if the lane's queue is full.
+        :return Lane: The lane the call was admitted to.
+        :raises PredictPoolFull: If the lane's queue is full.
+        """
+        lane = self.lanes.get(name, self.default)
+        queued = time.perf_counter()
+        with self._lock:
+            if len(lane.waiting) == 0 and self._can_run(lane):
+                self._start(lane)
+                granted = None
+            elif len(lane.waiting) >= lane.max_queue and not admit_all:
+                self._record(lane.name, rejected=True)
+                raise PredictPoolFull("Predict queue is full.")
+            else:
+                granted = threading.Event()
+                lane.waiting.append(granted)
+                self._record(lane.name)
+
+        if granted is not None:
+            self._wait(lane, granted)
+        if self.metrics is not None:
+            self.metrics.lane_wait.observe(time.perf_counter() - queued, (lane.name,))
+            self.metrics.lane_calls.inc(labels=(lane.name,))
+        return lane
+
+    def release(self, lane):
+        """Frees the thread of a call, and hands it to the next call waiting.
+
+        :param Lane lane: @see acquire
+        """
+        with self._lock:
+            lane.running -= 1
+            self._free += 1
+            self._dispatch()
+
+    def _wait(self, lane, granted):
+        try:
+            granted.wait()
+        except BaseException:
+            # e.g. a gevent timeout: give up the place in the queue, or the thread if it was just handed over
+            with self._lock:
+                if granted in lane.waiting:
+                    lane.waiting.remove(granted)
+                    self._record(lane.name)
+                else:
+                    lane.running -= 1
+                    self._free += 1
+                    self._dispatch()
+            raise
+
+    def _can_run(self, lane) -> bool:
+        return self._free > 0 and (lane.max_threads is None or lane.running < lane.max_threads)
+
+    def _start(self, lane):
+        # Stride scheduling: the lane with the lowest pass goes next, and every call moves its pass on by 1 / weight.
+        # Lanes that were idle start from the current pass, so they do not catch up.
+        start = max(lane.stride, self._stride)
+        self._stride = start
+        lane.stride = start + 1.0 / lane.weight
+        lane.running += 1
+        self._free -= 1
+
+    def _dispatch(self):
+        while self._free > 0:
+            ready = [lane for lane in self.lanes.values() if len(lane.waiting) > 0 and self._can_run(lane)]
+            if len(ready) == 0:
+                return
+            lane = min(ready, key=lambda lane: (max(lane.stride, self._stride), -lane.weight))
+            self._start(lane)
+            lane.waiting.popleft().set()
+            self._record(lane.name)
+
+    def _record(self, name, rejected=False):
+        if self.metrics is not None:
+            self.metrics.lane_queue.set(len(self.lanes[name].waiting), (name,))
+            if rejected:
+                self.metrics.lane_rejected.inc(labels=(name,))
+
+    def __str__(self):
+        return ", ".join(repr(lane) for lane in self.lanes.values())
@@ -0,0 +1,77 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Reports the memory of the server's processes, to check how much of it the gunicorn workers share.
+
+A process' memory is read from /proc/<pid>/smaps_rollup (or smaps on kernels older than 4.14), so it is only available
+on Linux. The sizes reported are:
+
+- rss: The resident set size, counting shared pages in full.
+- pss: The proportional set size, counting each shared page divided by the number of processes that share it.
+- uss: The unique set size, the private pages, which is what the process would free if it exited.
+- shared: The pages shared with other processes, e.g. a model preloaded by the gunicorn master.
+"""
+import os.path as osp
+
+# The smaps fields summed into each size
+_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Private_Clean": "uss",
+    "Private_Dirty": "uss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared"
+}
+
+SIZES = ("rss", "pss", "uss", "shared")
+
+
+def read_memory(pid="self") -> dict:
+    """Reads the memory of a process.
+
+    :param int|str pid: The process id, "self" for this process.
+    :return dict: {size: bytes} @see SIZES, or None if it is not available.
+    """
+    for name in ("smaps_rollup", "smaps"):
+        path = osp.join("/proc", str(pid), name)
+        try:
+            with open(path, "r") as fp:
+                lines = fp.readlines()
+        except OSError:
+            continue
+
+        r = dict.fromkeys(SIZES, 0)
+        for line in lines:
+            field, _, value = line.partition(":")
+            size = _FIELDS.get(field)
+            if size is not None:
+                # The values are in kB
+                r[size] += int(value.split()[0]) * 1024
+        return r
+    return None
+
+
+def format_memory(memory) -> str:
+    """Formats the memory of a process for logs.
+
+    :param dict memory: @see read_memory
+    :return str:
+    """
+    if memory is None:
+        return "unavailable"
+    return ", ".join("{} {:.1f} MiB".format(size, memory[size] / 1048576) for size in SIZES)
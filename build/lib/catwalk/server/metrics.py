@@ -0,0 +1,495 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Prometheus metrics, aggregated across gunicorn worker processes.
+
+Every metric series is a fixed slot in an array of doubles. A worker records into its own array, which is backed by
+a "metrics-<pid>.db" file (opened lazily in each process, so forked workers get their own) when a metrics directory
+is configured. Scraping /metrics on any worker reads and aggregates the files of all workers, so recording is a lock
+and an add on the hot path, and all the work is done at scrape time.
+
+All workers declare the same metrics in the same order, so slots line up across files. Each file has a header with a
+signature of its layout, and files with a different layout (e.g. from another version) are ignored.
+"""
+import array
+import bisect
+import errno
+import hashlib
+import mmap
+import os
+import os.path as osp
+import struct
+import threading
+import weakref
+
+from .admission import REASONS as ADMISSION_REASONS
+from .memory import SIZES, read_memory
+
+# The file header: magic, layout signature, pid
+_HEADER = struct.Struct("<8sQQ")
+_MAGIC = b"CATWALK1"
+
+# How series are aggregated across workers
+SUM = "sum"
+MAX = "max"
+LIVE_SUM = "livesum"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join("{}=\"{}\"".format(k, _escape(v)) for k, v in labels) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+# Registries whose values are reopened in forked child processes
+_registries = weakref.WeakSet()
+
+
+def _after_fork():
+    for registry in list(_registries):
+        registry.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _is_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+    return True
+
+
+class Registry(object):
+    """Allocates the slots of metric series, and records and aggregates their values.
+    The values attribute is opened on first use in each process.
+
+    :param str path: The directory shared by the worker processes, or None to keep metrics in this process only.
+    :param dict const_labels: Labels added to every series, e.g. the model name and version.
+    """
+
+    def __init__(self, path=None, const_labels=None):
+        self.path = path
+        self.const_labels = tuple(sorted((const_labels or {}).items()))
+        self.lock = threading.Lock()
+        self.metrics = []
+        self._modes = []
+        self._names = []
+        self._mmap = None
+
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        _registries.add(self)
+
+    def __getattr__(self, name):
+        # Only called when values has not been opened in this process yet
+        if name != "values":
+            raise AttributeError(name)
+        self._open()
+        return self.__dict__["values"]
+
+    def reset(self):
+        """Forgets the values of this process, e.g. after a fork, so they are reopened on next use."""
+        self.__dict__.pop("values", None)
+        self.lock = threading.Lock()
+
+    def allocate(self, names, mode):
+        """Allocates slots for series. Metrics must be declared before values are recorded.
+
+        :param list names: A unique name per slot, used for the layout signature.
+        :param str mode: How the slots are aggregated across workers: SUM, MAX or LIVE_SUM.
+        :return int: The first slot.
+        """
+        offset = len(self._names)
+        self._names.extend(names)
+        self._modes.extend([mode] * len(names))
+        self.reset()
+        return offset
+
+    @property
+    def signature(self) -> int:
+        h = hashlib.blake2b("\n".join(self._names).encode("utf-8"), digest_size=8)
+        return struct.unpack("<Q", h.digest())[0]
+
+    def _file(self, pid):
+        return osp.join(self.path, "metrics-{}.db".format(pid))
+
+    def _open(self):
+        pid = os.getpid()
+        n = len(self._names)
+        if self.path is None:
+            values = array.array("d", bytes(8 * n))
+        else:
+            size = _HEADER.size + 8 * n
+            fd = os.open(self._file(pid), os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self._mmap = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            _HEADER.pack_into(self._mmap, 0, _MAGIC, self.signature, pid)
+            values = memoryview(self._mmap)[_HEADER.size:].cast("d")
+            for i in range(n):
+                values[i] = 0.0
+        self.values = values
+
+    def _read_files(self):
+        """Yields the (pid, values) of every worker file with this layout."""
+        signature = self.signature
+        size = 8 * len(self._names)
+        for name in os.listdir(self.path):
+            if not (name.startswith("metrics-") and name.endswith(".db")):
+                continue
+            try:
+                with open(osp.join(self.path, name), "rb") as fp:
+                    body = fp.read()
+            except OSError:
+                continue
+            if len(body) != _HEADER.size + size:
+                continue
+            magic, file_signature, pid = _HEADER.unpack_from(body, 0)
+            if magic != _MAGIC or file_signature != signature:
+                continue
+            values = array.array("d")
+            values.frombytes(body[_HEADER.size:])
+            yield pid, values
+
+    def pids(self) -> list:
+        """Returns the ids of the live worker processes that record into the metrics directory.
+
+        :return list: This process' id if there is no metrics directory.
+        """
+        if self.path is None:
+            return [os.getpid()]
+        pids = []
+        for name in os.listdir(self.path):
+            if name.startswith("metrics-") and name.endswith(".db"):
+                pid = name[len("metrics-"):-len(".db")]
+                if pid.isdigit() and _is_alive(int(pid)):
+                    pids.append(int(pid))
+        return sorted(pids)
+
+    def collect(self) -> list:
+        """Aggregates the values of all workers.
+
+        :return list: A value per slot.
+        """
+        values = self.values
+        if self.path is None:
+            with self.lock:
+                return list(values)
+
+        r = [0.0] * len(self._names)
+        for pid, worker_values in self._read_files():
+            is_alive = _is_alive(pid)
+            for i, (mode, value) in enumerate(zip(self._modes, worker_values)):
+                if mode == SUM or (mode == LIVE_SUM and is_alive):
+                    r[i] += value
+                elif mode == MAX:
+                    r[i] = max(r[i], value)
+        return r
+
+    def render(self) -> bytes:
+        """Renders all metrics in the Prometheus text exposition format.
+
+        :return bytes:
+        """
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.render(values, self.const_labels))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Metric(object):
+    """A metric with a fixed set of label values, each of which is a series of width slots.
+
+    :param Registry registry:
+    :param str name:
+    :param str documentation:
+    :param tuple labelnames: The label names.
+    :param list labelvalues: The tuples of label values allowed. The last one is used for unknown label values.
+    :param str mode: How the series are aggregated across workers.
+    """
+
+    kind = None
+    width = 1
+
+    def __init__(self, registry, name, documentation, labelnames=(), labelvalues=None, mode=SUM):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.labelvalues = [tuple(str(v) for v in values) for values in (labelvalues or [()])]
+        self._index = {values: i for i, values in enumerate(self.labelvalues)}
+        self._other = len(self.labelvalues) - 1
+
+        names = ["{}{}:{}".format(name, values, i) for values in self.labelvalues for i in range(self.width)]
+        self.offset = registry.allocate(names, mode)
+        registry.metrics.append(self)
+
+    def slot(self, labels=()) -> int:
+        """Returns the first slot of the series with the given label values.
+
+        :param tuple labels: The label values, as strings.
+        :return int:
+        """
+        return self.offset + self._index.get(labels, self._other) * self.width
+
+    def _labels(self, values, const_labels):
+        return const_labels + tuple(zip(self.labelnames, values))
+
+    def render(self, values, const_labels):
+        for i, labelvalues in enumerate(self.labelvalues):
+            labels = _format_labels(self._labels(labelvalues, const_labels))
+            yield "{}{} {}".format(self.name, labels, _format_value(values[self.offset + i]))
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, value=1.0, labels=()):
+        registry = self.registry
+        values = registry.values
+        with registry.lock:
+            values[self.slot(labels)] += value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def inc(self, value=1.0, labels=()):
+        registry = self.registry
+        values = registry.values
+        with registry.lock:
+            values[self.slot(labels)] += value
+
+    def dec(self, value=1.0, labels=()):
+        self.inc(-value, labels)
+
+    def set(self, value, labels=()):
+        self.registry.values[self.slot(labels)] = value
+
+
+class Histogram(_Metric):
+    """Counts observations in buckets. Each series is a count per bucket (including +Inf), then the sum.
+
+    :param tuple buckets: The bucket upper bounds, in increasing order.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), labelvalues=None, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(float(b) for b in buckets)
+        self.width = len(self.buckets) + 2
+        super().__init__(registry, name, documentation, labelnames, labelvalues)
+
+    def observe(self, value, labels=()):
+        registry = self.registry
+        values = registry.values
+        slot = self.slot(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with registry.lock:
+            values[slot + bucket] += 1.0
+            values[slot + self.width - 1] += value
+
+    def observe_at(self, values, slot, value):
+        """Observes value in the series at slot, without locking. For callers that hold the registry lock."""
+        values[slot + bisect.bisect_left(self.buckets, value)] += 1.0
+        values[slot + self.width - 1] += value
+
+    def render(self, values, const_labels):
+        bounds = self.buckets + (float("inf"),)
+        for i, labelvalues in enumerate(self.labelvalues):
+            slot = self.offset + i * self.width
+            labels = self._labels(labelvalues, const_labels)
+            count = 0.0
+            for j, bound in enumerate(bounds):
+                count += values[slot + j]
+                yield "{}_bucket{} {}".format(self.name, _format_labels(labels + (("le", _format_value(bound)),)),
+                                              _format_value(count))
+            yield "{}_sum{} {}".format(self.name, _format_labels(labels), _format_value(values[slot + self.width - 1]))
+            yield "{}_count{} {}".format(self.name, _format_labels(labels), _format_value(count))
+
+
+# The status codes counted separately, other codes are counted as "other"
+STATUS_CODES = ("200", "202", "400", "404", "409", "413", "415", "429", "500", "503", "504")
+STAGES = ("parse", "validate", "convert", "predict", "serialize")
+
+
+class ServerMetrics(object):
+    """The metrics of the model server.
+
+    :param list endpoints: The names of the Flask end-points. Other end-points are labelled "other".
+    :param str path: The directory shared by the worker processes, or None to keep metrics in this process only.
+    :param dict const_labels: Labels added to every series, e.g. the model name and version.
+    :param list lanes: The names of the priority lanes, if they are enabled @see catwalk.server.lanes
+    """
+
+    def __init__(self, endpoints, path=None, const_labels=None, lanes=None):
+        self.registry = Registry(path, const_labels)
+        endpoints = list(endpoints) + ["other"]
+        codes = list(STATUS_CODES) + ["other"]
+
+        self.requests = Counter(self.registry, "catwalk_requests_total", "Requests by end-point and status code.",
+                                ("endpoint", "code"), [(e, c) for e in endpoints for c in codes])
+        self.request_duration = Histogram(self.registry, "catwalk_request_duration_seconds",
+                                          "Request latency by end-point.", ("endpoint",), [(e,) for e in endpoints])
+        self.stage_duration = Histogram(self.registry, "catwalk_stage_duration_seconds",
+                                        "Wall time of the stages of predict requests.", ("stage",),
+                                        [(s,) for s in STAGES + ("other",)])
+        self.rows = Counter(self.registry, "catwalk_predict_rows_total", "Rows predicted.")
+        self.request_size = Histogram(self.registry, "catwalk_request_size_bytes", "Request body sizes by end-point.",
+                                      ("endpoint",), [(e,) for e in endpoints], buckets=SIZE_BUCKETS)
+        self.response_size = Histogram(self.registry, "catwalk_response_size_bytes",
+                                       "Response body sizes by end-point.", ("endpoint",), [(e,) for e in endpoints],
+                                       buckets=SIZE_BUCKETS)
+        self.in_flight = Gauge(self.registry, "catwalk_requests_in_flight", "Requests being handled.",
+                               mode=LIVE_SUM)
+        self.model_load = Gauge(self.registry, "catwalk_model_load_seconds",
+                                "Time taken to load the model (the slowest worker).", mode=MAX)
+        self.predict_queue = Gauge(self.registry, "catwalk_predict_queue_depth",
+                                   "Predict calls waiting for a thread of the predict pool.", mode=LIVE_SUM)
+        self.predict_wait = Histogram(self.registry, "catwalk_predict_queue_wait_seconds",
+                                      "Time predict calls waited for a thread of the predict pool.")
+        self.predict_rejected = Counter(self.registry, "catwalk_predict_rejected_total",
+                                        "Predict calls rejected because the predict pool's queue was full.")
+        self.admission_rejected = Counter(self.registry, "catwalk_admission_rejected_total",
+                                          "Predict requests rejected by admission control, by reason.", ("reason",),
+                                          [(r,) for r in ADMISSION_REASONS])
+        self.concurrency_limit = Gauge(self.registry, "catwalk_concurrency_limit",
+                                       "The adaptive limit of concurrent predict requests.", mode=LIVE_SUM)
+        self.registry_loads = Counter(self.registry, "catwalk_registry_loads_total",
+                                      "Models loaded by the model registry.")
+        self.registry_evictions = Counter(self.registry, "catwalk_registry_evictions_total",
+                                          "Models evicted by the model registry.")
+        self.registry_load_duration = Histogram(self.registry, "catwalk_registry_load_duration_seconds",
+                                                "Time taken to load the models of the model registry.")
+        self.registry_models = Gauge(self.registry, "catwalk_registry_models_loaded",
+                                     "Models loaded by the model registry.", mode=LIVE_SUM)
+        self.registry_memory = Gauge(self.registry, "catwalk_registry_memory_bytes",
+                                     "Memory taken by the models of the model registry.", mode=LIVE_SUM)
+        self.lane_queue = None
+        self.lane_wait = None
+        self.lane_calls = None
+        self.lane_rejected = None
+        if lanes:
+            lanes = [(lane,) for lane in lanes]
+            self.lane_queue = Gauge(self.registry, "catwalk_lane_queue_depth",
+                                    "Predict calls waiting for a thread, by priority lane.", ("lane",), lanes,
+                                    mode=LIVE_SUM)
+            self.lane_wait = Histogram(self.registry, "catwalk_lane_wait_seconds",
+                                       "Time predict calls waited for a thread, by priority lane.", ("lane",), lanes)
+            self.lane_calls = Counter(self.registry, "catwalk_lane_calls_total", "Predict calls by priority lane.",
+                                      ("lane",), lanes)
+            self.lane_rejected = Counter(self.registry, "catwalk_lane_rejected_total",
+                                         "Predict calls rejected because their lane's queue was full.", ("lane",),
+                                         lanes)
+
+        # The slots of each end-point's request series, and of each status code's requests_total series
+        self._endpoint_slots = {}
+        for e in endpoints:
+            self._endpoint_slots[e] = (self.request_duration.slot((e,)), self.request_size.slot((e,)),
+                                       self.response_size.slot((e,)),
+                                       {c: self.requests.slot((e, c)) for c in codes})
+
+    def record_request(self, endpoint, status_code, duration, request_size=None, response_size=None):
+        """Records a completed request.
+
+        :param str endpoint: The Flask end-point name.
+        :param int status_code:
+        :param float duration: The request latency, in seconds.
+        :param int request_size: The request body size in bytes, if known.
+        :param int response_size: The response body size in bytes, if known.
+        """
+        slots = self._endpoint_slots.get(endpoint) or self._endpoint_slots["other"]
+        duration_slot, request_size_slot, response_size_slot, code_slots = slots
+        code_slot = code_slots.get(str(status_code), code_slots["other"])
+
+        registry = self.registry
+        values = registry.values
+        with registry.lock:
+            values[code_slot] += 1.0
+            self.request_duration.observe_at(values, duration_slot, duration)
+            if request_size is not None:
+                self.request_size.observe_at(values, request_size_slot, request_size)
+            if response_size is not None:
+                self.response_size.observe_at(values, response_size_slot, response_size)
+
+    def record_stages(self, stages):
+        """Records the wall times of the stages of a request.
+
+        :param dict stages: {stage: (wall, cpu)} in seconds @see catwalk.server.timing.StageTimer.
+        """
+        histogram = self.stage_duration
+        registry = self.registry
+        values = registry.values
+        with registry.lock:
+            for stage, times in stages.items():
+                histogram.observe_at(values, histogram.slot((stage,)), times[0])
+
+    def render_memory(self) -> bytes:
+        """Renders the memory of each worker, read when scraped. Its series are labelled by pid, so they are not
+        recorded in the registry.
+
+        :return bytes:
+        """
+        lines = []
+        for pid in self.registry.pids():
+            memory = read_memory(pid)
+            if memory is None:
+                continue
+            for size in SIZES:
+                labels = self.registry.const_labels + (("pid", pid), ("kind", size))
+                lines.append("catwalk_worker_memory_bytes{} {}".format(_format_labels(labels),
+                                                                       _format_value(memory[size])))
+        if len(lines) == 0:
+            return b""
+        lines = ["# HELP catwalk_worker_memory_bytes Memory of each worker process by kind: rss, pss, uss (unique) "
+                 "and shared.", "# TYPE catwalk_worker_memory_bytes gauge"] + lines
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def render(self) -> bytes:
+        """Renders the metrics of all workers in the Prometheus text exposition format.
+
+        :return bytes:
+        """
+        return self.registry.render() + self.render_memory()
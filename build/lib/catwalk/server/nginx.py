@@ -0,0 +1,216 @@
+##############################################################################
+#
+# Original Copyright 2019 Amazon.com Inc
+# Original: https://github.com/awslabs/amazon-sagemaker-examples/tree/master/advanced_functionality/scikit_bring_your_own/container/decision_trees
+# Modifications to this file Copyright 2019 Leap Beyond Emerging Technologies Ltd.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+""" This file follows the Amazon SageMaker example here:
+https://github.com/awslabs/amazon-sagemaker-examples/tree/master/advanced_functionality/scikit_bring_your_own/container/decision_trees
+
+There are some notable differences:
+1) the gunicorn workers are planned from the model's concurrency profile, see catwalk.server.workers.
+2) nginx conf is written at runtime so that we can support variable port numbers.
+3) supports SSL
+4) able to run as a non-root user
+5) supports a dynamic port
+6) can preload the model in the gunicorn master, so the workers share its memory
+7) can run the model in the processes of a model engine, see catwalk.server.engine
+"""
+import os
+import os.path as osp
+import signal
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import logging
+
+import yaml
+from jinja2 import Environment, PackageLoader
+
+from ..helpers.configuration import app_config
+from ..helpers.logging import get_logger_from_app_config
+from .engine import ENGINE_PATH_ENV, make_engine_path, start_supervisor
+from .workers import available_cpus, available_memory, get_profile, plan_workers, IO_BOUND
+
+model_server_timeout = os.environ.get("MODEL_SERVER_TIMEOUT", 60)
+
+# The minimum connections of the nginx worker, its default is 512
+NGINX_MIN_CONNECTIONS = 1024
+
+
+def sigterm_handler(nginx_pid, gunicorn_pid, engine_pid=None):
+    try:
+        os.kill(nginx_pid, signal.SIGQUIT)
+    except OSError:
+        pass
+    for pid in [gunicorn_pid, engine_pid]:
+        try:
+            if pid is not None:
+                os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    sys.exit(0)
+
+
+def render_template(env, name, path, kwargs):
+    """Renders the template of a file into a directory.
+
+    :param Environment env:
+    :param str name: The file name, the template is name + ".j2".
+    :param str path: The directory.
+    :param dict kwargs: The template variables.
+    """
+    template = env.get_template(name + ".j2")
+    rendered = template.render(**kwargs)
+    with open(osp.join(path, name), "w") as fp:
+        fp.write(rendered)
+
+
+def plan_server_workers(model_path, logger):
+    """Plans the gunicorn workers from the model's concurrency profile and the CPUs and memory available.
+
+    :param str model_path:
+    :param Logger logger:
+    :return WorkerPlan:
+    """
+    with open(osp.join(model_path, "model.yml"), "r") as fp:
+        info = yaml.safe_load(fp)
+    profile = get_profile(info, app_config.get_nested("server.concurrency", None))
+    if app_config.get_nested("server.engine.enabled", False):
+        # predict runs in the model engine's processes, the workers only parse requests and wait for results
+        profile = {"bound": IO_BOUND, "thread_safe": True, "workers": app_config.get_nested("server.engine.frontends", 2)}
+
+    cpus, cpu_source = available_cpus()
+    memory, memory_source = available_memory()
+    plan = plan_workers(profile, cpus, memory)
+
+    logger.info("Concurrency profile: {}".format(profile if profile is not None else "none"))
+    logger.info("Resources: {} CPUs from {}, {} from {}".format(
+        cpus, cpu_source, "{:.0f} MiB".format(memory / 1048576) if memory is not None else "unknown memory",
+        memory_source))
+    logger.info("Worker plan: {}, because {}".format(plan, "; ".join(plan.reasons)))
+    return plan
+
+
+def start_engine(config, model_path, env, logger):
+    """Starts the model engine supervisor if server.engine.enabled, and passes its directory to the workers.
+
+    :param str config: The app_config path.
+    :param str model_path:
+    :param dict env: The environment of the gunicorn workers.
+    :param Logger logger:
+    :return Popen: The supervisor process, or None if the engine is disabled.
+    """
+    if not app_config.get_nested("server.engine.enabled", False):
+        return None
+
+    env[ENGINE_PATH_ENV] = make_engine_path()
+    logger.info("Starting the model engine in {}".format(env[ENGINE_PATH_ENV]))
+    return start_supervisor(config, model_path, env[ENGINE_PATH_ENV])
+
+
+def start_nginx(config=None, model_path=".", port=9090):
+    model_path = osp.abspath(model_path)
+
+    app_config_path = config
+    if isinstance(app_config_path, str) and app_config_path.lower() == "false":
+        app_config_path = None
+    app_config.load(app_config_path)
+
+    logger = get_logger_from_app_config(__name__)
+
+    # The model can be loaded once by the gunicorn master before it forks the workers, unless it runs in the engine
+    preload = app_config.get_nested("server.preload.enabled", False) and \
+        not app_config.get_nested("server.engine.enabled", False)
+
+    plan = plan_server_workers(model_path, logger)
+    logger.info("Starting nginx/gunicorn with {}{}.".format(plan, ", preloading the model" if preload else ""))
+
+    ssl_enabled = app_config.get_nested("server.ssl.enabled", False)
+    if ssl_enabled:
+        cert_path = app_config.get_nested("server.ssl.cert", "/certs/cert.pem")
+        cert_path = osp.abspath(cert_path)
+
+        key_path = app_config.get_nested("server.ssl.key", "/certs/key.pem")
+        key_path = osp.abspath(key_path)
+
+    # Create a temp dir where the app will sit
+    nginx_path = tempfile.mkdtemp()
+
+    env = Environment(loader=PackageLoader("catwalk", "templates"))
+
+    # render the config files
+    kwargs = {
+        "config": app_config_path if app_config_path else "",
+        "model_path": model_path,
+        "port": port,
+        "preload": preload,
+        # A proxied request takes a connection to the client and one to gunicorn
+        "worker_connections": max(NGINX_MIN_CONNECTIONS, 2 * plan.concurrency)
+    }
+    if ssl_enabled:
+        kwargs.update({"ssl_cert_path": cert_path, "ssl_key_path": key_path})
+
+    access_log = osp.join(nginx_path, "access.log")
+    error_log = osp.join(nginx_path, "error.log")
+    kwargs.update({"access_log": access_log, "error_log": error_log})
+
+    nginx_conf = "nginx{}.conf".format("-https" if ssl_enabled else "")
+    render_template(env, nginx_conf, nginx_path, kwargs)
+    render_template(env, "wsgi.py", nginx_path, kwargs)
+    if preload:
+        render_template(env, "gunicorn.conf.py", nginx_path, kwargs)
+
+    # link the log streams to stdout/err so they will be logged to the container logs
+    Path(access_log).touch()
+    Path(error_log).touch()
+    if logger.level <= logging.DEBUG:
+        subprocess.call(["ln", "-sf", "/dev/stdout", access_log])
+    subprocess.call(["ln", "-sf", "/dev/stderr", error_log])
+
+    nginx = subprocess.Popen(["nginx", "-c", osp.join(nginx_path, nginx_conf)])
+
+    gunicorn_args = ["gunicorn"]
+    if ssl_enabled:
+        gunicorn_args += ["--certfile", cert_path, "--keyfile", key_path]
+    if preload:
+        gunicorn_args += ["--preload", "-c", "gunicorn.conf.py"]
+    gunicorn_args += ["--timeout", str(model_server_timeout)]
+    gunicorn_args += plan.gunicorn_args()
+    gunicorn_args += ["-b", "unix:/tmp/gunicorn.sock",
+                      "--capture-output",
+                      "wsgi:app"]
+    # The workers aggregate their metrics through files in a directory that is new for every run
+    metrics_path = osp.join(nginx_path, "metrics")
+    os.makedirs(metrics_path)
+    gunicorn_env = dict(os.environ, CATWALK_METRICS_PATH=metrics_path)
+    engine = start_engine(app_config_path, model_path, gunicorn_env, logger)
+    engine_pid = engine.pid if engine is not None else None
+    gunicorn = subprocess.Popen(gunicorn_args, cwd=nginx_path, env=gunicorn_env)
+
+    signal.signal(signal.SIGTERM, lambda a, b: sigterm_handler(nginx.pid, gunicorn.pid, engine_pid))
+
+    # If any subprocess exits, so do we.
+    pids = set([nginx.pid, gunicorn.pid, engine_pid])
+    while True:
+        pid, _ = os.wait()
+        if pid in pids:
+            break
+
+    sigterm_handler(nginx.pid, gunicorn.pid, engine_pid)
+    logger.info("Server exiting")
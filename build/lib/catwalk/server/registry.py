@@ -0,0 +1,264 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Serves several models from one server.
+
+The server is started with one model, and with server.models.paths it can also serve the other models found in a list
+of model directories, or directories of model directories. Requests are routed to a model by the "name" and "version"
+of their "model" key, so several versions of a model can be served side by side:
+
+    server:
+      models:
+        paths:
+          - /models
+        max_memory: 2Gi
+        max_models: 20
+
+Models are loaded on first use. The memory each model takes is measured as the growth of this process' private memory
+while it loads, and when the loaded models take more than max_memory (or there are more than max_models), the least
+recently used are evicted. Requests that are using an evicted model finish with it, and it is freed when they are done.
+The model the server was started with is never evicted.
+
+Each model is imported as its own module @see catwalk.utils.get_model_module_name, which is removed when the model
+is evicted.
+"""
+import gc
+import logging
+import os
+import os.path as osp
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import yaml
+
+from ..utils import MODEL_MODULE_PREFIX
+from ..validation.columnar import ColumnarSpec
+from ..validation.compiler import compile_request_schema, compile_records_schema, compile_orient_schemas, \
+    compile_schema
+from ..validation.frame import FrameValidator
+from ..validation.model import ModelIOTypes
+from ..validation.tensor import TensorSpec
+from .coalescing import SingleFlight
+from .formats import get_formats
+from .memory import read_memory
+from .offload import run_native
+
+logger = logging.getLogger(__name__)
+
+
+class ServedModel(object):
+    """A model, with the validators and wire formats of its requests.
+
+    :param Model m: The model, with its info, io_type and is_batch attributes.
+    :param str path: The model path.
+    :param codec: The JSON codec @see catwalk.server.codec
+    :param bool validate_output: Whether DataFrame outputs are validated.
+    """
+
+    def __init__(self, m, path, codec, validate_output=True):
+        self.model = m
+        self.path = path
+        self.memory = 0
+        self.load_time = 0.0
+
+        input_schema = m.info["schema"]["input"]
+        output_schema = m.info["schema"]["output"]
+        self.in_schema = compile_request_schema(input_schema, m.io_type)
+        self.records_schema = compile_records_schema(input_schema)
+        self.orient_schemas = compile_orient_schemas(input_schema, m.io_type)
+        self.row_schema = compile_schema(input_schema["items"] if input_schema["type"] == "array" else input_schema)
+
+        self.input_tensor, self.output_tensor = None, None
+        if m.io_type == ModelIOTypes.NUMPY_ARRAY:
+            self.input_tensor = TensorSpec(input_schema)
+            self.output_tensor = TensorSpec(output_schema)
+        self.columnar_input, self.columnar_output = None, None
+        if m.io_type == ModelIOTypes.COLUMNAR:
+            self.columnar_input = ColumnarSpec(input_schema, "input")
+            self.columnar_output = ColumnarSpec(output_schema, "output")
+        self.frame_input, self.frame_output = None, None
+        if m.io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            self.frame_input = FrameValidator(input_schema, "input")
+            if validate_output:
+                self.frame_output = FrameValidator(output_schema, "output")
+
+        self.formats = get_formats(codec, m.io_type)
+        self.info_body = codec.dumps(m.info)
+
+    @property
+    def key(self) -> tuple:
+        """The (name, version) of the model."""
+        return self.model.info["name"], self.model.info["version"]
+
+    def close(self):
+        """Removes the model's module, so it is freed with the model."""
+        module = type(self.model).__module__
+        if module.startswith(MODEL_MODULE_PREFIX):
+            sys.modules.pop(module, None)
+
+
+def find_models(paths) -> dict:
+    """Finds the models in a list of paths.
+
+    :param list paths: Model directories (with a model.yml), or directories of model directories.
+    :return dict: {(name, version): path}
+    """
+    models = {}
+    for path in paths:
+        path = osp.abspath(path)
+        if osp.isfile(osp.join(path, "model.yml")):
+            candidates = [path]
+        else:
+            candidates = [osp.join(path, name) for name in sorted(os.listdir(path))
+                          if osp.isfile(osp.join(path, name, "model.yml"))]
+        for candidate in candidates:
+            with open(osp.join(candidate, "model.yml"), "r") as fp:
+                info = yaml.safe_load(fp)
+            key = (info["name"], info["version"])
+            if key in models:
+                if models[key] != candidate:
+                    logger.warning("Model %s:%s is in both %s and %s, using the first", key[0], key[1], models[key],
+                                   candidate)
+                continue
+            models[key] = candidate
+    return models
+
+
+def _private_memory() -> int:
+    memory = read_memory()
+    return memory["uss"] if memory is not None else 0
+
+
+class ModelRegistry(object):
+    """Loads models on first use, and evicts the least recently used to keep to a memory budget.
+
+    :param dict models: {(name, version): path} @see find_models
+    :param callable load: Loads a model: load(path) returns a ServedModel, or None if it cannot be loaded.
+    :param int max_memory: The memory the loaded models can take in bytes, or None.
+    :param int max_models: The number of models that can be loaded, or None.
+    :param ServerMetrics metrics: Records loads, evictions and the loaded models, if given.
+    """
+
+    def __init__(self, models, load, max_memory=None, max_models=None, metrics=None):
+        self.models = dict(models)
+        self.max_memory = max_memory
+        self.max_models = max_models
+        self.metrics = metrics
+        self._load = load
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = SingleFlight()
+
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def memory(self) -> int:
+        """The memory taken by the loaded models, in bytes."""
+        return sum(served.memory for served in list(self._loaded.values()))
+
+    def get(self, name, version):
+        """Returns a model, loading it on first use.
+
+        :param str name:
+        :param str version:
+        :return ServedModel: The model, or None if there is no such model.
+        """
+        key = (name, version)
+        with self._lock:
+            served = self._loaded.get(key)
+            if served is not None:
+                self._loaded.move_to_end(key)
+                return served
+        if key not in self.models:
+            return None
+        return self._loading.do("{}:{}".format(name, version), lambda: self._load_model(key))
+
+    def _load_model(self, key):
+        path = self.models[key]
+        before = _private_memory()
+        started = time.perf_counter()
+        # Importing and constructing a model can take a while: yield the hub to the worker's other requests
+        served = run_native(self._load, path)
+        if served is None:
+            logger.error("Unable to load model: %s", path)
+            return None
+        served.load_time = time.perf_counter() - started
+        served.memory = max(_private_memory() - before, 0)
+        logger.info("Loaded model %s:%s in %.2fs, memory: %.1f MB", key[0], key[1], served.load_time,
+                    served.memory / 2 ** 20)
+
+        with self._lock:
+            self._loaded[key] = served
+            self.loads += 1
+            evicted = self._evict(key)
+        for old in evicted:
+            old.close()
+        if len(evicted) > 0:
+            gc.collect()
+        self._record(served.load_time, len(evicted))
+        return served
+
+    def _is_full(self) -> bool:
+        return (self.max_memory is not None and self.memory > self.max_memory) or \
+            (self.max_models is not None and len(self._loaded) > self.max_models)
+
+    def _evict(self, keep) -> list:
+        evicted = []
+        while self._is_full():
+            key = next((k for k in self._loaded if k != keep), None)
+            if key is None:
+                break
+            served = self._loaded.pop(key)
+            self.evictions += 1
+            evicted.append(served)
+            logger.info("Evicted model %s:%s, memory: %.1f MB", key[0], key[1], served.memory / 2 ** 20)
+        return evicted
+
+    def _record(self, load_time, evictions):
+        if self.metrics is not None:
+            self.metrics.registry_loads.inc()
+            self.metrics.registry_load_duration.observe(load_time)
+            if evictions > 0:
+                self.metrics.registry_evictions.inc(evictions)
+            self.metrics.registry_models.set(len(self._loaded))
+            self.metrics.registry_memory.set(self.memory)
+
+    def stats(self) -> dict:
+        """Returns the model counts and memory of the registry.
+
+        :return dict:
+        """
+        return {
+            "models": len(self.models),
+            "loaded": len(self._loaded),
+            "memory": self.memory,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    def list(self) -> list:
+        """Returns the models of the registry, and whether they are loaded.
+
+        :return list: [{"name", "version", "loaded"}]
+        """
+        loaded = set(self._loaded)
+        return [{"name": name, "version": version, "loaded": (name, version) in loaded}
+                for name, version in sorted(self.models)]
@@ -0,0 +1,277 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Plans the gunicorn workers from the model's concurrency profile and the CPUs and memory available to the container.
+
+The profile is the "concurrency" section of model.yml, overridden by server.concurrency in the app_config:
+
+    concurrency:
+      bound: cpu            # cpu: predict computes, io: predict mostly waits (e.g. on a remote service)
+      releases_gil: false   # predict runs native code that releases the GIL (e.g. numpy, onnxruntime)
+      thread_safe: false    # predict can be called from several threads (or greenlets) at once
+      memory: 512Mi         # the memory of a worker, with the model loaded
+      workers: 4            # optional, overrides the number of workers
+      threads: 4            # optional, overrides the threads of gthread workers
+      max_connections: 100  # optional, the connections of each gevent or gthread worker
+
+The worker class, and the number of workers, threads and connections are:
+
+- CPU bound, releasing the GIL and thread-safe: gthread workers, whose threads run predict in parallel.
+- CPU bound otherwise: a sync worker per CPU.
+- I/O bound and thread-safe: a gevent worker per CPU, each serving many requests.
+- I/O bound and not thread-safe: sync workers, 2 per CPU + 1, so CPUs are not idle while workers wait.
+
+The number of workers is then capped by the memory limit divided by the memory of a worker. Without a profile, the
+server runs min(cpus, 3) gevent workers, as it always has.
+"""
+import math
+import os
+import os.path as osp
+import re
+
+CPU_BOUND = "cpu"
+IO_BOUND = "io"
+
+SYNC = "sync"
+GTHREAD = "gthread"
+GEVENT = "gevent"
+
+DEFAULT_CONNECTIONS = 1000
+DEFAULT_MAX_THREADS = 4
+LEGACY_MAX_WORKERS = 3
+
+# The share of the memory limit that workers may use, the rest is left for nginx and the gunicorn master
+MEMORY_SHARE = 0.9
+
+CGROUP_PATH = "/sys/fs/cgroup"
+
+_MEMORY_UNITS = {
+    "": 1, "k": 1000, "m": 1000 ** 2, "g": 1000 ** 3, "t": 1000 ** 4,
+    "ki": 1024, "mi": 1024 ** 2, "gi": 1024 ** 3, "ti": 1024 ** 4
+}
+_MEMORY_PATTERN = re.compile(r"^\s*([0-9]+(?:\.[0-9]+)?)\s*([kmgt]i?)?b?\s*$", re.IGNORECASE)
+
+# cgroup v1 memory limits at or above this are "no limit"
+_UNLIMITED = 2 ** 60
+
+
+def parse_memory(value) -> int:
+    """Parses a memory size, e.g. 512Mi, 2G or a number of bytes.
+
+    :param int|str value:
+    :return int: The size in bytes.
+    :raises ValueError: If the size cannot be parsed.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    match = _MEMORY_PATTERN.match(str(value))
+    if match is None:
+        raise ValueError("Invalid memory size: {!r}".format(value))
+    return int(float(match.group(1)) * _MEMORY_UNITS[(match.group(2) or "").lower()])
+
+
+def _read(path):
+    try:
+        with open(path, "r") as fp:
+            return fp.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpus(root=CGROUP_PATH):
+    """Returns the CPU quota of the cgroup, from cpu.max (v2) or cpu.cfs_quota_us (v1).
+
+    :param str root: The cgroup file system.
+    :return float: The number of CPUs, or None if there is no quota.
+    """
+    cpu_max = _read(osp.join(root, "cpu.max"))
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    for name in ("cpu", "cpu,cpuacct"):
+        quota = _read(osp.join(root, name, "cpu.cfs_quota_us"))
+        period = _read(osp.join(root, name, "cpu.cfs_period_us"))
+        if quota is not None and period is not None:
+            return int(quota) / int(period) if int(quota) > 0 else None
+    return None
+
+
+def cgroup_memory(root=CGROUP_PATH):
+    """Returns the memory limit of the cgroup, from memory.max (v2) or memory.limit_in_bytes (v1).
+
+    :param str root: The cgroup file system.
+    :return int: The limit in bytes, or None if there is no limit.
+    """
+    limit = _read(osp.join(root, "memory.max"))
+    if limit is None:
+        limit = _read(osp.join(root, "memory", "memory.limit_in_bytes"))
+    if limit is None or not limit.isdigit() or int(limit) >= _UNLIMITED:
+        return None
+    return int(limit)
+
+
+def available_cpus(root=CGROUP_PATH) -> (int, str):
+    """Returns the number of CPUs the server can use: the CPUs it may run on, limited by the cgroup CPU quota.
+
+    :param str root: The cgroup file system.
+    :return (int, str): The number of CPUs, and where it comes from for logs.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus, source = len(os.sched_getaffinity(0)), "CPU affinity"
+    else:
+        cpus, source = os.cpu_count() or 1, "CPU count"
+
+    quota = cgroup_cpus(root)
+    if quota is not None and quota < cpus:
+        cpus, source = max(1, int(math.ceil(quota))), "cgroup CPU quota {:g}".format(quota)
+    return cpus, source
+
+
+def available_memory(root=CGROUP_PATH) -> (int, str):
+    """Returns the memory the server can use: the cgroup memory limit, or the physical memory.
+
+    :param str root: The cgroup file system.
+    :return (int, str): The memory in bytes (None if unknown), and where it comes from for logs.
+    """
+    limit = cgroup_memory(root)
+    if limit is not None:
+        return limit, "cgroup memory limit"
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"), "physical memory"
+    except (AttributeError, ValueError, OSError):
+        return None, "unknown"
+
+
+def get_profile(model_info, config_profile=None):
+    """Returns the concurrency profile of a model.
+
+    :param dict model_info: The model.yml metadata.
+    :param dict config_profile: server.concurrency from the app_config, which overrides the model's profile.
+    :return dict: The profile, or None if neither declares one.
+    """
+    if "concurrency" not in model_info and not config_profile:
+        return None
+    profile = {"bound": CPU_BOUND, "releases_gil": False, "thread_safe": False}
+    profile.update(model_info.get("concurrency") or {})
+    profile.update(config_profile or {})
+    return profile
+
+
+class WorkerPlan(object):
+    """The gunicorn worker class, and the number of workers, threads and connections, with the reasons for them.
+
+    :param str worker_class: SYNC, GTHREAD or GEVENT.
+    :param int workers:
+    :param int threads: The threads of each gthread worker.
+    :param int connections: The connections of each gevent or gthread worker.
+    :param list reasons: Why they were chosen, for logs.
+    """
+
+    def __init__(self, worker_class, workers, threads=1, connections=None, reasons=None):
+        self.worker_class = worker_class
+        self.workers = workers
+        self.threads = threads
+        self.connections = connections
+        self.reasons = reasons or []
+
+    @property
+    def concurrency(self) -> int:
+        """The number of requests the workers serve at once."""
+        if self.worker_class == GEVENT:
+            return self.workers * self.connections
+        return self.workers * self.threads
+
+    def gunicorn_args(self) -> list:
+        """Returns the gunicorn arguments of the plan.
+
+        :return list:
+        """
+        args = ["-k", self.worker_class, "-w", str(self.workers)]
+        if self.worker_class == GTHREAD:
+            args += ["--threads", str(self.threads)]
+        if self.connections is not None and self.worker_class != SYNC:
+            args += ["--worker-connections", str(self.connections)]
+        return args
+
+    def __str__(self):
+        threads = " with {} threads".format(self.threads) if self.worker_class == GTHREAD else ""
+        return "{} {} workers{}".format(self.workers, self.worker_class, threads)
+
+
+def _choose(profile, cpus, reasons) -> WorkerPlan:
+    """Chooses the worker class and count from what predict is bound by."""
+    if profile["bound"] == IO_BOUND and profile["thread_safe"]:
+        reasons.append("predict is I/O bound and thread-safe: a gevent worker per CPU, each serving many requests")
+        return WorkerPlan(GEVENT, cpus, connections=profile.get("max_connections", DEFAULT_CONNECTIONS))
+    if profile["bound"] == IO_BOUND:
+        reasons.append("predict is I/O bound and not thread-safe: 2 sync workers per CPU + 1, to keep the CPUs busy "
+                       "while workers wait")
+        return WorkerPlan(SYNC, 2 * cpus + 1)
+    if profile["releases_gil"] and profile["thread_safe"]:
+        threads = profile.get("threads", min(cpus, DEFAULT_MAX_THREADS))
+        reasons.append("predict is CPU bound, releases the GIL and is thread-safe: gthread workers with {} threads, "
+                       "one thread per CPU".format(threads))
+        return WorkerPlan(GTHREAD, int(math.ceil(cpus / threads)), threads,
+                          connections=profile.get("max_connections", DEFAULT_CONNECTIONS))
+    reasons.append("predict is CPU bound and {}: a sync worker per CPU".format(
+        "not thread-safe" if profile["releases_gil"] else "holds the GIL"))
+    return WorkerPlan(SYNC, cpus)
+
+
+def plan_workers(profile, cpus, memory=None, environ=None) -> WorkerPlan:
+    """Plans the gunicorn workers.
+
+    :param dict profile: The concurrency profile @see get_profile, or None for the legacy plan.
+    :param int cpus: The CPUs available @see available_cpus.
+    :param int memory: The memory available in bytes @see available_memory, or None if it is unknown.
+    :param dict environ: The environment, whose MODEL_SERVER_WORKERS sets and MAX_MODEL_SERVER_WORKERS caps the
+        number of workers. Defaults to os.environ.
+    :return WorkerPlan:
+    """
+    environ = os.environ if environ is None else environ
+    reasons = ["{} CPUs available".format(cpus)]
+
+    if profile is None:
+        reasons.append("no concurrency profile: gevent workers, one per CPU up to {}".format(LEGACY_MAX_WORKERS))
+        plan = WorkerPlan(GEVENT, int(environ.get("MODEL_SERVER_WORKERS", cpus)), connections=DEFAULT_CONNECTIONS,
+                          reasons=reasons)
+        plan.workers = min(int(environ.get("MAX_MODEL_SERVER_WORKERS", LEGACY_MAX_WORKERS)), plan.workers)
+        return plan
+
+    plan = _choose(profile, cpus, reasons)
+    plan.reasons = reasons
+    if "workers" in profile:
+        plan.workers = profile["workers"]
+        reasons.append("{} workers set by the profile".format(plan.workers))
+    if "MODEL_SERVER_WORKERS" in environ:
+        plan.workers = int(environ["MODEL_SERVER_WORKERS"])
+        reasons.append("{} workers set by MODEL_SERVER_WORKERS".format(plan.workers))
+    if "MAX_MODEL_SERVER_WORKERS" in environ and int(environ["MAX_MODEL_SERVER_WORKERS"]) < plan.workers:
+        plan.workers = int(environ["MAX_MODEL_SERVER_WORKERS"])
+        reasons.append("capped at {} workers by MAX_MODEL_SERVER_WORKERS".format(plan.workers))
+
+    if "memory" in profile and memory is not None:
+        fit = max(1, int(memory * MEMORY_SHARE // parse_memory(profile["memory"])))
+        if fit < plan.workers:
+            plan.workers = fit
+            reasons.append("capped at {} workers of {} by {:.0f} MiB of memory".format(
+                fit, profile["memory"], memory / 1048576))
+    return plan
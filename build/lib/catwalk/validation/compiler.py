@@ -0,0 +1,434 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Compiles model.yml schemas into specialised Python validator functions.
+
+The compiled validators accept and reject exactly the same data as the Schema objects built by
+catwalk.validation.schema, but are generated once as straight-line Python code, so validating large arrays does not
+walk a tree of Schema objects for every element. Errors are raised as SchemaError with a bounded message.
+"""
+from schema import SchemaError
+
+from .model import ModelIOTypes, PayloadOrients
+
+# The maximum length of a value's repr in an error message
+MAX_REPR_LENGTH = 60
+
+# Type checks for the scalar swagger types. Note that bools are not valid integers or numbers.
+# The exact class checks are a fast path for the common case, the isinstance checks allow subclasses.
+_TYPE_CHECKS = {
+    "string": ("isinstance({v}, str)", "str"),
+    "boolean": ("isinstance({v}, bool)", "bool"),
+    "integer": ("({v}.__class__ is int or (isinstance({v}, int) and not isinstance({v}, bool)))", "int"),
+    "number": ("({v}.__class__ is float or {v}.__class__ is int"
+               " or (isinstance({v}, (float, int)) and not isinstance({v}, bool)))", "float"),
+}
+
+_NO_VALUE = object()
+
+
+def _short_repr(value) -> str:
+    r = repr(value)
+    if len(r) > MAX_REPR_LENGTH:
+        r = r[:MAX_REPR_LENGTH - 3] + "..."
+    return r
+
+
+def _fail(path, message, value=_NO_VALUE):
+    """Raises a SchemaError for the value at path. Called from the generated code."""
+    if value is not _NO_VALUE:
+        message = message.replace("{!r}", _short_repr(value))
+    if path:
+        message = "Key '{}' error: {}".format(path, message)
+    raise SchemaError(message)
+
+
+# Internal spec node constructors.
+# Specs are tuples: (kind, ...), where kind is one of "type", "nonempty_str", "dict", "list", "list_or", "object",
+# "one_of" (one of a tuple of values) or "any" (which accepts anything).
+
+def _type_spec(name, nullable=False):
+    return ("type", name, nullable)
+
+
+def _object_spec(properties, nullable=False):
+    """:param list properties: A list of (key, spec, required) tuples."""
+    return ("object", properties, nullable)
+
+
+def from_swagger(data):
+    """Converts a swagger dictionary format schema (as in model.yml) into an internal spec.
+
+    :param dict data: The swagger schema.
+    :return tuple: The spec.
+    """
+    nullable = bool(data.get("nullable", False))
+    if data["type"] in _TYPE_CHECKS:
+        return _type_spec(data["type"], nullable)
+    elif data["type"] == "array":
+        return ("list", from_swagger(data["items"]), nullable)
+    elif data["type"] == "object":
+        properties = [(key, from_swagger(value), True) for key, value in data["properties"].items()]
+        return _object_spec(properties, nullable)
+    elif data["type"] == "tensor":
+        # Tensors are validated in their request and response form, their shape and data are checked when they are
+        # decoded @see catwalk.validation.tensor
+        return _object_spec([
+            ("dtype", ("one_of", (data["dtype"],)), False),
+            ("shape", ("list", _type_spec("integer"), False), False),
+            ("data", ("any",), True)
+        ], nullable)
+    raise ValueError("Unsupported schema type: {}".format(data["type"]))
+
+
+def _io_spec(io_schema, io_type):
+    """Converts a model.yml input or output schema into a spec, wrapping it for PANDAS_DATA_FRAME models, and as
+    columns for COLUMNAR models."""
+    if io_type == ModelIOTypes.COLUMNAR:
+        items = io_schema["items"] if io_schema["type"] == "array" else io_schema
+        return _object_spec([(key, ("list", from_swagger(value), False), True)
+                             for key, value in items["properties"].items()])
+    spec = from_swagger(io_schema)
+    if io_type == ModelIOTypes.PANDAS_DATA_FRAME and io_schema["type"] == "object":
+        spec = ("list_or", spec)
+    return spec
+
+
+def _model_spec():
+    return _object_spec([
+        ("name", ("nonempty_str",), True),
+        ("version", ("nonempty_str",), True)
+    ])
+
+
+def request_spec(input_spec):
+    """Builds the spec of a request, equivalent to the "request_shell" schema.
+
+    :param tuple input_spec: The spec of the "input" key.
+    :return tuple:
+    """
+    return _object_spec([
+        ("correlation_id", ("nonempty_str",), False),
+        ("model", _model_spec(), False),
+        ("extra_data", ("dict",), False),
+        ("orient", ("one_of", PayloadOrients.ALL), False),
+        ("deadline", _type_spec("number"), False),
+        ("input", input_spec, True)
+    ])
+
+
+def response_spec(input_spec, output_spec, include_correlation_id=True):
+    """Builds the spec of a response, equivalent to the "response_shell" schema.
+
+    :param tuple input_spec: The spec of the "input" key.
+    :param tuple output_spec: The spec of the "output" key.
+    :param bool include_correlation_id: Set this to false to remove the correlation_id from the spec.
+    :return tuple:
+    """
+    properties = [
+        ("model", _model_spec(), True),
+        ("extra_data", ("dict",), False),
+        ("orient", ("one_of", PayloadOrients.ALL), False),
+        ("deadline", _type_spec("number"), False),
+        ("input", input_spec, True),
+        ("output", output_spec, True)
+    ]
+    if include_correlation_id:
+        properties.insert(0, ("correlation_id", ("nonempty_str",), True))
+    return _object_spec(properties)
+
+
+class _CodeGenerator(object):
+    """Generates the source of a validator function from a spec."""
+
+    def __init__(self):
+        self.lines = []
+        self.constants = {}
+        self._n = 0
+
+    def new_name(self, prefix):
+        self._n += 1
+        return "{}{}".format(prefix, self._n)
+
+    def constant(self, value):
+        name = self.new_name("_c")
+        self.constants[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    @staticmethod
+    def path_expr(path, indices):
+        """A Python expression that evaluates to the path of the current value."""
+        if len(indices) == 0:
+            return repr(path)
+        return "{}.format({})".format(repr(path), ", ".join(indices))
+
+    def generate(self, spec, v, path, indices, indent):
+        """Emits code that validates the variable v against spec."""
+        kind = spec[0]
+        if kind == "any":
+            return
+        nullable = spec[-1] is True if kind in ("type", "list", "object") else False
+        if nullable:
+            self.emit(indent, "if {} is not None:".format(v))
+            indent += 1
+
+        if kind == "type":
+            check, type_name = _TYPE_CHECKS[spec[1]]
+            self._check(check.format(v=v), "{!r} should be instance of '" + type_name + "'", v, path, indices, indent)
+        elif kind == "nonempty_str":
+            self._check("isinstance({v}, str) and len({v}) > 0".format(v=v), "{!r} should be a non-empty string",
+                        v, path, indices, indent)
+        elif kind == "one_of":
+            self._check("isinstance({v}, str) and {v} in {c}".format(v=v, c=self.constant(frozenset(spec[1]))),
+                        "{!r} should be one of " + ", ".join(repr(x) for x in spec[1]), v, path, indices, indent)
+        elif kind == "dict":
+            self._check("isinstance({}, dict)".format(v), "{!r} should be instance of 'dict'", v, path, indices, indent)
+        elif kind == "list":
+            self._list(spec[1], v, path, indices, indent)
+        elif kind == "list_or":
+            self.emit(indent, "if isinstance({}, list):".format(v))
+            self._list(spec[1], v, path, indices, indent + 1)
+            self.emit(indent, "else:")
+            self.generate(spec[1], v, path, indices, indent + 1)
+        elif kind == "object":
+            self._object(spec[1], v, path, indices, indent)
+
+    def _check(self, condition, message, v, path, indices, indent):
+        self.emit(indent, "if not ({}):".format(condition))
+        self.emit(indent + 1, "_fail({}, {}, {})".format(self.path_expr(path, indices), repr(message), v))
+
+    def _list(self, item_spec, v, path, indices, indent):
+        self._check("isinstance({}, list)".format(v), "{!r} should be instance of 'list'", v, path, indices, indent)
+        if item_spec[0] == "any":
+            return
+        i = self.new_name("i")
+        x = self.new_name("x")
+        self.emit(indent, "for {}, {} in enumerate({}):".format(i, x, v))
+        item_path = path.replace("{", "{{").replace("}", "}}") if len(indices) == 0 else path
+        self.generate(item_spec, x, item_path + "[{}]", indices + [i], indent + 1)
+
+    def _object(self, properties, v, path, indices, indent):
+        self._check("isinstance({}, dict)".format(v), "{!r} should be instance of 'dict'", v, path, indices, indent)
+
+        keys = [key for key, _, _ in properties]
+        required = [key for key, _, is_required in properties if is_required]
+        all_required = len(keys) == len(required)
+
+        # Check for wrong keys. If every key is required, a length check plus the missing key checks are enough.
+        if all_required:
+            self.emit(indent, "if len({}) != {}:".format(v, len(keys)))
+            indent_check = indent + 1
+        else:
+            indent_check = indent
+        k = self.new_name("k")
+        self.emit(indent_check, "for {} in {}:".format(k, v))
+        self.emit(indent_check + 1, "if {} not in {}:".format(k, self.constant(frozenset(keys))))
+        self.emit(indent_check + 2, "_fail({}, 'Wrong key ' + _short_repr({}))".format(
+            self.path_expr(path, indices), k))
+
+        for key, spec, is_required in properties:
+            key_path = key.replace("{", "{{").replace("}", "}}") if len(indices) > 0 else key
+            key_path = key_path if path == "" else path + "." + key_path
+            x = self.new_name("x")
+            if is_required:
+                self.emit(indent, "if {} not in {}:".format(repr(key), v))
+                message = repr("Missing key: " + _short_repr(key))
+                self.emit(indent + 1, "_fail({}, {})".format(self.path_expr(path, indices), message))
+                self.emit(indent, "{} = {}[{}]".format(x, v, repr(key)))
+                self.generate(spec, x, key_path, indices, indent)
+            else:
+                self.emit(indent, "if {} in {}:".format(repr(key), v))
+                self.emit(indent + 1, "{} = {}[{}]".format(x, v, repr(key)))
+                self.generate(spec, x, key_path, indices, indent + 1)
+
+
+class CompiledSchema(object):
+    """A validator compiled from a spec, with the same validate interface as a Schema object.
+
+    :param tuple spec: The spec to compile.
+    :param str path: The path of the validated data in error messages, e.g. "input".
+    """
+
+    def __init__(self, spec, path=""):
+        self.spec = spec
+
+        gen = _CodeGenerator()
+        gen.emit(0, "def validate(data):")
+        gen.generate(spec, "data", path, [], 1)
+        gen.emit(1, "return data")
+        self.source = "\n".join(gen.lines)
+
+        namespace = {"_fail": _fail, "_short_repr": _short_repr}
+        namespace.update(gen.constants)
+        exec(compile(self.source, "<catwalk compiled schema>", "exec"), namespace)
+        self._validate = namespace["validate"]
+
+    def validate(self, data):
+        """Validates data, raising a SchemaError if it does not match.
+
+        :param data: The data to validate.
+        :return: The data.
+        """
+        return self._validate(data)
+
+    def is_valid(self, data) -> bool:
+        """Checks if data matches, without raising.
+
+        :param data: The data to validate.
+        :return bool:
+        """
+        try:
+            self._validate(data)
+        except SchemaError:
+            return False
+        return True
+
+
+def compile_schema(data) -> CompiledSchema:
+    """Compiles a swagger dictionary format schema into a validator, the equivalent of to_schema.
+
+    :param dict data: The swagger schema.
+    :return CompiledSchema:
+    """
+    return CompiledSchema(from_swagger(data))
+
+
+def compile_request_schema(input_schema, io_type=ModelIOTypes.PYTHON_DICT) -> CompiledSchema:
+    """Compiles a request validator, the equivalent of get_request_schema.
+
+    :param dict input_schema: The model's input schema.
+    :param str io_type: The IO type of the model @see ModelIOTypes.
+    :return CompiledSchema: the compiled request validator
+    """
+    return CompiledSchema(request_spec(_io_spec(input_schema, io_type)))
+
+
+def compile_envelope_schema() -> CompiledSchema:
+    """Compiles a request validator that accepts any "input", for requests whose input is validated separately.
+
+    :return CompiledSchema:
+    """
+    return CompiledSchema(request_spec(("any",)))
+
+
+def compile_records_schema(input_schema) -> CompiledSchema:
+    """Compiles a validator for a list of records, i.e. the rows of a batch input.
+
+    :param dict input_schema: The model's input schema, either an object or an array of objects.
+    :return CompiledSchema:
+    """
+    spec = from_swagger(input_schema)
+    if input_schema["type"] != "array":
+        spec = ("list", spec, False)
+    return CompiledSchema(spec)
+
+
+def _columns(input_schema):
+    """Returns the (key, spec) of each column of a PANDAS_DATA_FRAME model's input schema."""
+    spec = from_swagger(input_schema["items"] if input_schema["type"] == "array" else input_schema)
+    if spec[0] != "object":
+        raise ValueError("Column oriented inputs require an object input schema")
+    return [(key, column_spec) for key, column_spec, _ in spec[1]]
+
+
+class ColumnsSchema(object):
+    """Validates a "columns" oriented input ({column: [values]}) a column at a time.
+
+    :param dict input_schema: The model's input schema.
+    :param str path: The path of the input in error messages.
+    """
+
+    def __init__(self, input_schema, path="input"):
+        self.path = path
+        self._schema = CompiledSchema(_object_spec([(key, ("list", spec, False), True)
+                                                    for key, spec in _columns(input_schema)]), path)
+
+    def validate(self, data):
+        self._schema.validate(data)
+        if len(set(len(values) for values in data.values())) > 1:
+            _fail(self.path, "columns should all have the same length")
+        return data
+
+
+class SplitSchema(object):
+    """Validates a "split" oriented input ({"columns": [names], "data": [[values]]}) a column at a time.
+
+    :param dict input_schema: The model's input schema.
+    :param str path: The path of the input in error messages.
+    """
+
+    def __init__(self, input_schema, path="input"):
+        self.path = path
+        columns = _columns(input_schema)
+        self._names = frozenset(key for key, _ in columns)
+        self._shell = CompiledSchema(_object_spec([
+            ("columns", ("list", ("nonempty_str",), False), True),
+            ("data", ("list", ("list", ("any",), False), False), True),
+            ("index", ("any",), False)
+        ]), path)
+        # The column validators report errors as "input.<column>[<row>]"
+        self._columns = {key: CompiledSchema(("list", spec, False), path + "." + key) for key, spec in columns}
+
+    def validate(self, data):
+        self._shell.validate(data)
+
+        columns = data["columns"]
+        if len(columns) != len(self._names) or set(columns) != self._names:
+            _fail(self.path + ".columns", "{!r} should be the columns " + ", ".join(sorted(self._names)), columns)
+
+        n = len(columns)
+        for i, row in enumerate(data["data"]):
+            if len(row) != n:
+                _fail("{}.data[{}]".format(self.path, i), "rows should have one value per column")
+
+        for j, key in enumerate(columns):
+            self._columns[key].validate([row[j] for row in data["data"]])
+        return data
+
+
+def compile_orient_schemas(input_schema, io_type=ModelIOTypes.PYTHON_DICT) -> dict:
+    """Compiles the validators of the column oriented inputs a model accepts (only PANDAS_DATA_FRAME models do).
+
+    :param dict input_schema: The model's input schema.
+    :param str io_type: The IO type of the model @see ModelIOTypes.
+    :return dict: The validators by orient @see PayloadOrients.
+    """
+    if io_type != ModelIOTypes.PANDAS_DATA_FRAME:
+        return {}
+    return {
+        PayloadOrients.COLUMNS: ColumnsSchema(input_schema),
+        PayloadOrients.SPLIT: SplitSchema(input_schema)
+    }
+
+
+def compile_response_schema(input_schema, output_schema, io_type=ModelIOTypes.PYTHON_DICT,
+                            include_correlation_id=True) -> CompiledSchema:
+    """Compiles a response validator, the equivalent of get_response_schema.
+
+    :param dict input_schema: The model's input schema.
+    :param dict output_schema: The model's output schema.
+    :param str io_type: The IO type of the model @see ModelIOTypes.
+    :param bool include_correlation_id: Some responses do not require the correlation_id.
+                                            Set this to false to remove it from the validator.
+    :return CompiledSchema: the compiled response validator
+    """
+    return CompiledSchema(response_spec(_io_spec(input_schema, io_type), _io_spec(output_schema, io_type),
+                                        include_correlation_id))
@@ -0,0 +1,163 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Validates pandas DataFrames against model.yml schemas a column at a time, without converting them to records.
+
+Columns are checked by their dtype where it determines the type of their values (e.g. int64 columns are integers),
+nulls are found with a vectorised isna, honouring "nullable", and object columns are checked by the set of types of
+their values. Only array and object properties, whose values are nested, are validated value by value.
+Errors have the same form as the compiled validators' column errors, e.g. "Key 'input.mu[3]' error".
+
+pandas is not imported, the columns' own methods are used.
+"""
+from numbers import Integral, Real
+
+from schema import SchemaError
+
+from .compiler import CompiledSchema, from_swagger, _short_repr
+
+# The dtype kinds that hold values of each type
+_DTYPE_KINDS = {
+    "integer": "iu",
+    "number": "iuf",
+    "boolean": "b",
+    "string": "U"
+}
+
+
+def _is_type(t, type_name) -> bool:
+    """Checks if values of the Python (or NumPy) type t are of the schema type type_name."""
+    if type_name == "string":
+        return issubclass(t, str)
+    if type_name == "boolean":
+        return issubclass(t, bool) or t.__name__ in ("bool_", "bool")
+    if issubclass(t, bool):
+        return False
+    if type_name == "integer":
+        return issubclass(t, Integral)
+    return issubclass(t, Real)
+
+
+def _fail(path, row, message):
+    raise SchemaError("Key '{}[{}]' error: {}".format(path, row, message) if row is not None else
+                      "Key '{}' error: {}".format(path, message))
+
+
+def _first(mask) -> int:
+    """Returns the position of the first True value of a boolean column."""
+    return int(mask.to_numpy().argmax())
+
+
+class _Column(object):
+    """A column of a FrameValidator."""
+
+    __slots__ = ["name", "path", "type_name", "nullable", "nested"]
+
+    def __init__(self, name, schema, path):
+        self.name = name
+        self.path = path + "." + name
+        self.type_name = schema["type"]
+        self.nullable = bool(schema.get("nullable", False))
+        # Array and object values are validated one by one
+        self.nested = CompiledSchema(("list", from_swagger(schema), False), self.path) \
+            if self.type_name not in _DTYPE_KINDS else None
+
+    def validate(self, column):
+        mask = column.isna()
+        has_nulls = bool(mask.any())
+        if has_nulls and not self.nullable:
+            _fail(self.path, _first(mask), "None should be instance of '{}'".format(self.type_name))
+
+        if self.nested is not None:
+            # Arrow list columns hold arrays, which are validated as lists
+            values = [value.tolist() if hasattr(value, "tolist") else value for value in column.tolist()]
+            if has_nulls:
+                values = [None if is_null else value for value, is_null in zip(values, mask.tolist())]
+            self.nested.validate(values)
+            return
+
+        kind = column.dtype.kind
+        if kind in _DTYPE_KINDS[self.type_name]:
+            return
+
+        if kind == "f" and self.type_name == "integer":
+            # Integer columns with nulls are stored as floats by pandas
+            fractional = (column % 1 != 0) & ~mask
+            if fractional.any():
+                row = _first(fractional)
+                _fail(self.path, row, "{} should be instance of 'int'".format(_short_repr(column.iloc[row].item())))
+        elif kind == "O":
+            self._validate_objects(column.to_numpy(), mask.to_numpy() if has_nulls else None)
+        else:
+            _fail(self.path, None, "a column of dtype {} should be instance of '{}'".format(
+                column.dtype, self.type_name))
+
+    def _validate_objects(self, values, nulls):
+        """Validates the values of an object column by the set of their types."""
+        types = set(map(type, values if nulls is None else values[~nulls]))
+        if all(_is_type(t, self.type_name) for t in types):
+            return
+        for row, value in enumerate(values):
+            if (nulls is None or not nulls[row]) and not _is_type(type(value), self.type_name):
+                _fail(self.path, row, "{} should be instance of '{}'".format(_short_repr(value), self.type_name))
+
+
+class FrameValidator(object):
+    """Validates DataFrames against the input or output schema of a PANDAS_DATA_FRAME model.
+
+    :param dict schema: The schema, an object or an array of objects, each row being an object.
+    :param str path: The path of the frame in error messages, e.g. "input".
+    """
+
+    def __init__(self, schema, path="input"):
+        if schema["type"] == "array":
+            schema = schema["items"]
+        if schema["type"] != "object":
+            raise ValueError("DataFrames can only be validated against object schemas")
+        self.path = path
+        self.columns = [_Column(name, column, path) for name, column in schema["properties"].items()]
+        self.names = frozenset(column.name for column in self.columns)
+
+    def validate(self, frame):
+        """Validates a DataFrame, raising a SchemaError if it does not match.
+
+        :param DataFrame frame:
+        :return DataFrame: The frame.
+        """
+        names = set(frame.columns)
+        if names != self.names or len(frame.columns) != len(self.names):
+            wrong = sorted(str(name) for name in names - self.names)
+            missing = sorted(self.names - names)
+            _fail(self.path, None, "Wrong key {!r}".format(wrong[0]) if wrong else
+                  "Missing key: {!r}".format(missing[0]) if missing else "Duplicate columns")
+
+        for column in self.columns:
+            column.validate(frame[column.name])
+        return frame
+
+    def is_valid(self, frame) -> bool:
+        """Checks if a DataFrame matches, without raising.
+
+        :param DataFrame frame:
+        :return bool:
+        """
+        try:
+            self.validate(frame)
+        except SchemaError:
+            return False
+        return True
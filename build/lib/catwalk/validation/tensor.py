@@ -0,0 +1,180 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Tensors, the input and output of NUMPY_ARRAY models.
+
+A tensor is declared in model.yml by its dtype and shape, where null dimensions can have any size, e.g.
+
+    input:
+      type: "tensor"
+      dtype: "float32"
+      shape: [null, 4]
+
+In requests and responses a tensor is {"dtype": str, "shape": [int], "data": ...}, where data holds the raw buffer
+of the tensor in little-endian byte order and C order: base64 encoded in JSON, or as bytes in MessagePack.
+The "dtype" is optional in requests, and so is the "shape" if at most one dimension is variable.
+"""
+import base64
+import binascii
+from functools import reduce
+import operator
+
+from schema import SchemaError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+TENSOR_DTYPES = ("bool", "int8", "int16", "int32", "int64", "uint8", "uint16", "uint32", "uint64",
+                 "float16", "float32", "float64")
+
+
+def _size(shape) -> int:
+    return reduce(operator.mul, shape, 1)
+
+
+def format_shape(shape) -> str:
+    """Formats a shape for error messages and headers, e.g. "2,4" or "?,4" for variable dimensions.
+
+    :param tuple shape:
+    :return str:
+    """
+    return ",".join("?" if n is None else str(n) for n in shape)
+
+
+def parse_shape(value) -> list:
+    """Parses a shape formatted as comma separated dimensions, e.g. "2,4".
+
+    :param str value:
+    :return list:
+    :raises ValueError: If the value is not a list of non-negative integers.
+    """
+    value = value.strip()
+    shape = [int(n) for n in value.split(",")] if len(value) > 0 else []
+    if any(n < 0 for n in shape):
+        raise ValueError("Invalid shape: {}".format(value))
+    return shape
+
+
+class TensorSpec(object):
+    """The dtype and shape of a tensor, as declared in model.yml.
+    Decodes tensors from, and encodes them to, their request and response form.
+
+    :param dict schema: The tensor schema, with "dtype" and "shape" keys.
+    """
+
+    def __init__(self, schema):
+        if np is None:
+            raise ImportError("NUMPY_ARRAY models require numpy")
+        self.dtype_name = schema["dtype"]
+        self.dtype = np.dtype(self.dtype_name).newbyteorder("<")
+        self.shape = tuple(schema["shape"])
+
+    def check_shape(self, shape, path="input.shape"):
+        """Checks that a shape matches the declared shape.
+
+        :param tuple|list shape:
+        :param str path: The path of the shape in error messages.
+        :raises SchemaError: If the shape does not match.
+        """
+        if len(shape) != len(self.shape) or any(n is not None and n != m for n, m in zip(self.shape, shape)):
+            raise SchemaError("Key '{}' error: {} should match the shape {}".format(
+                path, format_shape(shape), format_shape(self.shape)))
+
+    def infer_shape(self, nbytes, path="input.shape") -> list:
+        """Infers the shape of a buffer, which is only possible if at most one dimension is variable.
+
+        :param int nbytes: The size of the buffer.
+        :param str path: The path of the shape in error messages.
+        :return list:
+        :raises SchemaError: If the shape cannot be inferred.
+        """
+        variable = [i for i, n in enumerate(self.shape) if n is None]
+        if len(variable) > 1:
+            raise SchemaError("Missing key: 'shape', required for the shape {}".format(format_shape(self.shape)))
+
+        shape = list(self.shape)
+        row_size = _size(n for n in shape if n is not None) * self.dtype.itemsize
+        if len(variable) == 1 and row_size > 0:
+            shape[variable[0]] = nbytes // row_size
+        if _size(shape) * self.dtype.itemsize != nbytes:
+            raise SchemaError("Key '{}' error: {} bytes do not fit the shape {}".format(
+                path, nbytes, format_shape(self.shape)))
+        return shape
+
+    def decode(self, payload, path="input"):
+        """Decodes a tensor from its request form, after the request schema has been validated.
+        The array is a read-only view of the decoded buffer, it is not copied.
+
+        :param dict payload: The tensor, with "data" and optionally "dtype" and "shape" keys.
+        :param str path: The path of the tensor in error messages.
+        :return numpy.ndarray:
+        :raises SchemaError: If the tensor does not match this spec.
+        """
+        if payload.get("dtype", self.dtype_name) != self.dtype_name:
+            raise SchemaError("Key '{}.dtype' error: {!r} should be {!r}".format(
+                path, payload["dtype"], self.dtype_name))
+
+        data = payload["data"]
+        if isinstance(data, str):
+            try:
+                data = base64.b64decode(data, validate=True)
+            except binascii.Error:
+                raise SchemaError("Key '{}.data' error: invalid base64".format(path))
+        elif not isinstance(data, (bytes, bytearray, memoryview)):
+            raise SchemaError("Key '{}.data' error: should be a base64 string or bytes".format(path))
+
+        if payload.get("shape") is None:
+            shape = self.infer_shape(len(data), path + ".shape")
+        else:
+            shape = payload["shape"]
+            self.check_shape(shape, path + ".shape")
+            if _size(shape) * self.dtype.itemsize != len(data):
+                raise SchemaError("Key '{}.data' error: {} bytes do not fit the shape {}".format(
+                    path, len(data), format_shape(shape)))
+
+        return np.frombuffer(data, self.dtype).reshape(shape)
+
+    def conform(self, array, path="output.shape"):
+        """Converts an array (e.g. a model output) to this spec's dtype, little-endian and in C order, without
+        copying it if it already is.
+
+        :param array: An array, or anything numpy.asarray accepts.
+        :param str path: The path of the shape in error messages.
+        :return numpy.ndarray:
+        :raises SchemaError: If the shape does not match.
+        """
+        array = np.ascontiguousarray(array, dtype=self.dtype)
+        self.check_shape(array.shape, path)
+        return array
+
+    def encode(self, array, binary=False) -> dict:
+        """Encodes a tensor to its response form.
+
+        :param array: The tensor.
+        :param bool binary: If True the data is bytes, e.g. for MessagePack, otherwise it is base64 encoded.
+        :return dict:
+        """
+        array = self.conform(array)
+        data = array.reshape(-1).view(np.uint8).data
+        return {
+            "dtype": self.dtype_name,
+            "shape": list(array.shape),
+            "data": bytes(data) if binary else base64.b64encode(data).decode("ascii")
+        }
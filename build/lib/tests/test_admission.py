@@ -0,0 +1,310 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test admission control: request deadlines, the adaptive concurrency limit and the input budget"""
+import math
+import os
+import os.path as osp
+import tempfile
+import threading
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.admission import parse_deadline, deadline_scope, current_deadline, tighten_deadline, \
+    check_deadline, expiring, ConcurrencyLimit, InputBudget, DeadlineExceeded, Overloaded, InputTooLarge, \
+    DEADLINE_HEADER, TIMEOUT_HEADER
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+class TestDeadlines(unittest.TestCase):
+
+    def test_parse(self):
+        print("Testing request deadlines are read from headers")
+
+        self.assertIsNone(parse_deadline({}, now=100.0))
+        self.assertEqual(parse_deadline({DEADLINE_HEADER: "150.5"}, now=100.0), 150.5)
+        self.assertEqual(parse_deadline({TIMEOUT_HEADER: "2"}, now=100.0), 102.0)
+        self.assertEqual(parse_deadline({DEADLINE_HEADER: "150", TIMEOUT_HEADER: "2"}, now=100.0), 102.0)
+        self.assertEqual(parse_deadline({}, timeout=30, now=100.0), 130.0)
+        self.assertEqual(parse_deadline({TIMEOUT_HEADER: "60"}, timeout=30, now=100.0), 130.0)
+        self.assertRaises(ValueError, parse_deadline, {DEADLINE_HEADER: "soon"})
+
+    def test_check(self):
+        print("Testing expired deadlines are detected")
+
+        self.assertIsNone(current_deadline())
+        check_deadline()
+        with deadline_scope(time.time() + 60):
+            check_deadline()
+            predict = expiring(lambda X: X)
+            tighten_deadline(None)
+            check_deadline()
+            tighten_deadline(time.time() - 1)
+            self.assertRaises(DeadlineExceeded, check_deadline)
+        self.assertIsNone(current_deadline())
+
+        # The deadline is checked when the wrapped function is called, e.g. in another thread
+        self.assertEqual(predict(1), 1)
+        with deadline_scope(time.time() - 1):
+            predict = expiring(lambda X: X)
+        self.assertRaises(DeadlineExceeded, predict, 1)
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+
+    def test_acquire(self):
+        print("Testing requests over the concurrency limit are refused")
+
+        limit = ConcurrencyLimit(initial=2, max_limit=2)
+        self.assertTrue(limit.acquire())
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire())
+        limit.release(0.01)
+        self.assertTrue(limit.acquire())
+        self.assertEqual(limit.in_flight, 2)
+
+    def test_aimd(self):
+        print("Testing the concurrency limit adapts to latency")
+
+        limit = ConcurrencyLimit(initial=4, min_limit=2, max_limit=8, target=0.1, backoff=0.5)
+        for _ in range(100):
+            while limit.acquire():
+                pass
+            limit.release(0.01)
+        self.assertEqual(limit.limit, 8)
+
+        limit.acquire()
+        limit.release(0.2)
+        self.assertEqual(limit.limit, 4)
+        # The limit is cut once per latency
+        limit.acquire()
+        limit.release(0.2)
+        self.assertEqual(limit.limit, 4)
+
+        time.sleep(0.01)
+        limit.acquire()
+        limit.release(0.001, dropped=True)
+        self.assertEqual(limit.limit, 2)
+
+        # A limit that is not used does not grow
+        limit = ConcurrencyLimit(initial=8, max_limit=16, target=0.1)
+        for _ in range(100):
+            limit.acquire()
+            limit.release(0.01)
+        self.assertEqual(limit.limit, 8)
+
+    def test_target(self):
+        print("Testing the target latency follows a low percentile of the recent latencies")
+
+        limit = ConcurrencyLimit(tolerance=2.0, window=10)
+        for latency in [0.05, 0.01, 0.03]:
+            limit.acquire()
+            limit.release(latency)
+        self.assertEqual(limit.target_latency, 0.02)
+
+        # Latencies are forgotten after a window
+        for _ in range(10):
+            limit.acquire()
+            limit.release(0.03)
+        self.assertEqual(limit.target_latency, 0.06)
+
+    def test_mixed(self):
+        print("Testing a few fast requests do not pull the target latency down")
+
+        limit = ConcurrencyLimit(initial=8, max_limit=16, tolerance=2.0)
+        for i in range(1600):
+            if limit.in_flight == 0:
+                while limit.in_flight < 8 and limit.acquire():
+                    pass
+            # 5% of the requests are answered in well under a millisecond
+            limit.release(0.0005 if i % 20 == 0 else 0.02)
+        while limit.in_flight > 0:
+            limit.release(0.02)
+        self.assertEqual(limit.target_latency, 0.04)
+        self.assertGreater(limit.limit, 8)
+
+        # Requests that did not predict leave the target and the limit as they are
+        limit_before = limit.limit
+        for _ in range(200):
+            limit.acquire()
+            limit.release(0.0001, observed=False)
+        self.assertEqual(limit.target_latency, 0.04)
+        self.assertEqual(limit.limit, limit_before)
+        self.assertEqual(limit.in_flight, 0)
+
+
+class TestInputBudget(unittest.TestCase):
+
+    def test_reserve(self):
+        print("Testing the input budget")
+
+        budget = InputBudget(100)
+        self.assertRaises(InputTooLarge, budget.reserve, 101)
+        budget.reserve(60)
+        self.assertRaises(Overloaded, budget.reserve, 50)
+        budget.release(60)
+        budget.reserve(50)
+        self.assertEqual(budget.reserved, 50)
+
+
+class TestServerAdmission(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  admission:\n    retry_after: 3\n    max_input_bytes: 64Ki\n"
+                     "    concurrency:\n      enabled: true\n      initial: 1\n      max: 1\n"
+                     "  predict_pool:\n    enabled: true\n")
+        self.model_path = osp.join(EXAMPLES_PATH, "rng")
+        app_server.init(self.config_path, self.model_path)
+        self.client = app_server.app.test_client()
+        X, _ = app_server.model.load_test_data()
+        self.X = X[0]
+
+    def tearDown(self):
+        app_server.init(None, self.model_path)
+        app_config.clear()
+        os.remove(self.config_path)
+
+    def _rejected(self, reason):
+        lines = self.client.get("/metrics").data.decode("utf-8").splitlines()
+        prefix = 'catwalk_admission_rejected_total{model="RNGModel",version="0.0.1",reason="%s"} ' % reason
+        return [float(line.split(" ")[-1]) for line in lines if line.startswith(prefix)][0]
+
+    def _block(self):
+        """Blocks predict until the returned event is set."""
+        release = threading.Event()
+        entered = threading.Event()
+        predict = app_server.model.predict
+
+        def blocked(X):
+            entered.set()
+            release.wait(10)
+            return predict(X)
+        app_server.model.predict = blocked
+        return predict, entered, release
+
+    def test_deadline(self):
+        print("Testing requests past their deadline are not predicted")
+
+        calls = []
+        predict = app_server.model.predict
+        app_server.model.predict = lambda X: calls.append(X) or predict(X)
+        try:
+            rv = self.client.post("/predict", json={"input": self.X}, headers={TIMEOUT_HEADER: "10"})
+            self.assertEqual(rv.status_code, 200)
+            self.assertNotIn("deadline", rv.get_json())
+
+            rv = self.client.post("/predict", json={"input": self.X, "deadline": time.time() + 10})
+            self.assertEqual(rv.status_code, 200)
+            self.assertIn("deadline", rv.get_json())
+            self.assertEqual(len(calls), 2)
+
+            rv = self.client.post("/predict", json={"input": self.X}, headers={DEADLINE_HEADER: str(time.time() - 1)})
+            self.assertEqual(rv.status_code, 504)
+            rv = self.client.post("/predict", json={"input": self.X, "deadline": time.time() - 1})
+            self.assertEqual(rv.status_code, 504)
+            self.assertEqual(len(calls), 2)
+
+            rv = self.client.post("/predict", json={"input": self.X}, headers={TIMEOUT_HEADER: "soon"})
+            self.assertEqual(rv.status_code, 400)
+            rv = self.client.post("/predict", json={"input": self.X, "deadline": "soon"})
+            self.assertEqual(rv.status_code, 400)
+        finally:
+            app_server.model.predict = predict
+
+        self.assertEqual(self._rejected("deadline"), 2)
+
+    def test_deadline_in_queue(self):
+        print("Testing requests whose deadline passes in the predict queue are not predicted")
+
+        app_server.admission.limit = None
+        predict, entered, release = self._block()
+        try:
+            codes = []
+            blocked = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": self.X}).status_code))
+            blocked.start()
+            entered.wait(10)
+
+            waiting = threading.Thread(target=lambda: codes.append(app_server.app.test_client().post(
+                "/predict", json={"input": self.X}, headers={TIMEOUT_HEADER: "0.2"}).status_code))
+            waiting.start()
+            time.sleep(0.4)
+            entered.clear()
+            release.set()
+            waiting.join()
+            blocked.join()
+        finally:
+            app_server.model.predict = predict
+
+        self.assertEqual(sorted(codes), [200, 504])
+        self.assertFalse(entered.is_set())
+
+    def test_observed(self):
+        print("Testing only the latency of requests that predict adapts the concurrency limit")
+
+        rv = self.client.post("/predict", json={"input": self.X, "model": {"name": "Unknown", "version": "0.0.1"}})
+        self.assertEqual(rv.status_code, 404)
+        self.assertEqual(self.client.post("/predict", json={"input": {}}).status_code, 400)
+        self.assertEqual(app_server.admission.limit.target_latency, math.inf)
+
+        self.assertEqual(self.client.post("/predict", json={"input": self.X}).status_code, 200)
+        self.assertLess(app_server.admission.limit.target_latency, math.inf)
+
+    def test_concurrency_limit(self):
+        print("Testing requests over the concurrency limit are rejected with 503")
+
+        self.assertEqual(self.client.post("/predict", json={"input": self.X}).status_code, 200)
+        predict, entered, release = self._block()
+        try:
+            codes = []
+            blocked = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": self.X}).status_code))
+            blocked.start()
+            entered.wait(10)
+
+            rv = self.client.post("/predict", json={"input": self.X})
+            self.assertEqual(rv.status_code, 503)
+            self.assertEqual(rv.headers["Retry-After"], "3")
+            self.assertEqual(self.client.get("/status").status_code, 200)
+
+            release.set()
+            blocked.join()
+            self.assertEqual(codes, [200])
+        finally:
+            app_server.model.predict = predict
+
+        self.assertEqual(self.client.post("/predict", json={"input": self.X}).status_code, 200)
+        self.assertEqual(self._rejected("concurrency"), 1)
+        self.assertEqual(app_server.admission.limit.in_flight, 0)
+
+    def test_input_budget(self):
+        print("Testing requests larger than the input budget are rejected with 413")
+
+        rv = self.client.post("/predict", json={"input": self.X, "extra_data": {"padding": "x" * 20000}})
+        self.assertEqual(rv.status_code, 413)
+        self.assertEqual(self._rejected("size"), 1)
+        self.assertEqual(app_server.admission.budget.reserved, 0)
+        self.assertEqual(self.client.post("/predict", json={"input": self.X}).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the micro-batching scheduler"""
+import threading
+import unittest
+
+from catwalk.server.batching import BatchScheduler
+
+
+class TestBatchScheduler(unittest.TestCase):
+
+    def _submit_concurrently(self, scheduler, inputs):
+        results = [None] * len(inputs)
+        errors = [None] * len(inputs)
+
+        def worker(i):
+            try:
+                results[i] = scheduler.submit(inputs[i])
+            except Exception as err:
+                errors[i] = err
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(inputs))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_batching(self):
+        print("Testing concurrent requests are batched")
+
+        batch_sizes = []
+
+        def predict(X):
+            batch_sizes.append(len(X))
+            return [{"y": x["x"] * 2} for x in X]
+
+        scheduler = BatchScheduler(predict, max_batch_size=8, max_wait=0.2)
+        inputs = [[{"x": i}, {"x": -i}] for i in range(12)]
+        results, errors = self._submit_concurrently(scheduler, inputs)
+
+        for i, r in enumerate(results):
+            self.assertIsNone(errors[i])
+            self.assertEqual(r, [{"y": 2 * i}, {"y": -2 * i}], "Caller received the wrong slice")
+
+        self.assertEqual(sum(batch_sizes), 24)
+        self.assertLessEqual(max(batch_sizes), 8)
+        self.assertLess(len(batch_sizes), 12, "No requests were batched together")
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["requests"], 12)
+        self.assertEqual(stats["rows"], 24)
+        self.assertEqual(stats["batches"], len(batch_sizes))
+
+    def test_errors(self):
+        print("Testing batch errors are raised in every caller")
+
+        def predict(X):
+            raise RuntimeError("predict failed")
+
+        scheduler = BatchScheduler(predict, max_batch_size=4, max_wait=0.05)
+        results, errors = self._submit_concurrently(scheduler, [[{"x": i}] for i in range(4)])
+        for err in errors:
+            self.assertIsInstance(err, RuntimeError)
+
+    def test_wrong_length(self):
+        print("Testing a predict result of the wrong length is an error")
+
+        scheduler = BatchScheduler(lambda X: X[:-1], max_batch_size=4, max_wait=0.0)
+        with self.assertRaises(ValueError):
+            scheduler.submit([{"x": 1}, {"x": 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
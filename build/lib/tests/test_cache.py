@@ -0,0 +1,102 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the prediction result cache"""
+import os
+import os.path as osp
+import tempfile
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.cache import ResultCache
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_lru(self):
+        print("Testing LRU eviction")
+
+        cache = ResultCache(max_size=2, ttl=None)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), (True, 1))
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("b"), (False, None), "Least recently used entry was not evicted")
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("c"), (True, 3))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_ttl(self):
+        print("Testing TTL expiry")
+
+        cache = ResultCache(max_size=10, ttl=0.01)
+        cache.put("a", 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+
+class TestServerCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  cache:\n    enabled: true\n")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "batch"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        os.remove(self.config_path)
+        app_config.clear()
+
+    def test_row_cache(self):
+        print("Testing batch requests are cached per row")
+
+        X, y = app_server.model.load_test_data()
+
+        predicted = []
+        predict = app_server.model.predict
+        app_server.model.predict = lambda rows: predicted.append(len(rows)) or predict(rows)
+
+        response = self.client.post("/predict", json={"input": X[:1]})
+        self.assertEqual(response.get_json()["output"], y[:1])
+
+        response = self.client.post("/predict", json={"input": X})
+        self.assertEqual(response.get_json()["output"], y)
+
+        response = self.client.post("/predict", json={"input": X})
+        self.assertEqual(response.get_json()["output"], y)
+
+        self.assertEqual(predicted, [1, 1], "Only rows that missed the cache should be predicted")
+
+        stats = self.client.get("/stats").get_json()["cache"]
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test single-flight coalescing"""
+import os
+import os.path as osp
+import tempfile
+import threading
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.admission import TIMEOUT_HEADER
+from catwalk.server.coalescing import SingleFlight
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_concurrently(self, n, target):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def test_coalescing(self):
+        print("Testing identical calls are coalesced")
+
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = {}
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return {"score": 1.0}
+
+        def caller(i):
+            if i > 0:
+                started.wait()
+            results[i] = flight.do("key", fn)
+
+        def release_when_coalesced():
+            while flight.coalesced < 4:
+                time.sleep(0.001)
+            release.set()
+
+        releaser = threading.Thread(target=release_when_coalesced)
+        releaser.start()
+        self._run_concurrently(5, caller)
+        releaser.join()
+
+        self.assertEqual(len(calls), 1, "fn should only be called once")
+        self.assertEqual(len(results), 5)
+        for r in results.values():
+            self.assertEqual(r, {"score": 1.0})
+        self.assertEqual(flight.stats(), {"calls": 1, "coalesced": 4, "in_flight": 0})
+
+        # Once the call completes, a new call runs fn again
+        release.set()
+        flight.do("key", fn)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors(self):
+        print("Testing errors are raised in coalesced callers")
+
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            release.wait()
+            raise RuntimeError("predict failed")
+
+        def caller(i):
+            try:
+                flight.do("key", fn)
+            except RuntimeError as err:
+                errors.append(err)
+
+        def release_when_coalesced():
+            while flight.coalesced < 2:
+                time.sleep(0.001)
+            release.set()
+
+        releaser = threading.Thread(target=release_when_coalesced)
+        releaser.start()
+        self._run_concurrently(3, caller)
+        releaser.join()
+
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def _lead(self, flight, fn):
+        """Starts a call of fn in another thread, and waits until it is in flight."""
+        def call():
+            try:
+                flight.do("key", fn)
+            except Exception:
+                pass
+        leader = threading.Thread(target=call)
+        leader.start()
+        while flight.in_flight() < 1:
+            time.sleep(0.001)
+        return leader
+
+    def test_timeout(self):
+        print("Testing coalesced callers wait no longer than their timeout")
+
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait()
+            raise RuntimeError("done")
+
+        leader = self._lead(flight, fn)
+        with self.assertRaises(TimeoutError):
+            flight.do("key", fn, timeout=0.01)
+        release.set()
+        leader.join()
+        self.assertEqual(flight.coalesced, 1)
+
+    def test_private(self):
+        print("Testing private errors are not shared with coalesced callers")
+
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(10)
+                raise TimeoutError("The leader's deadline passed")
+            return "result"
+
+        def release_when_coalesced():
+            while flight.coalesced < 1:
+                time.sleep(0.001)
+            release.set()
+
+        leader = self._lead(flight, fn)
+        releaser = threading.Thread(target=release_when_coalesced)
+        releaser.start()
+        self.assertEqual(flight.do("key", fn, private=(TimeoutError,)), "result")
+        releaser.join()
+        leader.join()
+        self.assertEqual(len(calls), 2)
+
+
+class TestServerCoalescing(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  coalescing:\n    enabled: true\n")
+        self.model_path = osp.join(EXAMPLES_PATH, "batch")
+
+    def tearDown(self):
+        app_server.init(None, self.model_path)
+        app_config.clear()
+        os.remove(self.config_path)
+
+    def test_deterministic(self):
+        print("Testing only deterministic models are coalesced")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "neuron"))
+        self.assertIsNone(app_server.coalescer)
+        app_server.init(self.config_path, self.model_path)
+        self.assertIsNotNone(app_server.coalescer)
+
+    def test_deadline(self):
+        print("Testing coalesced requests wait no longer than their own deadline")
+
+        app_server.init(self.config_path, self.model_path)
+        X, _ = app_server.model.load_test_data()
+        release = threading.Event()
+        predict = app_server.model.predict
+        app_server.model.predict = lambda rows: release.wait(10) and predict(rows)
+        try:
+            codes = []
+            leader = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": X}).status_code))
+            leader.start()
+            while app_server.coalescer.in_flight() < 1:
+                time.sleep(0.001)
+
+            rv = app_server.app.test_client().post("/predict", json={"input": X}, headers={TIMEOUT_HEADER: "0.05"})
+            self.assertEqual(rv.status_code, 504)
+            release.set()
+            leader.join()
+            self.assertEqual(codes, [200])
+        finally:
+            app_server.model.predict = predict
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test COLUMNAR models and their columns"""
+from array import array
+import json
+import os.path as osp
+import unittest
+
+from schema import SchemaError
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.validation.columnar import ColumnarSpec
+from catwalk.validation.schema import get_request_schema
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "a": {"type": "integer", "format": "int32"},
+            "b": {"type": "number"},
+            "c": {"type": "string"},
+            "d": {"type": "number", "nullable": True}
+        }
+    }
+}
+
+
+class TestColumnarSpec(unittest.TestCase):
+
+    def test_decode(self):
+        print("Testing columns are decoded into typed columns")
+
+        spec = ColumnarSpec(SCHEMA)
+        X = spec.decode({"a": [1, 2], "b": [0.5, 1], "c": ["x", "y"], "d": [None, 1.0]})
+        self.assertEqual(X["a"], array("i", [1, 2]))
+        self.assertEqual(X["b"], array("d", [0.5, 1.0]))
+        self.assertEqual(X["c"], ["x", "y"])
+        self.assertEqual(X["d"], [None, 1.0])
+        self.assertEqual(spec.length(X), 2)
+
+        b = array("d", [1.0, 2.0])
+        self.assertIs(spec.decode({"a": [1, 2], "b": b, "c": ["x", "y"], "d": [1, 2]})["b"], b,
+                      "Typed columns should not be copied")
+
+    def test_decode_errors(self):
+        print("Testing invalid columns are rejected")
+
+        spec = ColumnarSpec(SCHEMA)
+        valid = {"a": [1, 2], "b": [0.5, 1], "c": ["x", "y"], "d": [None, 1.0]}
+
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.a\[1\]' error"):
+            spec.decode(dict(valid, a=[1, 2.5]))
+        with self.assertRaisesRegex(SchemaError, "Key 'input.a' error: .*maximum"):
+            spec.decode(dict(valid, a=[1, 2 ** 40]))
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.c\[0\]' error"):
+            spec.decode(dict(valid, c=[1, "y"]))
+        with self.assertRaisesRegex(SchemaError, "same length"):
+            spec.decode(dict(valid, b=[0.5]))
+        with self.assertRaisesRegex(SchemaError, "Missing key: 'd'"):
+            spec.decode({"a": [1], "b": [0.5], "c": ["x"]})
+        with self.assertRaisesRegex(SchemaError, "Wrong key 'e'"):
+            spec.decode(dict(valid, e=[1, 2]))
+        with self.assertRaisesRegex(SchemaError, "should be instance of 'dict'"):
+            spec.decode([valid])
+
+    def test_records(self):
+        print("Testing records are converted to and from columns")
+
+        spec = ColumnarSpec(SCHEMA)
+        records = [{"a": 1, "b": 0.5, "c": "x", "d": None}, {"a": 2, "b": 1.0, "c": "y", "d": 1.0}]
+        X = spec.from_records(records)
+        self.assertEqual(X["a"], array("i", [1, 2]))
+        self.assertEqual(spec.to_records(X), records)
+        self.assertEqual(spec.to_records(spec.from_records([])), [])
+
+    def test_request_schema(self):
+        print("Testing COLUMNAR request schemas accept columns or records")
+
+        schema = get_request_schema(SCHEMA, "COLUMNAR")
+        schema.validate({"input": {"a": [1], "b": [0.5], "c": ["x"], "d": [None]}})
+        schema.validate({"input": [{"a": 1, "b": 0.5, "c": "x", "d": None}]})
+        self.assertRaises(SchemaError, schema.validate, {"input": {"a": ["x"], "b": [0.5], "c": ["x"], "d": [None]}})
+
+
+class TestServerColumnar(unittest.TestCase):
+
+    def setUp(self):
+        app_server.init(None, osp.join(EXAMPLES_PATH, "columnar"))
+        self.client = app_server.app.test_client()
+        self.X, self.y = app_server.model.load_test_data()
+
+    def tearDown(self):
+        app_config.clear()
+
+    def test_columns(self):
+        print("Testing COLUMNAR models predict columns")
+
+        rv = self.client.post("/predict", json={"input": self.X})
+        self.assertEqual(rv.status_code, 200)
+        r = json.loads(rv.data)
+        self.assertEqual(r["input"], self.X)
+        self.assertEqual(r["output"], self.y)
+
+    def test_records(self):
+        print("Testing COLUMNAR models predict records as records")
+
+        records = [dict(zip(self.X, row)) for row in zip(*self.X.values())]
+        rv = self.client.post("/predict", json={"input": records})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(json.loads(rv.data)["output"], [dict(zip(self.y, row)) for row in zip(*self.y.values())])
+
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        rv = self.client.post("/predict/stream", data=data, content_type="application/x-ndjson")
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual([json.loads(line)["z"] for line in rv.data.splitlines()], self.y["z"])
+
+    def test_errors(self):
+        print("Testing invalid COLUMNAR requests are rejected")
+
+        rv = self.client.post("/predict", json={"input": dict(self.X, sigma=[1.0, "x", 1.0])})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn("input.sigma[1]", json.loads(rv.data)["output"]["message"])
+
+        rv = self.client.post("/predict", json={"input": dict(self.X, x=[1.0])})
+        self.assertEqual(rv.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
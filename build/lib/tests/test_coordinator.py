@@ -0,0 +1,178 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test scoring across several model servers"""
+import json
+import os.path as osp
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
+
+from catwalk.helpers.configuration import app_config
+from catwalk.scoring import score, ScoringError
+from catwalk.scoring.coordinator import Coordinator, EndpointError
+from catwalk.scoring.files import read_chunks
+from catwalk.server import app as app_server
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+MODEL_PATH = osp.join(EXAMPLES_PATH, "batch")
+
+
+def _free_port():
+    """Returns a port that nothing is listening on."""
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def _flaky_app(fail):
+    """A proxy to the model server app that returns 503 for the first fail requests to /predict."""
+    app = Flask("flaky")
+    calls = {"predict": 0}
+
+    @app.route("/info")
+    def info():
+        return app_server.info()
+
+    @app.route("/predict", methods=["POST"])
+    def predict():
+        calls["predict"] += 1
+        if calls["predict"] <= fail:
+            return Response("", 503)
+        with app_server.app.test_request_context("/predict", method="POST", data=request.get_data(),
+                                                 content_type="application/json"):
+            return app_server.predict()
+
+    return app
+
+
+def _closing_app(app):
+    """Closes the connection after every response, so a server that is shut down refuses every further request."""
+    def closing(environ, start_response):
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [("Connection", "close")], exc_info)
+        return app(environ, start)
+    return closing
+
+
+class TestCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.input_path = osp.join(self.path, "in.jsonl")
+        with open(self.input_path, "w") as fp:
+            for i in range(50):
+                fp.write(json.dumps({"seed": i, "seed_version": 1, "mu": 0.0, "sigma": 1.0}) + "\n")
+
+        app_server.init(None, MODEL_PATH)
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.path, ignore_errors=True)
+        app_config.clear()
+
+    def _serve(self, app=None):
+        server = make_server("127.0.0.1", 0, app or app_server.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return "http://127.0.0.1:{}".format(server.server_port)
+
+    def _read(self, path):
+        with open(path, "r") as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_endpoints(self):
+        print("Testing chunks are balanced across endpoints and reassembled in order")
+
+        expected = osp.join(self.path, "expected.jsonl")
+        score(MODEL_PATH, self.input_path, expected, chunk_size=5, processes=1)
+
+        output_path = osp.join(self.path, "out.jsonl")
+        endpoints = [self._serve(), self._serve(), self._serve()]
+        r = score(input_path=self.input_path, output_path=output_path, chunk_size=5, endpoints=endpoints)
+        self.assertEqual(self._read(output_path), self._read(expected))
+        self.assertEqual(r["chunks"], 10)
+        self.assertEqual(sum(e["requests"] for e in r["endpoints"].values()), 10)
+        for url in endpoints:
+            self.assertGreater(r["endpoints"][url]["requests"], 0, "Endpoint was not used: " + url)
+
+    def test_retries(self):
+        print("Testing failed chunks are retried on other endpoints")
+
+        expected = osp.join(self.path, "expected.jsonl")
+        score(MODEL_PATH, self.input_path, expected, chunk_size=5, processes=1)
+
+        # One endpoint always fails to connect, another returns 503 twice
+        endpoints = [self._serve(), self._serve(_flaky_app(2)), "http://127.0.0.1:{}".format(_free_port())]
+        coordinator = Coordinator(endpoints, backoff=0.0, cooldown=0.0)
+        info = coordinator.info()
+
+        chunks = enumerate(read_chunks(self.input_path, 5))
+        r = [row for _, rows in coordinator.score_chunks(chunks, info) for row in rows]
+        self.assertEqual(r, self._read(expected))
+
+        stats = coordinator.stats()
+        self.assertGreaterEqual(stats["retries"], 3)
+        self.assertGreater(stats["endpoints"][endpoints[2]]["requests"], 0)
+        self.assertEqual(stats["endpoints"][endpoints[2]]["failures"], stats["endpoints"][endpoints[2]]["requests"])
+
+    def test_ejection(self):
+        print("Testing a server that dies mid-run is ejected")
+
+        endpoints = [self._serve(), self._serve(), self._serve(_closing_app(app_server.app))]
+        coordinator = Coordinator(endpoints, retries=1, backoff=0.0, cooldown=60.0)
+        info = coordinator.info()
+
+        r = coordinator.score_chunks(enumerate(read_chunks(self.input_path, 1)), info)
+        results = [next(r) for _ in range(5)]
+        dead = self.servers.pop()
+        dead.shutdown()
+        dead.server_close()
+        requests = coordinator.stats()["endpoints"][endpoints[2]]["requests"]
+        results.extend(r)
+        self.assertEqual(len(results), 50)
+
+        # Only the requests that were in flight, or chose the server before its first failure, are sent to it
+        stats = coordinator.stats()["endpoints"][endpoints[2]]
+        self.assertLessEqual(stats["requests"] - requests, 4)
+        self.assertGreater(stats["failures"], 0)
+
+    def test_unavailable(self):
+        print("Testing unavailable endpoints")
+
+        with self.assertRaises(ScoringError):
+            score(input_path=self.input_path, output_path=osp.join(self.path, "out.jsonl"),
+                  endpoints=["http://127.0.0.1:{}".format(_free_port())])
+
+        coordinator = Coordinator(["http://127.0.0.1:{}".format(_free_port())], retries=1, backoff=0.0)
+        with self.assertRaises(EndpointError):
+            coordinator.predict("abc", [{"seed": 1, "seed_version": 1, "mu": 0.0, "sigma": 1.0}])
+        self.assertEqual(coordinator.stats()["retries"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
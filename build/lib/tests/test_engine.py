@@ -0,0 +1,265 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test running the model in the processes of the model engine"""
+import os
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.engine import dump, load, answer, sweep_buffers, ModelEngine, EngineClient, EngineError, \
+    EngineBusy, RemoteModel, BUFFER_SUFFIX
+from catwalk.utils import get_model_class
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+CRASH_MODEL = """
+import os
+
+
+class Model(object):
+
+    def __init__(self, path="."):
+        pass
+
+    def predict(self, X):
+        if X == "crash":
+            os._exit(1)
+        if X == "raise":
+            raise ValueError("bad input")
+        return {"pid": os.getpid()}
+"""
+
+
+def _buffers(path):
+    return [name for name in os.listdir(path) if name.endswith(BUFFER_SUFFIX)]
+
+
+class _ClosedConnection(object):
+
+    def send_bytes(self, message):
+        raise BrokenPipeError("Broken pipe")
+
+
+class _ArrayModel(object):
+
+    def predict(self, X):
+        return np.zeros(X)
+
+
+class TestMessages(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_inline(self):
+        print("Testing small messages are sent inline")
+
+        obj = ("predict", ({"a": 1, "b": [1.5, "x"]},))
+        message, files = dump(obj, self.path)
+        self.assertEqual(files, [])
+        self.assertEqual(load(message, self.path), obj)
+
+    def test_shared_memory(self):
+        print("Testing large buffers are sent through shared memory")
+
+        X = np.arange(100000, dtype=np.float64).reshape(1000, 100)
+        df = pd.DataFrame({"a": np.arange(20000), "b": np.linspace(0, 1, 20000)})
+        message, files = dump((X, df), self.path, 1024)
+        self.assertGreater(len(files), 0)
+        self.assertEqual(sorted(_buffers(self.path)), sorted(files))
+        self.assertLess(len(message), 4096)
+
+        X2, df2 = load(message, self.path)
+        self.assertEqual(_buffers(self.path), [])
+        np.testing.assert_array_equal(X2, X)
+        pd.testing.assert_frame_equal(df2, df)
+
+        # Copy-on-write, as if unpickled from bytes
+        X2[0, 0] = -1
+        self.assertEqual(X2[0, 0], -1)
+
+    def test_unsent(self):
+        print("Testing the buffers of results that cannot be sent are removed")
+
+        message, _ = dump(("predict", (10000,)), self.path, 1024)
+        with self.assertRaises(BrokenPipeError):
+            answer(_ClosedConnection(), _ArrayModel(), message, self.path, 1024)
+        self.assertEqual(_buffers(self.path), [])
+
+    def test_sweep(self):
+        print("Testing stale buffers are removed")
+
+        _, old = dump(np.zeros(10000), self.path, 1024)
+        _, new = dump(np.zeros(10000), self.path, 1024)
+        stale = time.time() - 120
+        os.utime(osp.join(self.path, old[0]), (stale, stale))
+        self.assertEqual(sweep_buffers(self.path, 60), 1)
+        self.assertEqual(_buffers(self.path), new)
+
+
+class TestModelEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engines = []
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.stop()
+        app_config.clear()
+
+    def _start(self, model_path, processes=2):
+        fd, config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  engine:\n    processes: {}\n    shm_threshold: 1024\n".format(processes))
+        try:
+            engine = ModelEngine(config_path, model_path)
+            self.engines.append(engine)
+            model = RemoteModel(EngineClient(engine.path, 1024, 30, 30))
+        finally:
+            os.remove(config_path)
+        return engine, model
+
+    def test_predict(self):
+        print("Testing the engine predicts as the model does")
+
+        for name in ["rng", "projection"]:
+            model_path = osp.join(EXAMPLES_PATH, name)
+            m = get_model_class(model_path)(model_path)
+            engine, remote = self._start(model_path)
+
+            X, y = m.load_test_data(model_path)
+            X2, y2 = remote.load_test_data(model_path)
+            self.assertEqual(repr(X2), repr(X))
+            for x in X:
+                self.assertEqual(repr(remote.predict(x)), repr(m.predict(x)))
+            self.assertEqual(_buffers(engine.path), [])
+
+    def test_restart(self):
+        print("Testing model errors are raised, and crashed model processes are restarted")
+
+        model_path = tempfile.mkdtemp()
+        try:
+            with open(osp.join(model_path, "model.py"), "w") as fp:
+                fp.write(CRASH_MODEL)
+            engine, remote = self._start(model_path, processes=1)
+
+            pid = remote.predict("ok")["pid"]
+            with self.assertRaises(EngineError) as cm:
+                remote.predict("raise")
+            self.assertIn("ValueError: bad input", str(cm.exception))
+            self.assertIn("Traceback", cm.exception.details)
+            self.assertEqual(remote.predict("ok")["pid"], pid)
+
+            with self.assertRaises(EngineError):
+                remote.predict("crash")
+            self.assertNotEqual(remote.predict("ok")["pid"], pid)
+            self.assertTrue(engine.is_alive)
+        finally:
+            shutil.rmtree(model_path, ignore_errors=True)
+
+        engine.stop()
+        self.assertFalse(engine.is_alive)
+        self.assertFalse(osp.exists(engine.path))
+
+    def test_busy(self):
+        print("Testing calls beyond max_in_flight are rejected")
+
+        # No engine is running in path, so the first call waits to connect until its connect_timeout
+        path = tempfile.mkdtemp()
+        try:
+            client = EngineClient(path, connect_timeout=1.0, max_in_flight=1)
+            errors = []
+
+            def call():
+                try:
+                    client.call("predict", 1)
+                except EngineError as err:
+                    errors.append(err)
+
+            waiting = threading.Thread(target=call)
+            waiting.start()
+            while client.in_flight < 1:
+                time.sleep(0.001)
+            with self.assertRaises(EngineBusy):
+                client.call("predict", 2)
+            waiting.join()
+            self.assertEqual(client.in_flight, 0)
+            self.assertEqual([type(err) for err in errors], [EngineError])
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class TestServerEngine(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  engine:\n    enabled: true\n    processes: 2\n")
+        self.model_path = osp.join(EXAMPLES_PATH, "projection")
+        app_server.init(self.config_path, self.model_path)
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        engine = app_server.engine
+        app_server.init(None, self.model_path)
+        app_config.clear()
+        os.remove(self.config_path)
+        self.assertFalse(engine.is_alive)
+
+    def test_predict(self):
+        print("Testing the server predicts through the engine")
+
+        self.assertIsInstance(app_server.model, RemoteModel)
+        X, y = app_server.model.load_test_data(self.model_path)
+        rv = self.client.post("/predict", json={"input": app_server.served.input_tensor.encode(X)})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(app_server.served.output_tensor.decode(rv.get_json()["output"]).tolist(), y.tolist())
+        self.assertEqual(self.client.get("/info").status_code, 200)
+
+    def test_errors(self):
+        print("Testing engine errors are returned as JSON")
+
+        X, _ = app_server.model.load_test_data(self.model_path)
+        body = {"input": app_server.served.input_tensor.encode(X)}
+        client = app_server.model.client
+        with mock.patch.object(client, "_in_flight", client.max_in_flight):
+            rv = self.client.post("/predict", json=body)
+        self.assertEqual(rv.status_code, 503)
+        self.assertEqual(rv.get_json()["output"]["message"], "Predict queue is full.")
+        self.assertIn("Retry-After", rv.headers)
+
+        with mock.patch.object(client, "call", side_effect=EngineError("ValueError: bad input", "Traceback")):
+            rv = self.client.post("/predict", json=body)
+        self.assertEqual(rv.status_code, 500)
+        self.assertEqual(rv.get_json()["output"]["message"], "Model engine error: ValueError: bad input")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test DataFrames are validated a column at a time"""
+import json
+import os.path as osp
+import unittest
+
+import numpy as np
+import pandas as pd
+from schema import SchemaError
+
+from catwalk.server import app as app_server
+from catwalk.server.formats import ArrowFormat
+from catwalk.validation.frame import FrameValidator
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "a": {"type": "integer"},
+        "b": {"type": "number"},
+        "c": {"type": "string"},
+        "d": {"type": "number", "nullable": True},
+        "e": {"type": "array", "items": {"type": "number"}}
+    }
+}
+
+
+def frame(**columns):
+    data = {"a": [1, 2, 3], "b": [0.5, 1.0, 1.5], "c": ["x", "y", "z"], "d": [1.0, None, 2.0],
+            "e": [[1.0], [2.0, 3.0], []]}
+    data.update(columns)
+    return pd.DataFrame(data)
+
+
+class TestFrameValidator(unittest.TestCase):
+
+    def test_valid(self):
+        print("Testing valid DataFrames pass column validation")
+
+        validator = FrameValidator(SCHEMA)
+        df = frame()
+        self.assertIs(validator.validate(df), df)
+        self.assertTrue(validator.is_valid(frame(b=[1, 2, 3])), "Integer columns should be numbers")
+        self.assertFalse(validator.is_valid(frame(a=[1.0, 2.0, np.nan])),
+                         "Integer columns with nulls should not be valid unless nullable")
+        self.assertTrue(FrameValidator({"type": "array", "items": SCHEMA}).is_valid(df),
+                        "Array of object schemas should validate rows")
+
+    def test_nullable(self):
+        print("Testing nulls are only allowed in nullable columns")
+
+        validator = FrameValidator(SCHEMA)
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.b\[1\]' error: None"):
+            validator.validate(frame(b=[0.5, np.nan, 1.5]))
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.c\[2\]' error: None"):
+            validator.validate(frame(c=["x", "y", None]))
+        self.assertTrue(validator.is_valid(frame(d=[np.nan, np.nan, np.nan])))
+
+        schema = {"type": "object", "properties": {"a": {"type": "integer", "nullable": True}}}
+        self.assertTrue(FrameValidator(schema).is_valid(pd.DataFrame({"a": [1.0, np.nan, 3.0]})),
+                        "Integer columns with nulls are stored as floats")
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.a\[2\]' error: 3.5"):
+            FrameValidator(schema).validate(pd.DataFrame({"a": [1.0, np.nan, 3.5]}))
+
+    def test_types(self):
+        print("Testing columns of the wrong type are rejected with their first invalid row")
+
+        validator = FrameValidator(SCHEMA, "output")
+        with self.assertRaisesRegex(SchemaError, r"Key 'output.c\[1\]' error: 2 should be instance of 'string'"):
+            validator.validate(frame(c=["x", 2, "z"]))
+        with self.assertRaisesRegex(SchemaError, "Key 'output.b' error: a column of dtype datetime64"):
+            validator.validate(frame(b=pd.to_datetime(["2019-01-01"] * 3)))
+        with self.assertRaisesRegex(SchemaError, r"Key 'output.b\[0\]' error: True should be instance of 'number'"):
+            validator.validate(frame(b=[True, 1.0, 2.0]))
+        with self.assertRaisesRegex(SchemaError, r"Key 'output.e\[1\]"):
+            validator.validate(frame(e=[[1.0], ["x"], []]))
+
+    def test_columns(self):
+        print("Testing missing and unexpected columns are rejected")
+
+        validator = FrameValidator(SCHEMA)
+        with self.assertRaisesRegex(SchemaError, "Missing key: 'e'"):
+            validator.validate(frame().drop(columns=["e"]))
+        with self.assertRaisesRegex(SchemaError, "Wrong key 'f'"):
+            validator.validate(frame(f=[1, 2, 3]))
+        with self.assertRaises(ValueError):
+            FrameValidator({"type": "number"})
+
+
+class TestFrameServer(unittest.TestCase):
+
+    def setUp(self):
+        app_server.init(None, osp.join(EXAMPLES_PATH, "dataframe"))
+        self.client = app_server.app.test_client()
+
+    def test_arrow_request(self):
+        print("Testing invalid Arrow requests are rejected by column validation")
+
+        X, _ = app_server.model.load_test_data()
+        rv = self.client.post("/predict", data=ArrowFormat.write_stream(X, {}),
+                              content_type=ArrowFormat.mimetype, headers={"Accept": "application/json"})
+        self.assertEqual(rv.status_code, 200)
+
+        rv = self.client.post("/predict", data=ArrowFormat.write_stream(X.drop(columns=["weights"]), {}),
+                              content_type=ArrowFormat.mimetype, headers={"Accept": "application/json"})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn("Missing key: 'weights'", json.loads(rv.data)["output"]["message"])
+
+    def test_output(self):
+        print("Testing invalid DataFrame outputs are not returned")
+
+        X, _ = app_server.model.load_test_data()
+        predict = app_server.model.predict
+        app_server.app.config["TESTING"] = True
+        app_server.model.predict = lambda df: pd.DataFrame({"activation": ["x"] * len(df)})
+        try:
+            with self.assertRaisesRegex(SchemaError, r"Key 'output.activation\[0\]' error"):
+                self.client.post("/predict", data=json.dumps({"input": X.to_dict(orient="records")}),
+                                 content_type="application/json")
+        finally:
+            app_server.model.predict = predict
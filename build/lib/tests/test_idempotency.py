@@ -0,0 +1,140 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the idempotency store"""
+import os
+import os.path as osp
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.idempotency import MemoryBackend, FileBackend, OWNER, DONE, PENDING
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+class TestIdempotencyBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _backends(self, **kwargs):
+        return [MemoryBackend(**kwargs), FileBackend(self.path, **kwargs)]
+
+    def test_store(self):
+        print("Testing responses are stored")
+
+        for backend in self._backends(wait_timeout=0.05):
+            self.assertEqual(backend.begin("a"), (OWNER, None))
+            self.assertEqual(backend.begin("a"), (PENDING, None), "In-flight call was not detected")
+
+            backend.complete("a", b"response")
+            self.assertEqual(backend.begin("a"), (DONE, b"response"))
+
+            self.assertEqual(backend.begin("b"), (OWNER, None))
+            backend.abort("b")
+            self.assertEqual(backend.begin("b"), (OWNER, None), "Aborted call was not released")
+            backend.abort("b")
+
+    def test_wait(self):
+        print("Testing retries wait for in-flight calls")
+
+        for backend in self._backends(wait_timeout=5):
+            self.assertEqual(backend.begin("c"), (OWNER, None))
+            timer = threading.Timer(0.05, backend.complete, ("c", b"response"))
+            timer.start()
+            self.assertEqual(backend.begin("c"), (DONE, b"response"))
+            timer.join()
+
+    def test_window(self):
+        print("Testing stored responses expire")
+
+        for backend in self._backends(window=0.05):
+            backend.begin("d")
+            backend.complete("d", b"response")
+            time.sleep(0.1)
+            self.assertEqual(backend.begin("d"), (OWNER, None))
+
+    def test_shared_files(self):
+        print("Testing the file backend is shared")
+
+        first = FileBackend(self.path, wait_timeout=0.05)
+        second = FileBackend(self.path, wait_timeout=0.05)
+        self.assertEqual(first.begin("e"), (OWNER, None))
+        self.assertEqual(second.begin("e"), (PENDING, None))
+        first.complete("e", b"response")
+        self.assertEqual(second.begin("e"), (DONE, b"response"))
+
+    def test_max_entries(self):
+        print("Testing the number of stored responses is bounded")
+
+        for backend in self._backends(max_entries=2):
+            for key in ["f", "g", "h"]:
+                backend.begin(key)
+                backend.complete(key, key.encode("utf-8"))
+                time.sleep(0.01)
+            if isinstance(backend, FileBackend):
+                backend.prune()
+            self.assertEqual(backend.stats()["stored"], 2)
+            self.assertEqual(backend.begin("f"), (OWNER, None), "Oldest response was not evicted")
+
+
+class TestServerIdempotency(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  idempotency:\n    enabled: true\n")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "rng"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        os.remove(self.config_path)
+        app_config.clear()
+
+    def test_retry(self):
+        print("Testing retries with the same correlation_id do not run the model again")
+
+        X, y = app_server.model.load_test_data()
+
+        predicted = []
+        predict = app_server.model.predict
+        app_server.model.predict = lambda x: predicted.append(x) or predict(x)
+
+        first = self.client.post("/predict", json={"correlation_id": "retry-1", "input": X[0]})
+        retry = self.client.post("/predict", json={"correlation_id": "retry-1", "input": X[0]})
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(first.get_json(), retry.get_json())
+        self.assertEqual(retry.get_json()["output"], y[0])
+        self.assertEqual(len(predicted), 1)
+
+        # Requests without a correlation_id are always run
+        self.client.post("/predict", json={"input": X[0]})
+        self.client.post("/predict", json={"input": X[0]})
+        self.assertEqual(len(predicted), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the Prometheus metrics"""
+import multiprocessing
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.metrics import Registry, Counter, Gauge, Histogram, LIVE_SUM, MAX
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+def _declare(registry):
+    return (Counter(registry, "test_total", "A counter.", ("code",), [("200",), ("other",)]),
+            Gauge(registry, "test_in_flight", "A live gauge.", mode=LIVE_SUM),
+            Gauge(registry, "test_load_seconds", "A max gauge.", mode=MAX))
+
+
+def _record_in_child(path):
+    counter, in_flight, load = _declare(Registry(path))
+    counter.inc(2, ("200",))
+    in_flight.inc()
+    load.set(5.0)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_render(self):
+        print("Testing the Prometheus text format")
+
+        registry = Registry(const_labels={"model": "a\"b"})
+        counter = Counter(registry, "test_total", "A counter.", ("code",), [("200",), ("other",)])
+        histogram = Histogram(registry, "test_seconds", "A histogram.", buckets=(0.1, 1.0))
+        counter.inc(1, ("200",))
+        counter.inc(1, ("418",))
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(3.0)
+
+        lines = registry.render().decode("utf-8").splitlines()
+        self.assertIn("# TYPE test_total counter", lines)
+        self.assertIn('test_total{model="a\\"b",code="200"} 1.0', lines)
+        self.assertIn('test_total{model="a\\"b",code="other"} 1.0', lines)
+        self.assertIn('test_seconds_bucket{model="a\\"b",le="0.1"} 1.0', lines)
+        self.assertIn('test_seconds_bucket{model="a\\"b",le="1.0"} 2.0', lines)
+        self.assertIn('test_seconds_bucket{model="a\\"b",le="+Inf"} 3.0', lines)
+        self.assertIn('test_seconds_sum{model="a\\"b"} 3.6', lines)
+        self.assertIn('test_seconds_count{model="a\\"b"} 3.0', lines)
+
+    def test_workers(self):
+        print("Testing metrics are aggregated across worker processes")
+
+        counter, in_flight, load = _declare(Registry(self.path))
+        counter.inc(1, ("200",))
+        in_flight.inc()
+        load.set(1.0)
+
+        # A worker that has exited
+        child = multiprocessing.get_context("fork").Process(target=_record_in_child, args=(self.path,))
+        child.start()
+        child.join()
+        self.assertEqual(len(os.listdir(self.path)), 2)
+
+        # A file with another layout is ignored
+        other = tempfile.mkdtemp()
+        Counter(Registry(other), "other_total", "Another layout.", ("code",), [("200",), ("other",)]).inc(100)
+        for name in os.listdir(other):
+            shutil.move(osp.join(other, name), osp.join(self.path, "metrics-1.db"))
+        shutil.rmtree(other)
+
+        values = counter.registry.collect()
+        self.assertEqual(values[counter.slot(("200",))], 3.0, "Counters of exited workers are kept")
+        self.assertEqual(values[in_flight.slot()], 1.0, "Live gauges of exited workers are dropped")
+        self.assertEqual(values[load.slot()], 5.0)
+
+    def test_fork(self):
+        print("Testing forked processes record into their own file")
+
+        registry = Registry(self.path)
+        counter = Counter(registry, "test_total", "A counter.")
+        counter.inc()
+
+        def record():
+            counter.inc(10)
+
+        child = multiprocessing.get_context("fork").Process(target=record)
+        child.start()
+        child.join()
+        self.assertEqual(registry.values[counter.slot()], 1.0)
+        self.assertEqual(registry.collect()[counter.slot()], 11.0)
+
+
+class TestServerMetrics(unittest.TestCase):
+
+    def setUp(self):
+        app_server.init(None, osp.join(EXAMPLES_PATH, "batch"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        app_config.clear()
+
+    def test_metrics(self):
+        print("Testing the /metrics end-point")
+
+        X, _ = app_server.model.load_test_data()
+        self.assertEqual(self.client.post("/predict", json={"input": X}).status_code, 200)
+        self.assertEqual(self.client.post("/predict", json={"input": 1}).status_code, 400)
+
+        rv = self.client.get("/metrics")
+        self.assertEqual(rv.status_code, 200)
+        self.assertTrue(rv.content_type.startswith("text/plain; version=0.0.4"))
+        lines = rv.data.decode("utf-8").splitlines()
+
+        labels = 'model="BatchRNGModel",version="0.0.1"'
+        self.assertIn('catwalk_requests_total{%s,endpoint="predict",code="200"} 1.0' % labels, lines)
+        self.assertIn('catwalk_requests_total{%s,endpoint="predict",code="400"} 1.0' % labels, lines)
+        self.assertIn('catwalk_predict_rows_total{%s} %s' % (labels, float(len(X))), lines)
+        self.assertIn('catwalk_requests_in_flight{%s} 1.0' % labels, lines, "The scrape itself is in flight")
+        for stage in ("parse", "validate", "convert", "predict", "serialize"):
+            self.assertIn('catwalk_stage_duration_seconds_count{%s,stage="%s"} %s' % (
+                labels, stage, "2.0" if stage == "parse" else "1.0"), lines)
+
+    def test_disabled(self):
+        print("Testing metrics can be disabled")
+
+        fd, config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  metrics:\n    enabled: false\n")
+        try:
+            app_server.init(config_path, osp.join(EXAMPLES_PATH, "batch"))
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+        finally:
+            os.remove(config_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test serving several models from one server"""
+import os
+import os.path as osp
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server import registry as registry_module
+from catwalk.server.registry import ModelRegistry, find_models
+from catwalk.utils import get_model_module_name, MODEL_MODULE_PREFIX
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+VERSION = "0.0.1"
+
+GEVENT_SCRIPT = """
+from gevent import monkey
+monkey.patch_all()
+import sys
+import gevent
+from catwalk.server import app as app_server
+
+app_server.init(sys.argv[1], sys.argv[2])
+load = app_server.registry._load
+
+def slow_load(path):
+    n = 0
+    for i in range(5000000):
+        n += i
+    return load(path)
+
+app_server.registry._load = slow_load
+ticks = []
+
+def tick():
+    while True:
+        ticks.append(1)
+        gevent.sleep(0.001)
+
+ticker = gevent.spawn(tick)
+gevent.sleep(0.01)
+before = len(ticks)
+served = app_server.registry.get("BatchRNGModel", "0.0.1")
+ticker.kill()
+assert served is not None
+print(len(ticks) - before)
+"""
+
+
+class _Served(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.memory = 0
+        self.load_time = 0.0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.models = {("m{}".format(i), VERSION): "/models/m{}".format(i) for i in range(4)}
+        self.loaded = []
+
+    def load(self, path):
+        self.loaded.append(path)
+        return _Served(path)
+
+    def test_find(self):
+        print("Testing models are found in model directories")
+
+        models = find_models([EXAMPLES_PATH])
+        self.assertEqual(len(models), len(os.listdir(EXAMPLES_PATH)))
+        self.assertEqual(models[("BatchRNGModel", VERSION)], osp.abspath(osp.join(EXAMPLES_PATH, "batch")))
+
+        models = find_models([osp.join(EXAMPLES_PATH, "rng"), EXAMPLES_PATH])
+        self.assertEqual(models[("RNGModel", VERSION)], osp.abspath(osp.join(EXAMPLES_PATH, "rng")))
+
+    def test_lazy(self):
+        print("Testing models are loaded once, on first use")
+
+        registry = ModelRegistry(self.models, self.load)
+        self.assertEqual(self.loaded, [])
+        served = registry.get("m1", VERSION)
+        self.assertEqual(served.path, "/models/m1")
+        self.assertIs(registry.get("m1", VERSION), served)
+        self.assertEqual(self.loaded, ["/models/m1"])
+        self.assertIsNone(registry.get("m1", "0.0.2"))
+        self.assertIsNone(registry.get("unknown", VERSION))
+        self.assertEqual(registry.stats()["loads"], 1)
+
+    def test_max_models(self):
+        print("Testing the least recently used models are evicted")
+
+        registry = ModelRegistry(self.models, self.load, max_models=2)
+        m0 = registry.get("m0", VERSION)
+        m1 = registry.get("m1", VERSION)
+        registry.get("m0", VERSION)
+        registry.get("m2", VERSION)
+        self.assertTrue(m1.closed)
+        self.assertFalse(m0.closed)
+        self.assertEqual([m["name"] for m in registry.list() if m["loaded"]], ["m0", "m2"])
+        self.assertEqual(registry.stats()["evictions"], 1)
+
+        # Evicted models are loaded again on their next use
+        registry.get("m1", VERSION)
+        self.assertEqual(self.loaded.count("/models/m1"), 2)
+
+    def test_max_memory(self):
+        print("Testing models are evicted to keep to the memory budget")
+
+        registry = ModelRegistry(self.models, self.load, max_memory=250)
+        memory = iter([0, 100, 100, 200, 200, 300, 300, 1300])
+        with mock.patch.object(registry_module, "_private_memory", lambda: next(memory)):
+            m0 = registry.get("m0", VERSION)
+            m1 = registry.get("m1", VERSION)
+            self.assertEqual(registry.memory, 200)
+            registry.get("m2", VERSION)
+            self.assertTrue(m0.closed)
+            self.assertEqual(registry.memory, 200)
+
+            # A model larger than the budget evicts the others, but is kept
+            m3 = registry.get("m3", VERSION)
+            self.assertTrue(m1.closed)
+            self.assertEqual(registry.stats()["loaded"], 1)
+            self.assertFalse(m3.closed)
+
+
+class TestServerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  models:\n    paths:\n      - {}\n    max_models: 1\n".format(EXAMPLES_PATH))
+        self.model_path = osp.join(EXAMPLES_PATH, "rng")
+        app_server.init(self.config_path, self.model_path)
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        app_server.init(None, self.model_path)
+        app_config.clear()
+        os.remove(self.config_path)
+
+    def predict(self, name, X):
+        return self.client.post("/predict", json={"input": X, "model": {"name": name, "version": VERSION}})
+
+    def test_routing(self):
+        print("Testing requests are routed to the model they name")
+
+        X, _ = app_server.model.load_test_data()
+        rv = self.client.post("/predict", json={"input": X[0]})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.get_json()["model"]["name"], "RNGModel")
+
+        served = app_server.registry.get("BatchRNGModel", VERSION)
+        batch, _ = served.model.load_test_data()
+        rv = self.predict("BatchRNGModel", batch)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(len(rv.get_json()["output"]), len(batch))
+
+        # Requests are validated against the schema of the model they are routed to
+        self.assertEqual(self.predict("BatchRNGModel", X[0]).status_code, 400)
+        self.assertEqual(self.predict("RNGModel", X[0]).status_code, 200)
+        self.assertEqual(self.predict("Unknown", X[0]).status_code, 404)
+
+        models = {m["name"]: m["loaded"] for m in self.client.get("/models").get_json()["models"]}
+        self.assertEqual(len(models), len(os.listdir(EXAMPLES_PATH)))
+        self.assertTrue(models["RNGModel"])
+        self.assertTrue(models["BatchRNGModel"])
+        self.assertFalse(models["Neuron"])
+
+    def test_eviction(self):
+        print("Testing routed models are evicted and their modules removed")
+
+        batch = app_server.registry.get("BatchRNGModel", VERSION)
+        module = type(batch.model).__module__
+        self.assertTrue(module.startswith(MODEL_MODULE_PREFIX))
+        self.assertIn(module, sys.modules)
+        self.assertNotEqual(module, type(app_server.model).__module__)
+        self.assertEqual(module, get_model_module_name(osp.join(EXAMPLES_PATH, "batch")))
+
+        neuron = app_server.registry.get("Neuron", VERSION)
+        X, _ = neuron.model.load_test_data()
+        self.assertEqual(self.predict("Neuron", X[0]).status_code, 200)
+        self.assertNotIn(module, sys.modules)
+        self.assertEqual(app_server.registry.stats()["evictions"], 1)
+
+        # The default model is never evicted
+        self.assertEqual(self.client.post("/predict", json={"input": app_server.model.load_test_data()[0][0]})
+                         .status_code, 200)
+
+        lines = self.client.get("/metrics").data.decode("utf-8").splitlines()
+        self.assertIn("catwalk_registry_loads_total 2.0", lines)
+        self.assertIn("catwalk_registry_evictions_total 1.0", lines)
+        self.assertIn("catwalk_registry_models_loaded 1.0", lines)
+        # Requests are served by several models, so they are not labelled with the default one
+        self.assertFalse(any('model="RNGModel"' in line for line in lines))
+
+    def test_gevent(self):
+        print("Testing routed models are loaded without blocking the gevent hub")
+
+        env = dict(os.environ, PYTHONPATH=osp.join(osp.dirname(osp.abspath(__file__)), ".."))
+        r = subprocess.run([sys.executable, "-c", GEVENT_SCRIPT, self.config_path, self.model_path],
+                           stdout=subprocess.PIPE, env=env, timeout=60)
+        self.assertEqual(r.returncode, 0)
+        self.assertGreater(int(r.stdout.decode("utf-8").strip().splitlines()[-1]), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to check compiled schemas accept and reject the same data as Schema objects"""
+import unittest
+
+from schema import SchemaError
+
+from catwalk.validation.compiler import compile_request_schema, compile_response_schema, MAX_REPR_LENGTH
+from catwalk.validation.model import ModelIOTypes
+from catwalk.validation.schema import get_request_schema, get_response_schema
+
+ROW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "s": {"type": "string"},
+        "b": {"type": "boolean"},
+        "i": {"type": "integer"},
+        "n": {"type": "number", "nullable": True},
+        "a": {"type": "array", "items": {"type": "number"}},
+        "o": {"type": "object", "nullable": True, "properties": {"{x}": {"type": "integer"}}}
+    }
+}
+
+ARRAY_SCHEMA = {"type": "array", "items": ROW_SCHEMA}
+
+VALID_ROW = {"s": "foo", "b": True, "i": 1, "n": 1.5, "a": [1, 2.0], "o": {"{x}": 3}}
+
+ROWS = [
+    VALID_ROW,
+    dict(VALID_ROW, n=None, o=None, a=[]),
+    dict(VALID_ROW, i=True),
+    dict(VALID_ROW, i=1.0),
+    dict(VALID_ROW, n=False),
+    dict(VALID_ROW, b=1),
+    dict(VALID_ROW, s=None),
+    dict(VALID_ROW, a=None),
+    dict(VALID_ROW, a=[1, "2"]),
+    dict(VALID_ROW, a=(1, 2)),
+    dict(VALID_ROW, o={}),
+    dict(VALID_ROW, o={"{x}": 1, "y": 2}),
+    dict(VALID_ROW, extra=1),
+    {k: v for k, v in VALID_ROW.items() if k != "s"},
+    "not a row",
+    None,
+]
+
+ENVELOPES = [
+    {},
+    {"correlation_id": "1A", "extra_data": {"foo": "bar"}},
+    {"correlation_id": ""},
+    {"correlation_id": 1},
+    {"model": {"name": "m", "version": "1"}},
+    {"model": {"name": "m"}},
+    {"model": {"name": "m", "version": ""}},
+    {"model": {"name": "m", "version": "1", "x": 1}},
+    {"extra_data": []},
+    {"deadline": 1700000000.5},
+    {"deadline": 1700000000},
+    {"deadline": "1700000000"},
+    {"deadline": True},
+    {"unknown": 1},
+]
+
+
+class TestSchemaCompiler(unittest.TestCase):
+
+    def _assert_same(self, reference, compiled, data):
+        try:
+            reference.validate(data)
+            expected = True
+        except SchemaError:
+            expected = False
+
+        try:
+            compiled.validate(data)
+            actual = True
+        except SchemaError as err:
+            actual = False
+            self.assertLess(len(err.code), 4 * MAX_REPR_LENGTH, "Error message is not bounded")
+
+        self.assertEqual(actual, expected, "Compiled schema disagrees on {!r}".format(data))
+
+    def test_request_schema(self):
+        print("Testing compiled request schemas")
+
+        for io_type in [ModelIOTypes.PYTHON_DICT, ModelIOTypes.PANDAS_DATA_FRAME]:
+            for input_schema in [ROW_SCHEMA, ARRAY_SCHEMA]:
+                reference = get_request_schema(input_schema, io_type)
+                compiled = compile_request_schema(input_schema, io_type)
+
+                for envelope in ENVELOPES:
+                    for row in ROWS:
+                        for X in [row, [row], [VALID_ROW, row], []]:
+                            self._assert_same(reference, compiled, dict(envelope, input=X))
+                self._assert_same(reference, compiled, "not a request")
+                self._assert_same(reference, compiled, {"correlation_id": "1A"})
+
+    def test_response_schema(self):
+        print("Testing compiled response schemas")
+
+        for include_correlation_id in [True, False]:
+            reference = get_response_schema(ARRAY_SCHEMA, ROW_SCHEMA, include_correlation_id=include_correlation_id)
+            compiled = compile_response_schema(ARRAY_SCHEMA, ROW_SCHEMA, include_correlation_id=include_correlation_id)
+
+            for envelope in ENVELOPES:
+                for row in ROWS:
+                    self._assert_same(reference, compiled, dict(envelope, input=[VALID_ROW], output=row))
+
+    def test_error_message(self):
+        print("Testing compiled schema error messages")
+
+        compiled = compile_request_schema(ARRAY_SCHEMA)
+        X = [VALID_ROW] * 10 + [dict(VALID_ROW, a=[0.0] * 10000)] + [dict(VALID_ROW, a=["x" * 10000])]
+
+        with self.assertRaises(SchemaError) as ctx:
+            compiled.validate({"input": X})
+        self.assertEqual(ctx.exception.code.split(" ")[1], "'input[11].a[0]'")
+        self.assertLess(len(ctx.exception.code), 4 * MAX_REPR_LENGTH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test offline file scoring"""
+import importlib
+import json
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from catwalk.helpers.configuration import app_config
+from catwalk.scoring import score, ScoringError
+from catwalk.scoring.files import read_chunks, open_writer, pyarrow
+
+# The score function shadows its module in catwalk.scoring
+score_module = importlib.import_module("catwalk.scoring.score")
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+MODEL_PATH = osp.join(EXAMPLES_PATH, "batch")
+
+INPUT_PROPERTIES = {"seed": {"type": "integer"}, "mu": {"type": "number"}, "ok": {"type": "boolean"},
+                    "tags": {"type": "array", "items": {"type": "string"}}}
+
+
+def _records(n):
+    return [{"seed": i, "seed_version": 1, "mu": 0.0, "sigma": 1.0} for i in range(n)]
+
+
+class TestFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_csv(self):
+        print("Testing CSV round trips with schema types")
+
+        path = osp.join(self.path, "a.csv")
+        rows = [{"seed": 1, "mu": 0.5, "ok": True, "tags": ["a"]}, {"seed": 2, "mu": 1.0, "ok": False, "tags": []}]
+        writer = open_writer(path, 0, INPUT_PROPERTIES)
+        position = writer.write(rows[:1])
+        writer.write([{"seed": 9, "mu": 0.0, "ok": True, "tags": []}])
+        writer.close()
+
+        # Resuming truncates the output to the position
+        writer = open_writer(path, position, INPUT_PROPERTIES)
+        writer.write(rows[1:])
+        writer.close()
+
+        self.assertEqual(list(read_chunks(path, 10, INPUT_PROPERTIES)), [rows])
+
+    def test_jsonl(self):
+        print("Testing JSON lines are read in chunks")
+
+        path = osp.join(self.path, "a.jsonl")
+        writer = open_writer(path)
+        writer.write(_records(5))
+        writer.close()
+
+        chunks = list(read_chunks(path, 2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual(chunks[2][0]["seed"], 4)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        print("Testing Parquet parts are combined")
+
+        path = osp.join(self.path, "a.parquet")
+        writer = open_writer(path)
+        writer.write(_records(3))
+        writer.write(_records(2))
+        writer.close()
+
+        self.assertFalse(osp.exists(path + ".parts"))
+        self.assertEqual([len(c) for c in read_chunks(path, 4)], [4, 1])
+
+    def test_unsupported(self):
+        print("Testing unsupported file types")
+
+        with self.assertRaises(ValueError):
+            read_chunks(osp.join(self.path, "a.xlsx"), 10)
+
+
+class TestScore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.input_path = osp.join(self.path, "in.jsonl")
+        with open(self.input_path, "w") as fp:
+            for row in _records(25):
+                fp.write(json.dumps(row) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        app_config.clear()
+
+    def _read(self, path):
+        with open(path, "r") as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_score(self):
+        print("Testing files are scored in order across processes")
+
+        expected = osp.join(self.path, "expected.jsonl")
+        r = score(MODEL_PATH, self.input_path, expected, chunk_size=10, processes=1)
+        self.assertEqual(r["rows"], 25)
+        self.assertEqual(r["chunks"], 3)
+
+        output_path = osp.join(self.path, "out.jsonl")
+        score(MODEL_PATH, self.input_path, output_path, chunk_size=4, processes=2)
+        self.assertEqual(self._read(output_path), self._read(expected))
+        self.assertFalse(osp.exists(output_path + ".checkpoint"))
+
+    def test_resume(self):
+        print("Testing a crashed job resumes from its checkpoint")
+
+        expected = osp.join(self.path, "expected.jsonl")
+        score(MODEL_PATH, self.input_path, expected, chunk_size=10, processes=1)
+
+        scored = []
+        score_chunk = score_module._score_chunk
+
+        def crash(args):
+            if args[0] == 2:
+                raise RuntimeError("crash")
+            scored.append(args[0])
+            return score_chunk(args)
+
+        output_path = osp.join(self.path, "out.jsonl")
+        with mock.patch.object(score_module, "_score_chunk", crash):
+            with self.assertRaises(RuntimeError):
+                score(MODEL_PATH, self.input_path, output_path, chunk_size=10, processes=1)
+        self.assertTrue(osp.exists(output_path + ".checkpoint"))
+
+        with mock.patch.object(score_module, "_score_chunk", crash):
+            scored.clear()
+            with self.assertRaises(RuntimeError):
+                score(MODEL_PATH, self.input_path, output_path, chunk_size=10, processes=1)
+            self.assertEqual(scored, [], "Checkpointed chunks were scored again")
+
+        r = score(MODEL_PATH, self.input_path, output_path, chunk_size=10, processes=1)
+        self.assertEqual(r["chunks"], 3)
+        self.assertEqual(self._read(output_path), self._read(expected))
+
+    def test_invalid(self):
+        print("Testing invalid input stops the job")
+
+        with open(self.input_path, "a") as fp:
+            fp.write(json.dumps({"seed": "a", "seed_version": 1, "mu": 0.0, "sigma": 1.0}) + "\n")
+
+        with self.assertRaises(ScoringError) as ctx:
+            score(MODEL_PATH, self.input_path, osp.join(self.path, "out.jsonl"), chunk_size=10, processes=2)
+        self.assertIn("chunk 2", str(ctx.exception))
+        self.assertIn("seed", str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
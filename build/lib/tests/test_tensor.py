@@ -0,0 +1,180 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test NUMPY_ARRAY models and their tensor payloads"""
+import base64
+import json
+import os.path as osp
+import unittest
+
+import msgpack
+import numpy as np
+from schema import SchemaError
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server import formats
+from catwalk.validation.schema import get_schema
+from catwalk.validation.tensor import TensorSpec, parse_shape, format_shape
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+SPEC = {"type": "tensor", "dtype": "float32", "shape": [None, 2]}
+
+
+class TestTensorSpec(unittest.TestCase):
+
+    def test_decode(self):
+        print("Testing tensors are decoded without copies")
+
+        spec = TensorSpec(SPEC)
+        data = np.arange(6, dtype="<f4").tobytes()
+
+        X = spec.decode({"data": base64.b64encode(data).decode("ascii"), "shape": [3, 2], "dtype": "float32"})
+        self.assertEqual(X.shape, (3, 2))
+        self.assertEqual(X.tolist(), [[0, 1], [2, 3], [4, 5]])
+        self.assertFalse(X.flags.writeable)
+
+        X = spec.decode({"data": data})
+        self.assertEqual(X.shape, (3, 2), "The variable dimension was not inferred")
+        self.assertTrue(np.shares_memory(X, np.frombuffer(data, np.uint8)), "The buffer was copied")
+
+    def test_decode_errors(self):
+        print("Testing invalid tensors are rejected")
+
+        spec = TensorSpec(SPEC)
+        data = np.arange(6, dtype="<f4").tobytes()
+        with self.assertRaisesRegex(SchemaError, "Key 'input.shape' error"):
+            spec.decode({"data": data, "shape": [2, 3]})
+        with self.assertRaisesRegex(SchemaError, "Key 'input.data' error: 24 bytes"):
+            spec.decode({"data": data, "shape": [2, 2]})
+        with self.assertRaisesRegex(SchemaError, "Key 'input.dtype' error"):
+            spec.decode({"data": data, "dtype": "float64"})
+        with self.assertRaisesRegex(SchemaError, "invalid base64"):
+            spec.decode({"data": "not base64!"})
+        with self.assertRaisesRegex(SchemaError, "Key 'input.shape' error: 20 bytes"):
+            spec.decode({"data": data[:20]})
+        with self.assertRaisesRegex(SchemaError, "Missing key: 'shape'"):
+            TensorSpec({"dtype": "uint8", "shape": [None, None]}).decode({"data": data})
+
+    def test_encode(self):
+        print("Testing tensors are encoded in their response form")
+
+        spec = TensorSpec(SPEC)
+        r = spec.encode(np.array([[1, 2]], dtype=np.float64))
+        self.assertEqual(r["dtype"], "float32")
+        self.assertEqual(r["shape"], [1, 2])
+        self.assertEqual(base64.b64decode(r["data"]), np.array([1, 2], dtype="<f4").tobytes())
+        self.assertEqual(spec.encode(np.zeros((1, 2)), binary=True)["data"], bytes(8))
+
+        with self.assertRaisesRegex(SchemaError, "Key 'output.shape' error"):
+            spec.encode(np.zeros(2))
+
+    def test_shapes(self):
+        print("Testing shapes are parsed and formatted")
+
+        self.assertEqual(parse_shape("3, 4"), [3, 4])
+        self.assertEqual(parse_shape(""), [])
+        self.assertEqual(format_shape((None, 4)), "?,4")
+        self.assertRaises(ValueError, parse_shape, "3,-1")
+        self.assertRaises(ValueError, parse_shape, "a")
+
+    def test_meta_schema(self):
+        print("Testing tensor schemas are valid model metadata")
+
+        meta = {
+            "name": "tensor", "version": "1", "contact": {"name": "a", "email": "b"}, "io_type": "NUMPY_ARRAY",
+            "schema": {"input": SPEC, "output": {"type": "tensor", "dtype": "int64", "shape": []}}
+        }
+        get_schema("meta").validate(meta)
+
+        meta["schema"]["output"]["dtype"] = "complex64"
+        self.assertRaises(SchemaError, get_schema("meta").validate, meta)
+
+
+class TestServerTensor(unittest.TestCase):
+
+    def setUp(self):
+        app_server.init(None, osp.join(EXAMPLES_PATH, "projection"))
+        self.client = app_server.app.test_client()
+        self.X, self.y = app_server.model.load_test_data()
+
+    def tearDown(self):
+        app_config.clear()
+
+    def test_json(self):
+        print("Testing tensors in JSON requests")
+
+        X = app_server.served.input_tensor.encode(self.X)
+        rv = self.client.post("/predict", json={"input": X})
+        self.assertEqual(rv.status_code, 200)
+        r = json.loads(rv.data)
+        self.assertEqual(r["input"], X)
+        self.assertEqual(r["output"]["shape"], [3, 2])
+        self.assertEqual(app_server.served.output_tensor.decode(r["output"]).tolist(), self.y.tolist())
+
+    def test_msgpack(self):
+        print("Testing tensors in MessagePack requests are bytes")
+
+        X = app_server.served.input_tensor.encode(self.X, binary=True)
+        rv = self.client.post("/predict", data=msgpack.packb({"input": X}), content_type="application/msgpack")
+        self.assertEqual(rv.status_code, 200)
+        r = msgpack.unpackb(rv.data, raw=False)
+        self.assertIsInstance(r["output"]["data"], bytes)
+        self.assertEqual(app_server.served.output_tensor.decode(r["output"]).tolist(), self.y.tolist())
+
+    def test_raw(self):
+        print("Testing raw tensor requests")
+
+        rv = self.client.post("/predict", data=self.X.tobytes(), content_type="application/octet-stream",
+                              headers={"Accept": "application/octet-stream", "X-Correlation-ID": "raw"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/octet-stream")
+        self.assertEqual(rv.headers[formats.SHAPE_HEADER], "3,2")
+        self.assertEqual(rv.headers[formats.DTYPE_HEADER], "float32")
+        self.assertEqual(rv.headers[formats.CORRELATION_ID_HEADER], "raw")
+        self.assertEqual(np.frombuffer(rv.data, "<f4").reshape(3, 2).tolist(), self.y.tolist())
+
+        # Raw requests can have JSON responses
+        rv = self.client.post("/predict", data=self.X.tobytes(), content_type="application/octet-stream",
+                              headers={formats.SHAPE_HEADER: "3,4", "Accept": "application/json"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/json")
+        self.assertEqual(json.loads(rv.data)["output"]["shape"], [3, 2])
+
+    def test_errors(self):
+        print("Testing invalid tensor requests are rejected")
+
+        rv = self.client.post("/predict", data=self.X.tobytes()[:-4], content_type="application/octet-stream")
+        self.assertEqual(rv.status_code, 400)
+
+        rv = self.client.post("/predict", data=self.X.tobytes(), content_type="application/octet-stream",
+                              headers={formats.SHAPE_HEADER: "x"})
+        self.assertEqual(rv.status_code, 400)
+
+        X = app_server.served.input_tensor.encode(self.X)
+        X["dtype"] = "float64"
+        rv = self.client.post("/predict", json={"input": X})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn("dtype", json.loads(rv.data)["output"]["message"])
+
+        rv = self.client.post("/predict", json={"input": self.X.tolist()})
+        self.assertEqual(rv.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,8 @@ import click
 
 from catwalk.cicd import test_model, test_server, build_prep, build, test_image, deploy_prep
 from catwalk.server import serve
+from catwalk.scoring import score, ScoringError
+from catwalk.utils import install_requirements
 
 
 def test_all(model_path="."):
@@ -94,6 +96,44 @@ def cli_test_server(**kwargs):
     return 0 if test_server(**kwargs) else 1
 
 
+@main.command(name="score")
+@model_options
+@click.option("--input", "-i", "input_path", required=True, type=click.Path(exists=True, dir_okay=False),
+              help="The file to score: .csv, .jsonl/.ndjson or .parquet.")
+@click.option("--output", "-o", "output_path", required=True, type=click.Path(dir_okay=False),
+              help="The file to write the results to: .csv, .jsonl/.ndjson or .parquet.")
+@click.option("--chunk-size", "-s", default=10000, show_default=True,
+              help="The number of rows validated and predicted at a time.")
+@click.option("--processes", "-n", default=None, type=int,
+              help="The number of worker processes. Defaults to the number of CPUs.")
+@click.option("--resume/--no-resume", default=True, show_default=True,
+              help="Specifies weather or not to resume from the checkpoint of an interrupted run.")
+@click.option("--progress-interval", default=10.0, show_default=True,
+              help="The minimum time, in seconds, between progress reports.")
+@click.option("--install-requirements/--no-install-requirements", default=True,
+              help="Specifies weather or not to install the model's requirements.txt first.")
+@click.option("--endpoints", "-e", default=None,
+              help="A comma separated list of model server URLs (e.g. http://host1:9090,http://host2:9090) to score "
+                   "on, instead of loading the model locally.")
+@click.option("--concurrency", default=2, show_default=True,
+              help="The number of requests in flight per endpoint.")
+@click.option("--retries", default=3, show_default=True,
+              help="The number of times a failed batch is retried on another endpoint.")
+@click.option("--timeout", default=60.0, show_default=True,
+              help="The timeout, in seconds, of requests to the endpoints.")
+def cli_score(**kwargs):
+    if kwargs["endpoints"]:
+        kwargs["endpoints"] = [e.strip() for e in kwargs["endpoints"].split(",") if e.strip()]
+    elif kwargs.pop("install_requirements") and install_requirements(kwargs["model_path"]) != 0:
+        return 1
+    kwargs.pop("install_requirements", None)
+    try:
+        score(**kwargs)
+    except (ScoringError, ValueError) as err:
+        raise click.ClickException(str(err))
+    return 0
+
+
 @main.command(name="build-prep")
 @model_options
 @server_options
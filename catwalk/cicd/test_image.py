@@ -47,6 +47,7 @@ from ..helpers.configuration import app_config
 
 from ..validation.schema import get_schema, get_response_schema
 from ..validation.model import ModelIOTypes
+from ..validation.tensor import TensorSpec
 from ..utils import get_docker_tag, get_model_class
 
 
@@ -176,6 +177,25 @@ class TestImage(unittest.TestCase):
 
         return data
 
+    @staticmethod
+    def _test_input(X_test, model_info):
+        io_type = ModelIOTypes.get_io_type(model_info)
+
+        if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            # Pandas models test all the data in records format
+            X_test = X_test.to_dict(orient="records")
+        elif io_type == ModelIOTypes.COLUMNAR:
+            # Columnar models test all the data, as lists
+            X_test = {name: list(column) for name, column in X_test.items()}
+        elif io_type == ModelIOTypes.NUMPY_ARRAY:
+            # Tensor models test all the data, base64 encoded
+            X_test = TensorSpec(model_info["schema"]["input"]).encode(X_test)
+        elif model_info["schema"]["input"]["type"] != "array":
+            # Batch models test all the data, non-batch models just use the first row
+            X_test = X_test[0]
+
+        return X_test
+
     def _test_predict(self, model_info):
         self.logger.info("Testing {} POST /predict".format(self.http))
 
@@ -185,16 +205,9 @@ class TestImage(unittest.TestCase):
 
         m = Model(self.model_path)
         X_test, y_test = m.load_test_data(self.model_path)
-
+        X_test = self._test_input(X_test, model_info)
         io_type = ModelIOTypes.get_io_type(model_info)
 
-        if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-            # Pandas models test all the data in records format
-            X_test = X_test.to_dict(orient="records")
-        elif model_info["schema"]["input"]["type"] != "array":
-            # Batch models test all the data, non-batch models just use the first row
-            X_test = X_test[0]
-
         request_data = {
             "correlation_id": "1A",
             "extra_data": {
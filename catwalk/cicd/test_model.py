@@ -38,6 +38,9 @@ import yaml
 from ..utils import get_model_class
 from ..validation.schema import to_schema, get_schema
 from ..validation.model import ModelIOTypes
+from ..validation.columnar import ColumnarSpec
+from ..validation.frame import FrameValidator
+from ..validation.tensor import TensorSpec
 from .base_test import BaseTest
 
 
@@ -86,7 +89,7 @@ class TestModel(BaseTest):
         requirements_exists = osp.exists(requirements_path)
 
         io_type = ModelIOTypes.get_io_type(self.meta)
-        requirements_is_required = (io_type == ModelIOTypes.PANDAS_DATA_FRAME)
+        requirements_is_required = io_type in (ModelIOTypes.PANDAS_DATA_FRAME, ModelIOTypes.NUMPY_ARRAY)
 
         if requirements_is_required:
             self.assertTrue(requirements_exists, "A requirements.txt file is necessary for this io_type")
@@ -105,6 +108,23 @@ class TestModel(BaseTest):
             self.assertTrue("pandas" in requirements,
                             "io_type: PANDAS_DATA_FRAME requires pandas to be present in your requirements.txt file.")
 
+        if io_type == ModelIOTypes.NUMPY_ARRAY:
+            self.assertTrue("numpy" in requirements,
+                            "io_type: NUMPY_ARRAY requires numpy to be present in your requirements.txt file.")
+
+    def _io_type_class(self, io_type):
+        if io_type == ModelIOTypes.PYTHON_DICT:
+            return list
+        elif io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            import pandas as pd
+            return pd.DataFrame
+        elif io_type == ModelIOTypes.NUMPY_ARRAY:
+            import numpy as np
+            return np.ndarray
+        elif io_type == ModelIOTypes.COLUMNAR:
+            return dict
+        self.fail("Unsupported IO type: " + io_type)
+
     def _test_model_interface(self):
         self.logger.info("Test model interface")
 
@@ -125,30 +145,28 @@ class TestModel(BaseTest):
         X_test, y_test = m.load_test_data(self.model_path)
 
         io_type = ModelIOTypes.get_io_type(self.meta)
-
-        if io_type == ModelIOTypes.PYTHON_DICT:
-            _type = list
-        elif io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-            import pandas as pd
-            _type = pd.DataFrame
-        else:
-            self.fail("Unsupported IO type: " + io_type)
+        _type = self._io_type_class(io_type)
 
         self.assertIsInstance(X_test, _type)
         self.assertIsInstance(y_test, _type)
+        if io_type == ModelIOTypes.COLUMNAR:
+            self._validate_columns(X_test, y_test, m)
+            return m
         self.assertEqual(len(X_test), len(y_test))
 
         self.logger.info("Test using the provided test data")
 
-        # Create schemas from validation file
-        in_schema = self.meta["schema"]["input"]
-        if io_type == ModelIOTypes.PANDAS_DATA_FRAME and in_schema["type"] == "object":
-            in_schema = {"type": "array", "items": in_schema}
-        in_schema = to_schema(in_schema)
-        out_schema = self.meta["schema"]["output"]
-        if io_type == ModelIOTypes.PANDAS_DATA_FRAME and out_schema["type"] == "object":
-            out_schema = {"type": "array", "items": out_schema}
-        out_schema = to_schema(out_schema)
+        if io_type == ModelIOTypes.NUMPY_ARRAY:
+            self._validate_tensors(X_test, y_test, m)
+            return m
+
+        # Create schemas from validation file, DataFrames are validated a column at a time
+        if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+            in_schema = FrameValidator(self.meta["schema"]["input"], "input")
+            out_schema = FrameValidator(self.meta["schema"]["output"], "output")
+        else:
+            in_schema = to_schema(self.meta["schema"]["input"])
+            out_schema = to_schema(self.meta["schema"]["output"])
 
         # Validate model I/O
         if io_type == ModelIOTypes.PANDAS_DATA_FRAME or self.meta["schema"]["input"]["type"] == "array":
@@ -161,37 +179,27 @@ class TestModel(BaseTest):
         return m
 
     def _validate(self, X, y, in_schema, out_schema, model, io_type=ModelIOTypes.PYTHON_DICT):
-        if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-            X_dict = X.to_dict(orient="records")
-            y_dict = y.to_dict(orient="records")
-        else:
-            X_dict = X
-            y_dict = y
-
         r = None
-        r_dict = None
 
         # Validate against schemas
         try:
-            in_schema.validate(X_dict)
-            out_schema.validate(y_dict)
+            in_schema.validate(X)
+            out_schema.validate(y)
 
             # Call predict
             r = model.predict(X)
-            if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-                r_dict = r.to_dict(orient="records")
-            else:
-                r_dict = r
-
-            out_schema.validate(r_dict)
+            out_schema.validate(r)
 
             # Check model gives the expected answer
-            self.assertEqual(r_dict, y_dict)
+            if io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+                self.assertEqual(r.to_dict(orient="records"), y.to_dict(orient="records"))
+            else:
+                self.assertEqual(r, y)
         except SchemaError as err:
             self.logger.error("Expected input/output schema validation failed")
-            self.logger.error("Input:", X_dict)
-            self.logger.error("Output:", y_dict)
-            self.logger.error("Result:", r_dict)
+            self.logger.error("Input: %s", X)
+            self.logger.error("Output: %s", y)
+            self.logger.error("Result: %s", r)
             self.fail(err)
         except AssertionError as e:
             self.logger.error("Result is not what was expected")
@@ -199,6 +207,55 @@ class TestModel(BaseTest):
             self.logger.error(y)
             raise e
 
+    def _validate_columns(self, X, y, model):
+        self.logger.info("Test using the provided test data")
+
+        in_spec = ColumnarSpec(self.meta["schema"]["input"], "input")
+        out_spec = ColumnarSpec(self.meta["schema"]["output"], "output")
+
+        # Validate against the column specs
+        try:
+            X = in_spec.decode(X)
+            y = out_spec.decode(y)
+            self.assertEqual(in_spec.length(X), out_spec.length(y),
+                             "Test data should have one output row per input row")
+
+            # Call predict
+            r = out_spec.decode(model.predict(X))
+        except SchemaError as err:
+            self.logger.error("Expected input/output column validation failed")
+            self.fail(err)
+
+        # Check model gives the expected answer
+        self.assertDictEqual({k: list(v) for k, v in r.items()}, {k: list(v) for k, v in y.items()},
+                             "Result is not what was expected")
+
+    def _validate_tensors(self, X, y, model):
+        for key in ["input", "output"]:
+            self.assertEqual(self.meta["schema"][key]["type"], "tensor",
+                             "io_type: NUMPY_ARRAY requires tensor {} schemas".format(key))
+        in_spec = TensorSpec(self.meta["schema"]["input"])
+        out_spec = TensorSpec(self.meta["schema"]["output"])
+
+        # Validate against the tensor specs
+        try:
+            self.assertEqual(X.dtype, in_spec.dtype, "Input dtype should be " + in_spec.dtype_name)
+            self.assertEqual(y.dtype, out_spec.dtype, "Output dtype should be " + out_spec.dtype_name)
+            in_spec.check_shape(X.shape, "input")
+            out_spec.check_shape(y.shape, "output")
+
+            # Call predict, on a read-only input as the server does
+            X = X.copy()
+            X.flags.writeable = False
+            r = out_spec.conform(model.predict(X))
+        except SchemaError as err:
+            self.logger.error("Expected input/output tensor validation failed")
+            self.fail(err)
+
+        # Check model gives the expected answer
+        self.assertEqual(r.shape, y.shape, "Result has the wrong shape")
+        self.assertTrue((r == y).all(), "Result is not what was expected:\n{}\n{}".format(r, y))
+
 
 def test_model(model_path="."):
     suite = unittest.TestSuite()
@@ -64,12 +64,13 @@ class ApplicationConfig(dict):
         """
         split_keys = key.split(delimiter)
         r = self
-        for k in split_keys:
-            at_end = k == split_keys[-1]
-            v = r.get(k, value if at_end else {})
-            r[k] = v
-            if isinstance(v, dict):
-                r = v
+        for k in split_keys[:-1]:
+            v = r.get(k)
+            if not isinstance(v, dict):
+                v = {}
+                r[k] = v
+            r = v
+        r[split_keys[-1]] = value
 
 
 app_config = ApplicationConfig()
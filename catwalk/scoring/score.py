@@ -0,0 +1,291 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Offline bulk scoring of CSV, JSON lines and Parquet files.
+
+The input file is read in chunks, and each chunk is validated against the model.yml input schema and predicted by a
+pool of worker processes (each of which loads the model once). Results are written to the output file in input order
+as they complete. After each chunk is written, a checkpoint file records how far the job got, so a job that crashed
+or was killed resumes where it stopped.
+"""
+import collections
+import json
+import multiprocessing
+import os
+import os.path as osp
+import tempfile
+import time
+
+from schema import SchemaError
+import yaml
+
+from ..helpers.logging import get_logger_from_app_config
+from ..validation.compiler import compile_records_schema
+from .coordinator import Coordinator, EndpointError
+from .files import read_chunks, open_writer, record_properties
+
+# The server app module (with the model loaded), input validator and model loading error of this (worker) process
+_app = None
+_records_schema = None
+_init_error = None
+
+
+class ScoringError(Exception):
+    """Raised when a scoring job cannot continue, e.g. on invalid input."""
+    pass
+
+
+def _init_worker(model_path):
+    """Loads the model into this process, as the server does.
+    Errors are raised by _score_chunk, as a pool restarts workers whose initializer fails forever."""
+    global _app, _records_schema, _init_error
+    from ..server import app as app_server
+
+    app_server.init(None, model_path)
+    if app_server.model is None:
+        _init_error = ScoringError("Unable to load model: {}".format(model_path))
+        return
+    _app = app_server
+    _records_schema = compile_records_schema(app_server.model.info["schema"]["input"])
+
+
+def _as_records(rows):
+    """Wraps results that are not records (e.g. numbers), so they can be written to any file format."""
+    return [row if isinstance(row, dict) else {"output": row} for row in rows]
+
+
+def _score_chunk(args):
+    """Validates and predicts a chunk of records.
+
+    :param (int, list) args: The chunk number and its records.
+    :return (int, list): The chunk number and its results.
+    """
+    n, rows = args
+    if _init_error is not None:
+        raise _init_error
+
+    try:
+        _records_schema.validate(rows)
+    except SchemaError as err:
+        raise ScoringError("Invalid input in chunk {}: {}".format(n, err.code))
+
+    if _app.model.is_batch:
+        r = _app.predict_input(rows)
+    else:
+        r = [_app.predict_input(row) for row in rows]
+
+    if len(r) != len(rows):
+        raise ScoringError("Chunk {}: predict returned {} rows for {} input rows".format(n, len(r), len(rows)))
+    return n, _as_records(r)
+
+
+class Checkpoint(object):
+    """The progress of a scoring job, saved next to its output file.
+
+    :param str path: The checkpoint file.
+    :param str input_path: The input file of the job.
+    :param int chunk_size: The chunk size of the job.
+    """
+
+    def __init__(self, path, input_path, chunk_size):
+        self.path = path
+        stat = os.stat(input_path)
+        self.job = {
+            "input": osp.abspath(input_path),
+            "input_size": stat.st_size,
+            "input_mtime": stat.st_mtime,
+            "chunk_size": chunk_size
+        }
+        self.chunks = 0
+        self.rows = 0
+        self.position = 0
+
+    def load(self) -> bool:
+        """Loads the checkpoint, if it exists and was saved by the same job (i.e. input file and chunk size).
+
+        :return bool: True if the job can be resumed from the checkpoint.
+        """
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("job") != self.job:
+            return False
+        self.chunks = data["chunks"]
+        self.rows = data["rows"]
+        self.position = data["position"]
+        return True
+
+    def save(self):
+        """Atomically saves the checkpoint."""
+        fd, tmp_path = tempfile.mkstemp(dir=osp.dirname(osp.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"job": self.job, "chunks": self.chunks, "rows": self.rows, "position": self.position}, fp)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class Progress(object):
+    """Logs the progress and throughput of a scoring job at most every interval seconds.
+
+    :param Logger logger:
+    :param float interval: The minimum time, in seconds, between reports.
+    :param int rows: The number of rows scored before this run (when resuming).
+    """
+
+    def __init__(self, logger, interval=10.0, rows=0):
+        self.logger = logger
+        self.interval = float(interval)
+        self.initial_rows = rows
+        self.rows = rows
+        self.started = time.perf_counter()
+        self._reported = self.started
+
+    @property
+    def rate(self) -> float:
+        return (self.rows - self.initial_rows) / max(time.perf_counter() - self.started, 1e-9)
+
+    def update(self, rows):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            self.report()
+
+    def report(self):
+        self.logger.info("Scored %d rows (%.0f rows/s)", self.rows, self.rate)
+
+
+def _load_info(model_path):
+    with open(osp.join(model_path, "model.yml"), "r") as fp:
+        return yaml.safe_load(fp)
+
+
+def _score_chunks(chunks, processes, model_path):
+    """Scores (chunk number, records) tuples, yielding the results in order. At most two chunks per process are in
+    flight, so memory use does not grow with the size of the input."""
+    if processes == 1:
+        _init_worker(model_path)
+        for chunk in chunks:
+            yield _score_chunk(chunk)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker, (model_path,))
+    try:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_score_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while len(pending) > 0:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _score_remote(chunks, coordinator, info):
+    """Scores (chunk number, records) tuples on model servers, yielding the results in order."""
+    try:
+        for n, r in coordinator.score_chunks(chunks, info):
+            yield n, _as_records(r)
+    except (EndpointError, ValueError) as err:
+        raise ScoringError(str(err))
+
+
+def score(model_path=".", input_path=None, output_path=None, chunk_size=10000, processes=None, resume=True,
+          progress_interval=10.0, endpoints=None, concurrency=2, retries=3, timeout=60.0) -> dict:
+    """Scores an input file with a model, writing the results to an output file.
+    The file formats are taken from the file extensions: .csv, .jsonl/.ndjson or .parquet/.pq.
+
+    If endpoints are given, the chunks are scored by those model servers instead of a local process pool, and the
+    model is not loaded locally.
+
+    :param str model_path: The model directory.
+    :param str input_path: The input file.
+    :param str output_path: The output file.
+    :param int chunk_size: The number of records per chunk.
+    :param int processes: The number of worker processes, defaults to the number of CPUs.
+    :param bool resume: Resume from the checkpoint of a previous run of the same job, if there is one.
+    :param float progress_interval: The minimum time, in seconds, between progress reports.
+    :param list endpoints: The base URLs of model servers to score on.
+    :param int concurrency: The number of requests in flight per server.
+    :param int retries: The number of times a chunk is retried on another server.
+    :param float timeout: The socket timeout of requests to the servers, in seconds.
+    :return dict: The number of rows and chunks scored, and the throughput.
+    :raises ScoringError: If the input is invalid or the model fails.
+    """
+    logger = get_logger_from_app_config(__name__)
+    model_path = osp.abspath(model_path)
+    chunk_size = max(int(chunk_size), 1)
+    processes = max(int(processes or os.cpu_count() or 1), 1)
+
+    coordinator = None
+    if endpoints:
+        coordinator = Coordinator(endpoints, concurrency, retries, timeout)
+        try:
+            info = coordinator.info()
+        except ValueError as err:
+            raise ScoringError(str(err))
+    else:
+        info = _load_info(model_path)
+
+    checkpoint = Checkpoint(output_path + ".checkpoint", input_path, chunk_size)
+    if resume and checkpoint.load():
+        logger.info("Resuming from chunk %d (%d rows) of %s", checkpoint.chunks, checkpoint.rows, input_path)
+
+    # Chunks before the checkpoint are read, but not scored again
+    chunks = read_chunks(input_path, chunk_size, record_properties(info["schema"]["input"]))
+    chunks = ((n, rows) for n, rows in enumerate(chunks) if n >= checkpoint.chunks)
+
+    writer = open_writer(output_path, checkpoint.position, record_properties(info["schema"]["output"]))
+    progress = Progress(logger, progress_interval, checkpoint.rows)
+
+    if coordinator is None:
+        logger.info("Scoring %s with %d processes", input_path, processes)
+        results = _score_chunks(chunks, processes, model_path)
+    else:
+        logger.info("Scoring %s on %d endpoints", input_path, len(coordinator.endpoints))
+        results = _score_remote(chunks, coordinator, info)
+
+    try:
+        for n, rows in results:
+            checkpoint.position = writer.write(rows)
+            checkpoint.chunks = n + 1
+            checkpoint.rows += len(rows)
+            checkpoint.save()
+            progress.update(len(rows))
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close()
+    checkpoint.remove()
+    progress.report()
+    r = {"rows": progress.rows, "chunks": checkpoint.chunks, "rows_per_second": progress.rate}
+    if coordinator is not None:
+        r.update(coordinator.stats())
+        logger.info("Endpoint requests: %s, retries: %d", r["endpoints"], r["retries"])
+    return r
@@ -19,28 +19,75 @@
 The app module of catwalk, defines and instantiates the main flask app.
 Contains decorated flask functions, see help on each function for details.
 """
-import json
 import yaml
+import gc
 import logging
-import copy
+import os
 import os.path as osp
+import tempfile
+import time
 from uuid import uuid4
 
-from flask import Flask, Response, request
-from werkzeug.exceptions import BadRequest
+from flask import Flask, Response, g, has_app_context, request, stream_with_context
 from schema import SchemaError
 
 from ..utils import get_model_class
 from ..helpers.configuration import app_config
 from ..helpers.logging import get_logger_from_app_config
 
-from ..validation.schema import get_request_schema
-from ..validation.model import is_loaded_model, ModelIOTypes
+from ..validation.compiler import compile_envelope_schema
+from ..validation.model import is_loaded_model, is_batch_model, ModelIOTypes
+from ..validation.columnar import ColumnarSpec
+from .admission import AdmissionControl, ConcurrencyLimit, InputBudget, DeadlineExceeded, Overloaded, InputTooLarge, \
+    check_deadline, tighten_deadline, expiring, current_deadline, predicted
+from .batching import BatchScheduler
+from .cache import ResultCache
+from .coalescing import SingleFlight
+from .codec import get_codec
+from .dedup import Deduplicator
+from .engine import ModelEngine, EngineClient, EngineBusy, EngineError, RemoteModel, ENGINE_PATH_ENV, \
+    DEFAULT_THRESHOLD, DEFAULT_BACKLOG
+from .formats import get_formats, request_format, response_format, is_arrow_table, ArrowFormat, JSONFormat, \
+    TensorFormat
+from .hashing import canonical_hash, row_hashes, model_namespace
+from .idempotency import get_backend, idempotency_key, DONE, PENDING
+from .metrics import ServerMetrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .orient import RECORDS, COLUMNS, to_data_frame, from_data_frame, batch_rows
+from .memory import read_memory, format_memory
+from .offload import PredictPool, PredictPoolFull, native_scope, in_native_scope, run_native
+from .registry import ServedModel, ModelRegistry, find_models
+from .lanes import LaneScheduler, get_lanes, lane_scope, current_lane
+from .jobs import JobManager, JobStore, JobQueueFull, DONE as JOB_DONE, FAILED as JOB_FAILED
+from .rows import is_data_frame, take_rows, split_rows, join_rows
+from .streaming import stream_predictions, NDJSON_MIMETYPE
+from .timing import StageTimer
+from .workers import available_cpus, get_profile, parse_memory
 
 # Init Flask app
 app = Flask(__name__)
 model = None
-in_schema = None
+# The model the server was started with, with its validators @see catwalk.server.registry
+served = None
+envelope_schema = compile_envelope_schema()
+formats = get_formats(get_codec())
+registry = None
+batcher = None
+cache = None
+coalescer = None
+idempotency = None
+deduplicator = None
+jobs = None
+metrics = None
+predict_pool = None
+engine = None
+admission = AdmissionControl()
+codec = get_codec()
+
+# The (model path, model, load time) loaded by preload in the gunicorn master, shared by the workers it forks
+preloaded = None
+
+# Pre-serialised response bodies
+static_bodies = {}
 
 # Default to Flask's logger
 logger = app.logger
@@ -54,11 +101,10 @@ def json_response(response_data, status_code=200) -> Response:
     :param int status_code: The HTTP status code.
     :return Response: the HTTP response object.
     """
-    if status_code != 200:
+    if status_code >= 400:
         logger.error("Returning code {} with message {}".format(status_code, response_data["output"]["message"]))
 
-    json_str = json.dumps(response_data)
-    return Response(json_str, status_code, mimetype="application/json")
+    return Response(codec.dumps(response_data), status_code, mimetype="application/json")
 
 
 def api_error(message, status_code=500, request_data=None) -> Response:
@@ -69,14 +115,83 @@ def api_error(message, status_code=500, request_data=None) -> Response:
     :param dict request_data: Optional request data that was sent (this may be empty for e.g. a 400 Bad Request).
     :return Response: the HTTP response object.
     """
-    if request_data is not None:
-        response = copy.deepcopy(request_data)
-    else:
-        response = {}
+    # A shallow copy is enough, as we only replace the "output" key
+    response = dict(request_data) if request_data is not None else {}
     response["output"] = {"message": message}
     return json_response(response, status_code)
 
 
+def static_error(message, status_code=500) -> Response:
+    """Returns the same response as api_error without request data, from a pre-serialised body.
+    Only use this for fixed messages, as every message is cached.
+
+    :param str message: The error message to return.
+    :param int status_code: The HTTP status code.
+    :return Response: the HTTP response object.
+    """
+    body = static_bodies.get(message)
+    if body is None:
+        body = codec.dumps({"output": {"message": message}})
+        static_bodies[message] = body
+
+    logger.error("Returning code {} with message {}".format(status_code, message))
+    return Response(body, status_code, mimetype="application/json")
+
+
+def current():
+    """Returns the model the current request is routed to @see route_request
+
+    :return ServedModel:
+    """
+    if registry is not None and has_app_context():
+        return g.get("served", served)
+    return served
+
+
+def validate_request(data):
+    """Validates request data against the model's request schema.
+
+    Arrow requests hold the input as a table, and column oriented requests hold it as columns, so their envelope and
+    input are validated separately. Arrow inputs are converted to the DataFrame the model is given, and validated
+    as such.
+
+    :param dict data: The request data.
+    :raises SchemaError: If the data is invalid.
+    """
+    s = current()
+    orient = data.get("orient", RECORDS) if isinstance(data, dict) else RECORDS
+    if isinstance(data, dict) and is_arrow_table(data.get("input")):
+        envelope_schema.validate(data)
+        data["input"] = s.frame_input.validate(ArrowFormat.to_data_frame(data["input"]))
+    elif orient in s.orient_schemas:
+        envelope_schema.validate(data)
+        s.orient_schemas[orient].validate(data["input"])
+    elif orient != RECORDS and isinstance(orient, str):
+        raise SchemaError("Key 'orient' error: {!r} is only supported by PANDAS_DATA_FRAME models".format(orient))
+    elif s.columnar_input is not None:
+        validate_columnar(data)
+    else:
+        s.in_schema.validate(data)
+        if s.input_tensor is not None:
+            # NUMPY_ARRAY models: the shape and dtype are checked as the input is decoded
+            data["input"] = s.input_tensor.decode(data["input"])
+
+
+def validate_columnar(data):
+    """Validates a request to a COLUMNAR model. The input is a dict of columns, which is decoded into typed columns as
+    it is validated, or a list of records.
+
+    :param dict data: The request data.
+    :raises SchemaError: If the data is invalid.
+    """
+    s = current()
+    envelope_schema.validate(data)
+    if isinstance(data["input"], list):
+        s.records_schema.validate(data["input"])
+    else:
+        data["input"] = s.columnar_input.decode(data["input"])
+
+
 def ensure_correlation_id(data):
     """Checks for a "correlation_id" key and generates one if it doesn't exist.
 
@@ -98,6 +213,238 @@ def ensure_model(data):
         }
 
 
+def to_model_input(X, orient=RECORDS):
+    """Converts the "input" of a request to the form the model's predict method expects.
+
+    :param dict|list|DataFrame X: The request input.
+    :param str orient: The orientation of the input @see PayloadOrients.
+    :return (object, bool): The model input, and whether a single dict was received.
+    """
+    if is_data_frame(X):
+        return X, False
+
+    if orient != RECORDS:
+        return to_data_frame(X, orient, pd), False
+
+    # PANDAS_DATA_FRAME mode supports receiving data as a dict OR a list
+    did_receive_dict = isinstance(X, dict) or X is None
+    if current().model.io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+        if did_receive_dict:
+            X = [X]
+        X = pd.DataFrame.from_dict(X)
+    return X, did_receive_dict
+
+
+def from_model_output(r, did_receive_dict, as_records=True, orient=RECORDS):
+    """Converts the result of the model's predict method to the "output" of a response.
+
+    :param r: The model output.
+    :param bool did_receive_dict: Whether the request input was a single dict.
+    :param bool as_records: If False, DataFrame outputs are returned as they are, e.g. for Arrow responses.
+    :param str orient: The orientation of the output, the same as the input's @see PayloadOrients.
+    :return dict|list|DataFrame: The response output.
+    """
+    s = current()
+    if s.output_tensor is not None:
+        return s.output_tensor.conform(r)
+
+    if s.columnar_output is not None:
+        return s.columnar_output.decode(r)
+
+    if s.frame_output is not None:
+        s.frame_output.validate(r)
+
+    if s.model.io_type == ModelIOTypes.PANDAS_DATA_FRAME and as_records and orient != RECORDS:
+        return from_data_frame(r, orient)
+
+    if s.model.io_type == ModelIOTypes.PANDAS_DATA_FRAME and as_records:
+        r = r.to_dict(orient="records")
+
+        # PANDAS_DATA_FRAME mode supports receiving data as a dict OR a list
+        # `to_dict(orient="records")` will always return a list, so if we received a dict, we want to convert the output
+        if did_receive_dict:
+            # return the last result if we received a dict
+            r = r[-1]
+    return r
+
+
+def predict_input(X, as_records=True, timer=None, orient=RECORDS):
+    """Predicts the "input" of a request and returns the "output" of the response.
+
+    :param dict|list|pyarrow.Table X: The request input.
+    :param bool as_records: If False, DataFrame outputs are returned as they are.
+    :param StageTimer timer: Optionally times the convert and predict stages.
+    :param str orient: The orientation of the input and output @see PayloadOrients.
+    :return dict|list|DataFrame: The response output.
+    """
+    s = current()
+    if s.columnar_input is not None and isinstance(X, list):
+        # COLUMNAR models predict records (e.g. streamed or scored rows) as columns, and return records
+        return s.columnar_output.to_records(predict_input(s.columnar_input.from_records(X), as_records, timer))
+
+    X, did_receive_dict = to_model_input(X, orient)
+    if timer is not None:
+        timer.lap("convert")
+    r = run_predict(X)
+    if timer is not None:
+        timer.lap("predict")
+    r = from_model_output(r, did_receive_dict, as_records, orient)
+    if timer is not None:
+        timer.lap("convert")
+    return r
+
+
+def run_predict(X):
+    """Runs the model's predict method, via the result cache and batch scheduler if they are enabled.
+    Only the default model's predictions are cached.
+
+    :param X: The model input.
+    :return: The model output.
+    """
+    if cache is None or current() is not served:
+        return predict_uncached(X)
+
+    if model.is_batch and served.columnar_input is None:
+        return predict_rows_cached(X)
+
+    key = canonical_hash(X, model_namespace(model.info))
+    hit, r = cache.get(key)
+    if not hit:
+        r = predict_uncached(X)
+        cache.put(key, r)
+    return r
+
+
+def predict_rows_cached(X):
+    """Predicts a batch via the result cache, row by row: only the rows that miss the cache are predicted.
+
+    :param list|DataFrame X: The model input.
+    :return list|DataFrame: The model output.
+    """
+    keys = row_hashes(X, model_namespace(model.info))
+    results = [None] * len(keys)
+    missing = []
+    for i, key in enumerate(keys):
+        hit, results[i] = cache.get(key)
+        if not hit:
+            missing.append(i)
+
+    if len(missing) > 0:
+        r = predict_uncached(X if len(missing) == len(keys) else take_rows(X, missing))
+        r = split_rows(r)
+        if len(r) != len(missing):
+            raise ValueError("Predict returned {} rows for {} input rows".format(len(r), len(missing)))
+        for i, value in zip(missing, r):
+            results[i] = value
+            cache.put(keys[i], value)
+
+    return join_rows(results, model.io_type == ModelIOTypes.PANDAS_DATA_FRAME)
+
+
+def predict_uncached(X):
+    """Runs the model's predict method on the unique rows of X, if deduplication is enabled.
+
+    :param X: The model input.
+    :return: The model output.
+    """
+    if deduplicator is not None and current() is served:
+        return deduplicator.predict(X, predict_model)
+    return predict_model(X)
+
+
+def predict_model(X):
+    """Runs the model's predict method, via the batch scheduler if batching is enabled. Successful calls mark the
+    request as predicted, so its latency adapts the concurrency limit.
+
+    :param X: The model input.
+    :return: The model output.
+    :raises DeadlineExceeded: If the request's deadline has passed.
+    """
+    check_deadline()
+    # Jobs predict large batches, which are not batched with requests @see run_job
+    if batcher is not None and current() is served and not in_native_scope():
+        r = batcher.submit(X)
+    else:
+        r = call_model(X)
+    predicted()
+    return r
+
+
+def call_model(X):
+    """Calls the model's predict method, in the predict pool if it is enabled, or in a native thread in a native_scope.
+
+    :param X: The model input.
+    :return: The model output.
+    :raises PredictPoolFull: If the predict pool's queue is full.
+    :raises DeadlineExceeded: If the request's deadline passes while it waits for the predict pool.
+    """
+    m = current().model
+    if predict_pool is not None:
+        return predict_pool.run(expiring(m.predict), X, current_lane())
+    if in_native_scope():
+        return run_native(m.predict, X)
+    return m.predict(X)
+
+
+@app.errorhandler(PredictPoolFull)
+@app.errorhandler(EngineBusy)
+def predict_queue_full(err) -> Response:
+    """Rejects requests when the predict pool's queue or the model engine's backlog is full, so they can be retried
+    (e.g. on another replica).
+
+    :param PredictPoolFull|EngineBusy err:
+    :return Response:
+    """
+    response = static_error("Predict queue is full.", 503)
+    response.headers["Retry-After"] = str(app_config.get_nested("server.predict_pool.retry_after", 1))
+    return response
+
+
+@app.errorhandler(EngineError)
+def engine_error(err) -> Response:
+    """Answers requests whose predict failed in the model engine (the model raised an exception, its process crashed,
+    or it timed out) with a JSON error.
+
+    :param EngineError err:
+    :return Response:
+    """
+    if err.details is not None:
+        logger.error("Model engine error: %s", err.details)
+    return api_error("Model engine error: {}".format(err), 500)
+
+
+@app.errorhandler(Overloaded)
+def overloaded(err) -> Response:
+    """Rejects requests over the concurrency limit or the input budget, so they can be retried.
+
+    :param Overloaded err:
+    :return Response:
+    """
+    response = static_error("Server is overloaded.", 503)
+    response.headers["Retry-After"] = str(app_config.get_nested("server.admission.retry_after", 1))
+    return response
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(err) -> Response:
+    """Answers requests whose deadline has passed, without predicting them.
+
+    :param DeadlineExceeded err:
+    :return Response:
+    """
+    return static_error("Request deadline exceeded.", 504)
+
+
+@app.errorhandler(InputTooLarge)
+def input_too_large(err) -> Response:
+    """Rejects requests whose estimated input is larger than the input budget.
+
+    :param InputTooLarge err:
+    :return Response:
+    """
+    return static_error("Request input is too large.", 413)
+
+
 @app.route("/info")
 def info() -> Response:
     """The info end-point, returns metadata about the loaded model.
@@ -105,14 +452,83 @@ def info() -> Response:
     """
     logger.info("Info message received")
     if model is None:
-        return api_error("No model loaded.")
+        return static_error("No model loaded.")
+
+    return Response(served.info_body, 200, mimetype="application/json")
+
+
+@app.route("/models")
+def models() -> Response:
+    """The models end-point, lists the models the server can serve, and whether they are loaded.
+
+    :return Response:
+    """
+    if model is None:
+        return static_error("No model loaded.")
+
+    listed = registry.list() if registry is not None else []
+    if not any(m["name"] == model.info["name"] and m["version"] == model.info["version"] for m in listed):
+        listed.insert(0, {"name": model.info["name"], "version": model.info["version"], "loaded": True})
+    return json_response({"models": listed})
 
-    return json_response(model.info)
+
+def route_request(data, fmt):
+    """Routes a request to the model named by its "model" key, loading it if it is not loaded @see ModelRegistry
+    Requests without a "model" key are routed to the default model.
+
+    :param dict data: The decoded request data.
+    :param fmt: The wire format of the request.
+    :return Response: An error response, or None if the request was routed.
+    """
+    s = served
+    requested = data.get("model") if isinstance(data, dict) else None
+    if registry is not None and isinstance(requested, dict) and \
+            isinstance(requested.get("name"), str) and isinstance(requested.get("version"), str) and \
+            (requested["name"], requested["version"]) != (model.info["name"], model.info["version"]):
+        s = registry.get(requested["name"], requested["version"])
+        if s is None:
+            return api_error("Model not found.", 404, data)
+
+    if not any(type(f) is type(fmt) for f in s.formats):
+        return static_error("Invalid POST data: unsupported Content-Type.", 415)
+    g.served = s
+
+
+def parse_request():
+    """Negotiates the format of the request body, then parses and validates it.
+
+    :return (Format, dict, Response): The request format and data, or an error response.
+    """
+    fmt = request_format(formats, request.mimetype)
+    if fmt is None:
+        return None, None, static_error("Invalid POST data: unsupported Content-Type.", 415)
+
+    # Time the stages of the request, see record_request
+    timer = g.timer = StageTimer()
+    try:
+        # Try to parse the body
+        data = fmt.decode(request.get_data(cache=False))
+        if isinstance(fmt, TensorFormat):
+            fmt.read_headers(data, request.headers)
+        timer.lap("parse")
+        error = route_request(data, fmt)
+        if error is not None:
+            return fmt, None, error
+        # Try to validate the input data
+        validate_request(data)
+        timer.lap("validate")
+    except ValueError:
+        return fmt, None, static_error("Invalid POST data: {} parse error.".format(fmt.name), 400)
+    except SchemaError as err:
+        return fmt, None, api_error("Invalid POST data: " + err.code, 400)
+
+    return fmt, data, None
 
 
 @app.route("/predict", methods=["POST"])
 def predict() -> Response:
     """The predict end-point, validates and runs the predict method on the loaded model.
+    Requests are admitted by admission control first @see catwalk.server.admission
 
     :return Response:
     """
@@ -120,54 +536,344 @@ def predict() -> Response:
 
     # Early exit if no model is loaded
     if model is None:
-        return api_error("No model loaded.")
+        return static_error("No model loaded.")
 
     try:
-        # Try to parse the JSON body
-        data = request.get_json()
-        # Try to validate the input data
-        in_schema.validate(data)
-    except BadRequest:
-        return api_error("Invalid POST data: JSON parse error.", 400)
-    except SchemaError as err:
-        return api_error("Invalid POST data: " + err.code, 400)
+        deadline = admission.deadline(request.headers)
+    except ValueError:
+        return static_error("Invalid deadline header.", 400)
+    expansion = getattr(request_format(formats, request.mimetype), "expansion", 1)
+    with admission.admit(deadline, request.content_length, expansion):
+        return predict_admitted()
 
+
+def predict_admitted() -> Response:
+    """Validates and runs predict on an admitted request.
+
+    :return Response:
+    """
+    fmt, data, error = parse_request()
+    if error is not None:
+        return error
+    tighten_deadline(data.get("deadline"))
+    check_deadline()
+    s = current()
+    out_fmt = response_format(s.formats, request.accept_mimetypes, fmt)
+
+    has_correlation_id = "correlation_id" in data
     ensure_correlation_id(data)
     ensure_model(data)
+    g.correlation_id = data["correlation_id"]
 
     # Test to see if the model loaded matches the request
-    if not is_loaded_model(data, model.info):
+    if not is_loaded_model(data, s.model.info):
         return api_error("Model not found.", 404, data)
 
     # All checks complete, run predict
     logger.info("correlation_id: %s data validated.", data["correlation_id"])
 
-    X = data["input"]
+    # Retries with a client-specified correlation_id can be answered from the idempotency store.
+    # Raw tensor responses are not stored, as their shape is returned in a header.
+    if idempotency is not None and has_correlation_id and not isinstance(out_fmt, TensorFormat):
+        key = idempotency_key(data["correlation_id"], model_namespace(s.model.info))
+        return idempotent_response(key, data, out_fmt)
 
-    # PANDAS_DATA_FRAME mode supports receiving data as a dict OR a list
-    did_receive_dict = isinstance(data["input"], dict) or data["input"] is None
-    if model.io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-        if did_receive_dict:
-            X = [X]
-        X = pd.DataFrame.from_dict(X)
+    return predict_response(data, out_fmt)
 
-    r = model.predict(X)
 
-    if model.io_type == ModelIOTypes.PANDAS_DATA_FRAME:
-        r = r.to_dict(orient="records")
+def predict_response(data, out_fmt) -> Response:
+    """Runs predict on a validated request and returns the response.
 
-        # PANDAS_DATA_FRAME mode supports receiving data as a dict OR a list
-        # `to_dict(orient="records")` will always return a list, so if we received a dict, we want to convert the output
-        if did_receive_dict:
-            # return the last result if we received a dict
-            r = r[-1]
+    :param dict data: The request data.
+    :param out_fmt: The wire format of the response.
+    :return Response:
+    """
+    # Arrow responses take DataFrame outputs as they are
+    as_records = not isinstance(out_fmt, ArrowFormat)
+    orient = data.get("orient", RECORDS)
+
+    timer = g.timer
+    s = current()
+    with lane_scope(classify_lane(data)):
+        if coalescer is not None and s.model.info.get("deterministic", False):
+            key = canonical_hash(data["input"], "{}:{}:{}".format(model_namespace(s.model.info), as_records, orient))
+            r = coalesced_predict(key, lambda: predict_input(data["input"], as_records, timer, orient))
+            # Requests that were coalesced spent this time waiting for another request's prediction
+            timer.lap("predict")
+        else:
+            r = predict_input(data["input"], as_records, timer, orient)
 
     # Save the result to the request object and return
     data["output"] = r
+    if metrics is not None:
+        metrics.rows.inc(input_rows(data))
 
     logger.info("correlation_id: %s returning response.", data["correlation_id"])
 
-    return json_response(data)
+    if is_data_frame(data["input"]):
+        # Only the output table is returned in Arrow responses, and other formats encode the input as records
+        data["input"] = data["input"].to_dict(orient="records") if as_records else None
+
+    if s.output_tensor is not None:
+        # Tensors are base64 encoded in JSON, and bytes in the binary formats. Only the output tensor is returned in
+        # raw tensor responses.
+        binary = not isinstance(out_fmt, JSONFormat)
+        data["output"] = s.output_tensor.encode(data["output"], binary)
+        data["input"] = None if isinstance(out_fmt, TensorFormat) else s.input_tensor.encode(data["input"], binary)
+
+    body = out_fmt.encode(data)
+    timer.lap("serialize")
+    response = Response(body, 200, mimetype=out_fmt.mimetype)
+    if isinstance(out_fmt, TensorFormat):
+        response.headers.extend(out_fmt.headers(data))
+    return response
+
+
+def coalesced_predict(key, fn):
+    """Runs a predict function via the request coalescer. Requests wait for an identical request in flight until
+    their own deadline at most, and make their own call if its deadline passed or its lane was full.
+
+    :param str key: The key of the request's input.
+    :param callable fn: The predict function.
+    :return: The result of fn.
+    :raises DeadlineExceeded: If the request's deadline passed while it waited.
+    """
+    deadline = current_deadline()
+    timeout = None if deadline is None else max(deadline - time.time(), 0.0)
+    try:
+        return coalescer.do(key, fn, timeout, (DeadlineExceeded, PredictPoolFull, EngineBusy))
+    except TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded.")
+
+
+def input_rows(data) -> int:
+    """Returns the number of rows in the input of a request.
+
+    :param dict data: The request data.
+    :return int:
+    """
+    X = data["input"]
+    if is_data_frame(X):
+        return len(X)
+    columnar = current().columnar_input is not None and isinstance(X, dict)
+    return batch_rows(X, COLUMNS if columnar else data.get("orient", RECORDS))
+
+
+def classify_lane(data) -> str:
+    """Classifies a request into a priority lane @see catwalk.server.lanes
+
+    :param dict data: The request data.
+    :return str: The lane, or None if priority lanes are disabled.
+    """
+    if predict_pool is None or predict_pool.lanes is None:
+        return None
+    return predict_pool.lanes.classify(request.headers, data.get("extra_data"), input_rows(data),
+                                       request.content_length)
+
+
+def idempotent_response(key, data, out_fmt) -> Response:
+    """Returns the stored response for key if there is one, otherwise runs predict_response and stores its response.
+
+    :param str key: The idempotency key of the request.
+    :param dict data: The request data.
+    :param out_fmt: The wire format of the response.
+    :return Response:
+    """
+    state, stored = idempotency.begin(key)
+    if state == DONE:
+        logger.info("correlation_id: %s returning stored response.", data["correlation_id"])
+        mimetype, body = stored.split(b"\n", 1)
+        return Response(body, 200, mimetype=mimetype.decode("utf-8"))
+    if state == PENDING:
+        return api_error("A request with this correlation_id is still in progress.", 409, data)
+
+    # The call is aborted on any exit without a response to store, including a timeout or killed greenlet
+    completed = False
+    try:
+        response = predict_response(data, out_fmt)
+        if response.status_code == 200:
+            # Store the mimetype with the body, as the response format is negotiated
+            idempotency.complete(key, response.mimetype.encode("utf-8") + b"\n" + response.get_data())
+            completed = True
+    finally:
+        if not completed:
+            idempotency.abort(key)
+    return response
+
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_stream() -> Response:
+    """The streaming predict end-point, for models that predict batches.
+    Reads newline-delimited JSON records, and streams back one newline-delimited JSON result per record.
+    The correlation_id can be given in the X-Correlation-ID header, and is returned in the same header.
+
+    :return Response:
+    """
+    logger.info("Stream predict message received")
+
+    if model is None:
+        return static_error("No model loaded.")
+
+    if not model.is_batch:
+        return static_error("Streaming is only supported by models that predict batches.", 400)
+
+    correlation_id = request.headers.get("X-Correlation-ID") or str(uuid4())
+    chunk_size = app_config.get_nested("server.stream.chunk_size", 1000)
+    logger.info("correlation_id: %s streaming response.", correlation_id)
+
+    lines = iter(request.stream.readline, b"")
+    body = stream_predictions(lines, admitted(predict_input), codec, served.row_schema, chunk_size)
+
+    response = Response(stream_with_context(body), 200, mimetype=NDJSON_MIMETYPE)
+    response.headers["X-Correlation-ID"] = correlation_id
+    return response
+
+
+def job_input(data) -> list:
+    """Returns the input of a job request as records, as job results are paged as records: column oriented inputs are
+    converted to records, and a single record is a job of one row.
+
+    :param dict data: The request data.
+    :return list:
+    """
+    X = data["input"]
+    orient = data.get("orient", RECORDS)
+    if orient != RECORDS and not is_data_frame(X):
+        X = to_data_frame(X, orient, pd).to_dict(orient="records")
+    elif served.columnar_input is not None and isinstance(X, dict):
+        X = served.columnar_input.to_records(X)
+    if isinstance(X, dict):
+        X = [X]
+    return X
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job() -> Response:
+    """The job submission end-point, for models that predict batches.
+    Validates the request as /predict does, and queues it to be predicted in the background.
+
+    :return Response: The status of the new job, with a 202 status code.
+    """
+    logger.info("Job message received")
+
+    if model is None:
+        return static_error("No model loaded.")
+
+    if jobs is None:
+        return static_error("Jobs are not enabled.", 404)
+
+    if not model.is_batch:
+        return static_error("Jobs are only supported by models that predict batches.", 400)
+
+    fmt, data, error = parse_request()
+    if error is not None:
+        return error
+
+    ensure_correlation_id(data)
+    ensure_model(data)
+
+    if not is_loaded_model(data, model.info):
+        return api_error("Model not found.", 404, data)
+
+    try:
+        status = jobs.submit(job_input(data), correlation_id=data["correlation_id"], model=data["model"])
+    except JobQueueFull:
+        return static_error("Job queue is full.", 503)
+
+    logger.info("correlation_id: %s queued as job %s.", data["correlation_id"], status["job_id"])
+    response = json_response(status, 202)
+    response.headers["Location"] = "/jobs/" + status["job_id"]
+    return response
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id) -> Response:
+    """The job status end-point. Long-polls for the job to finish if the "wait" query parameter is given, in
+    seconds (up to server.jobs.max_wait).
+
+    :param str job_id:
+    :return Response:
+    """
+    if jobs is None:
+        return static_error("Jobs are not enabled.", 404)
+
+    wait = min(request.args.get("wait", 0.0, type=float), app_config.get_nested("server.jobs.max_wait", 30))
+    status = jobs.status(job_id, wait)
+    if status is None:
+        return static_error("Job not found.", 404)
+    return json_response(status)
+
+
+@app.route("/jobs/<job_id>/results")
+def job_results(job_id) -> Response:
+    """The job results end-point, returns the "page" query parameter's page (from 0) of a finished job's results.
+
+    :param str job_id:
+    :return Response:
+    """
+    if jobs is None:
+        return static_error("Jobs are not enabled.", 404)
+
+    status = jobs.status(job_id)
+    if status is None:
+        return static_error("Job not found.", 404)
+    if status["state"] == JOB_FAILED:
+        return api_error("Job failed: {}".format(status["error"]), 500)
+    if status["state"] != JOB_DONE:
+        return static_error("Job is not done.", 409)
+
+    body = jobs.store.get_page(job_id, request.args.get("page", 0, type=int))
+    if body is None:
+        return static_error("Page not found.", 404)
+    return Response(body, 200, mimetype="application/json")
+
+
+@app.before_request
+def start_request():
+    """Counts the request as in flight, and notes when it started, for the request metrics."""
+    if metrics is not None:
+        g.started = time.perf_counter()
+        metrics.in_flight.inc()
+
+
+@app.after_request
+def record_request(response) -> Response:
+    """Records the request metrics, and reports the stage timings of predict requests.
+    The timings are added to a Server-Timing header if server.timing.header is set, and logged as a structured log
+    record (with "correlation_id" and "timing" attributes) unless server.timing.log is false.
+
+    :param Response response:
+    :return Response:
+    """
+    started = g.pop("started", None)
+    if metrics is not None and started is not None:
+        metrics.in_flight.dec()
+        metrics.record_request(request.endpoint, response.status_code, time.perf_counter() - started,
+                               request.content_length, response.content_length)
+
+    timer = g.pop("timer", None)
+    if timer is not None:
+        if metrics is not None:
+            metrics.record_stages(timer.stages)
+        if app_config.get_nested("server.timing.header", False):
+            response.headers["Server-Timing"] = timer.server_timing()
+        if app_config.get_nested("server.timing.log", True):
+            correlation_id = g.get("correlation_id")
+            timing = timer.to_dict()
+            logger.info("correlation_id: %s timing: %s", correlation_id, codec.dumps(timing).decode("utf-8"),
+                        extra={"correlation_id": correlation_id, "timing": timing})
+    return response
+
+
+@app.route("/metrics")
+def metrics_endpoint() -> Response:
+    """The metrics end-point, returns the metrics of all workers in the Prometheus text format.
+
+    :return Response:
+    """
+    if metrics is None:
+        return static_error("Metrics are not enabled.", 404)
+    return Response(metrics.render(), 200, content_type=METRICS_CONTENT_TYPE)
 
 
 @app.route("/status")
@@ -177,6 +883,30 @@ def status():
     return ""
 
 
+@app.route("/stats")
+def stats() -> Response:
+    """The stats end-point, returns runtime statistics of this worker's optional server components.
+
+    :return Response:
+    """
+    data = {}
+    if batcher is not None:
+        data["batching"] = batcher.stats()
+    if cache is not None:
+        data["cache"] = cache.stats()
+    if coalescer is not None:
+        data["coalescing"] = coalescer.stats()
+    if idempotency is not None:
+        data["idempotency"] = idempotency.stats()
+    if deduplicator is not None:
+        data["dedup"] = deduplicator.stats()
+    if jobs is not None:
+        data["jobs"] = jobs.stats()
+    if registry is not None:
+        data["models"] = registry.stats()
+    return json_response(data)
+
+
 def load_model(path):
     """Loads a model from the given path.
 
@@ -191,16 +921,51 @@ def load_model(path):
     if Model is None:
         return
 
-    m = Model(path)
+    return init_model(Model(path), path)
+
 
-    # Load the metadata file
+def load_remote_model(path, config_path=None):
+    """Loads a model that runs in the processes of the model engine (server.engine.enabled). Only its metadata is
+    loaded in this process. The engine is started by start_nginx, which sets CATWALK_ENGINE_PATH, or else by this
+    process.
+
+    :param str path:
+    :param str config_path: The app_config path, for the engine started by this process.
+    :return RemoteModel: The model, which calls the engine.
+    """
+    global engine
+    path = osp.abspath(path)
+    if not osp.isfile(osp.join(path, "model.py")):
+        return
+
+    engine_path = os.environ.get(ENGINE_PATH_ENV)
+    if engine_path is None:
+        engine = ModelEngine(config_path, path)
+        engine_path = engine.path
+    logger.info("Model engine enabled: %s", engine_path)
+
+    threshold = app_config.get_nested("server.engine.shm_threshold", DEFAULT_THRESHOLD)
+    # By default the front ends share the engine's backlog
+    backlog = app_config.get_nested("server.engine.backlog", DEFAULT_BACKLOG)
+    frontends = app_config.get_nested("server.engine.frontends", 2)
+    max_in_flight = app_config.get_nested("server.engine.max_in_flight", max(backlog // frontends, 1))
+    client = EngineClient(engine_path, threshold, app_config.get_nested("server.engine.timeout", None),
+                          app_config.get_nested("server.engine.connect_timeout", 60.0), max_in_flight)
+    return init_model(RemoteModel(client), path)
+
+
+def init_model(m, path):
+    """Loads the metadata of a model.
+
+    :param Model m:
+    :param str path: The absolute model path.
+    :return Model: The model.
+    """
     with open(osp.join(path, "model.yml"), "r") as fp:
         info = yaml.safe_load(fp)
     m.info = info
     m.io_type = ModelIOTypes.get_io_type(m.info)
-
-    app_config.set_nested("model.name", info["name"])
-    app_config.set_nested("model.version", info["version"])
+    m.is_batch = is_batch_model(m.info)
 
     # pandas must be installed by a model's requirements.txt, to avoid binary incompatabilities between versions
     # this will succeed if the model has the requirement (this is test in the test_model script)
@@ -215,8 +980,354 @@ def load_model(path):
     return m
 
 
+def warm_up(m, path):
+    """Predicts the model's test data, so state that models create on first use is created.
+
+    :param Model m:
+    :param str path: The model path.
+    """
+    X, _ = m.load_test_data(path)
+    if m.io_type == ModelIOTypes.COLUMNAR:
+        X = ColumnarSpec(m.info["schema"]["input"], "input").decode(X)
+    elif not m.is_batch and m.io_type != ModelIOTypes.NUMPY_ARRAY and isinstance(X, list):
+        X = X[0]
+    m.predict(X)
+
+
+def preload(config_path, model_path):
+    """Loads and warms up the model in the gunicorn master, before it forks the workers (server.preload.enabled).
+    The workers share the model's pages copy-on-write, and init uses it rather than loading their own copy.
+
+    Objects that exist at this point are moved to the permanent generation with gc.freeze, so that garbage
+    collections in the workers do not write to (and so copy) the pages that hold them.
+
+    :param str config_path:
+    :param str model_path:
+    :return Flask: The app, which each worker initialises with init.
+    """
+    global logger, preloaded
+
+    app_config.load(config_path)
+    logger = get_logger_from_app_config(__name__)
+
+    started = time.perf_counter()
+    m = load_model(model_path)
+    if m is None:
+        logger.error("Unable to preload model: %s", model_path)
+        return app
+    if app_config.get_nested("server.preload.warmup", True):
+        try:
+            warm_up(m, osp.abspath(model_path))
+        except Exception as err:
+            logger.warning("Unable to warm up the model: %s", err)
+    load_time = time.perf_counter() - started
+
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+    preloaded = (osp.abspath(model_path), m, load_time)
+    logger.info("Preloaded model in %.2fs, memory: %s", load_time, format_memory(read_memory()))
+    return app
+
+
+def _load(model_path, config_path=None) -> (object, float):
+    """Loads the model, or uses the preloaded model.
+
+    :param str model_path:
+    :param str config_path:
+    :return (Model, float): The model, and the time taken to load it in seconds.
+    """
+    if preloaded is not None and preloaded[0] == osp.abspath(model_path):
+        _, m, load_time = preloaded
+        logger.info("Using the preloaded model, worker %d memory: %s", os.getpid(), format_memory(read_memory()))
+        return m, load_time
+
+    started = time.perf_counter()
+    if app_config.get_nested("server.engine.enabled", False):
+        m = load_remote_model(model_path, config_path)
+    else:
+        m = load_model(model_path)
+    return m, time.perf_counter() - started
+
+
+def init_batching():
+    """Creates the batch scheduler if batching is enabled in the app_config and the model predicts batches.
+
+    :return BatchScheduler: The scheduler, or None if batching is disabled.
+    """
+    if not app_config.get_nested("server.batching.enabled", False):
+        return
+
+    if not model.is_batch or model.io_type == ModelIOTypes.COLUMNAR:
+        logger.warning("Batching is enabled, but the model does not predict batches of records. Ignoring...")
+        return
+
+    max_batch_size = app_config.get_nested("server.batching.max_batch_size", 64)
+    max_wait_ms = app_config.get_nested("server.batching.max_wait_ms", 5)
+    logger.info("Batching enabled: max_batch_size=%s, max_wait_ms=%s", max_batch_size, max_wait_ms)
+
+    return BatchScheduler(call_model, max_batch_size, max_wait_ms / 1000.0)
+
+
+def init_cache():
+    """Creates the result cache if caching is enabled in the app_config and the model is deterministic.
+
+    :return ResultCache: The cache, or None if caching is disabled.
+    """
+    if not app_config.get_nested("server.cache.enabled", False):
+        return
+
+    if not model.info.get("deterministic", False):
+        logger.warning("Caching is enabled, but the model is not declared deterministic. Ignoring...")
+        return
+
+    max_size = app_config.get_nested("server.cache.max_size", 10000)
+    ttl = app_config.get_nested("server.cache.ttl", 300)
+    logger.info("Result cache enabled: max_size=%s, ttl=%s", max_size, ttl)
+
+    return ResultCache(max_size, ttl)
+
+
+def init_coalescing():
+    """Creates the request coalescer if coalescing is enabled in the app_config and the model is deterministic, as
+    coalesced requests share one prediction.
+
+    :return SingleFlight: The coalescer, or None if coalescing is disabled.
+    """
+    if not app_config.get_nested("server.coalescing.enabled", False):
+        return
+
+    if not model.info.get("deterministic", False):
+        logger.warning("Coalescing is enabled, but the model is not declared deterministic. Ignoring...")
+        return
+
+    logger.info("Request coalescing enabled")
+    return SingleFlight()
+
+
+def init_dedup():
+    """Creates the row deduplicator if deduplication is enabled in the app_config and the model predicts batches.
+
+    :return Deduplicator: The deduplicator, or None if deduplication is disabled.
+    """
+    if not app_config.get_nested("server.dedup.enabled", False):
+        return
+
+    if not model.is_batch or model.io_type == ModelIOTypes.COLUMNAR:
+        logger.warning("Deduplication is enabled, but the model does not predict batches of records. Ignoring...")
+        return
+
+    logger.info("Row deduplication enabled")
+    return Deduplicator()
+
+
+def init_idempotency():
+    """Creates the idempotency store backend if it is enabled in the app_config.
+
+    :return MemoryBackend|FileBackend: The backend, or None if the store is disabled.
+    """
+    if not app_config.get_nested("server.idempotency.enabled", False):
+        return
+
+    backend = app_config.get_nested("server.idempotency.backend", "memory")
+    kwargs = {
+        "window": app_config.get_nested("server.idempotency.window", 60),
+        "max_entries": app_config.get_nested("server.idempotency.max_entries", 10000),
+        "wait_timeout": app_config.get_nested("server.idempotency.wait_timeout", 30),
+        "lock_timeout": app_config.get_nested("server.idempotency.lock_timeout", 120)
+    }
+    if backend == "file":
+        kwargs["path"] = app_config.get_nested("server.idempotency.path",
+                                               osp.join(tempfile.gettempdir(), "catwalk-idempotency"))
+    logger.info("Idempotency store enabled: backend=%s", backend)
+
+    return get_backend(backend, **kwargs)
+
+
+def admitted(fn):
+    """Wraps a predict function for work that was already accepted (jobs and streams), so the predict pool queues its
+    calls even when the queue is full, rather than failing the work part way through.
+
+    :param callable fn:
+    :return callable:
+    """
+    pool = predict_pool
+    if pool is None:
+        return fn
+
+    def admitted_fn(*args, **kwargs):
+        with pool.admit_all():
+            return fn(*args, **kwargs)
+    return admitted_fn
+
+
+def run_job(X):
+    """Predicts the input of a job, and returns its result rows.
+    The model is called in the predict pool, or in a native thread if the pool is disabled, so a long job does not
+    block a gevent worker (and its heartbeat) while it runs.
+
+    :param X: The job input.
+    :return list:
+    """
+    try:
+        if predict_pool is None:
+            with native_scope():
+                return predict_input(X)
+        return admitted(predict_input)(X)
+    except Exception:
+        logger.exception("Job failed")
+        raise
+
+
+def init_jobs():
+    """Creates the job manager if jobs are enabled in the app_config, for models that predict batches.
+
+    :return JobManager: or None if jobs are disabled.
+    """
+    if not app_config.get_nested("server.jobs.enabled", False) or not model.is_batch:
+        return None
+
+    store = JobStore(app_config.get_nested("server.jobs.path", osp.join(tempfile.gettempdir(), "catwalk-jobs")),
+                     codec,
+                     page_size=app_config.get_nested("server.jobs.page_size", 1000),
+                     ttl=app_config.get_nested("server.jobs.ttl", 3600))
+    manager = JobManager(run_job, store,
+                         workers=app_config.get_nested("server.jobs.workers", 2),
+                         max_queue=app_config.get_nested("server.jobs.max_queue", 16))
+    logger.info("Jobs enabled: %d workers, store: %s", manager.workers, store.path)
+    return manager
+
+
+def init_predict_pool():
+    """Creates the predict pool if it is enabled in the app_config.
+    By default it has a thread per CPU if the model's concurrency profile says predict releases the GIL and is
+    thread-safe, and a single thread otherwise.
+
+    :return PredictPool: The pool, or None if it is disabled.
+    """
+    if not app_config.get_nested("server.predict_pool.enabled", False):
+        if app_config.get_nested("server.priority.enabled", False):
+            logger.warning("Priority lanes need the predict pool, set server.predict_pool.enabled")
+        return None
+
+    profile = get_profile(model.info, app_config.get_nested("server.concurrency", None)) or {}
+    parallel = profile.get("releases_gil", False) and profile.get("thread_safe", False)
+    threads = app_config.get_nested("server.predict_pool.threads", available_cpus()[0] if parallel else 1)
+    if threads > 1 and not profile.get("thread_safe", False):
+        logger.warning("The predict pool has %d threads, but the model's predict is not declared thread-safe", threads)
+    max_queue = app_config.get_nested("server.predict_pool.max_queue", 16)
+
+    lanes = get_lanes(app_config.get_nested("server.priority", None), max_queue)
+    pool = PredictPool(threads, max_queue, metrics, LaneScheduler(lanes, threads, metrics) if lanes else None)
+    logger.info("Predict pool enabled: threads=%d, max_queue=%d%s", pool.threads, pool.max_queue,
+                ", in gevent's native thread pool" if pool.is_gevent else "")
+    if pool.lanes is not None:
+        logger.info("Priority lanes enabled: %s", pool.lanes)
+    return pool
+
+
+def init_admission():
+    """Creates the admission control of predict requests, with the concurrency limit and input budget if they are
+    enabled in the app_config @see catwalk.server.admission
+
+    :return AdmissionControl:
+    """
+    limit = None
+    if app_config.get_nested("server.admission.concurrency.enabled", False):
+        limit = ConcurrencyLimit(app_config.get_nested("server.admission.concurrency.initial", 4),
+                                 app_config.get_nested("server.admission.concurrency.min", 1),
+                                 app_config.get_nested("server.admission.concurrency.max", 64),
+                                 app_config.get_nested("server.admission.concurrency.target", None),
+                                 app_config.get_nested("server.admission.concurrency.tolerance", 2.0),
+                                 app_config.get_nested("server.admission.concurrency.backoff", 0.9),
+                                 quantile=app_config.get_nested("server.admission.concurrency.quantile", 0.1))
+        logger.info("Adaptive concurrency limit enabled: %d to %d", limit.min_limit, limit.max_limit)
+
+    budget = None
+    max_input_bytes = app_config.get_nested("server.admission.max_input_bytes", None)
+    if max_input_bytes is not None:
+        budget = InputBudget(parse_memory(max_input_bytes))
+        logger.info("Input budget enabled: %d bytes", budget.max_bytes)
+
+    return AdmissionControl(limit, budget, app_config.get_nested("server.admission.timeout", None), metrics)
+
+
+def init_metrics(load_time):
+    """Creates the server metrics, unless they are disabled in the app_config.
+    Metrics are aggregated across worker processes through the server.metrics.path directory (set by start_nginx).
+    Every series is labelled with the model name and version, unless the model registry is enabled: requests are then
+    served by several models, so the labels of the model the server was started with would be wrong.
+
+    :param float load_time: The time taken to load the model, in seconds.
+    :return ServerMetrics: or None if metrics are disabled.
+    """
+    if not app_config.get_nested("server.metrics.enabled", True):
+        return None
+
+    path = app_config.get_nested("server.metrics.path", os.environ.get("CATWALK_METRICS_PATH"))
+    endpoints = sorted(set(rule.endpoint for rule in app.url_map.iter_rules()))
+    labels = {"model": model.info["name"], "version": model.info["version"]}
+    if app_config.get_nested("server.models.paths", None):
+        labels = None
+    lanes = get_lanes(app_config.get_nested("server.priority", None))
+    server_metrics = ServerMetrics(endpoints, path or None, labels, [lane.name for lane in lanes or []])
+    server_metrics.model_load.set(load_time)
+    logger.info("Metrics enabled%s", ", shared through " + path if path else "")
+    return server_metrics
+
+
+def load_served_model(path):
+    """Loads a model for the model registry.
+
+    :param str path:
+    :return ServedModel: The model, or None if it cannot be loaded.
+    """
+    m = load_model(path)
+    if m is None:
+        return None
+    return ServedModel(m, osp.abspath(path), codec, app_config.get_nested("server.validation.output", True))
+
+
+def init_registry():
+    """Creates the model registry if server.models.paths is set in the app_config, so the server can serve the
+    models found there as well as the model it was started with @see catwalk.server.registry
+
+    :return ModelRegistry: The registry, or None if it is disabled.
+    """
+    paths = app_config.get_nested("server.models.paths", None)
+    if not paths:
+        return None
+
+    if isinstance(paths, str):
+        paths = [paths]
+    available = find_models(paths)
+    available.pop((model.info["name"], model.info["version"]), None)
+    max_memory = app_config.get_nested("server.models.max_memory", None)
+    manager = ModelRegistry(available, load_served_model,
+                            max_memory=parse_memory(max_memory) if max_memory is not None else None,
+                            max_models=app_config.get_nested("server.models.max_models", None),
+                            metrics=metrics)
+    logger.info("Model registry enabled: %d models in %s", len(available), ", ".join(paths))
+    return manager
+
+
+def routed_formats() -> list:
+    """Returns the wire formats of every IO type, as requests routed to other models can use their formats.
+
+    :return list:
+    """
+    fmts = list(served.formats)
+    for io_type in (ModelIOTypes.PANDAS_DATA_FRAME, ModelIOTypes.NUMPY_ARRAY):
+        for fmt in get_formats(codec, io_type):
+            if not any(type(f) is type(fmt) for f in fmts):
+                fmts.append(fmt)
+    return fmts
+
+
 def init(config_path, model_path):
-    global logger, model, in_schema
+    global logger, model, served, registry, formats, batcher, cache, coalescer, idempotency, deduplicator, jobs, \
+        metrics, predict_pool, engine, admission, codec
 
     app_config.load(config_path)
 
@@ -224,12 +1335,51 @@ def init(config_path, model_path):
     if config_path is not None and osp.exists(config_path):
         logger.info("Loaded config: {}".format(config_path))
 
-    model = load_model(model_path)
+    codec = get_codec(app_config.get_nested("server.json.backend", "auto"))
+    static_bodies.clear()
+    logger.info("Using JSON backend: %s", codec.name)
+
+    if jobs is not None:
+        # The running jobs finish with the model they were submitted to
+        jobs.shutdown()
+    if engine is not None:
+        engine.stop()
+        engine = None
+    model, load_time = _load(model_path, config_path)
+    batcher = None
+    cache = None
+    coalescer = None
+    idempotency = None
+    deduplicator = None
+    jobs = None
+    metrics = None
+    admission = AdmissionControl()
+    served = None
+    registry = None
+    if predict_pool is not None:
+        predict_pool.shutdown()
+    predict_pool = None
 
     if model is None:
         logger.error("Unable to load model: %s", model_path)
     else:
-        in_schema = get_request_schema(model.info["schema"]["input"], model.io_type)
+        app_config.set_nested("model.name", model.info["name"])
+        app_config.set_nested("model.version", model.info["version"])
+        served = ServedModel(model, osp.abspath(model_path), codec,
+                             app_config.get_nested("server.validation.output", True))
+        formats = served.formats
+        batcher = init_batching()
+        cache = init_cache()
+        coalescer = init_coalescing()
+        idempotency = init_idempotency()
+        deduplicator = init_dedup()
+        jobs = init_jobs()
+        metrics = init_metrics(load_time)
+        predict_pool = init_predict_pool()
+        admission = init_admission()
+        registry = init_registry()
+        if registry is not None:
+            formats = routed_formats()
         logger.info("Initialised model: %s:%s", model.info["name"], model.info["version"])
 
     return app
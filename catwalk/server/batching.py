@@ -0,0 +1,197 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Dynamic micro-batching of concurrent predict calls.
+
+Callers submit model-native batches (a list of records or a DataFrame) to a BatchScheduler. The first caller to
+arrive becomes the batch leader: it waits up to max_wait for other callers to join, then runs a single predict over
+the concatenated rows and hands each caller its own slice of the result. Only threading primitives are used, so
+under gunicorn's gevent worker (which monkey patches threading) the callers are greenlets.
+"""
+import threading
+import time
+
+from .rows import batch_length, concat_batches, slice_batch
+
+
+class _BatchItem(object):
+    """A single caller's rows waiting in the batch queue."""
+
+    __slots__ = ["X", "rows", "enqueued", "event", "is_leader", "done", "result", "error"]
+
+    def __init__(self, X):
+        self.X = X
+        self.rows = batch_length(X)
+        self.enqueued = time.perf_counter()
+        self.event = threading.Event()
+        self.is_leader = False
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler(object):
+    """Gathers concurrent calls to submit into single calls to predict_fn.
+
+    :param callable predict_fn: The function that predicts a model-native batch and returns one output row per input
+                                row (in the same order).
+    :param int max_batch_size: The maximum number of rows in a batch. A single call larger than this is run alone.
+    :param float max_wait: The maximum time, in seconds, the leader waits for a batch to fill.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.005):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait), 0.0)
+
+        self._lock = threading.Lock()
+        self._filled = threading.Condition(self._lock)
+        self._queue = []
+        self._queued_rows = 0
+        self._has_leader = False
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._max_batch_rows = 0
+        self._max_batch_requests = 0
+        self._queue_wait = 0.0
+        self._max_queue_wait = 0.0
+
+    def submit(self, X):
+        """Queues X to be predicted as part of a batch, and blocks until its result is ready.
+
+        :param list|DataFrame X: The model-native rows to predict.
+        :return: The rows of the prediction result that correspond to X.
+        """
+        item = _BatchItem(X)
+
+        with self._lock:
+            self._queue.append(item)
+            self._queued_rows += item.rows
+            if not self._has_leader:
+                self._has_leader = True
+                item.is_leader = True
+            elif self._queued_rows >= self.max_batch_size:
+                self._filled.notify()
+
+        while True:
+            if item.is_leader:
+                item.is_leader = False
+                self._lead(item)
+            item.event.wait()
+            if item.done:
+                break
+            # We were woken to lead the next batch
+            item.event.clear()
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _lead(self, leader):
+        """Waits for the batch to fill (or time out), takes it from the queue, and runs it."""
+        deadline = leader.enqueued + self.max_wait
+        with self._lock:
+            while self._queued_rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._filled.wait(remaining)
+
+            # Take items from the head of the queue (the leader is always at the head)
+            batch = []
+            rows = 0
+            while len(self._queue) > 0:
+                nxt = self._queue[0]
+                if len(batch) > 0 and rows + nxt.rows > self.max_batch_size:
+                    break
+                batch.append(self._queue.pop(0))
+                rows += nxt.rows
+            self._queued_rows -= rows
+
+            # Hand leadership to the next caller in the queue, if there is one
+            successor = None
+            if len(self._queue) > 0:
+                successor = self._queue[0]
+                successor.is_leader = True
+            else:
+                self._has_leader = False
+
+        if successor is not None:
+            successor.event.set()
+
+        self._run(batch, rows)
+
+    def _run(self, batch, rows):
+        """Runs predict_fn on the concatenated batch and scatters the result back to each item."""
+        started = time.perf_counter()
+        self._record(batch, rows, started)
+
+        try:
+            r = self.predict_fn(concat_batches([item.X for item in batch]))
+            if batch_length(r) != rows:
+                raise ValueError("Batched predict returned {} rows for {} input rows".format(batch_length(r), rows))
+
+            if len(batch) == 1:
+                batch[0].result = r
+            else:
+                offset = 0
+                for item in batch:
+                    item.result = slice_batch(r, offset, offset + item.rows)
+                    offset += item.rows
+        except Exception as err:
+            for item in batch:
+                item.error = err
+
+        for item in batch:
+            item.done = True
+            item.event.set()
+
+    def _record(self, batch, rows, started):
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._rows += rows
+            self._max_batch_rows = max(self._max_batch_rows, rows)
+            self._max_batch_requests = max(self._max_batch_requests, len(batch))
+            for item in batch:
+                wait = started - item.enqueued
+                self._queue_wait += wait
+                self._max_queue_wait = max(self._max_queue_wait, wait)
+
+    def stats(self) -> dict:
+        """Returns the batch size and queue wait statistics of this scheduler.
+
+        :return dict:
+        """
+        with self._stats_lock:
+            batches = max(self._batches, 1)
+            requests = max(self._requests, 1)
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "rows": self._rows,
+                "mean_batch_rows": self._rows / batches,
+                "mean_batch_requests": self._requests / batches,
+                "max_batch_rows": self._max_batch_rows,
+                "max_batch_requests": self._max_batch_requests,
+                "mean_queue_wait_ms": 1000.0 * self._queue_wait / requests,
+                "max_queue_wait_ms": 1000.0 * self._max_queue_wait
+            }
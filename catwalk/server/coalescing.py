@@ -0,0 +1,110 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Single-flight coalescing of identical in-flight calls.
+
+While a call for a key is running, later calls for the same key wait for its result instead of starting their own.
+Callers can wait for at most a timeout (e.g. until their own deadline), and errors that belong to the call's caller
+rather than its result (e.g. its deadline passed, or its priority lane was full) are not shared: the callers that see
+them make their own call. Only threading primitives are used, so under gunicorn's gevent worker (which monkey patches threading) this
+coalesces calls across the greenlets of a worker.
+"""
+import threading
+
+
+class _Call(object):
+    """An in-flight call that other callers can wait on."""
+
+    __slots__ = ["event", "result", "error"]
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls with the same key into a single call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None, private=()):
+        """Calls fn, unless a call with the same key is already in flight, in which case its result is returned.
+        Exceptions raised by fn are raised in every caller, except the private ones.
+
+        :param str key: The key identifying the call.
+        :param callable fn: The function to call, with no arguments.
+        :param float timeout: The time to wait for a call in flight, in seconds, or None to wait until it is done.
+        :param tuple private: Exception types that are not shared: callers that waited for a call that raised one
+                              call fn themselves.
+        :return: The result of fn.
+        :raises TimeoutError: If the call in flight took longer than timeout.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                self.calls += 1
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError("Coalesced call timed out.")
+            if isinstance(call.error, private):
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+    def in_flight(self) -> int:
+        """Returns the number of calls currently in flight.
+
+        :return int:
+        """
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        """Returns the call and coalesced request counters.
+
+        :return dict:
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight()
+        }
@@ -0,0 +1,108 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Intra-batch row deduplication: predict only the unique rows of a batch and scatter the results back.
+
+Lists of records are deduplicated on their canonical JSON. DataFrames are hashed with pandas' vectorised
+hash_pandas_object where possible (falling back to canonical JSON for columns of unhashable values, such as lists).
+"""
+import threading
+
+from .hashing import canonical_dumps
+from .rows import is_data_frame, take_rows, batch_length
+
+
+def unique_rows(X) -> (list, list):
+    """Finds the unique rows of a model-native batch.
+
+    :param list|DataFrame X:
+    :return (list, list): The positions of the first occurrence of each unique row, and for each row of X, the
+                          position of its unique row in the first list.
+    """
+    if is_data_frame(X):
+        try:
+            return _unique_frame_rows(X)
+        except TypeError:
+            X = X.to_dict(orient="records")
+
+    first = []
+    inverse = []
+    seen = {}
+    for i, x in enumerate(X):
+        key = canonical_dumps(x)
+        j = seen.get(key)
+        if j is None:
+            j = len(first)
+            seen[key] = j
+            first.append(i)
+        inverse.append(j)
+    return first, inverse
+
+
+def _unique_frame_rows(X):
+    import numpy as np
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(X, index=False).values
+    # codes are numbered in order of first appearance, so the first index of each code is in row order
+    codes, _ = pd.factorize(hashes)
+    _, first = np.unique(codes, return_index=True)
+    return first.tolist(), codes.tolist()
+
+
+class Deduplicator(object):
+    """Predicts batches with duplicate rows removed, and records the dedup ratio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.unique_rows = 0
+
+    def predict(self, X, predict_fn):
+        """Calls predict_fn on the unique rows of X, and returns a result with one row for each row of X.
+
+        :param list|DataFrame X: The model input.
+        :param callable predict_fn: The function that predicts a model-native batch.
+        :return list|DataFrame: The model output.
+        """
+        first, inverse = unique_rows(X)
+        n = batch_length(X)
+
+        with self._lock:
+            self.rows += n
+            self.unique_rows += len(first)
+
+        if len(first) == n:
+            return predict_fn(X)
+
+        r = predict_fn(take_rows(X, first))
+        if batch_length(r) != len(first):
+            raise ValueError("Predict returned {} rows for {} input rows".format(batch_length(r), len(first)))
+        return take_rows(r, inverse)
+
+    def stats(self) -> dict:
+        """Returns the row counts and dedup ratio (the fraction of rows that were duplicates).
+
+        :return dict:
+        """
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "unique_rows": self.unique_rows,
+                "dedup_ratio": 1.0 - self.unique_rows / self.rows if self.rows > 0 else 0.0
+            }
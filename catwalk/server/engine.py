@@ -0,0 +1,531 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Runs the model in a pool of model processes, to which the server's workers send their predict calls.
+
+Pure Python models hold the GIL, so a worker can only use one CPU to predict, and every worker carries the server,
+the parsing code and a copy of the model. With the engine (server.engine.enabled), a few I/O bound front-end workers
+parse and validate requests, and predict calls run in a separate number of model processes (server.engine.processes):
+
+- A supervisor process loads the model once and forks the model processes, which share its memory copy-on-write. It
+  restarts model processes that exit (e.g. crash), backing off while they keep failing straight away.
+- The model processes all accept connections on one Unix socket, so each call is taken by an idle model process, and
+  calls wait in the socket's backlog while all of them are busy. Front ends connect per call, as a kept connection
+  would hold on to a model process. Each front end has at most server.engine.max_in_flight calls connected or
+  waiting to connect, and further calls are rejected with EngineBusy: blocking (and gevent) connects wait while the
+  backlog is full rather than fail, so the backlog alone does not bound the calls.
+- Calls and results are pickled with protocol 5, with large buffers (e.g. numpy arrays and DataFrame columns) out of
+  band. Buffers (and pickles) of server.engine.shm_threshold bytes or more are written to files in shared memory
+  (/dev/shm where available), which the reader maps and unlinks, so they are not copied through the socket. Files
+  that are never read (e.g. the front end gave up on the call) are removed by the supervisor after
+  server.engine.buffer_ttl seconds.
+
+start_nginx runs the supervisor next to gunicorn, and passes its directory to the workers in CATWALK_ENGINE_PATH.
+Without it (e.g. the debug server), init starts a ModelEngine, which runs the supervisor in the same way. The
+supervisor exits when the process that started it does.
+"""
+import atexit
+import subprocess
+import gc
+import logging
+import mmap
+import multiprocessing
+import os
+import os.path as osp
+import pickle
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener, Client, wait
+from uuid import uuid4
+
+from ..utils import get_model_class
+from .offload import is_gevent_patched
+
+ENGINE_PATH_ENV = "CATWALK_ENGINE_PATH"
+SOCKET_NAME = "engine.sock"
+BUFFER_SUFFIX = ".buf"
+
+DEFAULT_THRESHOLD = 65536
+DEFAULT_BACKLOG = 128
+DEFAULT_BUFFER_TTL = 600.0
+
+# The model methods the front ends can call
+METHODS = ("predict", "load_test_data")
+
+# Protocol 5 pickles buffers out of band (Python 3.8+)
+_PROTOCOL = min(pickle.HIGHEST_PROTOCOL, 5)
+
+# Model processes that exit sooner than this after starting are restarted with a back off
+_MIN_UPTIME = 1.0
+_MAX_BACKOFF = 10.0
+
+# How often the supervisor removes stale buffer files, in seconds
+_SWEEP_INTERVAL = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+class EngineError(Exception):
+    """Raised when a model process fails, or the model raises an exception.
+
+    :param str message:
+    :param str details: The model process' traceback, if there is one.
+    """
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+class EngineBusy(EngineError):
+    """Raised when a front end has max_in_flight calls in the engine, or its backlog is full."""
+    pass
+
+
+def shared_memory_path() -> str:
+    """Returns the directory to create engine directories in: /dev/shm if it is available.
+
+    :return str:
+    """
+    if osp.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def make_engine_path() -> str:
+    """Creates a private directory for the engine's socket and buffers, in shared memory where available.
+
+    :return str:
+    """
+    return tempfile.mkdtemp(prefix="catwalk-engine-", dir=shared_memory_path())
+
+
+def _write_buffer(path, data) -> tuple:
+    name = uuid4().hex + BUFFER_SUFFIX
+    size = data.nbytes
+    fd = os.open(osp.join(path, name), os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+    try:
+        os.ftruncate(fd, size)
+        with mmap.mmap(fd, size) as buf:
+            buf[:] = data
+    finally:
+        os.close(fd)
+    return name, size
+
+
+def _read_buffer(path, name, size):
+    # The file is unlinked once mapped, the mapping lives as long as the objects that use it. Copy-on-write, so the
+    # objects are writable as if they had been unpickled from bytes.
+    file_path = osp.join(path, name)
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        return mmap.mmap(fd, size, access=mmap.ACCESS_COPY)
+    finally:
+        os.close(fd)
+        os.remove(file_path)
+
+
+def dump(obj, path, threshold=DEFAULT_THRESHOLD) -> (bytes, list):
+    """Serialises an object into a message, writing large buffers to files in path.
+
+    :param obj:
+    :param str path: The engine directory.
+    :param int threshold: The size from which buffers are written to files.
+    :return (bytes, list): The message, and the names of the files written (which the reader removes).
+    """
+    buffers = []
+    if _PROTOCOL >= 5:
+        data = pickle.dumps(obj, protocol=_PROTOCOL, buffer_callback=buffers.append)
+    else:
+        data = pickle.dumps(obj, protocol=_PROTOCOL)
+
+    parts = []
+    files = []
+    for buf in [memoryview(data)] + [b.raw() for b in buffers]:
+        if buf.nbytes >= max(threshold, 1):
+            name, size = _write_buffer(path, buf)
+            files.append(name)
+            parts.append((name, size))
+        else:
+            parts.append(bytes(buf))
+    return pickle.dumps(parts, protocol=_PROTOCOL), files
+
+
+def load(message, path):
+    """Deserialises a message made by dump.
+
+    :param bytes message:
+    :param str path: The engine directory.
+    :return: The object.
+    """
+    parts = [part if isinstance(part, bytes) else _read_buffer(path, *part) for part in pickle.loads(message)]
+    if len(parts) > 1:
+        return pickle.loads(parts[0], buffers=parts[1:])
+    return pickle.loads(parts[0])
+
+
+def remove_files(path, files):
+    """Removes the buffer files of a message that was not read.
+
+    :param str path: The engine directory.
+    :param list files: @see dump
+    """
+    for name in files:
+        try:
+            os.remove(osp.join(path, name))
+        except OSError:
+            pass
+
+
+def sweep_buffers(path, max_age) -> int:
+    """Removes the buffer files that are older than max_age, which were written for messages that were never read.
+
+    :param str path: The engine directory.
+    :param float max_age: In seconds.
+    :return int: The number of files removed.
+    """
+    now = time.time()
+    removed = 0
+    for name in os.listdir(path):
+        if not name.endswith(BUFFER_SUFFIX):
+            continue
+        try:
+            if now - os.stat(osp.join(path, name)).st_mtime > max_age:
+                os.remove(osp.join(path, name))
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def handle_call(m, message, path, threshold) -> (bytes, list):
+    """Runs a call on the model, and returns the message of its result.
+
+    :param Model m:
+    :param bytes message: The (method, args) of the call.
+    :param str path: The engine directory.
+    :param int threshold: @see dump
+    :return (bytes, list): The ("ok", result) or ("error", message, traceback) message, and its files @see dump
+    """
+    try:
+        method, args = load(message, path)
+        if method not in METHODS:
+            raise AttributeError("Model method not allowed: {}".format(method))
+        return dump(("ok", getattr(m, method)(*args)), path, threshold)
+    except Exception as err:
+        return dump(("error", "{}: {}".format(type(err).__name__, err), traceback.format_exc()), path, threshold)
+
+
+def answer(conn, m, message, path, threshold):
+    """Runs a call on the model and sends its result. The result's files are removed if it cannot be sent, e.g. the
+    front end gave up on the call.
+
+    :param Connection conn:
+    :param Model m:
+    :param bytes message: @see handle_call
+    :param str path: The engine directory.
+    :param int threshold: @see dump
+    :raises OSError: If the result cannot be sent.
+    """
+    reply, files = handle_call(m, message, path, threshold)
+    try:
+        conn.send_bytes(reply)
+    except Exception:
+        remove_files(path, files)
+        raise
+
+
+def serve_model(listener, m, path, threshold=DEFAULT_THRESHOLD):
+    """The loop of a model process: accepts a connection, and answers its calls until it is closed.
+
+    :param Listener listener: The engine's socket.
+    :param Model m:
+    :param str path: The engine directory.
+    :param int threshold: @see dump
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    while True:
+        conn = listener.accept()
+        try:
+            while True:
+                try:
+                    message = conn.recv_bytes()
+                except EOFError:
+                    break
+                answer(conn, m, message, path, threshold)
+        except OSError as err:
+            logger.warning("Model process %d lost its connection: %s", os.getpid(), err)
+        finally:
+            conn.close()
+
+
+class EngineSupervisor(object):
+    """Loads the model, forks the model processes, and restarts them when they exit.
+
+    :param str model_path:
+    :param str path: The engine directory, where the socket is created.
+    :param int processes: The number of model processes.
+    :param int threshold: @see dump
+    :param int backlog: The number of calls that can wait for a model process.
+    :param float buffer_ttl: How long, in seconds, buffer files are kept before they are removed as stale.
+    """
+
+    def __init__(self, model_path, path, processes=2, threshold=DEFAULT_THRESHOLD, backlog=DEFAULT_BACKLOG,
+                 buffer_ttl=DEFAULT_BUFFER_TTL):
+        self.model_path = osp.abspath(model_path)
+        self.path = path
+        self.processes = max(int(processes), 1)
+        self.threshold = threshold
+        self.backlog = backlog
+        self.buffer_ttl = float(buffer_ttl)
+        self.restarts = 0
+
+    def run(self):
+        """Runs until terminated (SIGTERM or SIGINT), then stops the model processes."""
+        def stop(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        Model = get_model_class(self.model_path)
+        if Model is None:
+            raise EngineError("Unable to load model: {}".format(self.model_path))
+        m = Model(self.model_path)
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        listener = Listener(osp.join(self.path, SOCKET_NAME), "AF_UNIX", self.backlog)
+        context = multiprocessing.get_context("fork")
+        children = {}
+        try:
+            for i in range(self.processes):
+                self._start(context, children, listener, m, i)
+            logger.info("Model engine started: %d processes, socket: %s", self.processes, listener.address)
+            self._supervise(context, children, listener, m)
+        finally:
+            for process, _ in children.values():
+                process.terminate()
+            for process, _ in children.values():
+                process.join(5)
+            listener.close()
+
+    def _start(self, context, children, listener, m, slot):
+        process = context.Process(target=serve_model, args=(listener, m, self.path, self.threshold), daemon=True)
+        process.start()
+        children[process.sentinel] = (process, slot)
+        return process
+
+    def _supervise(self, context, children, listener, m):
+        parent = os.getppid()
+        started = {slot: time.monotonic() for _, slot in children.values()}
+        failures = {}
+        swept = time.monotonic()
+        while os.getppid() == parent:
+            if time.monotonic() - swept > _SWEEP_INTERVAL:
+                removed = sweep_buffers(self.path, self.buffer_ttl)
+                if removed > 0:
+                    logger.warning("Removed %d stale model engine buffers", removed)
+                swept = time.monotonic()
+            for sentinel in wait(list(children), 1.0):
+                process, slot = children.pop(sentinel)
+                process.join()
+                uptime = time.monotonic() - started[slot]
+                failures[slot] = failures.get(slot, 0) + 1 if uptime < _MIN_UPTIME else 0
+                backoff = min(0.1 * 2 ** failures[slot], _MAX_BACKOFF) if failures[slot] else 0.0
+                logger.warning("Model process %d exited with code %s after %.1fs, restarting%s", process.pid,
+                               process.exitcode, uptime, " in {:.1f}s".format(backoff) if backoff else "")
+                time.sleep(backoff)
+                self.restarts += 1
+                started[slot] = time.monotonic()
+                self._start(context, children, listener, m, slot)
+
+
+class EngineClient(object):
+    """Sends calls to the model processes of an engine.
+
+    :param str path: The engine directory.
+    :param int threshold: @see dump
+    :param float timeout: The time to wait for a result, in seconds, or None to wait as long as it takes.
+    :param float connect_timeout: The time to wait for the engine to start, in seconds.
+    :param int max_in_flight: The number of calls this client can have in the engine, or None for no limit.
+    """
+
+    def __init__(self, path, threshold=DEFAULT_THRESHOLD, timeout=None, connect_timeout=60.0, max_in_flight=None):
+        self.path = path
+        self.address = osp.join(path, SOCKET_NAME)
+        self.threshold = threshold
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_in_flight = max(int(max_in_flight), 1) if max_in_flight is not None else None
+        self.is_gevent = is_gevent_patched()
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """The number of calls in the engine."""
+        return self._in_flight
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, "AF_UNIX")
+            except BlockingIOError:
+                # The backlog is full
+                raise EngineBusy("The model engine is busy.")
+            except (FileNotFoundError, ConnectionRefusedError) as err:
+                # The engine is starting, or a model process is being restarted
+                if time.monotonic() > deadline:
+                    raise EngineError("Unable to connect to the model engine: {}".format(err))
+                time.sleep(0.05)
+
+    def _wait(self, conn):
+        if self.is_gevent:
+            # Yield to other greenlets while the model process works
+            from gevent.socket import wait_read
+            try:
+                wait_read(conn.fileno(), self.timeout)
+            except Exception:
+                raise EngineError("The model engine timed out.")
+        elif self.timeout is not None and not conn.poll(self.timeout):
+            raise EngineError("The model engine timed out.")
+
+    def _call(self, method, args) -> bytes:
+        message, files = dump((method, args), self.path, self.threshold)
+        try:
+            conn = self._connect()
+            try:
+                conn.send_bytes(message)
+                self._wait(conn)
+                return conn.recv_bytes()
+            finally:
+                conn.close()
+        except (EOFError, OSError) as err:
+            raise EngineError("The model process failed: {}".format(err or type(err).__name__))
+        finally:
+            remove_files(self.path, files)
+
+    def call(self, method, *args):
+        """Calls a method of the model in a model process.
+
+        :param str method: @see METHODS
+        :param args:
+        :return: The result.
+        :raises EngineBusy: If the client has max_in_flight calls in the engine.
+        :raises EngineError: If the model raises an exception, or the model process fails.
+        """
+        with self._lock:
+            if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                raise EngineBusy("The model engine is busy.")
+            self._in_flight += 1
+        try:
+            message = self._call(method, args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        r = load(message, self.path)
+        if r[0] == "error":
+            raise EngineError(r[1], r[2])
+        return r[1]
+
+
+class RemoteModel(object):
+    """Stands in for the model in the front ends, calling it in the engine's model processes.
+
+    :param EngineClient client:
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, X):
+        return self.client.call("predict", X)
+
+    def load_test_data(self, path="."):
+        return self.client.call("load_test_data", path)
+
+
+def start_supervisor(config_path, model_path, path) -> subprocess.Popen:
+    """Starts the engine supervisor in a new process.
+
+    :param str config_path: The app_config path, which sets the server.engine options.
+    :param str model_path:
+    :param str path: The engine directory @see make_engine_path
+    :return Popen:
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    return subprocess.Popen([sys.executable, "-c", "import sys; from catwalk.server.engine import main; main(sys.argv[1:])",
+                             config_path or "", osp.abspath(model_path), path], env=env)
+
+
+class ModelEngine(object):
+    """Runs an engine supervisor with its own directory, for servers that are not started by start_nginx, e.g. the
+    debug server. It is stopped when this process exits.
+
+    :param str config_path: @see start_supervisor
+    :param str model_path:
+    """
+
+    def __init__(self, config_path, model_path):
+        self.path = make_engine_path()
+        self._process = start_supervisor(config_path, model_path, self.path)
+        atexit.register(self.stop)
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process.poll() is None
+
+    def stop(self):
+        """Stops the supervisor and its model processes, and removes the engine directory."""
+        if self.is_alive:
+            self._process.terminate()
+            try:
+                self._process.wait(10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def main(argv):
+    """Runs the engine supervisor @see start_supervisor
+
+    :param list argv: The config path (or ""), the model path and the engine directory.
+    """
+    from ..helpers.configuration import app_config
+    from ..helpers.logging import get_logger_from_app_config
+    from .workers import available_cpus
+
+    config, model_path, path = argv
+    app_config.load(config or None)
+    global logger
+    logger = get_logger_from_app_config(__name__)
+    processes = app_config.get_nested("server.engine.processes", available_cpus()[0])
+    threshold = app_config.get_nested("server.engine.shm_threshold", DEFAULT_THRESHOLD)
+    backlog = app_config.get_nested("server.engine.backlog", DEFAULT_BACKLOG)
+    buffer_ttl = app_config.get_nested("server.engine.buffer_ttl", DEFAULT_BUFFER_TTL)
+    EngineSupervisor(model_path, path, processes, threshold, backlog, buffer_ttl).run()
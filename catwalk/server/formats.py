@@ -0,0 +1,319 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Wire formats for /predict requests and responses, selected by content negotiation.
+
+- JSON (application/json) is always available.
+- MessagePack (application/msgpack) encodes the same envelope as JSON, and requires the msgpack package.
+- Arrow IPC streams (application/vnd.apache.arrow.stream) are available for PANDAS_DATA_FRAME models, and require
+  the pyarrow package. The stream holds the input (or output) table, and the rest of the envelope (correlation_id,
+  model and extra_data) is stored as JSON in the "catwalk" schema metadata key.
+- Raw tensors (application/octet-stream) are available for NUMPY_ARRAY models. The body is the raw buffer of the
+  input (or output) tensor, and its shape, dtype and correlation_id are given in headers.
+"""
+import json
+
+from ..validation.model import ModelIOTypes
+from ..validation.tensor import format_shape, parse_shape
+from .codec import default_encoder
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+ENVELOPE_KEYS = ["correlation_id", "model", "extra_data"]
+ARROW_METADATA_KEY = b"catwalk"
+SHAPE_HEADER = "X-Tensor-Shape"
+DTYPE_HEADER = "X-Tensor-Dtype"
+CORRELATION_ID_HEADER = "X-Correlation-ID"
+
+
+class JSONFormat(object):
+    """The JSON wire format.
+
+    :param codec: The JSON codec to use @see catwalk.server.codec.
+    """
+
+    name = "JSON"
+    mimetype = "application/json"
+    mimetypes = ["application/json"]
+    # The decoded size of a request relative to its body @see catwalk.server.admission
+    expansion = 6
+
+    def __init__(self, codec):
+        self.codec = codec
+
+    def decode(self, body) -> dict:
+        """Decodes a request body.
+
+        :param bytes body:
+        :return dict: The request data.
+        :raises ValueError: If the body cannot be decoded.
+        """
+        return self.codec.loads(body)
+
+    def encode(self, data) -> bytes:
+        """Encodes response data.
+
+        :param dict data:
+        :return bytes: The response body.
+        """
+        return self.codec.dumps(data)
+
+
+class MsgPackFormat(object):
+    """The MessagePack wire format."""
+
+    name = "MessagePack"
+    mimetype = "application/msgpack"
+    mimetypes = ["application/msgpack", "application/x-msgpack"]
+    # The decoded size of a request relative to its body @see catwalk.server.admission
+    expansion = 8
+
+    @staticmethod
+    def decode(body) -> dict:
+        """Decodes a request body.
+
+        :param bytes body:
+        :return dict: The request data.
+        :raises ValueError: If the body cannot be decoded.
+        """
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as err:
+            raise ValueError("Invalid MessagePack: {}".format(err))
+
+    @staticmethod
+    def encode(data) -> bytes:
+        """Encodes response data.
+
+        :param dict data:
+        :return bytes: The response body.
+        """
+        return msgpack.packb(data, use_bin_type=True, default=default_encoder)
+
+
+class ArrowFormat(object):
+    """The Arrow IPC stream wire format.
+
+    Decoded requests hold the input as a pyarrow Table. Convert it with to_data_frame, which avoids copies where the
+    column types allow.
+    """
+
+    name = "Arrow"
+    mimetype = "application/vnd.apache.arrow.stream"
+    mimetypes = ["application/vnd.apache.arrow.stream"]
+    # The decoded size of a request relative to its body @see catwalk.server.admission
+    expansion = 2
+
+    @staticmethod
+    def decode(body) -> dict:
+        """Decodes a request body.
+
+        :param bytes body:
+        :return dict: The request data, with a pyarrow Table as "input".
+        :raises ValueError: If the body cannot be decoded.
+        """
+        data, table = ArrowFormat.read_stream(body)
+        data["input"] = table
+        return data
+
+    @staticmethod
+    def encode(data) -> bytes:
+        """Encodes response data.
+
+        :param dict data: The response data, with a DataFrame (or list of records) as "output".
+        :return bytes: The response body.
+        """
+        return ArrowFormat.write_stream(data["output"], data)
+
+    @staticmethod
+    def read_stream(body) -> (dict, object):
+        """Reads an Arrow IPC stream.
+
+        :param bytes body:
+        :return (dict, pyarrow.Table): The envelope stored in the metadata, and the table.
+        :raises ValueError: If the body cannot be read.
+        """
+        try:
+            table = pyarrow.ipc.open_stream(pyarrow.py_buffer(body)).read_all()
+        except Exception as err:
+            raise ValueError("Invalid Arrow IPC stream: {}".format(err))
+
+        metadata = table.schema.metadata or {}
+        envelope = json.loads(metadata[ARROW_METADATA_KEY]) if ARROW_METADATA_KEY in metadata else {}
+        if not isinstance(envelope, dict):
+            raise ValueError("Invalid Arrow IPC stream: the catwalk metadata must be an object")
+        return envelope, table
+
+    @staticmethod
+    def write_stream(rows, envelope) -> bytes:
+        """Writes an Arrow IPC stream.
+
+        :param DataFrame|list rows: A DataFrame or list of records.
+        :param dict envelope: The envelope to store in the metadata. Only the ENVELOPE_KEYS are stored.
+        :return bytes:
+        """
+        if isinstance(rows, list):
+            table = pyarrow.Table.from_pylist(rows)
+        else:
+            table = pyarrow.Table.from_pandas(rows, preserve_index=False)
+
+        envelope = {k: envelope[k] for k in ENVELOPE_KEYS if k in envelope}
+        metadata = dict(table.schema.metadata or {})
+        metadata[ARROW_METADATA_KEY] = json.dumps(envelope, default=default_encoder).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def to_data_frame(table):
+        """Converts a pyarrow Table to a DataFrame, without copying numeric columns that have no nulls.
+
+        :param pyarrow.Table table:
+        :return DataFrame:
+        """
+        return table.to_pandas(split_blocks=True)
+
+
+class TensorFormat(object):
+    """The raw tensor wire format.
+
+    Request bodies are the little-endian, C order buffer of the input tensor. The shape is given as comma separated
+    dimensions in the X-Tensor-Shape header, which can be left out if at most one dimension of the model's input is
+    variable, and the dtype can be checked with the X-Tensor-Dtype header. The correlation_id can be given in the
+    X-Correlation-ID header. Responses hold the output tensor in the same way, with all three headers set.
+    """
+
+    name = "Tensor"
+    mimetype = "application/octet-stream"
+    mimetypes = ["application/octet-stream"]
+    # The decoded size of a request relative to its body @see catwalk.server.admission
+    expansion = 1
+
+    @staticmethod
+    def decode(body) -> dict:
+        """Decodes a request body.
+
+        :param bytes body:
+        :return dict: The request data, with the tensor in its request form as "input" @see read_headers.
+        """
+        return {"input": {"data": body}}
+
+    @staticmethod
+    def read_headers(data, headers):
+        """Adds the shape, dtype and correlation_id given in the request headers to decoded request data.
+
+        :param dict data: The decoded request data.
+        :param headers: The request headers.
+        :raises ValueError: If the shape header is invalid.
+        """
+        if SHAPE_HEADER in headers:
+            data["input"]["shape"] = parse_shape(headers[SHAPE_HEADER])
+        if DTYPE_HEADER in headers:
+            data["input"]["dtype"] = headers[DTYPE_HEADER]
+        if CORRELATION_ID_HEADER in headers:
+            data["correlation_id"] = headers[CORRELATION_ID_HEADER]
+
+    @staticmethod
+    def encode(data) -> bytes:
+        """Encodes response data.
+
+        :param dict data: The response data, with the output tensor in its response form (with bytes data).
+        :return bytes: The response body.
+        """
+        return data["output"]["data"]
+
+    @staticmethod
+    def headers(data) -> dict:
+        """Returns the headers of a response.
+
+        :param dict data: The response data.
+        :return dict:
+        """
+        return {
+            SHAPE_HEADER: format_shape(data["output"]["shape"]),
+            DTYPE_HEADER: data["output"]["dtype"],
+            CORRELATION_ID_HEADER: data["correlation_id"]
+        }
+
+
+def is_arrow_table(X) -> bool:
+    """Checks if X is a pyarrow Table.
+
+    :param X:
+    :return bool:
+    """
+    return pyarrow is not None and isinstance(X, pyarrow.Table)
+
+
+def get_formats(codec, io_type=ModelIOTypes.PYTHON_DICT) -> list:
+    """Returns the wire formats available for a model, in order of preference. JSON is always first.
+
+    :param codec: The JSON codec to use.
+    :param str io_type: The IO type of the model @see ModelIOTypes.
+    :return list:
+    """
+    formats = [JSONFormat(codec)]
+    if msgpack is not None:
+        formats.append(MsgPackFormat())
+    if pyarrow is not None and io_type == ModelIOTypes.PANDAS_DATA_FRAME:
+        formats.append(ArrowFormat())
+    if io_type == ModelIOTypes.NUMPY_ARRAY:
+        formats.append(TensorFormat())
+    return formats
+
+
+def request_format(formats, mimetype):
+    """Finds the wire format of a request by its mimetype.
+
+    :param list formats: The available formats.
+    :param str mimetype: The request's mimetype, without parameters.
+    :return: The format, or None if the mimetype is not supported.
+    """
+    for fmt in formats:
+        if mimetype in fmt.mimetypes:
+            return fmt
+    # Flask also treats application/*+json as JSON
+    if mimetype.startswith("application/") and mimetype.endswith("+json"):
+        return formats[0]
+
+
+def response_format(formats, accept_mimetypes, default):
+    """Chooses the wire format of a response from the Accept header.
+
+    :param list formats: The available formats.
+    :param MIMEAccept accept_mimetypes: The request's parsed Accept header.
+    :param default: The format to use if Accept does not prefer any other, i.e. the request's format.
+    :return: The format.
+    """
+    candidates = [default.mimetype] + [fmt.mimetype for fmt in formats if fmt is not default]
+    best = accept_mimetypes.best_match(candidates, default=default.mimetype)
+    for fmt in formats:
+        if fmt.mimetype == best:
+            return fmt
+    return default
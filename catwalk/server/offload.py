@@ -0,0 +1,227 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Runs the model's predict method in a bounded pool of native threads.
+
+Under gunicorn's gevent worker every request is a greenlet on one thread, so a CPU bound predict blocks the hub and
+every other request of the worker (including /status) until it returns. The PredictPool runs predict in gevent's
+native thread pool instead, and the calling greenlet yields until it is done, so the worker keeps serving I/O.
+Without gevent (e.g. sync or gthread workers) a concurrent.futures pool is used, which bounds the concurrent predicts.
+
+Calls beyond the threads wait in a queue of max_queue calls, and calls beyond that are rejected straight away with
+PredictPoolFull, so overload is answered with a fast 503 rather than a growing queue. Work that was already accepted
+(jobs and streams) is run with admit_all, which queues it regardless of the bound. With priority lanes, calls wait in
+the queue of their lane instead, see catwalk.server.lanes.
+
+Work that must not block the hub when the pool is disabled (e.g. jobs), or that is not a predict call (loading the
+models of the model registry), is run with run_native.
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class PredictPoolFull(Exception):
+    """Raised when a call is rejected because the pool's queue is full."""
+    pass
+
+
+def is_gevent_patched() -> bool:
+    """Checks if gevent has monkey patched threading, i.e. this is a gevent worker.
+
+    :return bool:
+    """
+    monkey = sys.modules.get("gevent.monkey")
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+class ContextLocal(object):
+    """A thread local that is also local to each greenlet of a gevent worker, even if it is created before gevent
+    patches threading: with server.preload.enabled, the gunicorn master imports the app (and creates the module level
+    locals) before it forks the gevent workers, and a native thread local is shared by all the greenlets of a worker.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, "_native", threading.local())
+        object.__setattr__(self, "_green", None)
+
+    def _get(self):
+        if self._green is None:
+            if not is_gevent_patched():
+                return self._native
+            from gevent.local import local
+            object.__setattr__(self, "_green", local())
+        return self._green
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+
+_local = ContextLocal()
+
+
+@contextmanager
+def native_scope():
+    """Runs the model calls made in this context (in this thread or greenlet) with run_native, e.g. for jobs when the
+    predict pool is disabled.
+    """
+    _local.native = True
+    try:
+        yield
+    finally:
+        _local.native = False
+
+
+def in_native_scope() -> bool:
+    """Checks if this thread or greenlet is in a native_scope.
+
+    :return bool:
+    """
+    return getattr(_local, "native", False)
+
+
+def run_native(fn, *args):
+    """Calls fn(*args) in a native thread of gevent's hub thread pool under gevent, and yields until it returns, so
+    the worker keeps serving I/O. Without gevent, fn is called in this thread.
+
+    :param callable fn:
+    :param args:
+    :return: The result of fn.
+    """
+    if is_gevent_patched():
+        from gevent import get_hub
+        return get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+class PredictPool(object):
+    """A bounded pool of native threads that run predict calls.
+
+    :param int threads: The number of threads, i.e. concurrent predict calls.
+    :param int max_queue: The number of calls that can wait for a thread. Calls beyond this are rejected.
+    :param ServerMetrics metrics: Records the queue depth, wait times and rejections, if given.
+    :param LaneScheduler lanes: Shares the threads between priority lanes, whose queues replace the pool's queue.
+    """
+
+    def __init__(self, threads=1, max_queue=16, metrics=None, lanes=None):
+        self.threads = max(int(threads), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.metrics = metrics
+        self.lanes = lanes
+        self.is_gevent = is_gevent_patched()
+        if self.is_gevent:
+            from gevent.threadpool import ThreadPool
+            self._pool = ThreadPool(self.threads)
+        else:
+            self._pool = ThreadPoolExecutor(self.threads)
+
+        # The pending count is only changed by the callers, as gevent locks cannot be used from native threads
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._local = threading.local()
+
+    @property
+    def pending(self) -> int:
+        """The number of calls running or queued."""
+        return self._pending
+
+    @contextmanager
+    def admit_all(self):
+        """Admits the calls made in this context (in this thread or greenlet) even if the queue is full."""
+        self._local.admit_all = True
+        try:
+            yield
+        finally:
+            self._local.admit_all = False
+
+    def run(self, fn, X, lane=None):
+        """Calls fn(X) in a thread of the pool, and waits for its result.
+
+        :param callable fn: e.g. the model's predict method.
+        :param X: The model input.
+        :param str lane: The priority lane of the call, or None for the default lane.
+        :return: The result of fn.
+        :raises PredictPoolFull: If the queue (or the lane's queue) is full.
+        """
+        if self.lanes is not None:
+            return self._run_in_lane(fn, X, lane)
+
+        with self._lock:
+            if self._pending >= self.threads + self.max_queue and not getattr(self._local, "admit_all", False):
+                rejected = True
+            else:
+                rejected = False
+                self._pending += 1
+                self._record_depth()
+        if rejected:
+            if self.metrics is not None:
+                self.metrics.predict_rejected.inc()
+            raise PredictPoolFull("Predict queue is full.")
+
+        queued = time.perf_counter()
+        try:
+            started, r = self._call(fn, X)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._record_depth()
+
+        if self.metrics is not None:
+            self.metrics.predict_wait.observe(started - queued)
+        return r
+
+    def _run_in_lane(self, fn, X, lane):
+        # The lane scheduler hands out the threads, so the call starts straight away once it is admitted
+        queued = time.perf_counter()
+        admitted = self.lanes.acquire(lane, getattr(self._local, "admit_all", False))
+        with self._lock:
+            self._pending += 1
+        try:
+            started, r = self._call(fn, X)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self.lanes.release(admitted)
+
+        if self.metrics is not None:
+            self.metrics.predict_wait.observe(started - queued)
+        return r
+
+    def _call(self, fn, X):
+        def timed():
+            return time.perf_counter(), fn(X)
+
+        if self.is_gevent:
+            return self._pool.spawn(timed).get()
+        return self._pool.submit(timed).result()
+
+    def _record_depth(self):
+        if self.metrics is not None:
+            self.metrics.predict_queue.set(max(self._pending - self.threads, 0))
+
+    def shutdown(self):
+        """Stops the threads of the pool."""
+        if self.is_gevent:
+            self._pool.kill()
+        else:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,80 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Payload orientations for PANDAS_DATA_FRAME models.
+
+A request's "orient" selects how its input is laid out, and its output is returned in the same orientation:
+- "records" (the default): a list of {column: value} rows, or a single row.
+- "columns": {column: [values]}, i.e. one list per column.
+- "split": {"columns": [names], "data": [[row values]]}, as pandas' split orientation (an "index" is ignored).
+
+The column orientations do not repeat the column names on every row, and are converted to and from DataFrames a
+column at a time rather than a row at a time.
+"""
+from ..validation.model import PayloadOrients
+
+RECORDS = PayloadOrients.RECORDS
+COLUMNS = PayloadOrients.COLUMNS
+SPLIT = PayloadOrients.SPLIT
+
+
+def to_data_frame(X, orient, pd):
+    """Builds a DataFrame from a column oriented input.
+
+    :param dict X: The input.
+    :param str orient: COLUMNS or SPLIT.
+    :param module pd: The pandas module.
+    :return DataFrame:
+    """
+    if orient == COLUMNS:
+        return pd.DataFrame(X)
+    return pd.DataFrame(X["data"], columns=X["columns"])
+
+
+def _column_values(column):
+    """Returns a column's values as a NumPy array, which orjson encodes natively, or as a list for object columns."""
+    values = column.to_numpy()
+    if values.dtype.kind == "O":
+        return values.tolist()
+    return values
+
+
+def from_data_frame(r, orient) -> dict:
+    """Converts a DataFrame output to a column oriented output.
+
+    :param DataFrame r: The output.
+    :param str orient: COLUMNS or SPLIT.
+    :return dict:
+    """
+    if orient == COLUMNS:
+        return {column: _column_values(r[column]) for column in r.columns}
+    return {"columns": list(r.columns), "data": r.to_numpy().tolist()}
+
+
+def batch_rows(X, orient=RECORDS) -> int:
+    """Returns the number of rows in an input.
+
+    :param X: The input.
+    :param str orient: The orientation of the input.
+    :return int:
+    """
+    if orient == COLUMNS:
+        return len(next(iter(X.values()), ()))
+    if orient == SPLIT:
+        return len(X["data"])
+    return len(X) if isinstance(X, list) else 1
@@ -0,0 +1,107 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Helpers to treat the model-native batch types (a list of records, or a pandas DataFrame) uniformly.
+pandas is only imported when a DataFrame is actually passed in.
+"""
+
+
+def is_data_frame(X) -> bool:
+    """Checks if X is a pandas DataFrame, without importing pandas.
+
+    :param X: A model-native batch.
+    :return bool:
+    """
+    return type(X).__name__ == "DataFrame" and hasattr(X, "iloc")
+
+
+def batch_length(X) -> int:
+    """Returns the number of rows in a model-native batch.
+
+    :param list|DataFrame X:
+    :return int:
+    """
+    return len(X)
+
+
+def concat_batches(batches):
+    """Concatenates model-native batches into a single batch.
+
+    :param list batches: A list of batches, which must all be the same type.
+    :return list|DataFrame: The concatenated batch.
+    """
+    if len(batches) == 1:
+        return batches[0]
+
+    if is_data_frame(batches[0]):
+        import pandas as pd
+        return pd.concat(batches, ignore_index=True)
+
+    r = []
+    for X in batches:
+        r.extend(X)
+    return r
+
+
+def slice_batch(X, start, stop):
+    """Returns the rows of X in the range [start, stop).
+
+    :param list|DataFrame X:
+    :param int start:
+    :param int stop:
+    :return list|DataFrame:
+    """
+    if is_data_frame(X):
+        return X.iloc[start:stop].reset_index(drop=True)
+    return X[start:stop]
+
+
+def take_rows(X, indices):
+    """Returns the rows of X at the given positions, in the given order.
+
+    :param list|DataFrame X:
+    :param list indices: Row positions.
+    :return list|DataFrame:
+    """
+    if is_data_frame(X):
+        return X.iloc[indices].reset_index(drop=True)
+    return [X[i] for i in indices]
+
+
+def split_rows(r) -> list:
+    """Splits a model-native batch into a list of rows. DataFrame rows are returned as record dicts.
+
+    :param list|DataFrame r:
+    :return list:
+    """
+    if is_data_frame(r):
+        return r.to_dict(orient="records")
+    return list(r)
+
+
+def join_rows(rows, as_data_frame=False):
+    """Joins a list of rows, as returned by split_rows, back into a model-native batch.
+
+    :param list rows:
+    :param bool as_data_frame: If True, return a DataFrame rather than a list.
+    :return list|DataFrame:
+    """
+    if as_data_frame:
+        import pandas as pd
+        return pd.DataFrame.from_records(rows)
+    return rows
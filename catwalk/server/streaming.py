@@ -0,0 +1,119 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Streaming prediction of newline-delimited JSON (NDJSON) records.
+
+Input records are read, validated and predicted in chunks, and the results of each chunk are written out as NDJSON
+before the next chunk is read, so memory use is bounded by the chunk size rather than the size of the request.
+"""
+import logging
+
+from schema import SchemaError
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+class StreamError(Exception):
+    """An error in a line of the input stream."""
+
+    def __init__(self, line, message):
+        super().__init__(message)
+        self.line = line
+        self.message = message
+
+
+def iter_records(lines, codec, row_schema):
+    """Decodes and validates NDJSON records. Blank lines are skipped.
+
+    :param iterable lines: The input lines, as bytes.
+    :param codec: The JSON codec @see catwalk.server.codec.
+    :param row_schema: The schema (or compiled schema) of a single record.
+    :return: A generator of (line number, record) tuples.
+    :raises StreamError: If a line is not valid JSON or does not match the schema.
+    """
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if len(line) == 0:
+            continue
+
+        try:
+            record = codec.loads(line)
+        except ValueError:
+            raise StreamError(n, "JSON parse error.")
+
+        try:
+            row_schema.validate(record)
+        except SchemaError as err:
+            raise StreamError(n, err.code)
+
+        yield n, record
+
+
+def stream_predictions(lines, predict_records, codec, row_schema, chunk_size=1000):
+    """Predicts NDJSON records in chunks, and yields the NDJSON results of each chunk.
+
+    If a line is invalid, the valid records before it are predicted, and a final {"error": {"line": ...,
+    "message": ...}} record is written in place of the rest of the results. If predict fails (e.g. the model raises,
+    or the predict queue is full), the error record gives the first line of the chunk that failed, as the response
+    has already started and its status cannot be changed.
+
+    :param iterable lines: The input lines, as bytes.
+    :param callable predict_records: A function that predicts a list of records and returns a list of results.
+    :param codec: The JSON codec @see catwalk.server.codec.
+    :param row_schema: The schema (or compiled schema) of a single record.
+    :param int chunk_size: The maximum number of records predicted at a time.
+    :return: A generator of bytes.
+    """
+    chunk_size = max(int(chunk_size), 1)
+    chunk = []
+    first = None
+    error = None
+
+    try:
+        for n, record in iter_records(lines, codec, row_schema):
+            if len(chunk) == 0:
+                first = n
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                records, chunk = chunk, []
+                yield _predict_lines(first, records, predict_records, codec)
+    except StreamError as err:
+        error = err
+
+    if len(chunk) > 0:
+        try:
+            yield _predict_lines(first, chunk, predict_records, codec)
+        except StreamError as err:
+            error = err
+
+    if error is not None:
+        yield codec.dumps({"error": {"line": error.line, "message": error.message}}) + b"\n"
+
+
+def _predict_lines(line, records, predict_records, codec) -> bytes:
+    try:
+        return _encode_lines(predict_records(records), codec)
+    except Exception as err:
+        logger.exception("Stream predict failed at line %d", line)
+        raise StreamError(line, "Predict failed: {}".format(err))
+
+
+def _encode_lines(records, codec) -> bytes:
+    return b"".join(codec.dumps(r) + b"\n" for r in records)
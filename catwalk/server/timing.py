@@ -0,0 +1,98 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Per-request timing of the stages of a predict call, in wall and CPU time.
+
+A StageTimer is started when a request arrives, and each call to lap ends the current stage, so the stages of a
+request add up to its total time. The timings are reported in a Server-Timing header and a structured log record.
+"""
+import time
+from collections import OrderedDict
+
+# Per-thread CPU time, so the CPU time of a stage does not include other threads (Python 3.7+)
+cpu_time = getattr(time, "thread_time", time.process_time)
+
+
+class StageTimer(object):
+    """Times consecutive stages. Laps with the same stage name are added together."""
+
+    __slots__ = ["stages", "started", "_wall", "_cpu"]
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self._wall = self.started = time.perf_counter()
+        self._cpu = cpu_time()
+
+    def lap(self, stage):
+        """Ends the current stage (which began at the previous lap, or when the timer was created).
+
+        :param str stage: The name of the stage.
+        """
+        wall = time.perf_counter()
+        cpu = cpu_time()
+        times = self.stages.get(stage)
+        if times is None:
+            self.stages[stage] = [wall - self._wall, cpu - self._cpu]
+        else:
+            times[0] += wall - self._wall
+            times[1] += cpu - self._cpu
+        self._wall = wall
+        self._cpu = cpu
+
+    @property
+    def total(self) -> float:
+        """The wall time, in seconds, from the start of the timer to the end of the last stage."""
+        return self._wall - self.started
+
+    def server_timing(self) -> str:
+        """Formats the timings as a Server-Timing header value, in milliseconds, with the CPU time as the description.
+
+        :return str:
+        """
+        metrics = ["{};dur={:.3f};desc=\"cpu={:.3f}ms\"".format(stage, 1000 * wall, 1000 * cpu)
+                   for stage, (wall, cpu) in self.stages.items()]
+        metrics.append("total;dur={:.3f}".format(1000 * self.total))
+        return ", ".join(metrics)
+
+    def to_dict(self) -> dict:
+        """Returns the timings in milliseconds, for structured logs.
+
+        :return dict: {"stages": {stage: {"wall_ms": ..., "cpu_ms": ...}}, "total_ms": ...}
+        """
+        return {
+            "stages": {stage: {"wall_ms": round(1000 * wall, 3), "cpu_ms": round(1000 * cpu, 3)}
+                       for stage, (wall, cpu) in self.stages.items()},
+            "total_ms": round(1000 * self.total, 3)
+        }
+
+
+def parse_server_timing(value) -> OrderedDict:
+    """Parses a Server-Timing header value written by StageTimer.server_timing.
+
+    :param str value:
+    :return OrderedDict: {name: {"dur": float, "desc": str}}
+    """
+    r = OrderedDict()
+    for metric in value.split(","):
+        parts = [p.strip() for p in metric.split(";")]
+        params = {}
+        for param in parts[1:]:
+            key, _, v = param.partition("=")
+            params[key] = float(v) if key == "dur" else v.strip("\"")
+        r[parts[0]] = params
+    return r
@@ -16,6 +16,7 @@
 #
 ##############################################################################
 """A collection of utilities needed to manage configuration and execution of models."""
+import hashlib
 import re
 import os
 import os.path as osp
@@ -25,6 +26,9 @@ import sys
 
 import yaml
 
+# The prefix of the names of the modules models are imported as @see get_model_module_name
+MODEL_MODULE_PREFIX = "catwalk_model_"
+
 
 def get_docker_tag(model_meta) -> str:
     """Sanitise a model name in the yaml for safe use as a Docker tag.
@@ -36,13 +40,24 @@ def get_docker_tag(model_meta) -> str:
     return re.sub(r"[^A-Za-z0-9\-_]", "", tag)
 
 
-def get_model_class(model_path=".", model_file_name="model.py", model_class_name="Model", model_module_name="model"):
+def get_model_module_name(model_path) -> str:
+    """Returns the name of the module a model is imported as. It is unique to the model path, so several models can be
+    imported in one process, and the same in every process, so e.g. objects of the model's classes can be pickled.
+
+    :param str model_path: The path to the model directory.
+    :return str:
+    """
+    return MODEL_MODULE_PREFIX + hashlib.sha1(osp.abspath(model_path).encode("utf-8")).hexdigest()[:16]
+
+
+def get_model_class(model_path=".", model_file_name="model.py", model_class_name="Model", model_module_name=None):
     """Imports a model from a specified path, and returns the model class implementation from that module.
 
     :param str model_path: The path to the model directory.
     :param str model_file_name: The filename where the Model class resides.
     :param str model_class_name: The Model class name within the module.
-    :param str model_module_name: The Model module name that will be created. TODO: derive this from the model name?
+    :param str model_module_name: The Model module name that will be created, by default one unique to the model path
+                                    @see get_model_module_name
     :return class: The Model class from the module
     """
     model_path = osp.abspath(model_path)
@@ -54,10 +69,16 @@ def get_model_class(model_path=".", model_file_name="model.py", model_class_name
         return
 
     # dynamically create a python module
+    model_module_name = model_module_name or get_model_module_name(model_path)
     spec = il_util.spec_from_file_location(model_module_name, model_file)
     model_module = il_util.module_from_spec(spec)
-    spec.loader.exec_module(model_module)
+    # The module is registered before it is executed, as e.g. dataclasses look it up by name
     sys.modules[model_module_name] = model_module
+    try:
+        spec.loader.exec_module(model_module)
+    except BaseException:
+        del sys.modules[model_module_name]
+        raise
 
     if hasattr(model_module, model_class_name):
         return getattr(model_module, model_class_name)
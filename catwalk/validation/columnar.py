@@ -0,0 +1,141 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Columnar batches, the input and output of COLUMNAR models.
+
+COLUMNAR models declare their input and output like batch models, as an object (or an array of objects) in model.yml,
+but are given a dict of equally long columns instead of a list of records:
+
+    {"seed": array('q', [0, 1]), "mu": array('d', [0.0, 0.5]), "name": ["a", "b"]}
+
+Non-nullable integer and number columns are decoded into array.array columns, typed by the property's format:
+int32 ('i'), int64 ('q', the default for integers), float32 ('f') and float64 ('d', the default for numbers).
+They are checked a column at a time as they are decoded (booleans are accepted as 0 and 1, as array.array does).
+Other columns are lists, validated by a compiled validator.
+
+Columns can be wrapped without copying, e.g. with numpy.frombuffer(column, "f8") for 'd' columns.
+"""
+from array import array
+
+from schema import SchemaError
+
+from .compiler import CompiledSchema, from_swagger
+
+# array.array typecodes by property type and format
+TYPECODES = {
+    ("integer", None): "q",
+    ("integer", "int64"): "q",
+    ("integer", "int32"): "i",
+    ("number", None): "d",
+    ("number", "float64"): "d",
+    ("number", "float32"): "f",
+}
+
+
+def _properties(schema) -> dict:
+    """Returns the properties (columns) of an object, or array of objects, schema."""
+    if schema["type"] == "array":
+        schema = schema["items"]
+    if schema["type"] != "object":
+        raise ValueError("COLUMNAR models require object, or array of object, schemas")
+    return schema["properties"]
+
+
+class _Column(object):
+    """A column of a ColumnarSpec."""
+
+    __slots__ = ["name", "path", "typecode", "validator"]
+
+    def __init__(self, name, schema, path):
+        self.name = name
+        self.path = path + "." + name
+        self.typecode = None if schema.get("nullable", False) else TYPECODES.get((schema["type"],
+                                                                                  schema.get("format")))
+        self.validator = CompiledSchema(("list", from_swagger(schema), False), self.path)
+
+    def decode(self, values):
+        if self.typecode is None:
+            return self.validator.validate(values)
+        if isinstance(values, array) and values.typecode == self.typecode:
+            return values
+        try:
+            return array(self.typecode, values)
+        except (TypeError, OverflowError) as err:
+            # The compiled validator finds the row with the invalid value, otherwise it was out of range
+            self.validator.validate(values if isinstance(values, list) else list(values))
+            raise SchemaError("Key '{}' error: {}".format(self.path, err))
+
+
+class ColumnarSpec(object):
+    """The columns of a COLUMNAR model's input or output, as declared in model.yml.
+
+    :param dict schema: The input or output schema.
+    :param str path: The path of the columns in error messages, e.g. "input".
+    """
+
+    def __init__(self, schema, path="input"):
+        self.path = path
+        self.columns = [_Column(name, column, path) for name, column in _properties(schema).items()]
+        self.names = frozenset(column.name for column in self.columns)
+
+    def decode(self, X) -> dict:
+        """Validates and decodes columns, typing the integer and number columns.
+
+        :param dict X: The columns.
+        :return dict: The decoded columns.
+        :raises SchemaError: If the columns are invalid.
+        """
+        if not isinstance(X, dict):
+            raise SchemaError("Key '{}' error: {!r} should be instance of 'dict'".format(self.path, type(X).__name__))
+        if len(X) != len(self.names) or not self.names.issuperset(X):
+            wrong = sorted(set(X) - self.names)
+            missing = sorted(self.names - set(X))
+            raise SchemaError("Key '{}' error: {}".format(
+                self.path, "Wrong key {!r}".format(wrong[0]) if wrong else "Missing key: {!r}".format(missing[0])))
+
+        r = {column.name: column.decode(X[column.name]) for column in self.columns}
+        if len(set(len(values) for values in r.values())) > 1:
+            raise SchemaError("Key '{}' error: columns should all have the same length".format(self.path))
+        return r
+
+    @staticmethod
+    def length(X) -> int:
+        """Returns the number of rows of columns.
+
+        :param dict X:
+        :return int:
+        """
+        return len(next(iter(X.values()), ()))
+
+    def from_records(self, records) -> dict:
+        """Converts a list of records to decoded columns.
+
+        :param list records:
+        :return dict:
+        :raises SchemaError: If the records are invalid.
+        """
+        return self.decode({column.name: [record[column.name] for record in records] for column in self.columns})
+
+    def to_records(self, X) -> list:
+        """Converts columns to a list of records.
+
+        :param dict X:
+        :return list:
+        """
+        names = [column.name for column in self.columns]
+        return [dict(zip(names, row)) for row in zip(*(X[name] for name in names))]
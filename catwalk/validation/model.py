@@ -32,6 +32,17 @@ def is_loaded_model(request, model_info):
     return r_model_info["name"] == model_info["name"] and r_model_info["version"] == model_info["version"]
 
 
+def is_batch_model(model_info):
+    """Checks if the model's predict method takes a batch of rows, i.e. it is a PANDAS_DATA_FRAME model or its input
+    schema is an array.
+
+    :param dict model_info: The loaded model info.
+    :return bool: True if the model predicts batches.
+    """
+    io_type = ModelIOTypes.get_io_type(model_info)
+    return io_type == ModelIOTypes.PANDAS_DATA_FRAME or model_info["schema"]["input"]["type"] == "array"
+
+
 class ModelIOTypes(object):
     """Models can have support for various IO types (what they expect is their "X" argument).
      This class lists the supported values.
@@ -39,6 +50,8 @@ class ModelIOTypes(object):
     """
     PANDAS_DATA_FRAME = "PANDAS_DATA_FRAME"
     PYTHON_DICT = "PYTHON_DICT"
+    NUMPY_ARRAY = "NUMPY_ARRAY"
+    COLUMNAR = "COLUMNAR"
 
     @staticmethod
     def get_io_type(model_meta) -> str:
@@ -49,3 +62,15 @@ class ModelIOTypes(object):
         if "io_type" in model_meta and model_meta["io_type"] in ModelIOTypes.__dict__:
             return model_meta["io_type"]
         return ModelIOTypes.PYTHON_DICT
+
+
+class PayloadOrients(object):
+    """The layouts of the "input" and "output" of requests to PANDAS_DATA_FRAME models, selected by the request's
+    "orient" key. The default is RECORDS.
+
+    """
+    RECORDS = "records"
+    COLUMNS = "columns"
+    SPLIT = "split"
+
+    ALL = (RECORDS, COLUMNS, SPLIT)
@@ -21,9 +21,10 @@ Also contains modules to convert and read data dict to schema format.
 """
 import copy
 
-from schema import Schema, And, Or, Optional
+from schema import Schema, And, Or, Optional, Regex
 
-from .model import ModelIOTypes
+from .model import ModelIOTypes, PayloadOrients
+from .tensor import TENSOR_DTYPES
 
 # The SCHEMAS dictionary holds the various schemas by key.
 # Schemas can be retrieved from this dict by get_schema (see below).
@@ -59,11 +60,30 @@ SCHEMAS["object"] = {
     }
 }
 
-# The IO schema is used in the model's specs and can be either an array or object
+# The tensor schema defines the dtype and shape of the input or output of NUMPY_ARRAY models.
+# Null dimensions can have any size.
+SCHEMAS["tensor"] = {
+    "type": "tensor",
+    "dtype": Or(*TENSOR_DTYPES),
+    "shape": [Or(None, And(int, lambda n: n >= 0))]
+}
+
+# The IO schema is used in the model's specs and can be either an array, object or tensor
 SCHEMAS["io"] = Or(SCHEMAS["object"], {
     "type": "array",
     "items": SCHEMAS["object"]
-})
+}, SCHEMAS["tensor"])
+
+# The concurrency profile of a model, which sets how the server runs predict @see catwalk.server.workers
+SCHEMAS["concurrency"] = {
+    Optional("bound"): Or("cpu", "io"),
+    Optional("releases_gil"): bool,
+    Optional("thread_safe"): bool,
+    Optional("memory"): Or(And(int, lambda n: n > 0), Regex(r"^\s*[0-9]+(\.[0-9]+)?\s*([kKmMgGtT]i?)?[bB]?\s*$")),
+    Optional("workers"): And(int, lambda n: n > 0),
+    Optional("threads"): And(int, lambda n: n > 0),
+    Optional("max_connections"): And(int, lambda n: n > 0)
+}
 
 # The meta schema is the schema used for the model.yml file
 SCHEMAS["meta"] = Schema({
@@ -73,7 +93,10 @@ SCHEMAS["meta"] = Schema({
         "name": And(str, len),
         "email": And(str, len)
     },
-    Optional("io_type"): Or(ModelIOTypes.PYTHON_DICT, ModelIOTypes.PANDAS_DATA_FRAME),
+    Optional("io_type"): Or(ModelIOTypes.PYTHON_DICT, ModelIOTypes.PANDAS_DATA_FRAME, ModelIOTypes.NUMPY_ARRAY,
+                            ModelIOTypes.COLUMNAR),
+    Optional("deterministic"): bool,
+    Optional("concurrency"): SCHEMAS["concurrency"],
     "schema": {
         "input": SCHEMAS["io"],
         "output": SCHEMAS["io"]
@@ -93,6 +116,9 @@ SCHEMAS["request_shell"] = {
         "version": And(str, len)
     },
     Optional("extra_data"): dict,
+    Optional("orient"): Or(*PayloadOrients.ALL),
+    # The Unix time (in seconds) after which the client no longer waits for the response
+    Optional("deadline"): Or(float, int),
     "input": None
 }
 
@@ -141,11 +167,30 @@ def to_schema(data) -> Schema:
         schema = {}
         for key, value in data["properties"].items():
             schema[key] = to_schema(value)
+    elif data["type"] == "tensor":
+        # Tensors are validated in their request and response form @see catwalk.validation.tensor
+        schema = {
+            Optional("dtype"): data["dtype"],
+            Optional("shape"): [And(int, lambda n: n >= 0)],
+            "data": Or(str, bytes)
+        }
     if "nullable" in data and data["nullable"]:
         schema = Or(None, schema)
     return Schema(schema)
 
 
+def to_columnar_schema(data) -> Schema:
+    """Converts the input or output schema of a COLUMNAR model into a Schema object that accepts a dict of columns,
+    or a list of records.
+
+    :param dict data: The swagger schema, an object or array of objects.
+    :return Schema:
+    """
+    items = data["items"] if data["type"] == "array" else data
+    columns = {key: [to_schema(value)] for key, value in items["properties"].items()}
+    return Schema(Or(columns, [to_schema(items)]))
+
+
 def get_request_schema(input_schema, io_type=ModelIOTypes.PYTHON_DICT) -> Schema:
     """Retrieves a request Schema object by copying the request_shell Schema and filling in the "input" key.
 
@@ -153,6 +198,8 @@ def get_request_schema(input_schema, io_type=ModelIOTypes.PYTHON_DICT) -> Schema
     :param str io_type: The IO type of the model @see ModelIOTypes.
     :return Schema: the complete request Schema object
     """
+    if isinstance(input_schema, dict) and io_type == ModelIOTypes.COLUMNAR:
+        input_schema = to_columnar_schema(input_schema)
     if isinstance(input_schema, dict):
         or_wrap_array = io_type == ModelIOTypes.PANDAS_DATA_FRAME and input_schema["type"] == "object"
         input_schema = to_schema(input_schema)
@@ -175,6 +222,11 @@ def get_response_schema(input_schema, output_schema, io_type=ModelIOTypes.PYTHON
                                             Set this to false to remove it from the Schema.
     :return Schema: the complete response Schema object
     """
+    if io_type == ModelIOTypes.COLUMNAR:
+        if isinstance(input_schema, dict):
+            input_schema = to_columnar_schema(input_schema)
+        if isinstance(output_schema, dict):
+            output_schema = to_columnar_schema(output_schema)
     if isinstance(input_schema, dict):
         or_wrap_array = io_type == ModelIOTypes.PANDAS_DATA_FRAME and input_schema["type"] == "object"
         input_schema = to_schema(input_schema)
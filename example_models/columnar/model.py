@@ -0,0 +1,78 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Example model:
+Standard scaler
+Model to load test data and predict values, using columns (a struct of arrays).
+"""
+from array import array
+
+
+class Model(object):
+    """This Model standardises values, given their mean and standard deviation.
+    """
+
+    def __init__(self, path="."):
+        """The Model constructor.
+
+        Use this to initialise your model, including loading any weights.
+
+        :param str path: The full path to the folder in which the model is located.
+        """
+        pass
+
+    def load_test_data(self, path=".") -> (dict, dict):
+        """Loads and returns test data.
+
+        Format of the returned data is a dict of equally long columns.
+
+        :param str path: The full path to the folder in which the model is located.
+        :return: Tuple of feature, target columns.
+        """
+        features = {
+            "id": [1, 2, 3],
+            "x": [1.0, 2.5, -1.0],
+            "mu": [0.0, 0.5, 1.0],
+            "sigma": [1.0, 2.0, 0.5]
+        }
+
+        targets = {
+            "id": [1, 2, 3],
+            "z": [1.0, 1.0, -4.0]
+        }
+
+        return features, targets
+
+    def predict(self, X) -> dict:
+        """Uses the model to predict a value.
+
+        The numeric columns are array.array columns, so they could also be wrapped with numpy.frombuffer.
+
+        :param dict X: The columns to predict against
+        :return dict: The prediction result columns
+        """
+        z = array("d", ((x - mu) / sigma for x, mu, sigma in zip(X["x"], X["mu"], X["sigma"])))
+        return {"id": X["id"], "z": z}
+
+
+if __name__ == "__main__":
+    m = Model()
+
+    X_test, y_test = m.load_test_data()
+    y = m.predict(X_test)
+    print(y)
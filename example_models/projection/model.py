@@ -0,0 +1,83 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""
+Example model:
+Linear projection
+Model to load test data and predict values, using numpy arrays (tensors).
+"""
+import numpy as np
+
+
+class Model(object):
+    """This Model projects 4-dimensional embeddings to 2 dimensions with a fixed linear map.
+    """
+
+    def __init__(self, path="."):
+        """The Model constructor.
+
+        Use this to initialise your model, including loading any weights.
+
+        :param str path: The full path to the folder in which the model is located.
+        """
+        self.weights = np.array([
+            [1.0, 0.0],
+            [0.5, -0.5],
+            [0.0, 1.0],
+            [-0.25, 0.25]
+        ], dtype=np.float32)
+        self.bias = np.array([0.0, 1.0], dtype=np.float32)
+
+    def load_test_data(self, path=".") -> (np.ndarray, np.ndarray):
+        """Loads and returns test data.
+
+        Format of the returned data is a float32 numpy array of shape (rows, 4), and one of shape (rows, 2).
+
+        :param str path: The full path to the folder in which the model is located.
+        :return: Tuple of feature, target arrays.
+        """
+        features = np.array([
+            [1.0, 2.0, 3.0, 4.0],
+            [0.5, 0.0, -1.0, 2.0],
+            [0.0, 0.0, 0.0, 0.0]
+        ], dtype=np.float32)
+
+        targets = np.array([
+            [1.0, 4.0],
+            [0.0, 0.5],
+            [0.0, 1.0]
+        ], dtype=np.float32)
+
+        return features, targets
+
+    def predict(self, X) -> np.ndarray:
+        """Uses the model to predict a value.
+
+        X is a read-only view of the request buffer, so it must not be modified in place.
+
+        :param np.ndarray X: The features to predict against, of shape (rows, 4)
+        :return np.ndarray: The prediction result, of shape (rows, 2)
+        """
+        return X @ self.weights + self.bias
+
+
+if __name__ == "__main__":
+    m = Model()
+
+    X_test, y_test = m.load_test_data()
+    y = m.predict(X_test)
+    print(y)
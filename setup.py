@@ -39,5 +39,10 @@ setup(
         "gunicorn",
         "gevent",
         "PyYAML",
-        "schema"]
+        "schema"],
+    extras_require={
+        "fast-json": ["orjson"],
+        "msgpack": ["msgpack"],
+        "arrow": ["pyarrow"]
+    }
 )
@@ -0,0 +1,106 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the JSON codecs"""
+import json
+import math
+import unittest
+
+from catwalk.server.codec import get_codec, StdlibCodec, CODECS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_get_codec(self):
+        print("Testing codec selection")
+
+        self.assertIn(get_codec("auto"), CODECS.values())
+        self.assertIs(get_codec("stdlib"), StdlibCodec)
+        with self.assertRaises(ValueError):
+            get_codec("foo")
+
+    def test_round_trip(self):
+        print("Testing codec round trips")
+
+        data = {"correlation_id": "1A", "input": [{"a": 1, "b": 1.5, "c": None, "d": "é", "e": [True, False]}]}
+        for codec in CODECS.values():
+            if codec.name == "orjson" and get_codec("auto") is StdlibCodec:
+                continue
+            encoded = codec.dumps(data)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(json.loads(encoded.decode("utf-8")), data)
+            self.assertEqual(codec.loads(encoded), data)
+
+            with self.assertRaises(ValueError):
+                codec.loads(b"This should fail")
+
+    def test_nan(self):
+        print("Testing NaN and Infinity round trips")
+
+        data = b'{"input": [{"a": NaN, "b": Infinity, "c": -Infinity, "d": 1.5}]}'
+        for codec in CODECS.values():
+            if codec.name == "orjson" and get_codec("auto") is StdlibCodec:
+                continue
+            row = codec.loads(data)["input"][0]
+            self.assertTrue(math.isnan(row["a"]))
+            self.assertEqual((row["b"], row["c"], row["d"]), (math.inf, -math.inf, 1.5))
+
+            # orjson writes NaN and Infinity as null, the stdlib json module writes the literals
+            row = codec.loads(codec.dumps({"input": [row]}))["input"][0]
+            if codec.name == "orjson":
+                self.assertEqual(row, {"a": None, "b": None, "c": None, "d": 1.5})
+            else:
+                self.assertTrue(math.isnan(row["a"]))
+                self.assertEqual((row["b"], row["c"], row["d"]), (math.inf, -math.inf, 1.5))
+
+    def test_large_integers(self):
+        print("Testing integers beyond 64 bits round trip exactly")
+
+        big = 2 ** 70
+        for codec in CODECS.values():
+            if codec.name == "orjson" and get_codec("auto") is StdlibCodec:
+                continue
+            for n in [big, 2 ** 64 - 1, 2 ** 63]:
+                data = '{"input": [%d, %d, 1.5]}' % (n, -n)
+                self.assertEqual(codec.loads(data)["input"], [n, -n, 1.5])
+                self.assertEqual(codec.loads(data.encode("utf-8"))["input"], [n, -n, 1.5])
+            self.assertEqual(codec.loads(codec.dumps({"output": [big, {"n": -big}]})), {"output": [big, {"n": -big}]})
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy(self):
+        print("Testing NumPy encoding")
+
+        data = {
+            "scalar": np.float64(0.5),
+            "int": np.int32(3),
+            "array": np.arange(4, dtype=np.float32) / 2,
+            "matrix": np.arange(6).reshape(2, 3)[:, ::2],
+        }
+        expected = {"scalar": 0.5, "int": 3, "array": [0.0, 0.5, 1.0, 1.5], "matrix": [[0, 2], [3, 5]]}
+        for codec in CODECS.values():
+            if codec.name == "orjson" and get_codec("auto") is StdlibCodec:
+                continue
+            self.assertEqual(json.loads(codec.dumps(data).decode("utf-8")), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -54,6 +54,11 @@ class TestConfig(unittest.TestCase):
         value = app_config.get_nested("nested.item2")
         self.assertEqual(value, "bar", "Nested config item not found.")
 
+        app_config.set_nested("nested.item", False)
+        value = app_config.get_nested("nested.item")
+        self.assertIs(value, False, "Nested config item not overwritten.")
+        self.assertEqual(app_config.get_nested("nested.item2"), "bar", "Nested config sibling was lost.")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test intra-batch row deduplication"""
+import unittest
+
+from catwalk.server.dedup import Deduplicator, unique_rows
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    pd = None
+
+
+class TestDedup(unittest.TestCase):
+
+    def test_unique_rows(self):
+        print("Testing unique rows of record lists")
+
+        X = [{"a": 1, "b": 2}, {"b": 2, "a": 1}, {"a": 2, "b": 2}, {"a": 1, "b": 2}]
+        first, inverse = unique_rows(X)
+        self.assertEqual(first, [0, 2])
+        self.assertEqual(inverse, [0, 0, 1, 0])
+
+    def test_predict(self):
+        print("Testing only unique rows are predicted")
+
+        predicted = []
+
+        def predict(X):
+            predicted.append(len(X))
+            return [{"y": x["x"] * 2} for x in X]
+
+        dedup = Deduplicator()
+        r = dedup.predict([{"x": 1}, {"x": 2}, {"x": 1}, {"x": 1}], predict)
+        self.assertEqual(r, [{"y": 2}, {"y": 4}, {"y": 2}, {"y": 2}])
+        self.assertEqual(predicted, [2])
+        self.assertEqual(dedup.stats()["dedup_ratio"], 0.5)
+
+    @unittest.skipIf(pd is None, "pandas is not installed")
+    def test_data_frame(self):
+        print("Testing DataFrame deduplication")
+
+        def predict(X):
+            return (X["a"] * 10).to_frame("y")
+
+        dedup = Deduplicator()
+        X = pd.DataFrame({"a": [1, 2, 1, 3, 2], "b": ["x", "y", "x", "z", "y"]})
+        r = dedup.predict(X, predict)
+        self.assertEqual(r["y"].tolist(), [10, 20, 10, 30, 20])
+        self.assertEqual(dedup.stats()["unique_rows"], 3)
+
+        # Columns of unhashable values fall back to canonical JSON
+        X = pd.DataFrame({"a": [[1], [2], [1]]})
+        self.assertEqual(unique_rows(X), ([0, 1], [0, 1, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
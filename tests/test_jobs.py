@@ -0,0 +1,291 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test asynchronous prediction jobs"""
+import os
+import os.path as osp
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.codec import get_codec
+from catwalk.server.jobs import JobManager, JobStore, JobQueueFull, DONE, FAILED, RUNNING, is_job_id
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+# Checks the gevent hub keeps running greenlets while a CPU bound job runs, with the predict pool disabled
+GEVENT_SCRIPT = """
+from gevent import monkey
+monkey.patch_all()
+import sys
+import tempfile
+import gevent
+from catwalk.server import app as app_server
+
+fd, config_path = tempfile.mkstemp()
+with open(fd, "w") as fp:
+    fp.write("server:\\n  jobs:\\n    enabled: true\\n    workers: 1\\n")
+app_server.init(config_path, sys.argv[1])
+
+def predict(X):
+    n = 0
+    for i in range(5000000):
+        n += i
+    return [{"n": n} for x in X]
+
+app_server.model.predict = predict
+ticks = []
+
+def tick():
+    while True:
+        ticks.append(1)
+        gevent.sleep(0.001)
+
+ticker = gevent.spawn(tick)
+X, _ = app_server.model.load_test_data()
+status = app_server.jobs.submit(X)
+gevent.sleep(0.01)
+before = len(ticks)
+status = app_server.jobs.status(status["job_id"], wait=60)
+ticker.kill()
+assert status["state"] == "done", status
+print(len(ticks) - before)
+"""
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = JobStore(self.path, get_codec(), page_size=2)
+        self.managers = []
+
+    def tearDown(self):
+        # The worker threads are stopped before their store is removed
+        for manager in self.managers:
+            manager.shutdown(10)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def manager(self, run_fn, **kwargs) -> JobManager:
+        manager = JobManager(run_fn, self.store, **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def test_pages(self):
+        print("Testing job results are stored in pages")
+
+        jobs = self.manager(lambda X: [{"y": x * 2} for x in X], workers=1)
+        status = jobs.submit([1, 2, 3, 4, 5], correlation_id="abc")
+        self.assertTrue(is_job_id(status["job_id"]))
+        self.assertEqual(status["correlation_id"], "abc")
+
+        status = jobs.status(status["job_id"], wait=10)
+        self.assertEqual(status["state"], DONE)
+        self.assertEqual(status["rows"], 5)
+        self.assertEqual(status["pages"], 3)
+
+        pages = [get_codec().loads(self.store.get_page(status["job_id"], n)) for n in range(3)]
+        self.assertEqual([row["y"] for page in pages for row in page["output"]], [2, 4, 6, 8, 10])
+        self.assertIsNone(self.store.get_page(status["job_id"], 3))
+
+    def test_failure(self):
+        print("Testing failed jobs report their error")
+
+        def fail(X):
+            raise ValueError("bad input")
+
+        jobs = self.manager(fail, workers=1)
+        status = jobs.status(jobs.submit([1])["job_id"], wait=10)
+        self.assertEqual(status["state"], FAILED)
+        self.assertEqual(status["error"], "bad input")
+        self.assertEqual(jobs.stats()["failed"], 1)
+
+    def test_queue_full(self):
+        print("Testing the job queue is bounded")
+
+        release = threading.Event()
+        started = threading.Event()
+
+        def block(X):
+            started.set()
+            release.wait(10)
+            return X
+
+        jobs = self.manager(block, workers=1, max_queue=1)
+        first = jobs.submit([1])
+        started.wait(10)
+        jobs.submit([2])
+        with self.assertRaises(JobQueueFull):
+            jobs.submit([3])
+        self.assertEqual(jobs.stats()["rejected"], 1)
+        self.assertEqual(len(os.listdir(self.path)), 2, "Rejected job was not removed from the store")
+
+        release.set()
+        self.assertEqual(jobs.status(first["job_id"], wait=10)["state"], DONE)
+
+    def test_store_error(self):
+        print("Testing a job fails, and the worker carries on, when its results cannot be stored")
+
+        jobs = self.manager(lambda X: X, workers=1)
+        with mock.patch.object(self.store, "put_results", side_effect=FileNotFoundError("gone")):
+            status = jobs.status(jobs.submit([1])["job_id"], wait=10)
+        self.assertEqual(status["state"], FAILED)
+        self.assertEqual(status["error"], "gone")
+        self.assertEqual(jobs.status(jobs.submit([2])["job_id"], wait=10)["state"], DONE)
+
+    def test_shutdown(self):
+        print("Testing shutdown stops the worker threads and fails the queued jobs")
+
+        release = threading.Event()
+        started = threading.Event()
+
+        def block(X):
+            started.set()
+            release.wait(10)
+            return X
+
+        jobs = self.manager(block, workers=1)
+        running = jobs.submit([1])
+        started.wait(10)
+        queued = jobs.submit([2])
+        threads = list(jobs._threads)
+        threading.Timer(0.1, release.set).start()
+        jobs.shutdown(10)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(jobs.status(running["job_id"])["state"], DONE)
+        status = jobs.status(queued["job_id"])
+        self.assertEqual(status["state"], FAILED)
+        self.assertEqual(status["error"], "The server was shut down.")
+        with self.assertRaises(JobQueueFull):
+            jobs.submit([3])
+
+    def test_unknown(self):
+        print("Testing unknown and malformed job ids")
+
+        jobs = self.manager(lambda X: X)
+        self.assertIsNone(jobs.status("0" * 32))
+        self.assertIsNone(jobs.status("../etc"))
+        self.assertIsNone(self.store.get_page("../etc", 0))
+
+    def test_orphaned(self):
+        print("Testing the jobs of stopped workers are failed and pruned")
+
+        dead = subprocess.Popen([sys.executable, "-c", ""])
+        dead.wait()
+        now = time.time()
+        for job_id, worker, submitted in [("1" * 32, dead.pid, now), ("2" * 32, os.getpid(), now),
+                                          ("3" * 32, None, now - 7200), ("4" * 32, None, now)]:
+            self.store.create(job_id, {"job_id": job_id, "state": RUNNING, "worker": worker, "submitted": submitted,
+                                       "finished": None, "error": None})
+
+        self.manager(lambda X: X)
+        states = {job_id: self.store.get_status(job_id)["state"] for job_id in os.listdir(self.path)}
+        self.assertEqual(states, {"1" * 32: FAILED, "2" * 32: RUNNING, "3" * 32: FAILED, "4" * 32: RUNNING})
+        self.assertEqual(self.store.get_status("1" * 32)["error"], "The worker running the job stopped.")
+
+        # With no ttl, the job without a worker is orphaned too, and only the live worker's job is kept
+        JobStore(self.path, get_codec(), ttl=-1).prune()
+        self.assertEqual(os.listdir(self.path), ["2" * 32])
+
+    def test_gevent(self):
+        print("Testing greenlets keep running while a job runs")
+
+        env = dict(os.environ, PYTHONPATH=osp.join(osp.dirname(osp.abspath(__file__)), ".."))
+        r = subprocess.run([sys.executable, "-c", GEVENT_SCRIPT, osp.join(EXAMPLES_PATH, "batch")],
+                           stdout=subprocess.PIPE, env=env, timeout=60)
+        self.assertEqual(r.returncode, 0)
+        self.assertGreater(int(r.stdout.decode("utf-8").strip().splitlines()[-1]), 5)
+
+
+class TestServerJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  jobs:\n    enabled: true\n    page_size: 3\n    path: {}\n".format(self.path))
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "batch"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        if app_server.jobs is not None:
+            app_server.jobs.shutdown(10)
+        os.remove(self.config_path)
+        shutil.rmtree(self.path, ignore_errors=True)
+        app_config.clear()
+
+    def test_job(self):
+        print("Testing a job is submitted, polled and its results fetched")
+
+        X, _ = app_server.model.load_test_data()
+        X = X * 3
+        rv = self.client.post("/jobs", json={"input": X})
+        self.assertEqual(rv.status_code, 202)
+        job_id = rv.get_json()["job_id"]
+        self.assertEqual(rv.headers["Location"], "/jobs/" + job_id)
+
+        rv = self.client.get("/jobs/{}?wait=10".format(job_id))
+        self.assertEqual(rv.status_code, 200)
+        status = rv.get_json()
+        self.assertEqual(status["state"], DONE)
+        self.assertEqual(status["rows"], len(X))
+
+        output = []
+        for page in range(status["pages"]):
+            rv = self.client.get("/jobs/{}/results?page={}".format(job_id, page))
+            self.assertEqual(rv.status_code, 200)
+            output.extend(rv.get_json()["output"])
+        self.assertEqual(output, app_server.predict_input(X))
+
+        rv = self.client.get("/jobs/{}/results?page={}".format(job_id, status["pages"]))
+        self.assertEqual(rv.status_code, 404)
+        self.assertEqual(self.client.get("/stats").get_json()["jobs"]["completed"], 1)
+
+    def test_single(self):
+        print("Testing a single record is predicted as a job of one row")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "dataframe"))
+        record = {"inputs": [0.5], "weights": [1.0]}
+        rv = self.client.post("/jobs", json={"input": record})
+        self.assertEqual(rv.status_code, 202)
+
+        status = self.client.get("/jobs/{}?wait=10".format(rv.get_json()["job_id"])).get_json()
+        self.assertEqual(status["state"], DONE)
+        self.assertEqual(status["rows"], 1)
+        rv = self.client.get("/jobs/{}/results?page=0".format(status["job_id"]))
+        self.assertEqual(rv.get_json()["output"], [app_server.predict_input(record)])
+
+    def test_errors(self):
+        print("Testing job request errors")
+
+        rv = self.client.post("/jobs", json={"input": [{"seed": "a"}]})
+        self.assertEqual(rv.status_code, 400)
+        rv = self.client.get("/jobs/" + "0" * 32)
+        self.assertEqual(rv.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
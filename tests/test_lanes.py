@@ -0,0 +1,202 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test priority lanes for predict calls"""
+import os
+import os.path as osp
+import tempfile
+import threading
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.lanes import get_lanes, LaneScheduler, Lane, lane_scope, current_lane, LANE_HEADER
+from catwalk.server.metrics import ServerMetrics
+from catwalk.server.offload import PredictPoolFull
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+def _wait_queued(scheduler, n):
+    while sum(len(lane.waiting) for lane in scheduler.lanes.values()) < n:
+        time.sleep(0.001)
+
+
+class TestLanes(unittest.TestCase):
+
+    def test_config(self):
+        print("Testing priority lanes are read from the config")
+
+        self.assertIsNone(get_lanes(None))
+        self.assertIsNone(get_lanes({"enabled": False}))
+
+        lanes = get_lanes({"enabled": True}, max_queue=8)
+        self.assertEqual([lane.name for lane in lanes], ["interactive", "bulk"])
+        self.assertEqual([lane.max_queue for lane in lanes], [8, 8])
+        self.assertEqual(lanes[1].min_rows, 1000)
+
+        lanes = get_lanes({"enabled": True, "default": "b", "lanes": {"a": {"weight": 2}, "b": None}})
+        self.assertEqual([lane.name for lane in lanes], ["b", "a"])
+
+        self.assertRaises(ValueError, get_lanes, {"enabled": True, "default": "c", "lanes": {"a": {}}})
+        self.assertRaises(ValueError, get_lanes, {"enabled": True, "lanes": {"a": {"weight": 0}}})
+        self.assertRaises(TypeError, get_lanes, {"enabled": True, "lanes": {"a": {"speed": 1}}})
+
+    def test_classify(self):
+        print("Testing requests are classified into lanes")
+
+        scheduler = LaneScheduler([Lane("interactive"), Lane("large", min_bytes=1000), Lane("bulk", min_rows=100)], 1)
+        self.assertEqual(scheduler.classify({}), "interactive")
+        self.assertEqual(scheduler.classify({LANE_HEADER: "bulk"}), "bulk")
+        self.assertEqual(scheduler.classify({}, {"priority": "bulk"}), "bulk")
+        self.assertEqual(scheduler.classify({LANE_HEADER: "interactive"}, {"priority": "bulk"}, rows=500),
+                         "interactive")
+        self.assertEqual(scheduler.classify({}, rows=100), "bulk")
+        self.assertEqual(scheduler.classify({LANE_HEADER: "unknown"}, rows=100), "bulk")
+        self.assertEqual(scheduler.classify({}, rows=99, size=1000), "large")
+        self.assertEqual(scheduler.classify({}, {"priority": 1}, rows=99, size=None), "interactive")
+
+        self.assertIsNone(current_lane())
+        with lane_scope("bulk"):
+            self.assertEqual(current_lane(), "bulk")
+        self.assertIsNone(current_lane())
+
+    def _run(self, scheduler, lanes):
+        """Queues a call per lane name while the only thread is busy, and returns the order they run in."""
+        held = scheduler.acquire()
+        order = []
+
+        def call(name):
+            lane = scheduler.acquire(name)
+            order.append(name)
+            scheduler.release(lane)
+
+        threads = [threading.Thread(target=call, args=(name,)) for name in lanes]
+        for t in threads:
+            t.start()
+        _wait_queued(scheduler, len(lanes))
+        scheduler.release(held)
+        for t in threads:
+            t.join()
+        return order
+
+    def test_weights(self):
+        print("Testing lanes share the threads by weight")
+
+        metrics = ServerMetrics(["predict"], None, {}, ["interactive", "bulk"])
+        scheduler = LaneScheduler(get_lanes({"enabled": True}), 1, metrics)
+        order = self._run(scheduler, ["bulk"] * 8 + ["interactive"] * 16)
+
+        self.assertEqual(len(order), 24)
+        self.assertEqual(order[:10].count("bulk"), 2)
+        self.assertEqual(order[-4:], ["bulk"] * 4)
+        self.assertEqual(scheduler.default.running + scheduler.lanes["bulk"].running, 0)
+
+        lines = metrics.render().decode("utf-8").splitlines()
+        self.assertIn('catwalk_lane_calls_total{lane="bulk"} 8.0', lines)
+        self.assertIn('catwalk_lane_calls_total{lane="interactive"} 17.0', lines)
+        self.assertIn('catwalk_lane_queue_depth{lane="bulk"} 0.0', lines)
+
+    def test_max_threads(self):
+        print("Testing lanes are kept to their max_threads")
+
+        scheduler = LaneScheduler([Lane("interactive"), Lane("bulk", max_threads=1)], 2)
+        bulk = scheduler.acquire("bulk")
+        waiting = threading.Thread(target=lambda: scheduler.release(scheduler.acquire("bulk")))
+        waiting.start()
+        _wait_queued(scheduler, 1)
+
+        # The other thread is left for interactive calls
+        interactive = scheduler.acquire("interactive")
+        self.assertEqual(len(scheduler.lanes["bulk"].waiting), 1)
+        scheduler.release(interactive)
+        scheduler.release(bulk)
+        waiting.join()
+        self.assertEqual(scheduler.lanes["bulk"].running, 0)
+
+    def test_max_queue(self):
+        print("Testing calls beyond a lane's queue are rejected")
+
+        scheduler = LaneScheduler([Lane("interactive", max_queue=1), Lane("bulk", max_queue=0)], 1)
+        held = scheduler.acquire("interactive")
+        self.assertRaises(PredictPoolFull, scheduler.acquire, "bulk")
+
+        waiting = threading.Thread(target=lambda: scheduler.release(scheduler.acquire("bulk", admit_all=True)))
+        waiting.start()
+        _wait_queued(scheduler, 1)
+        scheduler.release(held)
+        waiting.join()
+
+
+class TestServerLanes(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  predict_pool:\n    enabled: true\n    threads: 1\n"
+                     "  priority:\n    enabled: true\n    lanes:\n      interactive:\n        weight: 4\n"
+                     "      bulk:\n        max_queue: 0\n        min_rows: 2\n")
+        self.model_path = osp.join(EXAMPLES_PATH, "batch")
+        app_server.init(self.config_path, self.model_path)
+        self.client = app_server.app.test_client()
+        self.X, _ = app_server.model.load_test_data()
+
+    def tearDown(self):
+        app_server.init(None, self.model_path)
+        app_config.clear()
+        os.remove(self.config_path)
+
+    def test_lanes(self):
+        print("Testing bulk requests wait in their own lane")
+
+        self.assertGreaterEqual(len(self.X), 2)
+        release = threading.Event()
+        predict = app_server.model.predict
+        app_server.model.predict = lambda rows: release.wait(10) and predict(rows)
+        try:
+            codes = []
+            blocked = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": self.X}).status_code))
+            blocked.start()
+            while app_server.predict_pool.pending < 1:
+                time.sleep(0.001)
+
+            # The bulk lane has no queue, the interactive lane does
+            rv = self.client.post("/predict", json={"input": self.X[:1]}, headers={LANE_HEADER: "bulk"})
+            self.assertEqual(rv.status_code, 503)
+            waiting = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": self.X[:1]}).status_code))
+            waiting.start()
+            _wait_queued(app_server.predict_pool.lanes, 1)
+
+            release.set()
+            blocked.join()
+            waiting.join()
+            self.assertEqual(codes, [200, 200])
+        finally:
+            app_server.model.predict = predict
+
+        lines = self.client.get("/metrics").data.decode("utf-8").splitlines()
+        labels = 'model="{}",version="{}"'.format(app_server.model.info["name"], app_server.model.info["version"])
+        self.assertIn('catwalk_lane_calls_total{%s,lane="bulk"} 1.0' % labels, lines)
+        self.assertIn('catwalk_lane_calls_total{%s,lane="interactive"} 1.0' % labels, lines)
+        self.assertIn('catwalk_lane_rejected_total{%s,lane="bulk"} 1.0' % labels, lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test running predict in a bounded pool of native threads"""
+import os
+import os.path as osp
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.metrics import ServerMetrics
+from catwalk.server.offload import PredictPool, PredictPoolFull
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+# Checks the gevent hub keeps running greenlets while a CPU bound predict runs in the pool
+GEVENT_SCRIPT = """
+from gevent import monkey
+monkey.patch_all()
+import gevent
+from catwalk.server.offload import PredictPool
+
+def predict(X):
+    n = 0
+    for i in range(X):
+        n += i
+    return n
+
+ticks = []
+
+def tick():
+    while True:
+        ticks.append(1)
+        gevent.sleep(0.001)
+
+pool = PredictPool(threads=1)
+assert pool.is_gevent
+ticker = gevent.spawn(tick)
+gevent.sleep(0.01)
+before = len(ticks)
+pool.run(predict, 5000000)
+ticker.kill()
+print(len(ticks) - before)
+"""
+
+
+class TestPredictPool(unittest.TestCase):
+
+    def _block(self, pool, release, results):
+        def predict(X):
+            release.wait(10)
+            return X * 2
+
+        def call(X):
+            try:
+                results.append(pool.run(predict, X))
+            except PredictPoolFull as err:
+                results.append(err)
+
+        return call
+
+    def test_bounded(self):
+        print("Testing calls beyond the threads and queue are rejected")
+
+        metrics = ServerMetrics(["predict"])
+        pool = PredictPool(threads=1, max_queue=1, metrics=metrics)
+        self.assertFalse(pool.is_gevent)
+        self.assertEqual(pool.run(lambda X: X + 1, 1), 2)
+
+        release = threading.Event()
+        results = []
+        call = self._block(pool, release, results)
+        callers = [threading.Thread(target=call, args=(i,)) for i in range(2)]
+        for caller in callers:
+            caller.start()
+        while pool.pending < 2:
+            pass
+        self.assertEqual(metrics.registry.values[metrics.predict_queue.slot()], 1.0)
+
+        with self.assertRaises(PredictPoolFull):
+            pool.run(lambda X: X, 3)
+
+        def admitted():
+            with pool.admit_all():
+                results.append(pool.run(lambda X: X, 4))
+        caller = threading.Thread(target=admitted)
+        caller.start()
+        callers.append(caller)
+        while pool.pending < 3:
+            pass
+
+        release.set()
+        for caller in callers:
+            caller.join()
+        self.assertEqual(sorted(results), [0, 2, 4])
+        self.assertEqual(pool.pending, 0)
+
+        values = metrics.registry.values
+        slot, width = metrics.predict_wait.slot(), metrics.predict_wait.width
+        self.assertEqual(values[metrics.predict_rejected.slot()], 1.0)
+        self.assertEqual(values[metrics.predict_queue.slot()], 0.0)
+        self.assertEqual(sum(values[slot:slot + width - 1]), 4.0, "4 calls should have waited for a thread")
+        pool.shutdown()
+
+    def test_gevent(self):
+        print("Testing greenlets keep running while predict runs in gevent's thread pool")
+
+        env = dict(os.environ, PYTHONPATH=osp.join(osp.dirname(osp.abspath(__file__)), ".."))
+        r = subprocess.run([sys.executable, "-c", GEVENT_SCRIPT], stdout=subprocess.PIPE, env=env, timeout=60)
+        self.assertEqual(r.returncode, 0)
+        self.assertGreater(int(r.stdout.decode("utf-8").strip()), 5)
+
+
+class TestServerPredictPool(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  predict_pool:\n    enabled: true\n    max_queue: 0\n    retry_after: 2\n")
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "batch"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        app_server.init(None, osp.join(EXAMPLES_PATH, "batch"))
+        app_config.clear()
+        os.remove(self.config_path)
+
+    def test_reject(self):
+        print("Testing requests are rejected with 503 when the predict pool is full")
+
+        self.assertEqual(app_server.predict_pool.threads, 1)
+        X, _ = app_server.model.load_test_data()
+        self.assertEqual(self.client.post("/predict", json={"input": X}).status_code, 200)
+
+        release = threading.Event()
+        predict = app_server.model.predict
+        app_server.model.predict = lambda rows: release.wait(10) and predict(rows)
+        try:
+            codes = []
+            blocked = threading.Thread(target=lambda: codes.append(
+                app_server.app.test_client().post("/predict", json={"input": X}).status_code))
+            blocked.start()
+            while app_server.predict_pool.pending < 1:
+                pass
+
+            rv = self.client.post("/predict", json={"input": X})
+            self.assertEqual(rv.status_code, 503)
+            self.assertEqual(rv.headers["Retry-After"], "2")
+            self.assertEqual(self.client.get("/status").status_code, 200)
+
+            release.set()
+            blocked.join()
+            self.assertEqual(codes, [200])
+        finally:
+            app_server.model.predict = predict
+
+        lines = self.client.get("/metrics").data.decode("utf-8").splitlines()
+        self.assertTrue(any(line.startswith("catwalk_predict_rejected_total{") and line.endswith(" 1.0")
+                            for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the column oriented ("columns" and "split") payloads of PANDAS_DATA_FRAME models"""
+import json
+import os.path as osp
+import unittest
+
+from schema import SchemaError
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.orient import batch_rows
+from catwalk.validation.compiler import ColumnsSchema, SplitSchema, compile_orient_schemas
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "a": {"type": "integer"},
+        "b": {"type": "array", "items": {"type": "number"}}
+    }
+}
+
+
+class TestOrientSchemas(unittest.TestCase):
+
+    def test_columns(self):
+        print("Testing columns oriented inputs are validated")
+
+        schema = ColumnsSchema(INPUT_SCHEMA)
+        schema.validate({"a": [1, 2], "b": [[0.5], [1.0, 2.0]]})
+        schema.validate({"a": [], "b": []})
+
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.a\[1\]' error"):
+            schema.validate({"a": [1, "x"], "b": [[0.5], [1.0]]})
+        with self.assertRaisesRegex(SchemaError, "Missing key"):
+            schema.validate({"a": [1]})
+        with self.assertRaisesRegex(SchemaError, "same length"):
+            schema.validate({"a": [1, 2], "b": [[0.5]]})
+
+    def test_split(self):
+        print("Testing split oriented inputs are validated")
+
+        schema = SplitSchema(INPUT_SCHEMA)
+        schema.validate({"columns": ["b", "a"], "data": [[[0.5], 1], [[1.0], 2]]})
+        schema.validate({"columns": ["a", "b"], "data": [], "index": [0, 1]})
+
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.a\[1\]' error"):
+            schema.validate({"columns": ["a", "b"], "data": [[1, [0.5]], [None, [1.0]]]})
+        with self.assertRaisesRegex(SchemaError, "Key 'input.columns' error"):
+            schema.validate({"columns": ["a", "c"], "data": []})
+        with self.assertRaisesRegex(SchemaError, r"Key 'input.data\[0\]' error"):
+            schema.validate({"columns": ["a", "b"], "data": [[1]]})
+        with self.assertRaisesRegex(SchemaError, "Missing key"):
+            schema.validate({"columns": ["a", "b"]})
+
+    def test_io_types(self):
+        print("Testing only PANDAS_DATA_FRAME models accept column oriented inputs")
+
+        self.assertEqual(compile_orient_schemas(INPUT_SCHEMA), {})
+        self.assertEqual(sorted(compile_orient_schemas(INPUT_SCHEMA, "PANDAS_DATA_FRAME")), ["columns", "split"])
+
+    def test_batch_rows(self):
+        print("Testing the rows of inputs are counted in every orientation")
+
+        self.assertEqual(batch_rows({"a": 1}), 1)
+        self.assertEqual(batch_rows([{"a": 1}, {"a": 2}]), 2)
+        self.assertEqual(batch_rows({"a": [1, 2, 3]}, "columns"), 3)
+        self.assertEqual(batch_rows({"columns": ["a"], "data": [[1]]}, "split"), 1)
+
+
+class TestServerOrient(unittest.TestCase):
+
+    def tearDown(self):
+        app_config.clear()
+
+    def _predict(self, orient, X):
+        data = {"input": X}
+        if orient is not None:
+            data["orient"] = orient
+        return self.client.post("/predict", data=json.dumps(data), content_type="application/json")
+
+    def test_data_frame(self):
+        print("Testing DataFrame models return the same results in every orientation")
+
+        app_server.init(None, osp.join(EXAMPLES_PATH, "dataframe"))
+        self.client = app_server.app.test_client()
+        X, _ = app_server.model.load_test_data()
+
+        rv = self._predict(None, X.to_dict(orient="records"))
+        self.assertEqual(rv.status_code, 200)
+        records = json.loads(rv.data)["output"]
+
+        rv = self._predict("columns", X.to_dict(orient="list"))
+        self.assertEqual(rv.status_code, 200)
+        r = json.loads(rv.data)
+        self.assertEqual(r["orient"], "columns")
+        self.assertEqual(r["output"], {"activation": [row["activation"] for row in records]})
+
+        rv = self._predict("split", {"columns": list(X.columns), "data": X.values.tolist()})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(json.loads(rv.data)["output"], {"columns": ["activation"],
+                                                         "data": [[row["activation"]] for row in records]})
+
+    def test_errors(self):
+        print("Testing invalid column oriented requests are rejected")
+
+        app_server.init(None, osp.join(EXAMPLES_PATH, "dataframe"))
+        self.client = app_server.app.test_client()
+
+        rv = self._predict("columns", {"inputs": [[0.5], "x"], "weights": [[1.0], [1.0]]})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn("input.inputs[1]", json.loads(rv.data)["output"]["message"])
+
+        rv = self._predict("index", {"inputs": [[0.5]], "weights": [[1.0]]})
+        self.assertEqual(rv.status_code, 400)
+
+        app_server.init(None, osp.join(EXAMPLES_PATH, "neuron"))
+        self.client = app_server.app.test_client()
+        rv = self._predict("columns", {"inputs": [[0.5]], "weights": [[1.0]]})
+        self.assertEqual(rv.status_code, 400)
+        self.assertIn("PANDAS_DATA_FRAME", json.loads(rv.data)["output"]["message"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test preloading the model in the gunicorn master, and reporting worker memory"""
+import gc
+import multiprocessing
+import os
+import os.path as osp
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from jinja2 import Environment, PackageLoader
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.memory import read_memory, format_memory, SIZES
+from catwalk.server.metrics import ServerMetrics
+from catwalk.server.nginx import render_template
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+# The app is imported and preloaded by the gunicorn master before the gevent worker patches threading
+GEVENT_SCRIPT = """
+import sys
+from catwalk.server import app as app_server
+app_server.preload(None, sys.argv[1])
+
+from gevent import monkey
+monkey.patch_all()
+import gevent
+from catwalk.server.admission import deadline_scope, current_deadline
+from catwalk.server.lanes import lane_scope, current_lane
+from catwalk.server.offload import native_scope, in_native_scope
+
+def request(deadline, lane, native):
+    with deadline_scope(deadline), lane_scope(lane):
+        if native:
+            with native_scope():
+                gevent.sleep(0.05)
+                return current_deadline(), current_lane(), in_native_scope()
+        gevent.sleep(0.05)
+        return current_deadline(), current_lane(), in_native_scope()
+
+first = gevent.spawn(request, 1.0, "interactive", True)
+gevent.sleep(0.01)
+second = gevent.spawn(request, 2.0, "bulk", False)
+gevent.joinall([first, second])
+assert first.value == (1.0, "interactive", True), first.value
+assert second.value == (2.0, "bulk", False), second.value
+print("isolated")
+"""
+
+
+def _init_in_child(model_path, conn):
+    # As the gunicorn post_worker_init hook does
+    preloaded = app_server.model
+    app_server.init(None, model_path)
+    conn.send((app_server.model is preloaded, app_server.metrics is not None))
+    conn.close()
+
+
+class TestMemory(unittest.TestCase):
+
+    @unittest.skipIf(read_memory() is None, "/proc is not available")
+    def test_read_memory(self):
+        print("Testing process memory is read")
+
+        memory = read_memory()
+        self.assertEqual(set(memory), set(SIZES))
+        self.assertGreater(memory["rss"], 0)
+        self.assertLessEqual(memory["uss"], memory["pss"])
+        self.assertLessEqual(memory["pss"], memory["rss"])
+        self.assertEqual(memory["uss"] + memory["shared"], memory["rss"])
+        self.assertIn("uss", format_memory(memory))
+
+        self.assertIsNone(read_memory(2 ** 30))
+        self.assertEqual(format_memory(None), "unavailable")
+
+    @unittest.skipIf(read_memory() is None, "/proc is not available")
+    def test_metrics(self):
+        print("Testing the memory of each worker is exported")
+
+        path = tempfile.mkdtemp()
+        try:
+            metrics = ServerMetrics(["predict"], path, {"model": "m"})
+            metrics.rows.inc()
+            lines = metrics.render().decode("utf-8").splitlines()
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+        self.assertIn("# TYPE catwalk_worker_memory_bytes gauge", lines)
+        for size in SIZES:
+            prefix = 'catwalk_worker_memory_bytes{model="m",pid="%d",kind="%s"} ' % (os.getpid(), size)
+            self.assertTrue(any(line.startswith(prefix) for line in lines), prefix)
+
+
+class TestPreload(unittest.TestCase):
+
+    def tearDown(self):
+        app_server.preloaded = None
+        if hasattr(gc, "unfreeze"):
+            gc.unfreeze()
+        app_config.clear()
+
+    def test_preload(self):
+        print("Testing workers use the model preloaded by the master")
+
+        model_path = osp.join(EXAMPLES_PATH, "rng")
+        app_server.preload(None, model_path)
+        self.assertIsNotNone(app_server.preloaded)
+        if hasattr(gc, "get_freeze_count"):
+            self.assertGreater(gc.get_freeze_count(), 0)
+
+        m = app_server.preloaded[1]
+        app_server.init(None, model_path)
+        self.assertIs(app_server.model, m)
+        self.assertEqual(app_config.get_nested("model.name"), m.info["name"])
+
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.get_context("fork").Process(target=_init_in_child, args=(model_path, child))
+        process.start()
+        self.assertEqual(parent.recv(), (True, True))
+        process.join()
+
+        # Other models are still loaded by init
+        app_server.init(None, osp.join(EXAMPLES_PATH, "batch"))
+        self.assertIsNot(app_server.model, m)
+
+    def test_gevent(self):
+        print("Testing request contexts stay local to greenlets when the app is preloaded before gevent patches")
+
+        env = dict(os.environ, PYTHONPATH=osp.join(osp.dirname(osp.abspath(__file__)), ".."))
+        r = subprocess.run([sys.executable, "-c", GEVENT_SCRIPT, osp.join(EXAMPLES_PATH, "rng")],
+                           stdout=subprocess.PIPE, env=env, timeout=60)
+        self.assertEqual(r.returncode, 0)
+        self.assertEqual(r.stdout.decode("utf-8").strip().splitlines()[-1], "isolated")
+
+    def test_warm_up(self):
+        print("Testing every example model is warmed up")
+
+        for name in sorted(os.listdir(EXAMPLES_PATH)):
+            path = osp.join(EXAMPLES_PATH, name)
+            if osp.exists(osp.join(path, "model.yml")):
+                app_server.warm_up(app_server.load_model(path), path)
+
+    def test_templates(self):
+        print("Testing the wsgi module preloads the model")
+
+        env = Environment(loader=PackageLoader("catwalk", "templates"))
+        path = tempfile.mkdtemp()
+        try:
+            kwargs = {"config": "", "model_path": "/model", "preload": True}
+            render_template(env, "wsgi.py", path, kwargs)
+            render_template(env, "gunicorn.conf.py", path, kwargs)
+            with open(osp.join(path, "wsgi.py")) as fp:
+                self.assertIn('app = preload("", "/model")', fp.read())
+            with open(osp.join(path, "gunicorn.conf.py")) as fp:
+                self.assertIn("def post_worker_init(worker):", fp.read())
+
+            render_template(env, "wsgi.py", path, dict(kwargs, preload=False))
+            with open(osp.join(path, "wsgi.py")) as fp:
+                self.assertIn('app = init("", "/model")', fp.read())
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test the NDJSON streaming predict end-point"""
+import json
+import os
+import os.path as osp
+import tempfile
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.codec import get_codec
+from catwalk.server.streaming import stream_predictions
+from catwalk.validation.compiler import compile_schema
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+ROW_SCHEMA = {"type": "object", "properties": {"x": {"type": "integer"}}}
+
+
+def _predict(X):
+    return [{"y": x["x"] * 2} for x in X]
+
+
+class TestStreamPredictions(unittest.TestCase):
+
+    def test_chunks(self):
+        print("Testing records are predicted in chunks")
+
+        chunks = []
+
+        def predict(X):
+            chunks.append(len(X))
+            return _predict(X)
+
+        lines = [b'{"x": 1}\n', b'{"x": 2}\n', b'\n', b'{"x": 3}\n']
+        body = list(stream_predictions(lines, predict, get_codec(), compile_schema(ROW_SCHEMA), chunk_size=2))
+        self.assertEqual(chunks, [2, 1])
+        self.assertEqual(len(body), 2, "One response chunk per predicted chunk")
+        self.assertEqual([json.loads(line) for line in b"".join(body).splitlines()], [{"y": 2}, {"y": 4}, {"y": 6}])
+
+    def test_errors(self):
+        print("Testing invalid lines stop the stream with an error record")
+
+        lines = [b'{"x": 1}\n', b'{"x": "a"}\n', b'{"x": 3}\n']
+        body = b"".join(stream_predictions(lines, _predict, get_codec(), compile_schema(ROW_SCHEMA)))
+        r = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(r[0], {"y": 2}, "Valid records before the error were not predicted")
+        self.assertEqual(r[1]["error"]["line"], 2)
+        self.assertIn("x", r[1]["error"]["message"])
+        self.assertEqual(len(r), 2)
+
+        body = b"".join(stream_predictions([b'{"x": '], _predict, get_codec(), compile_schema(ROW_SCHEMA)))
+        self.assertEqual(json.loads(body), {"error": {"line": 1, "message": "JSON parse error."}})
+
+    def test_predict_errors(self):
+        print("Testing predict errors stop the stream with an error record")
+
+        def predict(X):
+            if any(x["x"] == 3 for x in X):
+                raise ValueError("bad record")
+            return _predict(X)
+
+        for n in range(3, 5):
+            lines = [b'{"x": 1}\n', b'{"x": 2}\n', b'{"x": 3}\n', b'{"x": 4}\n'][:n]
+            body = b"".join(stream_predictions(lines, predict, get_codec(), compile_schema(ROW_SCHEMA), chunk_size=2))
+            r = [json.loads(line) for line in body.splitlines()]
+            self.assertEqual(r, [{"y": 2}, {"y": 4},
+                                 {"error": {"line": 3, "message": "Predict failed: bad record"}}])
+
+
+class TestServerStream(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  stream:\n    chunk_size: 3\n")
+
+    def tearDown(self):
+        os.remove(self.config_path)
+        app_config.clear()
+
+    def _stream(self, example):
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, example))
+        client = app_server.app.test_client()
+
+        X, _ = app_server.model.load_test_data()
+        if hasattr(X, "to_dict"):
+            X = X.to_dict(orient="records")
+        records = X if isinstance(X, list) else [X]
+        records = records * 4
+        data = "".join(json.dumps(r) + "\n" for r in records)
+
+        rv = client.post("/predict/stream", data=data, content_type="application/x-ndjson",
+                         headers={"X-Correlation-ID": "stream-test"})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/x-ndjson")
+        self.assertEqual(rv.headers["X-Correlation-ID"], "stream-test")
+        return records, [json.loads(line) for line in rv.data.splitlines()]
+
+    def test_batch(self):
+        print("Testing streaming predict of a batch model")
+
+        records, r = self._stream("batch")
+        self.assertEqual(len(r), len(records))
+        self.assertEqual(r, [app_server.predict_input([x])[0] for x in records])
+
+    def test_data_frame(self):
+        print("Testing streaming predict of a DataFrame model")
+
+        records, r = self._stream("dataframe")
+        self.assertEqual(len(r), len(records))
+        for row in r:
+            self.assertIn("activation", row)
+
+    def test_not_batch(self):
+        print("Testing streaming is rejected for models that do not predict batches")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "rng"))
+        rv = app_server.app.test_client().post("/predict/stream", data="{}\n")
+        self.assertEqual(rv.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test per-request stage timing"""
+import os
+import os.path as osp
+import tempfile
+import time
+import unittest
+
+from catwalk.helpers.configuration import app_config
+from catwalk.server import app as app_server
+from catwalk.server.timing import StageTimer, parse_server_timing
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+
+class TestStageTimer(unittest.TestCase):
+
+    def test_laps(self):
+        print("Testing stage laps add up")
+
+        timer = StageTimer()
+        time.sleep(0.01)
+        timer.lap("a")
+        sum(range(100000))
+        timer.lap("b")
+        time.sleep(0.01)
+        timer.lap("a")
+
+        self.assertEqual(list(timer.stages), ["a", "b"])
+        wall, cpu = timer.stages["a"]
+        self.assertGreaterEqual(wall, 0.02)
+        self.assertLess(cpu, wall, "Sleeping should not use CPU time")
+        self.assertAlmostEqual(sum(w for w, _ in timer.stages.values()), timer.total)
+
+    def test_server_timing(self):
+        print("Testing the Server-Timing header format")
+
+        timer = StageTimer()
+        timer.lap("parse")
+        timings = parse_server_timing(timer.server_timing())
+        self.assertEqual(list(timings), ["parse", "total"])
+        self.assertTrue(timings["parse"]["desc"].startswith("cpu="))
+        self.assertIsInstance(timings["total"]["dur"], float)
+        self.assertEqual(list(timer.to_dict()["stages"]["parse"]), ["wall_ms", "cpu_ms"])
+
+
+class TestServerTiming(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.write("server:\n  timing:\n    header: true\n")
+
+        app_server.init(self.config_path, osp.join(EXAMPLES_PATH, "dataframe"))
+        self.client = app_server.app.test_client()
+
+    def tearDown(self):
+        os.remove(self.config_path)
+        app_config.clear()
+
+    def test_header(self):
+        print("Testing predict responses report stage timings")
+
+        X, _ = app_server.model.load_test_data()
+        with self.assertLogs("catwalk.server.app", "INFO") as logs:
+            rv = self.client.post("/predict", json={"correlation_id": "timed", "input": X.to_dict(orient="records")})
+        self.assertEqual(rv.status_code, 200)
+
+        timings = parse_server_timing(rv.headers["Server-Timing"])
+        self.assertEqual(list(timings), ["parse", "validate", "convert", "predict", "serialize", "total"])
+
+        records = [r for r in logs.records if hasattr(r, "timing")]
+        self.assertEqual(len(records), 1, "Timings should be logged once per request")
+        self.assertEqual(records[0].correlation_id, "timed")
+        self.assertIn("predict", records[0].timing["stages"])
+
+        # Other end-points are not timed
+        self.assertNotIn("Server-Timing", self.client.get("/info").headers)
+
+    def test_disabled(self):
+        print("Testing the Server-Timing header is off by default")
+
+        app_config.set_nested("server.timing.header", False)
+        X, _ = app_server.model.load_test_data()
+        rv = self.client.post("/predict", json={"input": X.to_dict(orient="records")})
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotIn("Server-Timing", rv.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+##############################################################################
+#
+# Copyright 2019 Leap Beyond Emerging Technologies B.V. (unless otherwise stated)
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+##############################################################################
+"""Module to test planning the gunicorn workers from concurrency profiles"""
+import os
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+import yaml
+from schema import SchemaError
+
+from catwalk.server.workers import parse_memory, cgroup_cpus, cgroup_memory, available_cpus, get_profile, \
+    plan_workers, SYNC, GTHREAD, GEVENT
+from catwalk.validation.schema import get_schema
+
+EXAMPLES_PATH = osp.join(osp.dirname(osp.abspath(__file__)), "..", "example_models")
+
+GIB = 1024 ** 3
+
+
+def profile(**kwargs):
+    return get_profile({"concurrency": kwargs})
+
+
+class TestCgroups(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, name, value):
+        path = osp.join(self.root, name)
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        with open(path, "w") as fp:
+            fp.write(value + "\n")
+
+    def test_v2(self):
+        print("Testing cgroup v2 limits are read")
+
+        self._write("cpu.max", "150000 100000")
+        self._write("memory.max", str(2 * GIB))
+        self.assertEqual(cgroup_cpus(self.root), 1.5)
+        self.assertEqual(cgroup_memory(self.root), 2 * GIB)
+        cpus, source = available_cpus(self.root)
+        self.assertLessEqual(cpus, 2, "A quota of 1.5 CPUs should round up to 2")
+
+        self._write("cpu.max", "max 100000")
+        self._write("memory.max", "max")
+        self.assertIsNone(cgroup_cpus(self.root))
+        self.assertIsNone(cgroup_memory(self.root))
+
+    def test_v1(self):
+        print("Testing cgroup v1 limits are read")
+
+        self.assertIsNone(cgroup_cpus(self.root))
+        self.assertIsNone(cgroup_memory(self.root))
+
+        self._write("cpu/cpu.cfs_quota_us", "400000")
+        self._write("cpu/cpu.cfs_period_us", "100000")
+        self._write("memory/memory.limit_in_bytes", str(GIB))
+        self.assertEqual(cgroup_cpus(self.root), 4.0)
+        self.assertEqual(cgroup_memory(self.root), GIB)
+
+        self._write("cpu/cpu.cfs_quota_us", "-1")
+        self._write("memory/memory.limit_in_bytes", "9223372036854771712")
+        self.assertIsNone(cgroup_cpus(self.root))
+        self.assertIsNone(cgroup_memory(self.root))
+
+
+class TestWorkerPlan(unittest.TestCase):
+
+    def test_parse_memory(self):
+        print("Testing memory sizes are parsed")
+
+        self.assertEqual(parse_memory(1000), 1000)
+        self.assertEqual(parse_memory("512Mi"), 512 * 1024 ** 2)
+        self.assertEqual(parse_memory("2G"), 2 * 1000 ** 3)
+        self.assertEqual(parse_memory("1.5gib"), int(1.5 * GIB))
+        with self.assertRaises(ValueError):
+            parse_memory("lots")
+
+    def test_profiles(self):
+        print("Testing the worker class and count follow the profile")
+
+        plan = plan_workers(profile(bound="cpu"), 32, environ={})
+        self.assertEqual((plan.worker_class, plan.workers), (SYNC, 32))
+        self.assertEqual(plan.gunicorn_args(), ["-k", "sync", "-w", "32"])
+
+        plan = plan_workers(profile(bound="cpu", releases_gil=True, thread_safe=True), 32, environ={})
+        self.assertEqual((plan.worker_class, plan.workers, plan.threads), (GTHREAD, 8, 4))
+        self.assertEqual(plan.gunicorn_args(), ["-k", "gthread", "-w", "8", "--threads", "4",
+                                                "--worker-connections", "1000"])
+
+        plan = plan_workers(profile(bound="cpu", releases_gil=True, thread_safe=False), 32, environ={})
+        self.assertEqual((plan.worker_class, plan.workers), (SYNC, 32))
+
+        plan = plan_workers(profile(bound="io", thread_safe=True, max_connections=50), 4, environ={})
+        self.assertEqual((plan.worker_class, plan.workers, plan.concurrency), (GEVENT, 4, 200))
+
+        plan = plan_workers(profile(bound="io"), 4, environ={})
+        self.assertEqual((plan.worker_class, plan.workers), (SYNC, 9))
+        self.assertTrue(any("I/O bound" in reason for reason in plan.reasons))
+
+    def test_limits(self):
+        print("Testing worker counts are capped by memory and the environment")
+
+        plan = plan_workers(profile(memory="3Gi"), 32, 32 * GIB, environ={})
+        self.assertEqual(plan.workers, 9)
+        self.assertIn("memory", plan.reasons[-1])
+        self.assertEqual(plan_workers(profile(memory="64Gi"), 32, 32 * GIB, environ={}).workers, 1)
+        self.assertEqual(plan_workers(profile(memory="1Gi"), 4, None, environ={}).workers, 4)
+
+        self.assertEqual(plan_workers(profile(workers=6), 32, environ={}).workers, 6)
+        self.assertEqual(plan_workers(profile(), 32, environ={"MODEL_SERVER_WORKERS": "5"}).workers, 5)
+        self.assertEqual(plan_workers(profile(), 32, environ={"MAX_MODEL_SERVER_WORKERS": "16"}).workers, 16)
+
+    def test_legacy(self):
+        print("Testing models without a profile keep the gevent workers")
+
+        self.assertIsNone(get_profile({}))
+        plan = plan_workers(None, 32, environ={})
+        self.assertEqual((plan.worker_class, plan.workers), (GEVENT, 3))
+        self.assertEqual(plan_workers(None, 2, environ={}).workers, 2)
+        self.assertEqual(plan_workers(None, 32, environ={"MAX_MODEL_SERVER_WORKERS": "8"}).workers, 8)
+
+    def test_config(self):
+        print("Testing the server config overrides the model's profile")
+
+        info = {"concurrency": {"bound": "io", "thread_safe": True}}
+        self.assertEqual(get_profile(info, {"bound": "cpu"}),
+                         {"bound": "cpu", "releases_gil": False, "thread_safe": True})
+        self.assertEqual(get_profile({}, {"bound": "io"})["bound"], "io")
+
+    def test_schema(self):
+        print("Testing model.yml concurrency profiles are validated")
+
+        with open(osp.join(EXAMPLES_PATH, "projection", "model.yml")) as fp:
+            info = yaml.safe_load(fp)
+        get_schema("meta").validate(info)
+        self.assertTrue(info["concurrency"]["releases_gil"])
+
+        info["concurrency"] = {"bound": "gpu"}
+        with self.assertRaises(SchemaError):
+            get_schema("meta").validate(info)
+
+
+if __name__ == '__main__':
+    unittest.main()